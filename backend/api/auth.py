@@ -9,7 +9,8 @@ from pydantic import BaseModel, EmailStr
 import os
 from dotenv import load_dotenv
 
-from ..models import get_db, User
+from models import get_db, User
+from services.admission import admission_controller
 
 load_dotenv()
 
@@ -83,6 +84,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     user = db.query(User).filter(User.email == token_data.email).first()
     if user is None:
         raise credentials_exception
+    # Later requests with this token take the user's admission slots
+    admission_controller.verify(token, str(user.id))
     return user
 
 # Routes
@@ -0,0 +1,413 @@
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel, Field
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from models import get_db, SessionLocal, User, MetaAdAccount, Campaign, CampaignMetrics, AdSet, Ad, engine
+from services.backfill import BACKFILL_MONTHS, BackfillPlanner, BackfillRunner, Chunk
+from services.campaign_counts import campaign_count_cache
+from services.column_store import archive_settled_days, column_store
+from services.graph_api import graph_get_all, normalize_account_id
+from services.hierarchy_sync import (
+    HIERARCHY_LEVELS, REMOVED_STATUSES, HierarchyLevel, LevelDelta, fetch_hierarchy_delta, plan_upserts
+)
+from services.jobs import DeferJob, Job, JobQueue, JobWorker, PermanentJobError, default_worker_id
+from services.records import MetricsRow
+from services.sharding import ShardCoordinator, async_advisory_lock
+from services.sync_scheduler import SyncScheduler
+from .auth import get_current_user
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+job_queue = JobQueue(engine)
+sync_scheduler = SyncScheduler(job_queue)
+backfill_planner = BackfillPlanner(engine)
+
+JobType = Literal['sync', 'backfill']
+# Jobs of each type one worker process runs at once
+JOB_CONCURRENCY = {
+    'sync': int(os.getenv("SYNC_JOB_CONCURRENCY", "4")),
+    'backfill': int(os.getenv("BACKFILL_JOB_CONCURRENCY", "1")),
+}
+# How long a job whose account another worker has locked waits before trying again
+ACCOUNT_LOCK_RETRY_SECONDS = float(os.getenv("ACCOUNT_LOCK_RETRY_SECONDS", "30"))
+# Fields read for each ad account a sync lists
+AD_ACCOUNT_FIELDS = ['id', 'name', 'currency', 'timezone_name', 'account_status']
+
+# Pydantic models
+class EnqueueJobRequest(BaseModel):
+    type: JobType
+    account_id: Optional[str] = None
+    # Backfills only: how much history to fetch
+    months: Optional[int] = Field(None, ge=1, le=BACKFILL_MONTHS)
+
+# Handlers
+def _update_schedule(db: Session, user_id: uuid.UUID, account_id: Optional[str]) -> None:
+    """
+    Feed the scheduler each synced account's last-week spend and active campaigns.
+    """
+    accounts = db.query(MetaAdAccount).filter(MetaAdAccount.user_id == user_id, MetaAdAccount.is_active == True)
+    week_ago = date.today() - timedelta(days=7)
+    for account in accounts:
+        meta_id = normalize_account_id(account.account_id)
+        if account_id and meta_id != account_id:
+            continue
+        spend = db.query(func.coalesce(func.sum(CampaignMetrics.spend), 0.0)).join(Campaign).filter(
+            Campaign.ad_account_id == account.id,
+            CampaignMetrics.date_start >= week_ago
+        ).scalar()
+        active = db.query(func.count(Campaign.id)).filter(
+            Campaign.ad_account_id == account.id,
+            Campaign.status == 'ACTIVE'
+        ).scalar()
+        sync_scheduler.update_activity(meta_id, str(user_id), float(spend or 0), int(active or 0))
+
+# Stored model, its Meta id column, and for child levels (FK column, parent model, parent Meta id column)
+HIERARCHY_MODELS = {
+    'campaign': (Campaign, 'campaign_id', None),
+    'adset': (AdSet, 'ad_set_id', ('campaign_id', Campaign, 'campaign_id')),
+    'ad': (Ad, 'ad_id', ('ad_set_id', AdSet, 'ad_set_id')),
+}
+
+def _hierarchy_watermarks(db: Session, account: MetaAdAccount) -> Dict[str, Optional[datetime]]:
+    """
+    Latest stored ``updated_time`` per level; None for a level never synced.
+    """
+    campaigns = db.query(func.max(Campaign.updated_time)).filter(Campaign.ad_account_id == account.id)
+    adsets = db.query(func.max(AdSet.updated_time)).join(Campaign).filter(Campaign.ad_account_id == account.id)
+    ads = db.query(func.max(Ad.updated_time)).join(AdSet).join(Campaign).filter(Campaign.ad_account_id == account.id)
+    return {'campaign': campaigns.scalar(), 'adset': adsets.scalar(), 'ad': ads.scalar()}
+
+def _apply_level(db: Session, account: MetaAdAccount, level: HierarchyLevel, delta: LevelDelta) -> Dict[str, int]:
+    """
+    Store one level's delta, writing only new objects and changed fields.
+    """
+    model, external, parent = HIERARCHY_MODELS[level.name]
+    external_column = getattr(model, external)
+
+    parent_ids = {}
+    if parent:
+        fk, parent_model, parent_external = parent
+        parent_column = getattr(parent_model, parent_external)
+        wanted = {values[level.parent] for values in delta.changed if values.get(level.parent)}
+        if wanted:
+            parent_ids = dict(db.query(parent_column, parent_model.id).filter(parent_column.in_(wanted)).all())
+
+    changed: List[Dict[str, Any]] = []
+    for values in delta.changed:
+        values = dict(values)
+        values['is_active'] = values.pop('effective_status', None) not in REMOVED_STATUSES
+        if parent:
+            parent_id = parent_ids.get(values.pop(level.parent, None))
+            if parent_id is None:
+                continue
+            values[fk] = parent_id
+        else:
+            values['ad_account_id'] = account.id
+        changed.append(values)
+
+    stored = {}
+    if changed:
+        columns = [c.key for c in model.__table__.columns if c.key != 'id']
+        for row in db.query(model).filter(external_column.in_([v['id'] for v in changed])):
+            stored[getattr(row, external)] = {name: getattr(row, name) for name in columns}
+    inserts, updates = plan_upserts(stored, changed)
+
+    for values in inserts:
+        values[external] = values.pop('id')
+        db.add(model(**values))
+    for meta_id, diff in updates.items():
+        db.query(model).filter(external_column == meta_id).update(diff, synchronize_session=False)
+
+    removed = 0
+    for values in delta.removed:
+        removed += db.query(model).filter(external_column == values['id'], model.is_active == True).update(
+            {'is_active': False, 'status': values['effective_status'], 'updated_time': values['updated_time']},
+            synchronize_session=False
+        )
+    return {'inserted': len(inserts), 'updated': len(updates), 'removed': removed}
+
+def _load_sync_target(user_id: str, account_id: Optional[str]) -> Tuple[str, List[Tuple[uuid.UUID, str]]]:
+    db = SessionLocal()
+    try:
+        user = db.get(User, uuid.UUID(user_id))
+        if not user or not user.meta_access_token:
+            raise PermanentJobError("No Meta access token found for the job's user")
+        return user.meta_access_token, _sync_targets(db, user.id, account_id)
+    finally:
+        db.close()
+
+def _sync_targets(db: Session, user_id: uuid.UUID, account_id: Optional[str]) -> List[Tuple[uuid.UUID, str]]:
+    accounts = db.query(MetaAdAccount).filter(MetaAdAccount.user_id == user_id, MetaAdAccount.is_active == True)
+    return [
+        (account.id, normalize_account_id(account.account_id)) for account in accounts
+        if not account_id or normalize_account_id(account.account_id) == account_id
+    ]
+
+def _store_listed_accounts(
+    user_id: str,
+    listed: List[Dict[str, Any]],
+    account_id: Optional[str]
+) -> List[Tuple[uuid.UUID, str]]:
+    """
+    Upsert the ad accounts Meta lists for the user, so accounts connected since
+    the last sync are synced and scheduled too; returns the accounts to sync.
+    Accounts stored for another user are left alone.
+    """
+    db = SessionLocal()
+    try:
+        owner = uuid.UUID(user_id)
+        listed = [meta_account for meta_account in listed if meta_account.get('id')]
+        stored = {
+            account.account_id: account for account in
+            db.query(MetaAdAccount).filter(MetaAdAccount.account_id.in_([a['id'] for a in listed]))
+        }
+        for meta_account in listed:
+            values = {
+                'account_name': meta_account.get('name', 'Unnamed Account'),
+                'currency': meta_account.get('currency', 'USD'),
+                'timezone_name': meta_account.get('timezone_name', 'UTC'),
+                'status': str(meta_account.get('account_status', 'ACTIVE'))
+            }
+            account = stored.get(meta_account['id'])
+            if account is None:
+                db.add(MetaAdAccount(user_id=owner, account_id=meta_account['id'], **values))
+            elif account.user_id == owner:
+                for name, value in values.items():
+                    setattr(account, name, value)
+        db.commit()
+        return _sync_targets(db, owner, account_id)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _watermarks(account_pk: uuid.UUID) -> Dict[str, Optional[datetime]]:
+    db = SessionLocal()
+    try:
+        return _hierarchy_watermarks(db, db.get(MetaAdAccount, account_pk))
+    finally:
+        db.close()
+
+def _apply_hierarchy(account_pk: uuid.UUID, deltas: Dict[str, LevelDelta]) -> Dict[str, Dict[str, int]]:
+    db = SessionLocal()
+    try:
+        account = db.get(MetaAdAccount, account_pk)
+        summary = {}
+        for level in HIERARCHY_LEVELS:
+            summary[level.name] = _apply_level(db, account, level, deltas[level.name])
+            # Children look their parents up by Meta id
+            db.flush()
+        db.commit()
+        return summary
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _finish_sync(user_id: str, account_id: Optional[str]) -> None:
+    db = SessionLocal()
+    try:
+        _update_schedule(db, uuid.UUID(user_id), account_id)
+    finally:
+        db.close()
+
+async def _sync_accounts(user_id: str, account_id: Optional[str]) -> Dict[str, Any]:
+    token, _ = await asyncio.to_thread(_load_sync_target, user_id, account_id)
+
+    hierarchy = {}
+    archived = {}
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        # Listed with the job's own token; the facebook SDK keeps one process-wide
+        # default session, which concurrent jobs for other users would share
+        listed = await graph_get_all(
+            client, "me/adaccounts", {'fields': ','.join(AD_ACCOUNT_FIELDS), 'limit': 250}, token
+        )
+        targets = await asyncio.to_thread(_store_listed_accounts, user_id, listed, account_id)
+        for account_pk, meta_id in targets:
+            watermarks = await asyncio.to_thread(_watermarks, account_pk)
+            deltas = await fetch_hierarchy_delta(client, token, meta_id, watermarks)
+            hierarchy[meta_id] = await asyncio.to_thread(_apply_hierarchy, account_pk, deltas)
+            if column_store is not None:
+                archived[meta_id] = await archive_settled_days(client, token, meta_id, column_store)
+
+    # Synced accounts may have gained or lost campaigns
+    campaign_count_cache.invalidate(account_id)
+    await asyncio.to_thread(_finish_sync, user_id, account_id)
+    return {"accounts_synced": len(listed), "hierarchy": hierarchy, "archived_days": archived}
+
+async def run_sync_job(job: Job) -> Dict[str, Any]:
+    """
+    Sync a user's ad accounts and their campaign / ad set / ad hierarchy from Meta.
+    """
+    account_id = job.payload.get('account_id')
+    account_id = normalize_account_id(account_id) if account_id else None
+    if not account_id:
+        return await _sync_accounts(job.owner, None)
+    # Shard leases should already keep other nodes off this account; this makes sure
+    async with async_advisory_lock(engine, f"sync:{account_id}") as acquired:
+        if not acquired:
+            raise DeferJob(ACCOUNT_LOCK_RETRY_SECONDS, f"Account {account_id} is being synced by another worker")
+        return await _sync_accounts(job.owner, account_id)
+
+def _store_campaign_metrics(account_pk: uuid.UUID, since: date, until: date, rows: List[MetricsRow]) -> int:
+    """
+    Replace the account's campaign metrics for ``since..until`` with ``rows``,
+    so a chunk stored twice (after an interrupted backfill) is not doubled.
+    Rows of campaigns that are not stored are skipped.
+    """
+    db = SessionLocal()
+    try:
+        campaigns = dict(db.query(Campaign.campaign_id, Campaign.id).filter(Campaign.ad_account_id == account_pk).all())
+        if not campaigns:
+            return 0
+        db.query(CampaignMetrics).filter(
+            CampaignMetrics.campaign_id.in_(list(campaigns.values())),
+            CampaignMetrics.date_start >= since,
+            CampaignMetrics.date_start <= until
+        ).delete(synchronize_session=False)
+        values = [
+            {
+                'campaign_id': campaigns[row.object_id],
+                'date_start': date.fromisoformat(row.date_start),
+                'date_stop': date.fromisoformat(row.date_stop or row.date_start),
+                'impressions': row.impressions,
+                'clicks': row.clicks,
+                'reach': row.reach,
+                'conversions': row.conversions,
+                'spend': row.spend,
+                'ctr': row.ctr,
+                'cpc': row.cpc,
+                'cpm': row.cpm,
+                'purchase_value': row.purchase_value,
+                'roas': row.roas
+            }
+            for row in rows if row.object_id in campaigns and row.date_start
+        ]
+        if values:
+            db.execute(insert(CampaignMetrics), values)
+        db.commit()
+        return len(values)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def run_backfill_job(job: Job) -> Dict[str, Any]:
+    """
+    Backfill an account's daily campaign metrics, resuming from its checkpoints.
+    """
+    account_id = job.payload.get('account_id')
+    if not account_id:
+        raise PermanentJobError("Backfill jobs need an account_id")
+    account_id = normalize_account_id(account_id)
+    token, targets = await asyncio.to_thread(_load_sync_target, job.owner, account_id)
+    if not targets:
+        raise PermanentJobError(f"Account {account_id} is not connected")
+    account_pk = targets[0][0]
+    await asyncio.to_thread(backfill_planner.plan, account_id, None, job.payload.get('months') or BACKFILL_MONTHS)
+
+    async def store(chunk: Chunk, rows: List[MetricsRow]) -> None:
+        await asyncio.to_thread(_store_campaign_metrics, account_pk, chunk.since, chunk.until, rows)
+
+    async with async_advisory_lock(engine, f"backfill:{account_id}") as acquired:
+        if not acquired:
+            raise DeferJob(ACCOUNT_LOCK_RETRY_SECONDS, f"Account {account_id} is being backfilled by another worker")
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            # Metrics are stored per campaign, so campaigns go first
+            if (await asyncio.to_thread(_watermarks, account_pk))['campaign'] is None:
+                deltas = await fetch_hierarchy_delta(client, token, account_id, {})
+                await asyncio.to_thread(_apply_hierarchy, account_pk, deltas)
+            progress = await BackfillRunner(backfill_planner, client, token).run(account_id, store)
+    return progress.payload()
+
+JOB_HANDLERS = {
+    'sync': run_sync_job,
+    'backfill': run_backfill_job,
+}
+
+def build_worker() -> JobWorker:
+    """
+    Worker for ``run_worker_processes``; module-level so spawned processes can unpickle it.
+
+    Each worker process is a node of the shard ring: it schedules and runs
+    syncs only for the accounts it leases.
+    """
+    worker_id = default_worker_id()
+    shards = ShardCoordinator(engine, worker_id)
+    scheduler = SyncScheduler(job_queue, shards=shards)
+    return JobWorker(
+        job_queue,
+        JOB_HANDLERS,
+        JOB_CONCURRENCY,
+        worker_id=worker_id,
+        background=(lambda: shards.run(scheduler.accounts), scheduler.run),
+        shards=shards.owned_query
+    )
+
+def enqueue_sync(user: User, account_id: Optional[str] = None) -> Job:
+    return job_queue.enqueue('sync', {'account_id': account_id}, owner=str(user.id))
+
+def enqueue_backfill(user: User, account_id: str, months: Optional[int] = None) -> Job:
+    return job_queue.enqueue('backfill', {'account_id': normalize_account_id(account_id), 'months': months}, owner=str(user.id))
+
+# Routes
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_job(
+    request: EnqueueJobRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Queue a job for the current user; poll ``GET /api/jobs/{id}`` for its outcome.
+    """
+    if request.type == 'sync':
+        if not current_user.meta_access_token:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No Meta access token found. Please connect your Meta account."
+            )
+        job = await asyncio.to_thread(enqueue_sync, current_user, request.account_id)
+    elif request.type == 'backfill':
+        if not request.account_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Backfills need an account_id")
+        job = await asyncio.to_thread(enqueue_backfill, current_user, request.account_id, request.months)
+    return job.status_payload()
+
+@router.get("/backfills/{account_id}")
+async def get_backfill_progress(
+    account_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Chunks done and remaining, rows stored and ETA of an account's backfill.
+    """
+    account_id = normalize_account_id(account_id)
+    owned = db.query(MetaAdAccount).filter(
+        MetaAdAccount.user_id == current_user.id,
+        MetaAdAccount.account_id.in_([account_id, f"act_{account_id}"])
+    ).first()
+    progress = await asyncio.to_thread(backfill_planner.progress, account_id) if owned else None
+    if progress is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No backfill for this account")
+    return progress.payload()
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    job = await asyncio.to_thread(job_queue.get, job_id, str(current_user.id))
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job.status_payload()
@@ -1,15 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime, timedelta
+from uuid import UUID
 from pydantic import BaseModel
 
-from ..models import get_db, User, MetaAdAccount, Campaign, CampaignMetrics
-from ..services.meta_api import MetaAPIService
+from models import get_db, SessionLocal, User, MetaAdAccount, Campaign, CampaignMetrics, AdSet, AdSetMetrics
+from services.arrow_export import (
+    ARROW_STREAM_MEDIA_TYPE, ArrowUnavailable, ipc_stream_chunks, metrics_schema, query_batches,
+    record_batches, require_arrow, select_schema
+)
+from services.export import (
+    METRIC_COLUMNS, export_response, metric_row_dict, rows_in_threadpool, select_columns
+)
+from services.graph_api import normalize_account_id
+from services.meta_api import MetaAPIService
+from services.records import MetricsRow
+from services.serialization import Layout, bulk_response
 from .auth import get_current_user
+from .jobs import enqueue_sync, sync_scheduler
 
 router = APIRouter(prefix="/api/meta", tags=["meta"])
 
+EXPORT_BATCH_ROWS = 1000
+STORED_METRIC_FIELDS = (
+    'date_start', 'date_stop', 'impressions', 'clicks', 'reach', 'conversions',
+    'spend', 'ctr', 'cpc', 'cpm', 'purchase_value', 'roas'
+)
+
 # Pydantic models
 class AdAccountResponse(BaseModel):
     id: str
@@ -41,6 +61,15 @@ class MetricsResponse(BaseModel):
     conversions: int
     roas: float
 
+def _uuid_or_404(value: str, detail: str) -> UUID:
+    """
+    Parse a stored row's ID from the URL; a malformed ID cannot name one, so it is a 404.
+    """
+    try:
+        return UUID(value)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+
 # Routes
 @router.get("/accounts", response_model=List[AdAccountResponse])
 async def get_ad_accounts(
@@ -117,28 +146,37 @@ async def get_ad_accounts(
             detail=f"Failed to fetch ad accounts: {str(e)}"
         )
 
-@router.get("/accounts/{account_id}/campaigns", response_model=List[CampaignResponse])
+# Served through bulk_response, so the models only document the rows layout
+@router.get("/accounts/{account_id}/campaigns", responses={200: {"model": List[CampaignResponse]}})
 async def get_campaigns(
     account_id: str,
+    request: Request,
     status: Optional[List[str]] = Query(None),
+    layout: Layout = 'rows',
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Get campaigns for an ad account.
+
+    ``layout=columns`` returns one list per field instead of one object per campaign.
     """
     # Verify account ownership
     account = db.query(MetaAdAccount).filter(
-        MetaAdAccount.id == account_id,
+        MetaAdAccount.id == _uuid_or_404(account_id, "Ad account not found"),
         MetaAdAccount.user_id == current_user.id
     ).first()
     
     if not account:
+        # 404 spelled out: ``status`` is the query parameter in this route
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
+            status_code=404,
             detail="Ad account not found"
         )
     
+    # Watched accounts are synced more often
+    await asyncio.to_thread(sync_scheduler.record_view, normalize_account_id(account.account_id))
+    
     # Get campaigns from database
     query = db.query(Campaign).filter(Campaign.ad_account_id == account.id)
     
@@ -147,29 +185,33 @@ async def get_campaigns(
     
     campaigns = query.all()
     
-    return [
-        CampaignResponse(
-            id=str(campaign.id),
-            campaign_id=campaign.campaign_id,
-            name=campaign.name,
-            status=campaign.status,
-            objective=campaign.objective,
-            daily_budget=campaign.daily_budget,
-            lifetime_budget=campaign.lifetime_budget,
-            created_time=campaign.created_time
-        ) for campaign in campaigns
-    ]
+    return bulk_response(request, [
+        {
+            'id': str(campaign.id),
+            'campaign_id': campaign.campaign_id,
+            'name': campaign.name,
+            'status': campaign.status,
+            'objective': campaign.objective,
+            'daily_budget': campaign.daily_budget,
+            'lifetime_budget': campaign.lifetime_budget,
+            'created_time': campaign.created_time
+        } for campaign in campaigns
+    ], layout)
 
-@router.get("/campaigns/{campaign_id}/metrics", response_model=List[MetricsResponse])
+@router.get("/campaigns/{campaign_id}/metrics", responses={200: {"model": List[MetricsResponse]}})
 async def get_campaign_metrics(
     campaign_id: str,
+    request: Request,
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
+    layout: Layout = 'rows',
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Get metrics for a campaign.
+
+    ``layout=columns`` returns ``{"date": [...], "spend": [...], ...}`` for charting.
     """
     # Set default date range if not provided
     if not end_date:
@@ -179,7 +221,7 @@ async def get_campaign_metrics(
     
     # Verify campaign ownership
     campaign = db.query(Campaign).join(MetaAdAccount).filter(
-        Campaign.id == campaign_id,
+        Campaign.id == _uuid_or_404(campaign_id, "Campaign not found"),
         MetaAdAccount.user_id == current_user.id
     ).first()
     
@@ -196,28 +238,110 @@ async def get_campaign_metrics(
         CampaignMetrics.date_start <= end_date.date()
     ).order_by(CampaignMetrics.date_start).all()
     
-    return [
-        MetricsResponse(
-            date=metric.date_start.isoformat(),
-            impressions=metric.impressions,
-            clicks=metric.clicks,
-            ctr=metric.ctr,
-            cpc=metric.cpc,
-            cpm=metric.cpm,
-            spend=metric.spend,
-            conversions=metric.conversions,
-            roas=metric.roas
-        ) for metric in metrics
-    ]
+    return bulk_response(request, [MetricsRow.from_model(metric).metrics_payload() for metric in metrics], layout)
 
-@router.post("/sync")
-async def sync_data(
-    account_id: Optional[str] = None,
+def _metric_export_batches(level: str, account_uuid, start_date, end_date):
+    """
+    Stored daily metrics for an account from a server-side cursor, in batches
+    of ``EXPORT_BATCH_ROWS`` export rows. Opens its own session, since the
+    request's session is closed before the response body is streamed.
+    """
+    db = SessionLocal()
+    try:
+        if level == 'campaign':
+            model, object_id = CampaignMetrics, Campaign.campaign_id
+            query = db.query(*(getattr(model, f) for f in STORED_METRIC_FIELDS), object_id, Campaign.name) \
+                .join(Campaign, CampaignMetrics.campaign_id == Campaign.id)
+        else:
+            model, object_id = AdSetMetrics, AdSet.ad_set_id
+            query = db.query(*(getattr(model, f) for f in STORED_METRIC_FIELDS), object_id, AdSet.name) \
+                .join(AdSet, AdSetMetrics.ad_set_id == AdSet.id) \
+                .join(Campaign, AdSet.campaign_id == Campaign.id)
+        query = query.filter(
+            Campaign.ad_account_id == account_uuid,
+            model.date_start >= start_date,
+            model.date_start <= end_date
+        ).order_by(model.date_start).execution_options(stream_results=True, yield_per=EXPORT_BATCH_ROWS)
+        
+        batch = []
+        for row in query:
+            record = MetricsRow.from_model(row, level)
+            record.object_id, record.name = row[-2], row[-1]
+            batch.append(metric_row_dict(record))
+            if len(batch) >= EXPORT_BATCH_ROWS:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        db.close()
+
+@router.get("/export/metrics")
+async def export_metrics(
+    request: Request,
+    account_id: str,
+    level: Literal['campaign', 'adset'] = 'campaign',
+    format: Literal['csv', 'ndjson', 'arrow'] = 'csv',
+    columns: Optional[str] = None,
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Sync data from Meta API.
+    Stream stored daily campaign or ad set metrics for an ad account as CSV,
+    NDJSON or Arrow IPC, optionally limited to ``columns`` (comma-separated).
+    """
+    if not end_date:
+        end_date = datetime.now()
+    if not start_date:
+        start_date = end_date - timedelta(days=365)
+    
+    account = db.query(MetaAdAccount).filter(
+        MetaAdAccount.id == _uuid_or_404(account_id, "Ad account not found"),
+        MetaAdAccount.user_id == current_user.id
+    ).first()
+    
+    if not account:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ad account not found"
+        )
+    
+    try:
+        selected = select_columns(columns, METRIC_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    batches = _metric_export_batches(level, account.id, start_date.date(), end_date.date())
+    
+    if format == 'arrow':
+        try:
+            require_arrow()
+        except ArrowUnavailable as e:
+            raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+        schema = metrics_schema()
+        record_stream = query_batches(record_batches(rows_in_threadpool(batches), schema), columns=selected)
+        return StreamingResponse(
+            ipc_stream_chunks(record_stream, select_schema(schema, selected)),
+            media_type=ARROW_STREAM_MEDIA_TYPE
+        )
+    
+    return export_response(
+        request,
+        rows_in_threadpool(batches),
+        format,
+        selected,
+        f"{level}-metrics-{account.account_id}-{start_date.date()}-{end_date.date()}"
+    )
+
+@router.post("/sync", status_code=status.HTTP_202_ACCEPTED)
+async def sync_data(
+    account_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Queue a sync from Meta API; poll ``GET /api/jobs/{job_id}`` for its outcome.
     """
     if not current_user.meta_access_token:
         raise HTTPException(
@@ -225,28 +349,11 @@ async def sync_data(
             detail="No Meta access token found. Please connect your Meta account."
         )
     
-    # Sync logic implemented using direct API calls (following Direct API pattern)
-    # No database storage needed - data is fetched directly from Meta API
-    try:
-        meta_service = MetaAPIService(current_user.meta_access_token)
-        accounts_result = meta_service.get_ad_accounts()
-        
-        if not accounts_result.get('success'):
-            return {
-                "message": "Sync failed", 
-                "status": "error",
-                "error": accounts_result.get('error', 'Unknown error')
-            }
-        
-        return {
-            "message": "Sync completed successfully", 
-            "status": "completed",
-            "accounts_synced": len(accounts_result.get('data', [])),
-            "timestamp": datetime.utcnow().isoformat()
-        }
-    except Exception as e:
-        return {
-            "message": "Sync failed with exception", 
-            "status": "error",
-            "error": str(e)
-        }
\ No newline at end of file
+    # Runs on a job worker, not in this request
+    job = await asyncio.to_thread(enqueue_sync, current_user, account_id)
+    return {
+        "message": "Sync queued",
+        "status": job.status,
+        "job_id": job.id,
+        "timestamp": datetime.utcnow().isoformat()
+    }
@@ -1,11 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 
-from api import auth, meta
-from models import Base, engine
+from api import auth, jobs, meta
+from models import Base, SessionLocal, engine
+from services.admission import AdmissionMiddleware
+from services.deadline import DeadlineExceeded, DeadlineMiddleware, apply_statement_timeouts
 
 load_dotenv()
 
@@ -15,6 +18,7 @@ async def lifespan(app: FastAPI):
     print("Starting Meta Ads Analytics Platform API...")
     # Create database tables
     Base.metadata.create_all(bind=engine)
+    jobs.job_queue.create_schema()
     yield
     # Shutdown
     print("Shutting down...")
@@ -26,6 +30,16 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-user / per-agency concurrency limits; added first so CORS headers still wrap 429s
+app.add_middleware(AdmissionMiddleware)
+# Request deadline; outside admission so time spent queued counts against it
+app.add_middleware(DeadlineMiddleware)
+apply_statement_timeouts(SessionLocal)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +52,7 @@ app.add_middleware(
 # Include routers
 app.include_router(auth.router)
 app.include_router(meta.router)
+app.include_router(jobs.router)
 
 @app.get("/")
 async def root():
@@ -1,4 +1,4 @@
-from .base import Base, engine, get_db
+from .base import Base, SessionLocal, engine, get_db
 from .user import User
 from .meta_account import MetaAdAccount
 from .campaign import Campaign
@@ -10,6 +10,7 @@ from .metrics import CampaignMetrics, AdSetMetrics
 __all__ = [
     "Base",
     "engine", 
+    "SessionLocal",
     "get_db",
     "User",
     "MetaAdAccount",
@@ -1,14 +1,91 @@
 import os
+import asyncio
 import logging
+import math
 import sys
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Header, Depends
+from datetime import date, datetime
+from fastapi import FastAPI, HTTPException, Header, Depends, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import httpx
 from dotenv import load_dotenv
 
+from services.admission import AdmissionMiddleware, admission_controller
+from services.column_store import COLUMN_METRICS, column_store, range_totals
+from services.composite import (
+    WidgetSpec,
+    composite_upstream_calls,
+    composite_upstream_calls_saved,
+    execute_plan,
+    plan_widgets,
+)
+from services.dashboard import (
+    ad_accounts_cache_key,
+    campaigns_cache_key,
+    dashboard_blocks,
+    dashboard_cache_key,
+    format_ndjson,
+    format_sse,
+    load_ad_accounts,
+    load_campaign_list,
+    load_dashboard_metrics,
+    stream_blocks,
+)
+from services.arrow_export import (
+    ARROW_STREAM_MEDIA_TYPE,
+    PARQUET_EXPORT_DIR,
+    PARQUET_MEDIA_TYPE,
+    ArrowUnavailable,
+    filter_expression,
+    ipc_stream_chunks,
+    metrics_schema,
+    partition_path,
+    query_batches,
+    record_batches,
+    require_arrow,
+    select_schema,
+    write_parquet_partitions,
+)
+from services.deadline import DeadlineExceeded, DeadlineMiddleware, remaining
+from services.export import (
+    EXPORT_LEVELS,
+    HIERARCHY_COLUMNS,
+    METRIC_COLUMNS,
+    export_response,
+    meta_hierarchy_rows,
+    meta_metric_rows,
+    primed,
+    select_columns,
+)
+from services.graph_api import (
+    MetaGraphError,
+    normalize_account_id,
+    parse_account_id,
+    token_fingerprint,
+    track_upstream_calls,
+)
+from services.metrics import registry as metrics_registry
+from services.portfolio import (
+    aggregate_portfolio,
+    load_fx_rates,
+    make_insights_fetcher,
+    resolve_employee_accounts,
+    DEFAULT_DEADLINE,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_PER_ACCOUNT_TIMEOUT,
+)
+from services.resilience import CircuitOpenError, resilient_get, upstream_policy
+from services.sparkline_store import (
+    ensure_loaded,
+    sparkline_store,
+    to_sparkline_points,
+    SPARKLINE_METRICS,
+)
+from services.swr_cache import response_cache
+from services.warmup import cache_warmer
+
 # Load environment variables
 load_dotenv()
 
@@ -30,6 +107,16 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Per-user / per-agency concurrency limits; added first so CORS headers still wrap 429s
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+# Request deadline; outside admission so time spent queued counts against it
+app.add_middleware(DeadlineMiddleware)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    logger.warning(f"⏱️ [DEADLINE] {request.url.path}: {str(exc)}")
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 # Configure CORS for Vercel frontend
 app.add_middleware(
     CORSMiddleware,
@@ -46,6 +133,8 @@ app.add_middleware(
 # Environment variables
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+# Interactive dashboard reads race a second Meta request after this long
+INTERACTIVE_HEDGE_AFTER = float(os.getenv('META_INTERACTIVE_HEDGE_SECONDS', '1.5'))
 
 # Pydantic models
 class DashboardMetricsResponse(BaseModel):
@@ -71,8 +160,8 @@ class SparklineDataResponse(BaseModel):
     data: List[Dict[str, Any]]
     success: bool
 
-async def get_user_meta_token(authorization: str = Header(...)):
-    """Get user's Meta access token from Supabase profiles"""
+async def get_authenticated_user(authorization: str = Header(...)) -> Dict[str, str]:
+    """Authenticate the Supabase user and load their Meta access token"""
     logger.info(f"🔐 Getting user Meta token from authorization header")
     
     if not authorization.startswith('Bearer '):
@@ -86,7 +175,9 @@ async def get_user_meta_token(authorization: str = Header(...)):
         async with httpx.AsyncClient() as client:
             logger.info("🔍 Fetching user from Supabase Auth...")
             
-            auth_response = await client.get(
+            auth_response = await resilient_get(
+                client,
+                'supabase',
                 f"{SUPABASE_URL}/auth/v1/user",
                 headers={
                     "Authorization": f"Bearer {token}",
@@ -101,11 +192,15 @@ async def get_user_meta_token(authorization: str = Header(...)):
             user_data = auth_response.json()
             user_id = user_data['id']
             logger.info(f"✅ User authenticated: {user_id}")
+            # Later requests with this token take the user's admission slots
+            admission_controller.verify(token, user_id)
             
             # Get Meta access token from profiles
             logger.info("🔍 Fetching Meta access token from profiles...")
             
-            profile_response = await client.get(
+            profile_response = await resilient_get(
+                client,
+                'supabase',
                 f"{SUPABASE_URL}/rest/v1/profiles",
                 headers={
                     "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
@@ -129,12 +224,46 @@ async def get_user_meta_token(authorization: str = Header(...)):
             meta_token = profiles[0]['meta_access_token']
             logger.info("✅ Meta access token retrieved successfully")
             
-            return meta_token
+            cache_warmer.touch(user_id, meta_token)
+            
+            return {"user_id": user_id, "meta_token": meta_token}
             
+    except CircuitOpenError as e:
+        logger.error(f"❌ Supabase unavailable: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication service temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))}
+        )
     except httpx.RequestError as e:
         logger.error(f"❌ Request error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to authenticate user")
 
+async def get_user_meta_token(user: Dict[str, str] = Depends(get_authenticated_user)):
+    """Get user's Meta access token from Supabase profiles"""
+    return user["meta_token"]
+
+def _require_account_id(value: Any) -> str:
+    """Ad account ID from a request, without ``act_``; 400 unless present and numeric"""
+    account_id = parse_account_id(value)
+    if account_id is None:
+        raise HTTPException(status_code=400, detail="account_id must be a numeric ad account ID")
+    return account_id
+
+def _request_number(value: Any, name: str, minimum: float, maximum: float = math.inf, cast=float):
+    """Numeric request field clamped to ``[minimum, maximum]``; 400 unless a finite number"""
+    try:
+        number = None if isinstance(value, bool) else cast(value)
+    except (TypeError, ValueError, OverflowError):
+        number = None
+    if number is None or not math.isfinite(number):
+        raise HTTPException(status_code=400, detail=f"{name} must be a number")
+    return max(minimum, min(number, maximum))
+
+def _max_staleness(request_data: Dict[str, Any]) -> float:
+    """Seconds of staleness the client accepts for cached data; negatives count as none"""
+    return _request_number(request_data.get('max_staleness') or 0, 'max_staleness', 0.0)
+
 @app.get("/")
 async def root():
     logger.info("🚀 Root endpoint hit - Railway Meta API Backend is running")
@@ -150,6 +279,11 @@ async def health_check():
     logger.info("💓 Health check endpoint hit")
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus-format process metrics"""
+    return metrics_registry.render()
+
 @app.post("/api/dashboard-metrics")
 async def get_dashboard_metrics(
     request_data: Dict[str, Any],
@@ -157,108 +291,45 @@ async def get_dashboard_metrics(
 ):
     """Get dashboard metrics directly from Meta API with live logging"""
     
-    account_id = request_data.get('account_id')
+    account_id = _require_account_id(request_data.get('account_id'))
     date_preset = request_data.get('date_preset', 'last_30d')
+    max_staleness = _max_staleness(request_data)
     
     logger.info(f"🔄 [DASHBOARD] Starting metrics fetch for account: {account_id}")
+    cache_warmer.record_account(meta_token, account_id)
     logger.info(f"📅 [DASHBOARD] Date preset: {date_preset}")
     logger.info(f"🔑 [DASHBOARD] Meta token available: {bool(meta_token)}")
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Build Meta API URL for insights
-            fields = [
-                'spend', 'impressions', 'clicks', 'cpc', 'cpm', 'ctr',
-                'conversions', 'video_thruplay_watched_actions'
-            ]
-            
-            insights_url = f"https://graph.facebook.com/v19.0/act_{account_id}/insights"
-            params = {
-                'access_token': meta_token,
-                'fields': ','.join(fields),
-                'date_preset': date_preset,
-                'level': 'account'
-            }
-            
-            logger.info(f"🌐 [META API] Calling insights endpoint: {insights_url}")
-            logger.info(f"📊 [META API] Fields requested: {fields}")
-            
-            # Call Meta API
-            response = await client.get(insights_url, params=params)
-            
-            logger.info(f"📡 [META API] Response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                error_text = response.text
-                logger.error(f"❌ [META API] Error response: {error_text}")
-                raise HTTPException(status_code=response.status_code, detail=f"Meta API error: {error_text}")
-            
-            insights_data = response.json()
-            logger.info(f"📊 [META API] Raw insights response: {insights_data}")
-            
-            # Get campaigns count
-            campaigns_url = f"https://graph.facebook.com/v19.0/act_{account_id}/campaigns"
-            campaigns_params = {
-                'access_token': meta_token,
-                'fields': 'id,name,status',
-                'limit': 1000
-            }
-            
-            logger.info(f"🎯 [META API] Calling campaigns endpoint for count...")
-            
-            campaigns_response = await client.get(campaigns_url, params=campaigns_params)
-            campaigns_data = campaigns_response.json() if campaigns_response.status_code == 200 else {'data': []}
-            
-            logger.info(f"🎯 [META API] Campaigns response: {len(campaigns_data.get('data', []))} campaigns found")
-            
-            # Process the data
-            data = insights_data.get('data', [])
-            
-            if data:
-                insight = data[0]  # Account level data
-                logger.info(f"✅ [PROCESSING] Processing insight data: {insight}")
-                
-                metrics = DashboardMetricsResponse(
-                    totalSpend=float(insight.get('spend', 0)),
-                    totalRevenue=0.0,  # Revenue calculation needed
-                    averageRoas=0.0,   # ROAS calculation needed
-                    totalConversions=int(float(insight.get('conversions', 0))),
-                    totalClicks=int(insight.get('clicks', 0)),
-                    totalImpressions=int(insight.get('impressions', 0)),
-                    averageCTR=float(insight.get('ctr', 0)),
-                    averageCPC=float(insight.get('cpc', 0)),
-                    averageCPM=float(insight.get('cpm', 0)),
-                    totalCampaigns=len(campaigns_data.get('data', [])),
-                    activeCampaigns=len([c for c in campaigns_data.get('data', []) if c.get('status') == 'ACTIVE']),
-                    pausedCampaigns=len([c for c in campaigns_data.get('data', []) if c.get('status') == 'PAUSED']),
-                    performanceChange={
-                        "spend": 0, "revenue": 0, "roas": 0, "conversions": 0, "ctr": None, "cpc": None
-                    },
-                    totalAccounts=1,
-                    activeAccounts=1,
-                    dateRange=date_preset,
-                    lastUpdated=datetime.now().isoformat()
-                )
-                
-                logger.info(f"✅ [SUCCESS] Dashboard metrics processed successfully")
-                logger.info(f"💰 [METRICS] Spend: ${metrics.totalSpend}, Clicks: {metrics.totalClicks}, Impressions: {metrics.totalImpressions}")
-                
-                return {"data": metrics.dict(), "success": True}
-            else:
-                logger.warning(f"⚠️ [PROCESSING] No insight data returned from Meta API")
-                
-                # Return zeros if no data
-                empty_metrics = DashboardMetricsResponse(
-                    totalSpend=0.0, totalRevenue=0.0, averageRoas=0.0, totalConversions=0,
-                    totalClicks=0, totalImpressions=0, averageCTR=0.0, averageCPC=0.0, averageCPM=0.0,
-                    totalCampaigns=len(campaigns_data.get('data', [])), activeCampaigns=0, pausedCampaigns=0,
-                    performanceChange={"spend": 0, "revenue": 0, "roas": 0, "conversions": 0, "ctr": None, "cpc": None},
-                    totalAccounts=1, activeAccounts=1, dateRange=date_preset, lastUpdated=datetime.now().isoformat()
-                )
-                
-                logger.info(f"📊 [ZERO DATA] Returning empty metrics for account {account_id}")
-                return {"data": empty_metrics.dict(), "success": True}
+        logger.info(f"🌐 [META API] Fetching insights and campaign counts concurrently...")
+        values, freshness = await response_cache.get(
+            dashboard_cache_key(meta_token, account_id, date_preset),
+            lambda: load_dashboard_metrics(meta_token, account_id, date_preset),
+            max_staleness=max_staleness,
+            account_id=account_id
+        )
+        
+        metrics = DashboardMetricsResponse(
+            **values,
+            performanceChange={
+                "spend": 0, "revenue": 0, "roas": 0, "conversions": 0, "ctr": None, "cpc": None
+            },
+            totalAccounts=1,
+            activeAccounts=1,
+            dateRange=date_preset,
+            lastUpdated=freshness['lastUpdated']
+        )
+        
+        logger.info(f"✅ [SUCCESS] Dashboard metrics served from {freshness['source']} ({freshness['ageSeconds']}s old)")
+        logger.info(f"💰 [METRICS] Spend: ${metrics.totalSpend}, Clicks: {metrics.totalClicks}, Impressions: {metrics.totalImpressions}")
+        
+        return {"data": metrics.dict(), "success": True, "freshness": freshness}
                 
+    except MetaGraphError as e:
+        logger.error(f"❌ [META API] Error response: {e.message}")
+        raise HTTPException(status_code=e.status_code, detail=f"Meta API error: {e.message}")
+    except DeadlineExceeded:
+        raise
     except httpx.RequestError as e:
         logger.error(f"❌ [ERROR] Request error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard metrics: {str(e)}")
@@ -266,62 +337,498 @@ async def get_dashboard_metrics(
         logger.error(f"❌ [ERROR] Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+@app.post("/api/dashboard-stream")
+async def stream_dashboard(
+    request: Request,
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """Stream each dashboard block (SSE or NDJSON) as soon as its upstream call resolves"""
+    
+    account_id = _require_account_id(request_data.get('account_id'))
+    date_preset = request_data.get('date_preset', 'last_30d')
+    use_ndjson = request_data.get('format') == 'ndjson'
+    formatter = format_ndjson if use_ndjson else format_sse
+    
+    logger.info(f"📡 [DASHBOARD STREAM] Starting stream for account: {account_id}")
+    cache_warmer.record_account(meta_token, account_id)
+    
+    async def events():
+        with upstream_policy('meta', hedge_after=INTERACTIVE_HEDGE_AFTER):
+            async with httpx.AsyncClient(timeout=30.0) as client:
+                blocks = dashboard_blocks(client, meta_token, account_id, date_preset)
+                async for event, payload in stream_blocks(blocks, request.is_disconnected):
+                    yield formatter(event, payload)
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson" if use_ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sparkline_options(request_data: Dict[str, Any]):
+    window = _request_number(request_data.get('window', 7), 'window', 1, sparkline_store.capacity, cast=int)
+    metrics = request_data.get('metrics') or ['spend', 'clicks', 'impressions']
+    if isinstance(metrics, str):
+        metrics = metrics.split(',')
+    metrics = [m for m in metrics if m in SPARKLINE_METRICS]
+    value_metric = request_data.get('value_metric', 'spend')
+    if value_metric not in SPARKLINE_METRICS:
+        value_metric = 'spend'
+    if value_metric not in metrics:
+        metrics.append(value_metric)
+    return window, metrics, value_metric
+
 @app.post("/api/sparkline-data")
 async def get_sparkline_data(
     request_data: Dict[str, Any],
     meta_token: str = Depends(get_user_meta_token)
 ):
-    """Get sparkline data directly from Meta API with live logging"""
+    """Get sparkline data from the in-memory ring buffers, loading from Meta when cold"""
     
-    account_id = request_data.get('account_id')
+    account_id = _require_account_id(request_data.get('account_id'))
+    window, metrics, value_metric = _sparkline_options(request_data)
+    max_staleness = _max_staleness(request_data)
+    today = date.today()
     
-    logger.info(f"🔄 [SPARKLINE] Starting sparkline fetch for account: {account_id}")
+    logger.info(f"🔄 [SPARKLINE] Starting sparkline fetch for account: {account_id} ({window}d)")
+    cache_warmer.record_account(meta_token, account_id)
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Get last 7 days of data for sparkline
-            insights_url = f"https://graph.facebook.com/v19.0/act_{account_id}/insights"
-            params = {
-                'access_token': meta_token,
-                'fields': 'spend,impressions,clicks,date_start',
-                'date_preset': 'last_7d',
-                'time_increment': 1,  # Daily breakdown
-                'level': 'account'
-            }
-            
-            logger.info(f"🌐 [SPARKLINE] Calling Meta API for 7-day data...")
-            
-            response = await client.get(insights_url, params=params)
-            
-            logger.info(f"📡 [SPARKLINE] Response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                error_text = response.text
-                logger.error(f"❌ [SPARKLINE] Meta API error: {error_text}")
-                return {"data": [], "success": False}
-            
-            insights_data = response.json()
-            logger.info(f"📊 [SPARKLINE] Raw response: {insights_data}")
-            
-            # Process sparkline data
-            sparkline_data = []
-            for insight in insights_data.get('data', []):
-                sparkline_data.append({
-                    'date': insight.get('date_start'),
-                    'value': float(insight.get('spend', 0)),
-                    'clicks': int(insight.get('clicks', 0)),
-                    'impressions': int(insight.get('impressions', 0))
-                })
-            
-            logger.info(f"✅ [SPARKLINE] Processed {len(sparkline_data)} data points")
-            logger.info(f"📈 [SPARKLINE] Data: {sparkline_data}")
-            
-            return {"data": sparkline_data, "success": True}
+        freshness = await ensure_loaded(meta_token, account_id, max_staleness=max_staleness)
+        
+        sparkline_data = to_sparkline_points(sparkline_store.series(account_id, window, metrics, today), value_metric)
+        logger.info(f"✅ [SPARKLINE] Served {len(sparkline_data)} data points")
+        
+        return {"data": sparkline_data, "success": True, "freshness": freshness}
             
     except Exception as e:
         logger.error(f"❌ [SPARKLINE ERROR] {str(e)}")
         return {"data": [], "success": False}
 
+@app.post("/api/sparkline-data/batch")
+async def get_sparkline_data_batch(
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """Serve sparklines for many accounts in one response"""
+    
+    account_ids = [_require_account_id(a) for a in request_data.get('account_ids', [])][:200]
+    window, metrics, value_metric = _sparkline_options(request_data)
+    max_staleness = _max_staleness(request_data)
+    today = date.today()
+    
+    logger.info(f"🔄 [SPARKLINE] Batch of {len(account_ids)} accounts")
+    
+    failed = []
+    freshness = {}
+    semaphore = asyncio.Semaphore(20)
+    
+    async def load(account_id: str):
+        async with semaphore:
+            try:
+                freshness[account_id] = await ensure_loaded(meta_token, account_id, max_staleness=max_staleness)
+            except Exception as e:
+                logger.error(f"❌ [SPARKLINE] Failed to load {account_id}: {str(e)}")
+                failed.append(account_id)
+    
+    await asyncio.gather(*(load(a) for a in account_ids))
+    
+    # Accounts this token could not load are left out rather than served from another user's cache
+    data = {
+        account_id: to_sparkline_points(sparkline_store.series(account_id, window, metrics, today), value_metric)
+        for account_id in account_ids
+        if account_id not in failed
+    }
+    
+    logger.info(f"✅ [SPARKLINE] Served batch of {len(data)} sparklines ({len(failed)} failed)")
+    return {"data": data, "failed": failed, "freshness": freshness, "success": not failed}
+
+@app.post("/api/range-totals")
+async def get_range_totals(
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """Account totals over a date range, reading settled days from the column store"""
+    
+    account_id = _require_account_id(request_data.get('account_id'))
+    metrics = request_data.get('metrics') or list(COLUMN_METRICS)
+    if isinstance(metrics, str):
+        metrics = [m.strip() for m in metrics.split(',') if m.strip()]
+    unknown = [m for m in metrics if m not in COLUMN_METRICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metrics: {', '.join(map(str, unknown))}")
+    try:
+        until = date.fromisoformat(request_data['until']) if request_data.get('until') else date.today()
+        since = date.fromisoformat(request_data['since']) if request_data.get('since') else until.replace(day=1)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {str(e)}")
+    if since > until:
+        raise HTTPException(status_code=400, detail="since must not be after until")
+    
+    try:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            totals, archived = await range_totals(client, meta_token, account_id, metrics, since, until, column_store)
+    except MetaGraphError as e:
+        logger.error(f"❌ [RANGE TOTALS] Meta API error: {e.message}")
+        raise HTTPException(status_code=e.status_code, detail=f"Meta API error: {e.message}")
+    
+    logger.info(f"✅ [RANGE TOTALS] {account_id} {since}..{until}: {archived} days from the column store")
+    return {
+        "data": totals,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "archivedDays": archived,
+        "success": True
+    }
+
+@app.post("/api/ad-accounts")
+async def get_ad_accounts(
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """List the user's Meta ad accounts, serving a cached copy within the caller's staleness bound"""
+    
+    max_staleness = _max_staleness(request_data)
+    
+    try:
+        rows, freshness = await response_cache.get(
+            ad_accounts_cache_key(meta_token),
+            lambda: load_ad_accounts(meta_token),
+            max_staleness=max_staleness
+        )
+    except MetaGraphError as e:
+        logger.error(f"❌ [AD ACCOUNTS] Meta API error: {e.message}")
+        raise HTTPException(status_code=e.status_code, detail=f"Meta API error: {e.message}")
+    except httpx.RequestError as e:
+        logger.error(f"❌ [AD ACCOUNTS] Request error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch ad accounts: {str(e)}")
+    
+    accounts = [
+        {
+            'account_id': normalize_account_id(account.get('id')),
+            'account_name': account.get('name') or 'Unnamed Account',
+            'currency': account.get('currency') or 'USD',
+            'status': 'ACTIVE' if account.get('account_status') == 1 else 'INACTIVE',
+            'is_active': account.get('account_status') == 1
+        }
+        for account in rows
+    ]
+    
+    logger.info(f"✅ [AD ACCOUNTS] Served {len(accounts)} accounts from {freshness['source']}")
+    return {"accounts": accounts, "totalFetched": len(accounts), "success": True, "freshness": freshness}
+
+@app.post("/api/campaigns")
+async def get_campaigns(
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """List an account's campaigns, serving a cached copy within the caller's staleness bound"""
+    
+    account_id = _require_account_id(request_data.get('account_id'))
+    max_staleness = _max_staleness(request_data)
+    
+    logger.info(f"🔄 [CAMPAIGNS] Listing campaigns for account: {account_id}")
+    cache_warmer.record_account(meta_token, account_id)
+    
+    try:
+        campaigns, freshness = await response_cache.get(
+            campaigns_cache_key(meta_token, account_id),
+            lambda: load_campaign_list(meta_token, account_id),
+            max_staleness=max_staleness,
+            account_id=account_id
+        )
+    except MetaGraphError as e:
+        logger.error(f"❌ [CAMPAIGNS] Meta API error: {e.message}")
+        raise HTTPException(status_code=e.status_code, detail=f"Meta API error: {e.message}")
+    except httpx.RequestError as e:
+        logger.error(f"❌ [CAMPAIGNS] Request error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch campaigns: {str(e)}")
+    
+    logger.info(f"✅ [CAMPAIGNS] Served {len(campaigns)} campaigns from {freshness['source']}")
+    return {
+        "campaigns": campaigns,
+        "success": True,
+        "count": len(campaigns),
+        "source": "meta_api",
+        "timestamp": datetime.now().isoformat(),
+        "freshness": freshness
+    }
+
+@app.post("/api/dashboard/composite")
+async def get_composite_dashboard(
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """Serve many widgets from one planned set of shared upstream queries"""
+    
+    try:
+        widgets = [WidgetSpec.from_dict(raw, i) for i, raw in enumerate(request_data.get('widgets', []))]
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid widget spec: {str(e)}")
+    if len({w.id for w in widgets}) != len(widgets):
+        raise HTTPException(status_code=400, detail="Widget ids must be unique")
+    
+    plan = plan_widgets(widgets)
+    logger.info(
+        f"🧩 [COMPOSITE] {len(widgets)} widgets planned into {plan.planned_calls} upstream queries"
+    )
+    
+    with track_upstream_calls() as calls, upstream_policy('meta', hedge_after=INTERACTIVE_HEDGE_AFTER):
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            results = await execute_plan(plan, client, meta_token)
+    
+    saved = max(0, plan.naive_calls - calls['count'])
+    composite_upstream_calls.inc(calls['count'])
+    composite_upstream_calls_saved.inc(saved)
+    logger.info(f"✅ [COMPOSITE] Made {calls['count']} upstream calls, saved {saved}")
+    
+    return {
+        "data": results,
+        "meta": {
+            "widgets": len(widgets),
+            "upstreamCalls": calls['count'],
+            "naiveUpstreamCalls": plan.naive_calls,
+            "upstreamCallsSaved": saved,
+            "lastUpdated": datetime.now().isoformat()
+        },
+        "success": all(r['success'] for r in results.values())
+    }
+
+@app.post("/api/agency/portfolio")
+async def get_agency_portfolio(
+    request_data: Dict[str, Any],
+    user: Dict[str, str] = Depends(get_authenticated_user)
+):
+    """Aggregate metrics across every client account the employee can see"""
+    
+    date_preset = request_data.get('date_preset', 'last_30d')
+    currency = request_data.get('currency', 'USD')
+    per_account_timeout = _request_number(
+        request_data.get('per_account_timeout', DEFAULT_PER_ACCOUNT_TIMEOUT), 'per_account_timeout', 0.1, 10.0
+    )
+    deadline = _request_number(request_data.get('deadline', DEFAULT_DEADLINE), 'deadline', 0.1, 10.0)
+    max_concurrency = _request_number(
+        request_data.get('max_concurrency', DEFAULT_MAX_CONCURRENCY), 'max_concurrency', 1, 100, cast=int
+    )
+    requested_rates = request_data.get('fx_rates') or {}
+    if not isinstance(requested_rates, dict):
+        raise HTTPException(status_code=400, detail="fx_rates must map currency codes to rates")
+    fx_rates = load_fx_rates()
+    for code, rate in requested_rates.items():
+        rate = _request_number(rate, f"fx_rates.{code}", 0.0)
+        if rate <= 0:
+            raise HTTPException(status_code=400, detail=f"fx_rates.{code} must be positive")
+        fx_rates[code.upper()] = rate
+    
+    logger.info(f"🏢 [PORTFOLIO] Starting portfolio fetch for user: {user['user_id']}")
+    
+    try:
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        # The portfolio has its own per-account timeouts and deadline; retries would only overrun them
+        with upstream_policy('meta', attempts=1):
+            async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+                accounts = await resolve_employee_accounts(
+                    client, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, user['user_id']
+                )
+                logger.info(f"🏢 [PORTFOLIO] Resolved {len(accounts)} client accounts")
+                if accounts:
+                    admission_controller.assign_agency(user['user_id'], accounts[0].agency_id)
+                
+                # Leave room to respond with partial results inside the request deadline
+                left = remaining()
+                if left is not None:
+                    deadline = max(0.0, min(deadline, left - 0.5))
+            
+                portfolio = await aggregate_portfolio(
+                    accounts,
+                    make_insights_fetcher(client, user['meta_token'], date_preset),
+                    target_currency=currency,
+                    fx_rates=fx_rates,
+                    per_account_timeout=per_account_timeout,
+                    deadline=deadline,
+                    max_concurrency=max_concurrency
+                )
+    except CircuitOpenError as e:
+        logger.error(f"❌ [PORTFOLIO] {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, int(e.retry_after)))})
+    except httpx.HTTPError as e:
+        logger.error(f"❌ [PORTFOLIO] Request error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch portfolio: {str(e)}")
+    
+    summary = portfolio['summary']
+    logger.info(
+        f"✅ [PORTFOLIO] {summary['ok']} ok, {summary['empty']} empty, {summary['timeout']} timed out, "
+        f"{summary['error']} failed in {summary['elapsedMs']}ms"
+    )
+    
+    portfolio.update({'dateRange': date_preset, 'lastUpdated': datetime.now().isoformat()})
+    return {"data": portfolio, "success": True}
+
+def _export_options(request_data: Dict[str, Any], available):
+    fmt = request_data.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    try:
+        columns = select_columns(request_data.get('columns'), available)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return fmt, columns
+
+async def _start_export(request: Request, rows, fmt: str, columns, filename: str):
+    try:
+        rows = await primed(rows)
+    except MetaGraphError as e:
+        logger.error(f"❌ [EXPORT] Meta API error: {e.message}")
+        raise HTTPException(status_code=e.status_code, detail=f"Meta API error: {e.message}")
+    return export_response(request, rows, fmt, columns, filename)
+
+def _metric_export_range(request_data: Dict[str, Any]):
+    # The ID names Parquet directories as well as Graph paths
+    account_id = _require_account_id(request_data.get('account_id'))
+    level = request_data.get('level', 'campaign')
+    if level not in EXPORT_LEVELS:
+        raise HTTPException(status_code=400, detail=f"level must be one of {', '.join(EXPORT_LEVELS)}")
+    try:
+        until = date.fromisoformat(request_data['until']) if request_data.get('until') else date.today()
+        since = date.fromisoformat(request_data['since']) if request_data.get('since') else until.replace(day=1)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {str(e)}")
+    return account_id, level, since, until
+
+def _meta_metric_source(meta_token: str, account_id: str, level: str, since: date, until: date):
+    async def rows():
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            async for row in meta_metric_rows(client, meta_token, account_id, level, since, until):
+                yield row
+    return rows()
+
+def _require_arrow():
+    try:
+        require_arrow()
+    except ArrowUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+@app.post("/api/export/insights")
+async def export_insights(
+    request: Request,
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """Stream daily campaign/adset/ad metrics for a date range as CSV or NDJSON"""
+    
+    account_id, level, since, until = _metric_export_range(request_data)
+    fmt, columns = _export_options(request_data, METRIC_COLUMNS)
+    
+    logger.info(f"📤 [EXPORT] {level} metrics for {account_id} from {since} to {until} as {fmt}")
+    
+    rows = _meta_metric_source(meta_token, account_id, level, since, until)
+    return await _start_export(request, rows, fmt, columns, f"{level}-metrics-{account_id}-{since}-{until}")
+
+@app.post("/api/export/arrow")
+async def export_arrow(
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """Stream filtered daily metrics as Arrow IPC record batches"""
+    
+    _require_arrow()
+    account_id, level, since, until = _metric_export_range(request_data)
+    schema = metrics_schema()
+    columns = request_data.get('columns')
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(',') if c.strip()]
+    try:
+        output_schema = select_schema(schema, columns)
+        expression = filter_expression(request_data.get('filters'), schema)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    logger.info(f"🏹 [EXPORT] Arrow {level} metrics for {account_id} from {since} to {until}")
+    
+    try:
+        rows = await primed(_meta_metric_source(meta_token, account_id, level, since, until))
+    except MetaGraphError as e:
+        logger.error(f"❌ [EXPORT] Meta API error: {e.message}")
+        raise HTTPException(status_code=e.status_code, detail=f"Meta API error: {e.message}")
+    
+    batches = query_batches(record_batches(rows, schema), expression, columns)
+    return StreamingResponse(
+        ipc_stream_chunks(batches, output_schema),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/export/parquet")
+async def export_parquet(
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """Write daily metrics to Parquet files partitioned by account and month"""
+    
+    _require_arrow()
+    account_id, level, since, until = _metric_export_range(request_data)
+    
+    logger.info(f"🪵 [EXPORT] Parquet {level} metrics for {account_id} from {since} to {until}")
+    
+    try:
+        paths = await write_parquet_partitions(
+            _meta_metric_source(meta_token, account_id, level, since, until),
+            token_fingerprint(meta_token),
+            account_id,
+            level
+        )
+    except MetaGraphError as e:
+        logger.error(f"❌ [EXPORT] Meta API error: {e.message}")
+        raise HTTPException(status_code=e.status_code, detail=f"Meta API error: {e.message}")
+    
+    partitions = [
+        {
+            "month": month,
+            "url": f"/api/export/parquet/{account_id}/{month}/{level}",
+            "bytes": path.stat().st_size
+        }
+        for month, path in sorted(paths.items())
+    ]
+    return {"data": {"accountId": account_id, "level": level, "partitions": partitions}, "success": True}
+
+@app.get("/api/export/parquet/{account_id}/{month}/{level}")
+async def get_parquet_partition(
+    account_id: str,
+    month: str,
+    level: str,
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """Serve one exported Parquet partition; supports HTTP range requests"""
+    
+    account_id = parse_account_id(account_id)
+    if level not in EXPORT_LEVELS or account_id is None or len(month) != 7 or not month.replace('-', '').isdigit():
+        raise HTTPException(status_code=404, detail="Partition not found")
+    path = partition_path(PARQUET_EXPORT_DIR, token_fingerprint(meta_token), account_id, month, level)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Partition not found")
+    return FileResponse(path, media_type=PARQUET_MEDIA_TYPE, filename=f"{level}-{account_id}-{month}.parquet")
+
+@app.post("/api/export/hierarchy")
+async def export_hierarchy(
+    request: Request,
+    request_data: Dict[str, Any],
+    meta_token: str = Depends(get_user_meta_token)
+):
+    """Stream an account's campaigns, ad sets and ads as CSV or NDJSON"""
+    
+    account_id = _require_account_id(request_data.get('account_id'))
+    fmt, columns = _export_options(request_data, HIERARCHY_COLUMNS)
+    
+    logger.info(f"📤 [EXPORT] Hierarchy for {account_id} as {fmt}")
+    
+    async def rows():
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            async for row in meta_hierarchy_rows(client, meta_token, account_id):
+                yield row
+    
+    return await _start_export(request, rows(), fmt, columns, f"hierarchy-{account_id}")
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,296 @@
+"""
+Admission control for API requests.
+
+Every request takes a concurrency slot for its user and, once the user's agency
+is known, one for the agency. When a tenant's slots are busy the request waits
+in a short bounded queue; when that queue is full, or the wait runs out, it is
+turned away immediately with 429 and a ``Retry-After`` estimate instead of
+piling more Meta fan-outs onto the worker. One noisy tenant therefore queues
+behind itself rather than in front of everyone else.
+
+Admission runs before authentication, so a request is first counted against
+a fingerprint of its bearer token. Once a route dependency has verified the
+token (:meth:`AdmissionController.verify`), later requests with it count
+against the verified user, and the user's agency once known. Token claims are
+never trusted on their own: a forged ``sub`` would let anyone fill another
+user's slots, or dodge their own limit with a fresh ``sub`` per request.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .graph_api import token_fingerprint
+from .metrics import registry
+
+logger = logging.getLogger("meta-ads-railway.admission")
+
+DEFAULT_PER_USER = int(os.getenv("ADMISSION_PER_USER", "8"))
+DEFAULT_PER_AGENCY = int(os.getenv("ADMISSION_PER_AGENCY", "32"))
+DEFAULT_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+DEFAULT_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "2.0"))
+# Verified tokens remembered; older ones count against their fingerprint until verified again
+DEFAULT_MAX_VERIFIED = int(os.getenv("ADMISSION_MAX_VERIFIED_TOKENS", "10000"))
+EXEMPT_PATHS = ('/', '/health', '/metrics', '/docs', '/redoc', '/openapi.json')
+
+admission_queue_depth = registry.gauge("admission_queue_depth", "Requests waiting for a concurrency slot")
+admission_in_flight = registry.gauge("admission_in_flight", "Requests holding a concurrency slot")
+admission_wait_seconds = registry.histogram("admission_wait_seconds", "Time spent waiting for a concurrency slot")
+admission_rejections = registry.counter("admission_rejections_total", "Requests rejected by admission control")
+
+
+class SlotLimiter:
+    """
+    Counting semaphore with a FIFO wait queue that hands freed slots directly to
+    the next waiter, so late arrivals cannot overtake queued requests.
+    """
+
+    __slots__ = ('limit', 'active', 'waiters', 'hold_avg')
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters: Deque["asyncio.Future[None]"] = deque()
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self.hold_avg = 1.0
+
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self.waiters
+
+    def try_acquire(self) -> bool:
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return True
+        return False
+
+    async def acquire(self, timeout: float) -> bool:
+        if self.try_acquire():
+            return True
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            self._abandon(future)
+            raise
+        if future.done():
+            # Granted, possibly in the same tick the wait timed out
+            return True
+        self._abandon(future)
+        return False
+
+    def _abandon(self, future: "asyncio.Future[None]") -> None:
+        if future.done():
+            self.release()
+        else:
+            future.cancel()
+            self.waiters.remove(future)
+
+    def release(self, held_for: Optional[float] = None) -> None:
+        if held_for is not None:
+            self.hold_avg = 0.8 * self.hold_avg + 0.2 * held_for
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.hold_avg * (len(self.waiters) + 1) / self.limit))
+
+
+class Admission:
+    """
+    Outcome of an admission attempt; granted admissions must be released.
+    """
+
+    def __init__(self, controller: "AdmissionController", held: List[Tuple[str, str]], rejected_by: Optional[str] = None, retry_after: int = 0):
+        self.controller = controller
+        self.held = held
+        self.rejected_by = rejected_by
+        self.retry_after = retry_after
+        self.started_at = time.monotonic()
+
+    @property
+    def granted(self) -> bool:
+        return self.rejected_by is None
+
+    def release(self) -> None:
+        self.controller._release(self.held, time.monotonic() - self.started_at)
+        self.held = []
+
+
+class AdmissionController:
+    """
+    Per-user and per-agency slot limits with bounded waiting.
+    """
+
+    def __init__(
+        self,
+        per_user: int = DEFAULT_PER_USER,
+        per_agency: int = DEFAULT_PER_AGENCY,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        max_verified: int = DEFAULT_MAX_VERIFIED
+    ):
+        self.limits = {'user': per_user, 'agency': per_agency}
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_verified = max_verified
+        self._limiters: Dict[Tuple[str, str], SlotLimiter] = {}
+        self._agencies: Dict[str, str] = {}
+        # Token fingerprint -> user the token was verified for
+        self._verified: "OrderedDict[str, str]" = OrderedDict()
+
+    def verify(self, token: str, user_id: str) -> None:
+        """
+        Record that ``token`` authenticated as ``user_id``, so its requests count
+        against that user. Call only after the token has been verified.
+        """
+        key = token_fingerprint(token)
+        self._verified[key] = str(user_id)
+        self._verified.move_to_end(key)
+        while len(self._verified) > self.max_verified:
+            self._verified.popitem(last=False)
+
+    def user_key(self, token_key: str) -> str:
+        """
+        The verified user behind a token fingerprint, else the fingerprint itself.
+        """
+        return self._verified.get(token_key, token_key)
+
+    def assign_agency(self, user_id: str, agency_id: Optional[str]) -> None:
+        """
+        Record the agency a user works for so their requests also count against it.
+        """
+        if agency_id:
+            self._agencies[user_id] = str(agency_id)
+
+    def tenant_keys(self, user_key: str, agency_id: Optional[str] = None) -> List[Tuple[str, str]]:
+        # Agencies are only known for verified users (see assign_agency)
+        agency_id = agency_id or self._agencies.get(user_key)
+        keys = [('user', user_key)]
+        if agency_id:
+            keys.append(('agency', agency_id))
+        return keys
+
+    def _limiter(self, key: Tuple[str, str]) -> SlotLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = SlotLimiter(self.limits[key[0]])
+        return limiter
+
+    async def admit(self, keys: Iterable[Tuple[str, str]]) -> Admission:
+        """
+        Take a slot for every key, always in the given order (user before agency)
+        so requests never hold one scope's slot while another holds theirs in reverse.
+        """
+        held: List[Tuple[str, str]] = []
+        started = time.monotonic()
+        try:
+            for key in keys:
+                limiter = self._limiter(key)
+                scope = key[0]
+                if not limiter.try_acquire():
+                    if len(limiter.waiters) >= self.max_queue:
+                        return self._reject(held, scope, 'queue_full', limiter)
+                    remaining = self.max_wait - (time.monotonic() - started)
+                    admission_queue_depth.inc(scope=scope)
+                    try:
+                        acquired = remaining > 0 and await limiter.acquire(remaining)
+                    finally:
+                        admission_queue_depth.dec(scope=scope)
+                    if not acquired:
+                        return self._reject(held, scope, 'timeout', limiter)
+                held.append(key)
+        except BaseException:
+            self._release(held)
+            raise
+
+        admission_wait_seconds.observe(time.monotonic() - started)
+        admission_in_flight.inc()
+        return Admission(self, held)
+
+    def _reject(self, held: List[Tuple[str, str]], scope: str, reason: str, limiter: SlotLimiter) -> Admission:
+        self._release(held)
+        admission_rejections.inc(scope=scope, reason=reason)
+        return Admission(self, [], rejected_by=scope, retry_after=limiter.retry_after())
+
+    def _release(self, held: List[Tuple[str, str]], held_for: Optional[float] = None) -> None:
+        if held and held_for is not None:
+            admission_in_flight.dec()
+        for key in reversed(held):
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                continue
+            limiter.release(held_for)
+            if limiter.idle:
+                del self._limiters[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            f"{scope}:{tenant}": {'active': limiter.active, 'queued': len(limiter.waiters)}
+            for (scope, tenant), limiter in self._limiters.items()
+        }
+
+
+def token_key_from_scope(scope: Scope) -> str:
+    """
+    Fingerprint of the request's bearer token (or whole ``Authorization``
+    header), or the client address for anonymous requests.
+    """
+    headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+    authorization = headers.get('authorization')
+    if authorization:
+        scheme, _, token = authorization.partition(' ')
+        return token_fingerprint(token if scheme.lower() == 'bearer' and token else authorization)
+    client = scope.get('client')
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware holding an admission slot for the whole response, streaming
+    responses included.
+    """
+
+    def __init__(self, app: ASGIApp, controller: Optional[AdmissionController] = None, exempt_paths: Iterable[str] = EXEMPT_PATHS):
+        self.app = app
+        self.controller = controller or admission_controller
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['method'] == 'OPTIONS' or scope['path'] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        user_key = self.controller.user_key(token_key_from_scope(scope))
+        admission = await self.controller.admit(self.controller.tenant_keys(user_key))
+        if not admission.granted:
+            logger.warning(f"🚦 [ADMISSION] Rejected {scope['path']} for {admission.rejected_by} limit ({user_key})")
+            response = JSONResponse(
+                {"detail": f"Too many concurrent requests for this {admission.rejected_by}, retry shortly"},
+                status_code=429,
+                headers={"Retry-After": str(admission.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,273 @@
+"""
+Arrow IPC and Parquet exports of metric rows.
+
+Analysts load metrics into pandas / DuckDB; JSON makes them re-parse every
+value. Rows from any export source (Meta pagination, database cursors) are
+collected into Arrow record batches of ``ARROW_BATCH_ROWS`` rows, which are
+then either
+
+- written to the response as an Arrow IPC stream, one batch at a time,
+  optionally filtered and projected with ``pyarrow.compute`` on the way, or
+- written to Parquet files partitioned by account and month
+  (``<root>/<owner>/account_id=<id>/month=<YYYY-MM>/<level>.parquet``),
+  which are served as static files with HTTP range support.
+
+pyarrow is optional; without it :func:`require_arrow` raises
+:class:`ArrowUnavailable` and the endpoints answer 501.
+"""
+
+import asyncio
+import io
+import os
+from datetime import date
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+from .records import MetricsRow
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MEDIA_TYPE = 'application/vnd.apache.parquet'
+ARROW_BATCH_ROWS = int(os.getenv("ARROW_BATCH_ROWS", "10000"))
+PARQUET_EXPORT_DIR = Path(os.getenv("PARQUET_EXPORT_DIR", "/tmp/meta-ads-parquet"))
+FILTER_OPS = ('eq', 'ne', 'gt', 'gte', 'lt', 'lte')
+
+_INT_FIELDS = ('impressions', 'clicks', 'reach', 'conversions')
+_DATE_FIELDS = ('date_start', 'date_stop')
+
+
+class ArrowUnavailable(RuntimeError):
+    """
+    Raised when an Arrow or Parquet export is requested without pyarrow installed.
+    """
+
+
+def require_arrow() -> None:
+    if pa is None:
+        raise ArrowUnavailable("Arrow exports need pyarrow installed")
+
+
+def metrics_schema() -> 'pa.Schema':
+    """
+    Arrow schema of export metric rows, one field per ``MetricsRow`` slot.
+    Account and month are Hive partition keys in Parquet paths, not columns.
+    """
+    require_arrow()
+    columns = []
+    for name in MetricsRow.__slots__:
+        if name in _DATE_FIELDS:
+            columns.append(pa.field(name, pa.date32()))
+        elif name in _INT_FIELDS:
+            columns.append(pa.field(name, pa.int64()))
+        elif name in ('level', 'object_id', 'name'):
+            columns.append(pa.field(name, pa.string()))
+        else:
+            columns.append(pa.field(name, pa.float64()))
+    return pa.schema(columns)
+
+
+def _arrow_value(name: str, value: Any) -> Any:
+    if name in _DATE_FIELDS and isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+class BatchBuilder:
+    """
+    Accumulates row dicts column-wise and cuts them into record batches.
+    """
+
+    def __init__(self, schema: 'pa.Schema', batch_rows: int = ARROW_BATCH_ROWS):
+        self.schema = schema
+        self.batch_rows = batch_rows
+        self._columns: Dict[str, List[Any]] = {name: [] for name in schema.names}
+
+    def append(self, row: Dict[str, Any]) -> None:
+        for name, column in self._columns.items():
+            column.append(_arrow_value(name, row.get(name)))
+
+    def __len__(self) -> int:
+        return len(self._columns[self.schema.names[0]])
+
+    @property
+    def full(self) -> bool:
+        return len(self) >= self.batch_rows
+
+    def flush(self) -> 'pa.RecordBatch':
+        batch = pa.RecordBatch.from_pydict(self._columns, schema=self.schema)
+        self._columns = {name: [] for name in self.schema.names}
+        return batch
+
+
+async def record_batches(
+    rows: AsyncIterable[Dict[str, Any]],
+    schema: 'pa.Schema',
+    batch_rows: int = ARROW_BATCH_ROWS
+) -> AsyncIterator['pa.RecordBatch']:
+    builder = BatchBuilder(schema, batch_rows)
+    async for row in rows:
+        builder.append(row)
+        if builder.full:
+            yield builder.flush()
+    if len(builder):
+        yield builder.flush()
+
+
+def filter_expression(filters: Optional[Dict[str, Dict[str, Any]]], schema: 'pa.Schema') -> Optional['pc.Expression']:
+    """
+    Build a compute expression from ``{"spend": {"gte": 10}, "level": {"eq": "ad"}}``.
+
+    Raises:
+        ValueError: On an unknown column or operator.
+    """
+    expression = None
+    for name, conditions in (filters or {}).items():
+        if name not in schema.names:
+            raise ValueError(f"Unknown filter column: {name}")
+        if not isinstance(conditions, dict):
+            conditions = {'eq': conditions}
+        for op, value in conditions.items():
+            if op not in FILTER_OPS:
+                raise ValueError(f"Unknown filter operator: {op}")
+            field = pc.field(name)
+            value = _arrow_value(name, value)
+            condition = {
+                'eq': field == value, 'ne': field != value, 'gt': field > value,
+                'gte': field >= value, 'lt': field < value, 'lte': field <= value
+            }[op]
+            expression = condition if expression is None else expression & condition
+    return expression
+
+
+def select_schema(schema: 'pa.Schema', columns: Optional[Sequence[str]]) -> 'pa.Schema':
+    """
+    ``schema`` narrowed to ``columns`` (all of it when None).
+
+    Raises:
+        ValueError: On an unknown column.
+    """
+    if columns is None:
+        return schema
+    unknown = [c for c in columns if c not in schema.names]
+    if unknown:
+        raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+    return pa.schema([schema.field(c) for c in columns])
+
+
+async def query_batches(
+    batches: AsyncIterable['pa.RecordBatch'],
+    expression: Optional['pc.Expression'] = None,
+    columns: Optional[Sequence[str]] = None
+) -> AsyncIterator['pa.RecordBatch']:
+    """
+    Filter and project batches as they stream past; empty results are dropped.
+    """
+    async for batch in batches:
+        table = pa.Table.from_batches([batch])
+        if expression is not None:
+            table = table.filter(expression)
+        if columns is not None:
+            table = table.select(list(columns))
+        for part in table.to_batches():
+            if part.num_rows:
+                yield part
+
+
+async def ipc_stream_chunks(batches: AsyncIterable['pa.RecordBatch'], schema: 'pa.Schema') -> AsyncIterator[bytes]:
+    """
+    Encode batches as an Arrow IPC stream, yielding the bytes of each message as written.
+    """
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    yield drain()
+    async for batch in batches:
+        writer.write_batch(batch)
+        yield drain()
+    writer.close()
+    yield drain()
+
+
+def partition_path(root: Path, owner: str, account_id: str, month: str, level: str) -> Path:
+    """
+    Where a partition lives under ``root``.
+
+    Raises:
+        ValueError: If the parts would place the file outside ``root``.
+    """
+    path = root / owner / f"account_id={account_id}" / f"month={month}" / f"{level}.parquet"
+    if not path.resolve().is_relative_to(root.resolve()):
+        raise ValueError(f"Partition path escapes {root}")
+    return path
+
+
+async def write_parquet_partitions(
+    rows: AsyncIterable[Dict[str, Any]],
+    owner: str,
+    account_id: str,
+    level: str,
+    root: Path = PARQUET_EXPORT_DIR,
+    batch_rows: int = ARROW_BATCH_ROWS
+) -> Dict[str, Path]:
+    """
+    Write ``level`` rows to one Parquet file per ``date_start`` month for an
+    account, replacing earlier exports of those months. ``owner`` keeps each
+    token's exports apart.
+
+    Returns:
+        Month (``YYYY-MM``) to written file.
+    """
+    require_arrow()
+    schema = metrics_schema()
+    builders: Dict[str, BatchBuilder] = {}
+    writers: Dict[str, 'pq.ParquetWriter'] = {}
+    paths: Dict[str, Path] = {}
+
+    def open_writer(month: str) -> 'pq.ParquetWriter':
+        path = partition_path(root, owner, account_id, month, level)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        paths[month] = path
+        return pq.ParquetWriter(str(path) + '.tmp', schema, compression='zstd')
+
+    async def write(month: str) -> None:
+        if month not in writers:
+            writers[month] = await asyncio.to_thread(open_writer, month)
+        await asyncio.to_thread(writers[month].write_batch, builders[month].flush())
+
+    written = False
+    try:
+        async for row in rows:
+            month = str(row.get('date_start') or '')[:7] or 'unknown'
+            builder = builders.get(month)
+            if builder is None:
+                builder = builders[month] = BatchBuilder(schema, batch_rows)
+            builder.append(row)
+            if builder.full:
+                await write(month)
+        for month, builder in builders.items():
+            if len(builder):
+                await write(month)
+        written = True
+    finally:
+        for writer in writers.values():
+            await asyncio.to_thread(writer.close)
+        for path in paths.values():
+            # Publish complete months only; a failed export leaves earlier files in place
+            if written:
+                os.replace(str(path) + '.tmp', path)
+            else:
+                Path(str(path) + '.tmp').unlink(missing_ok=True)
+    return paths
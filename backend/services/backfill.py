@@ -0,0 +1,439 @@
+"""
+Rate-budgeted backfill of historical daily metrics.
+
+A newly connected account needs its daily metrics for as far back as Meta
+keeps them (37 months). Asked for in one insights call, that history times
+out or gets the account throttled, taking its dashboards down with it.
+Backfills run as jobs instead, in small steps:
+
+- :class:`BackfillPlanner` splits the history into chunks of
+  ``BACKFILL_CHUNK_DAYS`` and checkpoints each one as a row of
+  ``backfill_chunks``. Chunks run most recent first, so dashboards fill in
+  from today backwards.
+- :class:`BackfillRunner` fetches a chunk as an async insights report run:
+  POST ``act_<id>/insights``, poll the run until Meta finishes it, then page
+  through its ``insights`` edge. The run id is checkpointed, so a resumed
+  backfill polls the run it already started instead of starting another.
+  A run Meta fails (usually too much data for the window) is split in half.
+- Every Graph call is first taken from the account's ``backfill`` rate
+  budget, which only gets a share of the account's call rate
+  (``BACKFILL_BUDGET_SHARE``) and stops at a lower reported usage than
+  other background work. When it is spent the job is deferred
+  (:class:`~services.jobs.DeferJob`) and resumes from its checkpoint, so
+  interactive traffic keeps its headroom and the account is not throttled.
+- :meth:`BackfillPlanner.progress` reports done and remaining chunks and an
+  ETA from the throughput so far, pauses included.
+"""
+
+import asyncio
+import calendar
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import Column, Date, DateTime, Integer, String, Table, and_, delete, func, select, update
+from sqlalchemy.engine import Engine
+
+from .graph_api import MetaGraphError, graph_get, graph_post
+from .jobs import DeferJob, job_metadata, utcnow
+from .metrics import registry
+from .rate_budget import RateBudget, prepaid, rate_budget
+from .records import MetricsRow, rows_from_insights
+
+logger = logging.getLogger("meta-ads-railway.backfill")
+
+# Meta keeps insights for 37 months
+BACKFILL_MONTHS = int(os.getenv("BACKFILL_MONTHS", "37"))
+BACKFILL_CHUNK_DAYS = int(os.getenv("BACKFILL_CHUNK_DAYS", "30"))
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", "500"))
+BACKFILL_POLL_SECONDS = float(os.getenv("BACKFILL_POLL_SECONDS", "10"))
+BACKFILL_REPORT_TIMEOUT_SECONDS = float(os.getenv("BACKFILL_REPORT_TIMEOUT_SECONDS", "1800"))
+# How long a backfill whose rate budget is spent waits before resuming
+BACKFILL_BUDGET_RETRY_SECONDS = 30.0
+BACKFILL_LEVEL = 'campaign'
+BACKFILL_FIELDS = (
+    'campaign_id', 'campaign_name', 'date_start', 'date_stop', 'impressions', 'clicks', 'reach',
+    'spend', 'ctr', 'cpc', 'cpm', 'conversions', 'action_values'
+)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+
+REPORT_COMPLETED = 'Job Completed'
+REPORT_FAILED = ('Job Failed', 'Job Skipped')
+
+backfill_chunks_done = registry.counter("backfill_chunks_total", "Backfill chunks by outcome")
+backfill_rows = registry.counter("backfill_rows_total", "Daily metric rows stored by backfills")
+
+backfill_chunks_table = Table(
+    "backfill_chunks",
+    job_metadata,
+    Column("account_id", String(255), primary_key=True),
+    Column("since", Date, primary_key=True),
+    Column("until", Date, nullable=False),
+    Column("status", String(20), nullable=False, default=PENDING),
+    Column("report_run_id", String(64)),
+    Column("rows", Integer, nullable=False, default=0),
+    Column("started_at", DateTime),
+    Column("finished_at", DateTime),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Chunk:
+    account_id: str
+    since: date
+    until: date
+    status: str = PENDING
+    report_run_id: Optional[str] = None
+
+    @property
+    def days(self) -> int:
+        return (self.until - self.since).days + 1
+
+
+@dataclass(slots=True)
+class BackfillProgress:
+    account_id: str
+    chunks_total: int
+    chunks_done: int
+    days_total: int
+    days_done: int
+    rows: int
+    # Oldest day stored so far
+    done_since: Optional[date]
+    eta_seconds: Optional[float]
+
+    @property
+    def complete(self) -> bool:
+        return self.chunks_done == self.chunks_total
+
+    def payload(self) -> Dict[str, Any]:
+        return {
+            'account_id': self.account_id,
+            'chunks_total': self.chunks_total,
+            'chunks_done': self.chunks_done,
+            'days_total': self.days_total,
+            'days_done': self.days_done,
+            'rows': self.rows,
+            'done_since': self.done_since.isoformat() if self.done_since else None,
+            'eta_seconds': round(self.eta_seconds) if self.eta_seconds is not None else None,
+            'complete': self.complete
+        }
+
+
+def months_before(day: date, months: int) -> date:
+    """
+    The same day ``months`` earlier, clamped to the end of shorter months.
+    """
+    month = day.month - 1 - months
+    year, month = day.year + month // 12, month % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def split_window(since: date, until: date, chunk_days: int = BACKFILL_CHUNK_DAYS) -> List[Tuple[date, date]]:
+    """
+    ``(since, until)`` windows of at most ``chunk_days`` covering the given
+    days, most recent first.
+    """
+    chunks = []
+    end = until
+    while end >= since:
+        begin = max(since, end - timedelta(days=chunk_days - 1))
+        chunks.append((begin, end))
+        end = begin - timedelta(days=1)
+    return chunks
+
+
+def plan_chunks(until: date, months: int = BACKFILL_MONTHS, chunk_days: int = BACKFILL_CHUNK_DAYS) -> List[Tuple[date, date]]:
+    """
+    Windows covering the ``months`` up to ``until``, most recent first.
+    """
+    return split_window(months_before(until, months) + timedelta(days=1), until, chunk_days)
+
+
+def _chunk(row: Any) -> Chunk:
+    return Chunk(row.account_id, row.since, row.until, row.status, row.report_run_id)
+
+
+class BackfillPlanner:
+    """
+    Backfill chunks and their checkpoints in ``backfill_chunks``.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def plan(
+        self,
+        account_id: str,
+        until: Optional[date] = None,
+        months: int = BACKFILL_MONTHS,
+        chunk_days: int = BACKFILL_CHUNK_DAYS
+    ) -> int:
+        """
+        Checkpoint the chunks of an account's history up to ``until``
+        (yesterday by default); returns how many were added. Planning again
+        keeps existing chunks and their progress and only adds days after
+        the newest planned one.
+        """
+        until = until or date.today() - timedelta(days=1)
+        with self.engine.begin() as conn:
+            planned_until = conn.execute(
+                select(func.max(backfill_chunks_table.c.until)).where(backfill_chunks_table.c.account_id == account_id)
+            ).scalar()
+            if planned_until is None:
+                chunks = plan_chunks(until, months, chunk_days)
+            else:
+                chunks = split_window(planned_until + timedelta(days=1), until, chunk_days)
+            if chunks:
+                conn.execute(backfill_chunks_table.insert(), [
+                    {'account_id': account_id, 'since': since, 'until': end, 'status': PENDING, 'rows': 0}
+                    for since, end in chunks
+                ])
+        if chunks:
+            logger.info(f"🗂️ [BACKFILL] Planned {len(chunks)} chunks for account {account_id}")
+        return len(chunks)
+
+    def chunks(self, account_id: str) -> List[Chunk]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(backfill_chunks_table)
+                .where(backfill_chunks_table.c.account_id == account_id)
+                .order_by(backfill_chunks_table.c.since.desc())
+            ).all()
+        return [_chunk(row) for row in rows]
+
+    def next_chunk(self, account_id: str) -> Optional[Chunk]:
+        """
+        Most recent chunk not stored yet.
+        """
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(backfill_chunks_table)
+                .where(backfill_chunks_table.c.account_id == account_id, backfill_chunks_table.c.status != DONE)
+                .order_by(backfill_chunks_table.c.since.desc())
+                .limit(1)
+            ).first()
+        return _chunk(row) if row else None
+
+    def _key(self, chunk: Chunk):
+        return and_(backfill_chunks_table.c.account_id == chunk.account_id, backfill_chunks_table.c.since == chunk.since)
+
+    def start(self, chunk: Chunk, report_run_id: str) -> Chunk:
+        """
+        Checkpoint the report run fetching ``chunk``.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(backfill_chunks_table)
+                .where(self._key(chunk))
+                .values(
+                    status=RUNNING,
+                    report_run_id=report_run_id,
+                    started_at=func.coalesce(backfill_chunks_table.c.started_at, utcnow())
+                )
+            )
+        return Chunk(chunk.account_id, chunk.since, chunk.until, RUNNING, report_run_id)
+
+    def reset(self, chunk: Chunk) -> Chunk:
+        """
+        Forget the chunk's report run, so the next attempt starts a new one.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(update(backfill_chunks_table).where(self._key(chunk)).values(status=PENDING, report_run_id=None))
+        return Chunk(chunk.account_id, chunk.since, chunk.until)
+
+    def finish(self, chunk: Chunk, rows: int) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(backfill_chunks_table)
+                .where(self._key(chunk))
+                .values(
+                    status=DONE,
+                    rows=rows,
+                    started_at=func.coalesce(backfill_chunks_table.c.started_at, utcnow()),
+                    finished_at=utcnow()
+                )
+            )
+        backfill_chunks_done.inc(outcome='done')
+        backfill_rows.inc(rows)
+
+    def split(self, chunk: Chunk) -> Tuple[Chunk, Chunk]:
+        """
+        Replace a chunk with its older and newer halves.
+        """
+        middle = chunk.since + timedelta(days=chunk.days // 2 - 1)
+        halves = (Chunk(chunk.account_id, chunk.since, middle), Chunk(chunk.account_id, middle + timedelta(days=1), chunk.until))
+        with self.engine.begin() as conn:
+            conn.execute(delete(backfill_chunks_table).where(self._key(chunk)))
+            conn.execute(backfill_chunks_table.insert(), [
+                {'account_id': half.account_id, 'since': half.since, 'until': half.until, 'status': PENDING, 'rows': 0}
+                for half in halves
+            ])
+        backfill_chunks_done.inc(outcome='split')
+        return halves
+
+    def progress(self, account_id: str, now: Optional[datetime] = None) -> Optional[BackfillProgress]:
+        """
+        How far an account's backfill is, or None if none was planned. The
+        ETA assumes the remaining days go at the rate of the finished ones,
+        measured from the first chunk started to now, so budget pauses count.
+        """
+        now = now or utcnow()
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(backfill_chunks_table).where(backfill_chunks_table.c.account_id == account_id)
+            ).all()
+        if not rows:
+            return None
+        done = [row for row in rows if row.status == DONE]
+        days = lambda chunks: sum((row.until - row.since).days + 1 for row in chunks)
+        days_total, days_done = days(rows), days(done)
+
+        eta = None
+        started = [row.started_at for row in rows if row.started_at]
+        if days_done == days_total:
+            eta = 0.0
+        elif days_done and started:
+            elapsed = (now - min(started)).total_seconds()
+            eta = elapsed / days_done * (days_total - days_done)
+        return BackfillProgress(
+            account_id,
+            len(rows),
+            len(done),
+            days_total,
+            days_done,
+            sum(row.rows for row in done),
+            min((row.since for row in done), default=None),
+            eta
+        )
+
+
+ChunkStore = Callable[[Chunk, List[MetricsRow]], Awaitable[None]]
+
+
+class BackfillRunner:
+    """
+    Fetches an account's planned chunks through async report runs, within
+    the account's backfill rate budget.
+    """
+
+    def __init__(
+        self,
+        planner: BackfillPlanner,
+        client: httpx.AsyncClient,
+        meta_token: str,
+        budget: RateBudget = rate_budget,
+        poll_seconds: float = BACKFILL_POLL_SECONDS,
+        report_timeout: float = BACKFILL_REPORT_TIMEOUT_SECONDS
+    ):
+        self.planner = planner
+        self.client = client
+        self.meta_token = meta_token
+        self.budget = budget
+        self.poll_seconds = poll_seconds
+        self.report_timeout = report_timeout
+
+    def _spend(self, account_id: str) -> None:
+        # Reserves the next Graph call, which is then made inside prepaid()
+        if not self.budget.try_acquire(account_id, 'backfill'):
+            raise DeferJob(BACKFILL_BUDGET_RETRY_SECONDS, f"Backfill rate budget of account {account_id} is spent")
+
+    async def run(self, account_id: str, store: ChunkStore) -> BackfillProgress:
+        """
+        Store every remaining chunk, most recent first, with ``store`` (which
+        must replace whatever the chunk's days already hold, since a chunk
+        interrupted after storing is stored again).
+
+        Raises:
+            DeferJob: When the backfill budget is spent; progress is kept.
+            MetaGraphError: If Meta fails a call; progress is kept.
+        """
+        while True:
+            chunk = await asyncio.to_thread(self.planner.next_chunk, account_id)
+            if chunk is None:
+                break
+            await self.run_chunk(chunk, store)
+        return await asyncio.to_thread(self.planner.progress, account_id)
+
+    async def run_chunk(self, chunk: Chunk, store: ChunkStore) -> None:
+        if chunk.report_run_id:
+            try:
+                completed = await self._wait(chunk)
+            except MetaGraphError as e:
+                if e.status_code not in (400, 404):
+                    raise
+                # Report runs expire; start over
+                chunk = await asyncio.to_thread(self.planner.reset, chunk)
+        if not chunk.report_run_id:
+            chunk = await self._submit(chunk)
+            completed = await self._wait(chunk)
+
+        if not completed:
+            if chunk.days > 1:
+                halves = await asyncio.to_thread(self.planner.split, chunk)
+                logger.warning(
+                    f"⚠️ [BACKFILL] Report for {chunk.account_id} {chunk.since}..{chunk.until} failed; "
+                    f"split at {halves[0].until}"
+                )
+                return
+            await asyncio.to_thread(self.planner.reset, chunk)
+            raise MetaGraphError(502, f"Meta failed the report for account {chunk.account_id} on {chunk.since}")
+
+        rows = rows_from_insights(await self._results(chunk), BACKFILL_LEVEL)
+        await store(chunk, rows)
+        await asyncio.to_thread(self.planner.finish, chunk, len(rows))
+
+    async def _submit(self, chunk: Chunk) -> Chunk:
+        self._spend(chunk.account_id)
+        with prepaid():
+            response = await graph_post(self.client, f"act_{chunk.account_id}/insights", {
+                'level': BACKFILL_LEVEL,
+                'fields': ','.join(BACKFILL_FIELDS),
+                'time_range': json.dumps({'since': chunk.since.isoformat(), 'until': chunk.until.isoformat()}),
+                'time_increment': 1
+            }, self.meta_token)
+        return await asyncio.to_thread(self.planner.start, chunk, str(response['report_run_id']))
+
+    async def _wait(self, chunk: Chunk) -> bool:
+        """
+        Poll the chunk's report run; returns whether Meta completed it.
+        """
+        deadline = time.monotonic() + self.report_timeout
+        while True:
+            self._spend(chunk.account_id)
+            with prepaid():
+                run = await graph_get(
+                    self.client, chunk.report_run_id, {'fields': 'async_status,async_percent_completion'}, self.meta_token
+                )
+            status = run.get('async_status')
+            if status == REPORT_COMPLETED:
+                return True
+            if status in REPORT_FAILED:
+                return False
+            if time.monotonic() >= deadline:
+                await asyncio.to_thread(self.planner.reset, chunk)
+                raise MetaGraphError(504, f"Report run {chunk.report_run_id} did not finish in time")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _results(self, chunk: Chunk) -> List[Dict[str, Any]]:
+        # Paged by hand rather than with graph_stream so every page is budgeted
+        rows: List[Dict[str, Any]] = []
+        params: Dict[str, Any] = {'limit': BACKFILL_PAGE_SIZE}
+        while True:
+            self._spend(chunk.account_id)
+            with prepaid():
+                page = await graph_get(self.client, f"{chunk.report_run_id}/insights", params, self.meta_token)
+            rows.extend(page.get('data', []))
+            paging = page.get('paging', {})
+            after = paging.get('cursors', {}).get('after')
+            if not paging.get('next') or not after:
+                return rows
+            params['after'] = after
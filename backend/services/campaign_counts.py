@@ -0,0 +1,165 @@
+"""
+Campaign counts per ad account from Graph summaries.
+
+Counting campaigns used to mean downloading up to 1000 campaign objects and
+filtering them in Python, which both dominated dashboard payloads and
+undercounted larger accounts. Graph can count server-side: a campaigns edge
+request with ``summary=total_count`` and ``limit=0`` returns only the total,
+and ``effective_status`` narrows it to active or paused campaigns. The three
+count requests for up to 16 accounts go out as a single batch call.
+
+Counts are cached per account and token for a few minutes and dropped when an
+account is synced.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlencode
+
+import httpx
+
+from .graph_api import GRAPH_BATCH_LIMIT, MetaGraphError, graph_batch, token_fingerprint
+
+logger = logging.getLogger("meta-ads-railway.campaign-counts")
+
+CAMPAIGN_COUNT_TTL = float(os.getenv("CAMPAIGN_COUNT_TTL_SECONDS", "300"))
+
+# Count field -> effective_status filter (None counts every campaign the edge returns)
+COUNT_FILTERS: Tuple[Tuple[str, Optional[str]], ...] = (
+    ('totalCampaigns', None),
+    ('activeCampaigns', 'ACTIVE'),
+    ('pausedCampaigns', 'PAUSED'),
+)
+ACCOUNTS_PER_BATCH = GRAPH_BATCH_LIMIT // len(COUNT_FILTERS)
+
+CampaignCounts = Dict[str, int]
+
+
+def count_requests(account_id: str) -> List[Dict[str, str]]:
+    """
+    Batch entries counting one account's campaigns, in ``COUNT_FILTERS`` order.
+    """
+    requests = []
+    for _, status in COUNT_FILTERS:
+        params = {'summary': 'total_count', 'limit': 0}
+        if status:
+            params['effective_status'] = json.dumps([status])
+        requests.append({'method': 'GET', 'relative_url': f"act_{account_id}/campaigns?{urlencode(params)}"})
+    return requests
+
+
+def batches_needed(account_count: int) -> int:
+    return -(-account_count // ACCOUNTS_PER_BATCH)
+
+
+class CampaignCountCache:
+    """
+    Counts keyed by account, then by token fingerprint, so one user's lookup
+    never answers for a token Meta has not authorised on the account.
+    """
+
+    def __init__(self, ttl: float = CAMPAIGN_COUNT_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, Dict[str, Tuple[CampaignCounts, float]]] = {}
+
+    def get(self, account_id: str, token_key: str) -> Optional[CampaignCounts]:
+        entry = self._entries.get(account_id, {}).get(token_key)
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def put(self, account_id: str, token_key: str, counts: CampaignCounts) -> None:
+        self._entries.setdefault(account_id, {})[token_key] = (counts, time.time())
+
+    def invalidate(self, account_id: Optional[str] = None) -> None:
+        """
+        Drop one account's counts, or every account's when ``account_id`` is None.
+        """
+        if account_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(account_id, None)
+
+    def __len__(self) -> int:
+        return sum(len(tokens) for tokens in self._entries.values())
+
+
+campaign_count_cache = CampaignCountCache()
+
+
+async def _fetch_batch(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_ids: Sequence[str]
+) -> Dict[str, Union[CampaignCounts, MetaGraphError]]:
+    requests = [r for account_id in account_ids for r in count_requests(account_id)]
+    responses = await graph_batch(client, requests, meta_token)
+
+    results: Dict[str, Union[CampaignCounts, MetaGraphError]] = {}
+    for i, account_id in enumerate(account_ids):
+        bodies = responses[i * len(COUNT_FILTERS):(i + 1) * len(COUNT_FILTERS)]
+        error = next((b for b in bodies if isinstance(b, MetaGraphError)), None)
+        if error is not None:
+            results[account_id] = error
+            continue
+        results[account_id] = {
+            name: int(body.get('summary', {}).get('total_count', 0))
+            for (name, _), body in zip(COUNT_FILTERS, bodies)
+        }
+    return results
+
+
+async def fetch_campaign_counts_many(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_ids: Sequence[str],
+    cache: CampaignCountCache = campaign_count_cache
+) -> Dict[str, Union[CampaignCounts, BaseException]]:
+    """
+    Counts for several accounts: cached ones directly, the rest in as few batch
+    calls as possible. A failed account maps to its exception.
+    """
+    token_key = token_fingerprint(meta_token)
+    results: Dict[str, Union[CampaignCounts, BaseException]] = {}
+    missing = []
+    for account_id in dict.fromkeys(account_ids):
+        counts = cache.get(account_id, token_key)
+        if counts is not None:
+            results[account_id] = counts
+        else:
+            missing.append(account_id)
+
+    chunks = [missing[i:i + ACCOUNTS_PER_BATCH] for i in range(0, len(missing), ACCOUNTS_PER_BATCH)]
+    outcomes = await asyncio.gather(*(_fetch_batch(client, meta_token, chunk) for chunk in chunks), return_exceptions=True)
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.error(f"❌ [CAMPAIGN COUNTS] Batch of {len(chunk)} accounts failed: {str(outcome)}")
+            results.update((account_id, outcome) for account_id in chunk)
+            continue
+        for account_id, counts in outcome.items():
+            if not isinstance(counts, BaseException):
+                cache.put(account_id, token_key, counts)
+            results[account_id] = counts
+    return results
+
+
+async def fetch_campaign_counts(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_id: str,
+    cache: CampaignCountCache = campaign_count_cache
+) -> CampaignCounts:
+    """
+    Campaign totals by effective status for one account.
+
+    Raises:
+        MetaGraphError: If Meta rejects the count requests.
+    """
+    counts = (await fetch_campaign_counts_many(client, meta_token, [account_id], cache))[account_id]
+    if isinstance(counts, BaseException):
+        raise counts
+    return counts
@@ -0,0 +1,342 @@
+"""
+Memory-mapped on-disk column store for settled daily metrics.
+
+Daily metrics older than a few days no longer change, yet they were re-fetched
+from Meta or re-queried from Postgres on every range request. The store keeps
+them per account as one append-only file per metric of little-endian float64
+values indexed by day offset from the account's first day, plus a byte-per-day
+presence file and a small JSON manifest::
+
+    <root>/<account_id>/manifest.json     {"epoch": "2022-01-01", "days": 730, "metrics": [...]}
+    <root>/<account_id>/spend.f64
+    <root>/<account_id>/_present.u8
+
+Reads map the files and hand out ``memoryview`` slices without copying
+(``numpy.frombuffer`` turns them into arrays at no cost). Appends are atomic:
+values are written past the manifest's day count and fsynced, and only then
+does a new manifest (written to a temporary file and renamed) make them
+visible. A torn append is invisible and truncated away by the next one.
+
+Sync jobs append each account's newly settled days with
+:func:`archive_settled_days`; :func:`range_totals` answers date-range totals
+from the stored days and asks Meta only for the days outside them.
+"""
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from array import array
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy is optional, a Python loop is the fallback
+    numpy = None
+
+from .graph_api import action_total, graph_get
+
+logger = logging.getLogger("meta-ads-railway.column-store")
+
+MANIFEST = 'manifest.json'
+PRESENCE_FILE = '_present.u8'
+VALUE_SIZE = array('d').itemsize
+COLUMN_METRICS = ('spend', 'impressions', 'clicks', 'conversions')
+# Meta revises the most recent days; older ones are settled
+SETTLED_AFTER_DAYS = 3
+# How far back the first archive of an account reaches
+ARCHIVE_INITIAL_DAYS = int(os.getenv("COLUMN_STORE_INITIAL_DAYS", "365"))
+# Days asked for per insights page, and pages read per archive run
+ARCHIVE_PAGE_DAYS = 100
+ARCHIVE_MAX_PAGES = 20
+
+
+def settled_rows(rows: Iterable[Dict[str, Any]], settled_after: int, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Daily rows older than ``settled_after`` days, which Meta no longer revises.
+    """
+    cutoff = ((today or date.today()) - timedelta(days=settled_after)).isoformat()
+    return [row for row in rows if row.get('date_start') and str(row['date_start'])[:10] < cutoff]
+
+
+class _Mapping:
+    """
+    Committed length of an account's files and their maps, as of one manifest.
+    """
+
+    __slots__ = ('epoch', 'days', 'maps', 'version')
+
+    def __init__(self, epoch: Optional[date], days: int, version: Optional[int] = None):
+        self.epoch = epoch
+        self.days = days
+        self.maps: Dict[str, mmap.mmap] = {}
+        # Manifest mtime, so appends by another process are picked up
+        self.version = version
+
+
+class ColumnStore:
+    """
+    Per-account append-only column files with zero-copy reads.
+
+    Usage::
+
+        store.append("123", daily_rows)
+        spend = store.column("123", "spend", date(2023, 1, 1), date(2023, 12, 31))
+        store.totals("123", ["spend", "clicks"], since, until)
+    """
+
+    def __init__(self, root: Path, metrics: Sequence[str] = COLUMN_METRICS):
+        self.root = Path(root)
+        self.metrics = tuple(metrics)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._mappings: Dict[str, _Mapping] = {}
+        self._guard = threading.Lock()
+
+    def _lock(self, account_id: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(account_id, threading.Lock())
+
+    def _dir(self, account_id: str) -> Path:
+        if not account_id.isdigit():
+            raise ValueError(f"Invalid account id: {account_id!r}")
+        return self.root / account_id
+
+    def manifest(self, account_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((self._dir(account_id) / MANIFEST).read_text())
+        except FileNotFoundError:
+            return None
+
+    def date_range(self, account_id: str) -> Optional[Tuple[date, date]]:
+        """
+        First and last stored day, or None if nothing is stored.
+        """
+        manifest = self.manifest(account_id)
+        if not manifest or not manifest['days']:
+            return None
+        epoch = date.fromisoformat(manifest['epoch'])
+        return epoch, epoch + timedelta(days=manifest['days'] - 1)
+
+    def append(self, account_id: str, rows: Iterable[Dict[str, Any]], through: Optional[date] = None) -> int:
+        """
+        Append days after the last stored one; earlier days are settled and
+        skipped. Gaps are stored as absent days, including any up to
+        ``through`` that Meta returned no row for, so they are not asked for again.
+
+        Returns:
+            Number of days appended.
+        """
+        with self._lock(account_id):
+            directory = self._dir(account_id)
+            manifest = self.manifest(account_id)
+            by_day: Dict[date, Dict[str, Any]] = {}
+            for row in rows:
+                day = row.get('date_start') or row.get('date')
+                if day:
+                    by_day[day if isinstance(day, date) else date.fromisoformat(str(day)[:10])] = row
+            if manifest is None:
+                if not by_day:
+                    return 0
+                manifest = {'version': 1, 'epoch': min(by_day).isoformat(), 'days': 0, 'metrics': list(self.metrics)}
+            epoch = date.fromisoformat(manifest['epoch'])
+            stored = manifest['days']
+            new_days = sorted(d for d in by_day if (d - epoch).days >= stored)
+            last = max([*new_days[-1:], *([through] if through else [])], default=None)
+            if last is None or (last - epoch).days < stored:
+                return 0
+
+            count = (last - epoch).days + 1 - stored
+            present = bytearray(count)
+            columns = {metric: array('d', bytes(VALUE_SIZE * count)) for metric in manifest['metrics']}
+            for day in new_days:
+                offset = (day - epoch).days - stored
+                present[offset] = 1
+                row = by_day[day]
+                for metric, column in columns.items():
+                    column[offset] = action_total(row.get(metric))
+
+            directory.mkdir(parents=True, exist_ok=True)
+            self._write_tail(directory / PRESENCE_FILE, stored, 1, bytes(present))
+            for metric, column in columns.items():
+                self._write_tail(directory / f"{metric}.f64", stored, VALUE_SIZE, column.tobytes())
+
+            manifest.update({'days': stored + count, 'updated_at': time.time()})
+            tmp = directory / (MANIFEST + '.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, directory / MANIFEST)
+            # Readers holding views of the old mappings keep them; new reads remap
+            self._mappings.pop(account_id, None)
+            logger.info(f"🗄️ [COLUMN STORE] Appended {count} days for {account_id}")
+            return count
+
+    @staticmethod
+    def _write_tail(path: Path, stored_days: int, width: int, data: bytes) -> None:
+        with open(path, 'ab+') as f:
+            # Drop anything a torn append left past the committed length
+            f.truncate(stored_days * width)
+            f.seek(stored_days * width)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _mapping(self, account_id: str) -> _Mapping:
+        try:
+            version: Optional[int] = os.stat(self._dir(account_id) / MANIFEST).st_mtime_ns
+        except FileNotFoundError:
+            version = None
+        mapping = self._mappings.get(account_id)
+        if mapping is None or mapping.version != version:
+            manifest = self.manifest(account_id)
+            if manifest:
+                mapping = _Mapping(date.fromisoformat(manifest['epoch']), manifest['days'], version)
+            else:
+                mapping = _Mapping(None, 0, version)
+            self._mappings[account_id] = mapping
+        return mapping
+
+    def _view(self, account_id: str, name: str, width: int, since: Optional[date], until: Optional[date]) -> memoryview:
+        mapping = self._mapping(account_id)
+        if not mapping.days:
+            return memoryview(b'')
+        mapped = mapping.maps.get(name)
+        if mapped is None:
+            with open(self._dir(account_id) / name, 'rb') as f:
+                mapped = mapping.maps[name] = mmap.mmap(f.fileno(), mapping.days * width, access=mmap.ACCESS_READ)
+        start = 0 if since is None else max(0, (since - mapping.epoch).days)
+        end = mapping.days if until is None else min(mapping.days, (until - mapping.epoch).days + 1)
+        return memoryview(mapped)[start * width:max(start, end) * width]
+
+    def column(self, account_id: str, metric: str, since: Optional[date] = None, until: Optional[date] = None) -> memoryview:
+        """
+        Zero-copy float64 view of ``metric`` for the stored days within ``[since, until]``.
+
+        Raises:
+            KeyError: If the store does not keep ``metric``.
+        """
+        if metric not in self.metrics:
+            raise KeyError(metric)
+        return self._view(account_id, f"{metric}.f64", VALUE_SIZE, since, until).cast('d')
+
+    def present(self, account_id: str, since: Optional[date] = None, until: Optional[date] = None) -> memoryview:
+        """
+        One byte per day in range: 1 where Meta returned the day, 0 for gaps.
+        """
+        return self._view(account_id, PRESENCE_FILE, 1, since, until)
+
+    def totals(self, account_id: str, metrics: Sequence[str], since: Optional[date] = None, until: Optional[date] = None) -> Dict[str, float]:
+        """
+        Sum each metric over the stored days within ``[since, until]``, with a
+        vectorised NumPy reduction over the mapped column when NumPy is installed.
+        """
+        return {metric: _column_sum(self.column(account_id, metric, since, until)) for metric in metrics}
+
+
+def _column_sum(values: memoryview) -> float:
+    if numpy is not None:
+        return float(numpy.frombuffer(values, dtype=numpy.float64).sum())
+    return sum(values)
+
+
+def _account_insights(account_id: str, fields: Sequence[str], since: date, until: date, daily: bool) -> Tuple[str, Dict[str, Any]]:
+    params: Dict[str, Any] = {
+        'fields': ','.join(fields),
+        'time_range': json.dumps({'since': since.isoformat(), 'until': until.isoformat()}),
+        'level': 'account'
+    }
+    if daily:
+        params.update({'time_increment': 1, 'limit': min(ARCHIVE_PAGE_DAYS, (until - since).days + 1)})
+    return f"act_{account_id}/insights", params
+
+
+async def archive_settled_days(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_id: str,
+    store: "ColumnStore",
+    today: Optional[date] = None
+) -> int:
+    """
+    Fetch and append an account's settled days after the last stored one
+    (the last ``ARCHIVE_INITIAL_DAYS`` for an account not stored yet). Days
+    Meta returned no row for are only stored as absent once every page of the
+    range has been read; a run cut short stops at the last day it saw.
+
+    Returns:
+        Number of days appended.
+    """
+    today = today or date.today()
+    until = today - timedelta(days=SETTLED_AFTER_DAYS + 1)
+    stored = await asyncio.to_thread(store.date_range, account_id)
+    since = stored[1] + timedelta(days=1) if stored else today - timedelta(days=ARCHIVE_INITIAL_DAYS)
+    if since > until:
+        return 0
+    path, params = _account_insights(account_id, store.metrics, since, until, daily=True)
+    rows: List[Dict[str, Any]] = []
+    through = None
+    for _ in range(ARCHIVE_MAX_PAGES):
+        payload = await graph_get(client, path, params, meta_token)
+        rows.extend(payload.get('data', []))
+        paging = payload.get('paging', {})
+        after = paging.get('cursors', {}).get('after')
+        if not paging.get('next') or not after:
+            through = until
+            break
+        params['after'] = after
+    return await asyncio.to_thread(store.append, account_id, rows, through)
+
+
+async def range_totals(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_id: str,
+    metrics: Sequence[str],
+    since: date,
+    until: date,
+    store: Optional["ColumnStore"] = None
+) -> Tuple[Dict[str, float], int]:
+    """
+    Account totals of ``metrics`` over ``[since, until]``. Stored days are
+    summed from the columns; Meta is asked once for each part of the range
+    before or after them. When every day is stored the token's access to the
+    account is still checked with Meta, since the store is shared by all users.
+
+    Returns:
+        Totals by metric and the number of days read from the store.
+
+    Raises:
+        KeyError: If ``store`` does not keep one of ``metrics``.
+    """
+    stored = store.date_range(account_id) if store is not None else None
+    first, last = (max(since, stored[0]), min(until, stored[1])) if stored else (None, None)
+    if first is None or last is None or first > last:
+        missing = [(since, until)]
+        totals = {metric: 0.0 for metric in metrics}
+        archived = 0
+    else:
+        before, after = (since, first - timedelta(days=1)), (last + timedelta(days=1), until)
+        missing = [window for window in (before, after) if window[0] <= window[1]]
+        totals = await asyncio.to_thread(store.totals, account_id, metrics, first, last)
+        archived = (last - first).days + 1
+
+    if not missing:
+        await graph_get(client, f"act_{account_id}", {'fields': 'id'}, meta_token)
+    for window in missing:
+        path, params = _account_insights(account_id, metrics, *window, daily=False)
+        for row in (await graph_get(client, path, params, meta_token)).get('data', []):
+            for metric in metrics:
+                totals[metric] += action_total(row.get(metric))
+    return totals, archived
+
+
+_store_dir = os.getenv("COLUMN_STORE_DIR")
+column_store: Optional[ColumnStore] = ColumnStore(Path(_store_dir)) if _store_dir else None
@@ -0,0 +1,382 @@
+"""
+Composite dashboard requests.
+
+A page sends one list of widget specs. The planner merges overlapping insight
+needs into the smallest set of Graph queries: it unions field lists for the same
+account/range/level, and rolls account-level widgets up from a campaign-level
+query when one is already needed. The queries run once, concurrently, and the
+rows are fanned back out to each widget.
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from .campaign_counts import batches_needed, fetch_campaign_counts_many
+from .dashboard import (
+    KPI_FIELDS,
+    TOP_CAMPAIGN_FIELDS,
+    kpis_from_insight,
+    top_campaigns_from_rows,
+)
+from .graph_api import graph_get, graph_get_all, parse_account_id
+from .metrics import registry
+from .sparkline_store import SPARKLINE_METRICS, ensure_loaded, sparkline_store, to_sparkline_points
+
+logger = logging.getLogger("meta-ads-railway.composite")
+
+WIDGET_TYPES = ('kpis', 'insights', 'topCampaigns', 'sparkline', 'campaignCounts')
+LEVELS = ('account', 'campaign', 'adset', 'ad')
+
+# Fields that can be summed across campaigns to rebuild an account-level row
+ADDITIVE_FIELDS = {
+    'spend', 'impressions', 'clicks', 'conversions', 'actions', 'action_values',
+    'video_thruplay_watched_actions', 'inline_link_clicks', 'outbound_clicks'
+}
+# Ratio fields recomputed from summed bases after a rollup
+DERIVED_FIELDS = {
+    'ctr': ('clicks', 'impressions'),
+    'cpc': ('spend', 'clicks'),
+    'cpm': ('spend', 'impressions')
+}
+DIMENSION_FIELDS = {'date_start', 'date_stop', 'account_currency'}
+LEVEL_ID_FIELDS = {
+    'campaign': ['campaign_id', 'campaign_name'],
+    'adset': ['adset_id', 'adset_name'],
+    'ad': ['ad_id', 'ad_name']
+}
+ROLLUP_PAGE_SIZE = 500
+
+composite_upstream_calls = registry.counter(
+    "composite_upstream_calls_total", "Graph queries issued by composite dashboard requests"
+)
+composite_upstream_calls_saved = registry.counter(
+    "composite_upstream_calls_saved_total", "Graph queries avoided by composite query planning"
+)
+
+
+@dataclass
+class WidgetSpec:
+    """
+    One widget on the page and the data it needs.
+    """
+    id: str
+    type: str
+    account_id: str
+    date_preset: Optional[str] = 'last_30d'
+    time_range: Optional[Dict[str, str]] = None
+    level: str = 'account'
+    fields: List[str] = field(default_factory=list)
+    time_increment: Optional[Any] = None
+    breakdowns: List[str] = field(default_factory=list)
+    limit: int = 5
+    window: int = 7
+    metrics: List[str] = field(default_factory=lambda: ['spend', 'clicks', 'impressions'])
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any], index: int = 0) -> "WidgetSpec":
+        widget_type = raw.get('type')
+        if widget_type not in WIDGET_TYPES:
+            raise ValueError(f"Unknown widget type: {widget_type}")
+        account_id = parse_account_id(raw.get('account_id'))
+        if account_id is None:
+            raise ValueError(f"Widget {raw.get('id', index)} needs a numeric account_id")
+
+        spec = cls(
+            id=str(raw.get('id', index)),
+            type=widget_type,
+            account_id=account_id,
+            date_preset=raw.get('date_preset', 'last_30d'),
+            time_range=raw.get('time_range'),
+            level=raw.get('level', 'account'),
+            fields=list(raw.get('fields') or []),
+            time_increment=raw.get('time_increment'),
+            breakdowns=list(raw.get('breakdowns') or []),
+            limit=int(raw.get('limit', 5)),
+            window=int(raw.get('window', 7)),
+            metrics=[m for m in (raw.get('metrics') or ['spend', 'clicks', 'impressions']) if m in SPARKLINE_METRICS]
+        )
+
+        if spec.type == 'kpis':
+            spec.level, spec.fields = 'account', list(KPI_FIELDS)
+        elif spec.type == 'topCampaigns':
+            spec.level, spec.fields = 'campaign', list(TOP_CAMPAIGN_FIELDS)
+        elif spec.type == 'insights':
+            if spec.level not in LEVELS:
+                raise ValueError(f"Unknown level: {spec.level}")
+            if not spec.fields:
+                raise ValueError(f"Widget {spec.id} requests no fields")
+        return spec
+
+    @property
+    def scope(self) -> Tuple:
+        """
+        Widgets in the same scope can share a Graph query.
+        """
+        window = ('range', self.time_range['since'], self.time_range['until']) if self.time_range \
+            else ('preset', self.date_preset)
+        return (self.account_id, window, self.time_increment, tuple(sorted(self.breakdowns)))
+
+    @property
+    def rollup_safe(self) -> bool:
+        return all(f in ADDITIVE_FIELDS or f in DERIVED_FIELDS or f in DIMENSION_FIELDS for f in self.fields)
+
+
+@dataclass
+class InsightsQuery:
+    """
+    One planned Graph insights call.
+    """
+    account_id: str
+    level: str
+    date_params: Dict[str, Any]
+    time_increment: Optional[Any]
+    breakdowns: Tuple[str, ...]
+    fields: Set[str] = field(default_factory=set)
+    sort_limit: Optional[int] = None
+
+    @property
+    def paginate(self) -> bool:
+        return self.sort_limit is None
+
+    def params(self) -> Dict[str, Any]:
+        params: Dict[str, Any] = {
+            'fields': ','.join(sorted(self.fields | set(LEVEL_ID_FIELDS.get(self.level, [])))),
+            'level': self.level,
+            **self.date_params
+        }
+        if self.time_increment is not None:
+            params['time_increment'] = self.time_increment
+        if self.breakdowns:
+            params['breakdowns'] = ','.join(self.breakdowns)
+        if self.sort_limit is not None:
+            params['sort'] = 'spend_descending'
+            params['limit'] = self.sort_limit
+        elif self.level != 'account':
+            params['limit'] = ROLLUP_PAGE_SIZE
+        return params
+
+
+@dataclass
+class CompositePlan:
+    """
+    Planned upstream work plus how each widget is served from it.
+    """
+    widgets: List[WidgetSpec]
+    queries: List[InsightsQuery] = field(default_factory=list)
+    # widget id -> (query index, rolled up from a finer level)
+    sources: Dict[str, Tuple[int, bool]] = field(default_factory=dict)
+    sparkline_accounts: Set[str] = field(default_factory=set)
+    count_accounts: Set[str] = field(default_factory=set)
+
+    @property
+    def naive_calls(self) -> int:
+        """
+        Calls the page would make if every widget fetched its own data.
+        """
+        return len(self.widgets)
+
+    @property
+    def planned_calls(self) -> int:
+        return len(self.queries) + len(self.sparkline_accounts) + batches_needed(len(self.count_accounts))
+
+
+def _date_params(widget: WidgetSpec) -> Dict[str, Any]:
+    if widget.time_range:
+        return {'time_range': json.dumps({'since': widget.time_range['since'], 'until': widget.time_range['until']})}
+    return {'date_preset': widget.date_preset}
+
+
+def _rollup_bases(fields: List[str]) -> Set[str]:
+    bases = {f for f in fields if f in ADDITIVE_FIELDS or f in DIMENSION_FIELDS}
+    for f in fields:
+        bases.update(DERIVED_FIELDS.get(f, ()))
+    return bases
+
+
+def plan_widgets(widgets: List[WidgetSpec]) -> CompositePlan:
+    """
+    Merge widget requirements into the minimal set of upstream queries.
+    """
+    plan = CompositePlan(widgets=widgets)
+    scopes: Dict[Tuple, List[WidgetSpec]] = {}
+
+    for widget in widgets:
+        if widget.type == 'sparkline':
+            plan.sparkline_accounts.add(widget.account_id)
+        elif widget.type == 'campaignCounts':
+            plan.count_accounts.add(widget.account_id)
+        else:
+            scopes.setdefault(widget.scope, []).append(widget)
+
+    for scope, scope_widgets in scopes.items():
+        account_id, _, time_increment, breakdowns = scope
+        by_level: Dict[str, List[WidgetSpec]] = {}
+        for widget in scope_widgets:
+            by_level.setdefault(widget.level, []).append(widget)
+
+        def new_query(level: str, first: WidgetSpec) -> int:
+            plan.queries.append(InsightsQuery(
+                account_id=account_id,
+                level=level,
+                date_params=_date_params(first),
+                time_increment=time_increment,
+                breakdowns=breakdowns
+            ))
+            return len(plan.queries) - 1
+
+        campaign_widgets = by_level.pop('campaign', [])
+        account_widgets = by_level.pop('account', [])
+
+        campaign_index = None
+        if campaign_widgets:
+            campaign_index = new_query('campaign', campaign_widgets[0])
+            query = plan.queries[campaign_index]
+            for widget in campaign_widgets:
+                query.fields.update(widget.fields)
+                plan.sources[widget.id] = (campaign_index, False)
+            if all(w.type == 'topCampaigns' for w in campaign_widgets) and not any(w.rollup_safe for w in account_widgets):
+                # Only ranking needed: let Meta sort and truncate instead of paging everything
+                query.sort_limit = max(w.limit for w in campaign_widgets)
+
+        account_index = None
+        for widget in account_widgets:
+            if campaign_index is not None and widget.rollup_safe:
+                plan.queries[campaign_index].fields.update(_rollup_bases(widget.fields))
+                plan.sources[widget.id] = (campaign_index, True)
+                continue
+            if account_index is None:
+                account_index = new_query('account', widget)
+            plan.queries[account_index].fields.update(widget.fields)
+            plan.sources[widget.id] = (account_index, False)
+
+        for level, level_widgets in by_level.items():
+            index = new_query(level, level_widgets[0])
+            for widget in level_widgets:
+                plan.queries[index].fields.update(widget.fields)
+                plan.sources[widget.id] = (index, False)
+
+    return plan
+
+
+def _merge_actions(current: List[Dict[str, Any]], extra: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    totals: Dict[str, float] = {a['action_type']: float(a.get('value', 0)) for a in current}
+    for action in extra:
+        totals[action['action_type']] = totals.get(action['action_type'], 0.0) + float(action.get('value', 0))
+    return [{'action_type': k, 'value': v} for k, v in totals.items()]
+
+
+def rollup_rows(rows: List[Dict[str, Any]], fields: List[str], breakdowns: Tuple[str, ...] = ()) -> List[Dict[str, Any]]:
+    """
+    Sum finer-level rows into account-level rows, one per date bucket and breakdown.
+    """
+    groups: Dict[Tuple, Dict[str, Any]] = {}
+    bases = _rollup_bases(fields)
+
+    for row in rows:
+        key = (row.get('date_start'), row.get('date_stop')) + tuple(row.get(b) for b in breakdowns)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'date_start': row.get('date_start'), 'date_stop': row.get('date_stop')}
+            group.update({b: row.get(b) for b in breakdowns})
+            if 'account_currency' in row:
+                group['account_currency'] = row['account_currency']
+
+        for name in bases & ADDITIVE_FIELDS:
+            value = row.get(name)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                group[name] = _merge_actions(group.get(name, []), value)
+            else:
+                group[name] = group.get(name, 0.0) + float(value)
+
+    for group in groups.values():
+        clicks = group.get('clicks', 0.0)
+        impressions = group.get('impressions', 0.0)
+        spend = group.get('spend', 0.0)
+        derived = {
+            'ctr': clicks / impressions * 100 if impressions else 0.0,
+            'cpc': spend / clicks if clicks else 0.0,
+            'cpm': spend / impressions * 1000 if impressions else 0.0
+        }
+        for name in fields:
+            if name in derived:
+                group[name] = derived[name]
+
+    return sorted(groups.values(), key=lambda g: g['date_start'] or '')
+
+
+def _project(rows: List[Dict[str, Any]], widget: WidgetSpec) -> List[Dict[str, Any]]:
+    keep = set(widget.fields) | {'date_start', 'date_stop'} | set(widget.breakdowns) | \
+        set(LEVEL_ID_FIELDS.get(widget.level, []))
+    return [{k: v for k, v in row.items() if k in keep} for row in rows]
+
+
+async def _run_query(client: httpx.AsyncClient, meta_token: str, query: InsightsQuery) -> List[Dict[str, Any]]:
+    path = f"act_{query.account_id}/insights"
+    if query.paginate:
+        return await graph_get_all(client, path, query.params(), meta_token)
+    payload = await graph_get(client, path, query.params(), meta_token)
+    return payload.get('data', [])
+
+
+async def execute_plan(plan: CompositePlan, client: httpx.AsyncClient, meta_token: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Run every planned query once, concurrently, and build each widget's result.
+    """
+    query_tasks = [_run_query(client, meta_token, q) for q in plan.queries]
+    sparkline_accounts = sorted(plan.sparkline_accounts)
+    count_accounts = sorted(plan.count_accounts)
+
+    outcomes = await asyncio.gather(
+        *query_tasks,
+        *(ensure_loaded(meta_token, a) for a in sparkline_accounts),
+        fetch_campaign_counts_many(client, meta_token, count_accounts),
+        return_exceptions=True
+    )
+    query_results = outcomes[:len(query_tasks)]
+    sparkline_results = dict(zip(sparkline_accounts, outcomes[len(query_tasks):len(query_tasks) + len(sparkline_accounts)]))
+    count_results = outcomes[-1]
+    if isinstance(count_results, BaseException):
+        count_results = dict.fromkeys(count_accounts, count_results)
+
+    today = date.today()
+    results: Dict[str, Dict[str, Any]] = {}
+    for widget in plan.widgets:
+        if widget.type == 'sparkline':
+            outcome = sparkline_results[widget.account_id]
+            if not isinstance(outcome, BaseException):
+                outcome = to_sparkline_points(
+                    sparkline_store.series(widget.account_id, widget.window, widget.metrics, today)
+                )
+        elif widget.type == 'campaignCounts':
+            outcome = count_results[widget.account_id]
+        else:
+            index, rolled_up = plan.sources[widget.id]
+            rows = query_results[index]
+            if not isinstance(rows, BaseException):
+                query = plan.queries[index]
+                if rolled_up:
+                    rows = rollup_rows(rows, widget.fields, query.breakdowns)
+                if widget.type == 'kpis':
+                    outcome = kpis_from_insight(rows[0] if rows else {})
+                elif widget.type == 'topCampaigns':
+                    outcome = top_campaigns_from_rows(rows, widget.limit)
+                else:
+                    outcome = _project(rows, widget)
+            else:
+                outcome = rows
+
+        if isinstance(outcome, BaseException):
+            logger.error(f"❌ [COMPOSITE] Widget {widget.id} failed: {str(outcome)}")
+            results[widget.id] = {'type': widget.type, 'success': False, 'error': str(outcome)}
+        else:
+            results[widget.id] = {'type': widget.type, 'success': True, 'data': outcome}
+
+    return results
@@ -0,0 +1,267 @@
+"""
+Dashboard sub-queries and streaming orchestration.
+
+Each dashboard block (KPIs, campaign counts, sparkline, top campaigns) is an
+independent coroutine so callers can run them concurrently and either wait for
+all of them or stream each block as soon as it resolves.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import date
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .campaign_counts import campaign_count_cache, fetch_campaign_counts
+from .graph_api import action_total, graph_get, graph_get_all, token_fingerprint
+from .records import rows_from_insights
+from .sparkline_store import ensure_loaded, sparkline_store, to_sparkline_points
+
+logger = logging.getLogger("meta-ads-railway.dashboard")
+
+KPI_FIELDS = [
+    'spend', 'impressions', 'clicks', 'cpc', 'cpm', 'ctr',
+    'conversions', 'video_thruplay_watched_actions'
+]
+TOP_CAMPAIGN_FIELDS = ['campaign_id', 'campaign_name', 'spend', 'impressions', 'clicks', 'ctr', 'conversions']
+CAMPAIGN_LIST_FIELDS = [
+    'id', 'name', 'objective', 'status', 'daily_budget', 'lifetime_budget',
+    'created_time', 'updated_time', 'start_time', 'stop_time'
+]
+AD_ACCOUNT_FIELDS = ['id', 'name', 'currency', 'account_status']
+EMPTY_CAMPAIGN_COUNTS = {'totalCampaigns': 0, 'activeCampaigns': 0, 'pausedCampaigns': 0}
+
+
+def kpis_from_insight(insight: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert an account-level insight row into the dashboard KPI block.
+    """
+    return {
+        'totalSpend': float(insight.get('spend', 0)),
+        'totalRevenue': 0.0,  # Revenue calculation needed
+        'averageRoas': 0.0,   # ROAS calculation needed
+        'totalConversions': int(action_total(insight.get('conversions'))),
+        'totalClicks': int(insight.get('clicks', 0)),
+        'totalImpressions': int(insight.get('impressions', 0)),
+        'averageCTR': float(insight.get('ctr', 0)),
+        'averageCPC': float(insight.get('cpc', 0)),
+        'averageCPM': float(insight.get('cpm', 0))
+    }
+
+
+async def fetch_kpis(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_id: str,
+    date_preset: str
+) -> Dict[str, Any]:
+    """
+    Account-level KPI block. Returns zeros when Meta has no rows for the range.
+    """
+    payload = await graph_get(
+        client,
+        f"act_{account_id}/insights",
+        {'fields': ','.join(KPI_FIELDS), 'date_preset': date_preset, 'level': 'account'},
+        meta_token
+    )
+    data = payload.get('data', [])
+    return kpis_from_insight(data[0] if data else {})
+
+
+def campaign_record(account_id: str, campaign: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Shape a Graph campaign into the campaign list row served to the frontend.
+    """
+    daily_budget = campaign.get('daily_budget')
+    lifetime_budget = campaign.get('lifetime_budget')
+    return {
+        'campaign_id': campaign.get('id'),
+        'account_id': account_id,
+        'name': campaign.get('name'),
+        'objective': campaign.get('objective'),
+        'status': campaign.get('status'),
+        # Meta reports budgets in minor currency units
+        'daily_budget': int(daily_budget) / 100 if daily_budget else None,
+        'lifetime_budget': int(lifetime_budget) / 100 if lifetime_budget else None,
+        'start_time': campaign.get('start_time'),
+        'stop_time': campaign.get('stop_time'),
+        'created_time': campaign.get('created_time'),
+        'updated_time': campaign.get('updated_time')
+    }
+
+
+async def fetch_campaign_list(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_id: str
+) -> List[Dict[str, Any]]:
+    """
+    Every campaign on the account, following pagination.
+    """
+    rows = await graph_get_all(
+        client,
+        f"act_{account_id}/campaigns",
+        {'fields': ','.join(CAMPAIGN_LIST_FIELDS), 'limit': 250},
+        meta_token
+    )
+    return [campaign_record(account_id, c) for c in rows]
+
+
+async def fetch_ad_accounts(client: httpx.AsyncClient, meta_token: str) -> List[Dict[str, Any]]:
+    """
+    Ad accounts the token can see, in Meta's order.
+    """
+    return await graph_get_all(client, "me/adaccounts", {'fields': ','.join(AD_ACCOUNT_FIELDS), 'limit': 250}, meta_token)
+
+
+async def load_dashboard_metrics(meta_token: str, account_id: str, date_preset: str) -> Dict[str, Any]:
+    """
+    KPI and campaign count blocks fetched concurrently on a client of their own,
+    so the load can outlive the request that started it (cache refreshes, warm-ups).
+    A failed campaign count degrades to zeros; a failed KPI fetch raises.
+    """
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        kpis, campaign_counts = await asyncio.gather(
+            fetch_kpis(client, meta_token, account_id, date_preset),
+            fetch_campaign_counts(client, meta_token, account_id),
+            return_exceptions=True
+        )
+    if isinstance(kpis, BaseException):
+        raise kpis
+    if isinstance(campaign_counts, BaseException):
+        logger.warning(f"⚠️ [DASHBOARD] Campaign count failed for {account_id}: {str(campaign_counts)}")
+        campaign_counts = EMPTY_CAMPAIGN_COUNTS
+    return {**kpis, **campaign_counts}
+
+
+async def load_campaign_list(meta_token: str, account_id: str) -> List[Dict[str, Any]]:
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        campaigns = await fetch_campaign_list(client, meta_token, account_id)
+    # A fresh campaign list means counts may have moved too
+    campaign_count_cache.invalidate(account_id)
+    return campaigns
+
+
+async def load_ad_accounts(meta_token: str) -> List[Dict[str, Any]]:
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        return await fetch_ad_accounts(client, meta_token)
+
+
+def dashboard_cache_key(meta_token: str, account_id: str, date_preset: str) -> Tuple[str, ...]:
+    return (token_fingerprint(meta_token), 'dashboard-metrics', account_id, date_preset)
+
+
+def campaigns_cache_key(meta_token: str, account_id: str) -> Tuple[str, ...]:
+    return (token_fingerprint(meta_token), 'campaigns', account_id)
+
+
+def ad_accounts_cache_key(meta_token: str) -> Tuple[str, ...]:
+    return (token_fingerprint(meta_token), 'ad-accounts')
+
+
+async def fetch_top_campaigns(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_id: str,
+    date_preset: str,
+    limit: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Highest-spend campaigns for the range, sorted by Meta.
+    """
+    payload = await graph_get(
+        client,
+        f"act_{account_id}/insights",
+        {
+            'fields': ','.join(TOP_CAMPAIGN_FIELDS),
+            'date_preset': date_preset,
+            'level': 'campaign',
+            'sort': 'spend_descending',
+            'limit': limit
+        },
+        meta_token
+    )
+    return top_campaigns_from_rows(payload.get('data', []), limit)
+
+
+def top_campaigns_from_rows(rows: List[Dict[str, Any]], limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Shape campaign-level insight rows into the top campaigns block, highest spend first.
+    """
+    records = sorted(rows_from_insights(rows, 'campaign'), key=lambda record: record.spend, reverse=True)
+    return [record.top_campaign_payload() for record in records[:limit]]
+
+
+async def fetch_sparkline(
+    meta_token: str,
+    account_id: str,
+    window: int = 7
+) -> List[Dict[str, Any]]:
+    """
+    Sparkline points served from the ring buffers.
+    """
+    await ensure_loaded(meta_token, account_id)
+    return to_sparkline_points(sparkline_store.series(
+        account_id, window, ['spend', 'clicks', 'impressions'], end_day=date.today()
+    ))
+
+
+def dashboard_blocks(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_id: str,
+    date_preset: str
+) -> Dict[str, Callable[[], Awaitable[Any]]]:
+    """
+    Named block factories that make up the dashboard.
+    """
+    return {
+        'kpis': lambda: fetch_kpis(client, meta_token, account_id, date_preset),
+        'campaigns': lambda: fetch_campaign_counts(client, meta_token, account_id),
+        'sparkline': lambda: fetch_sparkline(meta_token, account_id),
+        'topCampaigns': lambda: fetch_top_campaigns(client, meta_token, account_id, date_preset)
+    }
+
+
+async def stream_blocks(
+    blocks: Dict[str, Callable[[], Awaitable[Any]]],
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    poll_interval: float = 0.25
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Start every block at once and yield ``(event, payload)`` as each one settles.
+
+    Outstanding blocks are cancelled when the client disconnects or when the
+    consumer stops iterating, so abandoned requests do not keep calling Meta.
+    """
+    tasks = {asyncio.create_task(factory()): name for name, factory in blocks.items()}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = tasks[task]
+                if task.exception() is not None:
+                    logger.error(f"❌ [DASHBOARD STREAM] Block {name} failed: {task.exception()}")
+                    yield 'error', {'block': name, 'error': str(task.exception())}
+                else:
+                    yield name, {'block': name, 'data': task.result()}
+            if pending and is_disconnected is not None and await is_disconnected():
+                logger.info(f"🔌 [DASHBOARD STREAM] Client disconnected, cancelling {len(pending)} blocks")
+                return
+        yield 'done', {'blocks': list(blocks)}
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def format_sse(event: str, payload: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+def format_ndjson(event: str, payload: Dict[str, Any]) -> str:
+    return json.dumps({'event': event, **payload}, default=str) + "\n"
@@ -0,0 +1,221 @@
+"""
+Request-scoped deadlines.
+
+Each request gets an absolute deadline, taken from the ``X-Request-Timeout-Ms``
+header (capped) or from a per-route default. The deadline lives in a context
+variable, so every upstream call made while serving the request sees it,
+including calls from tasks the request spawns:
+
+- HTTP calls size their timeout to ``min(policy timeout, remaining budget)``
+  and do not start (or retry) once the budget is gone;
+- database transactions get a matching ``statement_timeout``;
+- the middleware cancels the handler, and with it every child task, when the
+  deadline passes or the client disconnects.
+
+Work that should outlive the request (cache refreshes, warm-ups) is started
+with :func:`create_detached_task`, which drops the deadline.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from collections import deque
+from typing import Any, Coroutine, Deque, Dict, Iterable, Iterator, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import registry
+
+logger = logging.getLogger("meta-ads-railway.deadline")
+
+DEADLINE_HEADER = 'x-request-timeout-ms'
+DEFAULT_DEADLINE = float(os.getenv("REQUEST_DEADLINE_SECONDS", "25"))
+MAX_DEADLINE = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "60"))
+# Handlers get this long past the deadline to return partial results before being cancelled
+DEADLINE_GRACE = float(os.getenv("REQUEST_DEADLINE_GRACE_SECONDS", "0.25"))
+ROUTE_DEADLINES: Dict[str, float] = {
+    '/api/dashboard-stream': 60.0,
+    '/api/sparkline-data/batch': 30.0,
+    '/api/agency/portfolio': 15.0,
+    # Exports stream for as long as the data takes; the cap only bounds runaway downloads
+    '/api/export/insights': float(os.getenv("EXPORT_DEADLINE_SECONDS", "900")),
+    '/api/export/hierarchy': float(os.getenv("EXPORT_DEADLINE_SECONDS", "900")),
+    '/api/export/arrow': float(os.getenv("EXPORT_DEADLINE_SECONDS", "900")),
+    '/api/export/parquet': float(os.getenv("EXPORT_DEADLINE_SECONDS", "900")),
+    '/api/meta/export/metrics': float(os.getenv("EXPORT_DEADLINE_SECONDS", "900")),
+}
+EXEMPT_PATHS = ('/', '/health', '/metrics', '/docs', '/redoc', '/openapi.json')
+
+requests_cancelled = registry.counter("requests_cancelled_total", "Requests cancelled before completing, by reason")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised instead of starting upstream work the request no longer has time for.
+    """
+
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left before the current deadline, or None when there is no deadline.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_timeout(default: float) -> float:
+    """
+    Timeout for the next upstream call: ``default``, shrunk to the remaining budget.
+
+    Raises:
+        DeadlineExceeded: If the budget is already spent.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(default, left)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Run the block under a deadline ``seconds`` from now, never later than an
+    enclosing one. ``None`` leaves the current deadline untouched.
+    """
+    current = _deadline.get()
+    deadline = current
+    if seconds is not None:
+        candidate = time.monotonic() + seconds
+        deadline = candidate if current is None else min(current, candidate)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def create_detached_task(coro: Coroutine[Any, Any, Any]) -> "asyncio.Task[Any]":
+    """
+    Start ``coro`` as a task that keeps the caller's context but not its deadline.
+    """
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context.run(asyncio.create_task, coro)
+
+
+def apply_statement_timeouts(session_factory: Any) -> None:
+    """
+    Give every PostgreSQL transaction opened by ``session_factory`` a
+    ``statement_timeout`` equal to the remaining request budget.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(session_factory, "after_begin")
+    def set_statement_timeout(session: Any, transaction: Any, connection: Any) -> None:
+        left = remaining()
+        if left is None or connection.dialect.name != 'postgresql':
+            return
+        # SET LOCAL cannot take bind parameters; the value is an integer we computed
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(left * 1000))}")
+
+
+def requested_deadline(scope: Scope, routes: Dict[str, float] = ROUTE_DEADLINES) -> float:
+    """
+    Deadline in seconds for a request: the client's header if sent, else the route default.
+    """
+    for name, value in scope.get('headers', []):
+        if name.decode('latin-1').lower() == DEADLINE_HEADER:
+            try:
+                return max(0.0, min(float(value.decode('latin-1')) / 1000.0, MAX_DEADLINE))
+            except ValueError:
+                break
+    return routes.get(scope['path'], DEFAULT_DEADLINE)
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that applies the request deadline and cancels the handler
+    when it expires or the client goes away.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Optional[Dict[str, float]] = None, exempt_paths: Iterable[str] = EXEMPT_PATHS):
+        self.app = app
+        self.routes = ROUTE_DEADLINES if routes is None else routes
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['path'] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        seconds = requested_deadline(scope, self.routes)
+        buffered: Deque[Message] = deque()
+        receive_lock = asyncio.Lock()
+        disconnected = asyncio.Event()
+        response_started = False
+
+        async def next_message() -> Message:
+            # Callers hold receive_lock
+            if disconnected.is_set():
+                return {'type': 'http.disconnect'}
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+            return message
+
+        async def tracked_receive() -> Message:
+            # The watcher holds receive_lock while it waits for a disconnect, so a
+            # body it already buffered is handed over without taking the lock
+            if buffered:
+                return buffered.popleft()
+            async with receive_lock:
+                if buffered:
+                    return buffered.popleft()
+                return await next_message()
+
+        async def tracked_send(message: Message) -> None:
+            nonlocal response_started
+            if message['type'] == 'http.response.start':
+                response_started = True
+            await send(message)
+
+        async def watch_disconnect() -> None:
+            # Request bodies here are small JSON documents; buffer them for the handler
+            # and keep listening until the client goes away. Only the client is read here:
+            # taking back a buffered message a handler never asks for (a GET's empty body)
+            # would spin without yielding to the event loop
+            while not disconnected.is_set():
+                async with receive_lock:
+                    message = await next_message()
+                if message['type'] != 'http.disconnect':
+                    buffered.append(message)
+
+        with deadline_scope(seconds):
+            handler = asyncio.create_task(self.app(scope, tracked_receive, tracked_send))
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            done, _ = await asyncio.wait({handler, watcher}, timeout=seconds + DEADLINE_GRACE, return_when=asyncio.FIRST_COMPLETED)
+            if handler in done:
+                handler.result()
+                return
+
+            reason = 'disconnect' if watcher in done else 'deadline'
+            requests_cancelled.inc(reason=reason)
+            logger.warning(f"⏱️ [DEADLINE] Cancelling {scope['path']} after {reason} ({seconds:.1f}s budget)")
+            handler.cancel()
+            await asyncio.gather(handler, return_exceptions=True)
+            if reason == 'deadline' and not response_started:
+                await JSONResponse({"detail": "Request deadline exceeded"}, status_code=504)(scope, receive, send)
+        finally:
+            for task in (handler, watcher):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(handler, watcher, return_exceptions=True)
@@ -0,0 +1,348 @@
+"""
+Async helpers for calling the Meta Graph API from the Railway backend.
+"""
+
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Union
+
+import httpx
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, json is the fallback
+    orjson = None
+
+from .json_stream import PageDecoder
+from .metrics import registry
+from .rate_budget import ACCOUNT_PATH, rate_budget
+from .resilience import CircuitOpenError, resilient_get, resilient_request
+
+GRAPH_API_VERSION = os.getenv("META_GRAPH_API_VERSION", "v19.0")
+GRAPH_API_URL = os.getenv("META_GRAPH_API_URL", f"https://graph.facebook.com/{GRAPH_API_VERSION}")
+GRAPH_BATCH_LIMIT = 50
+
+graph_requests_total = registry.counter("graph_requests_total", "Graph API requests issued by status code")
+
+# Per-request call tally; set by track_upstream_calls() and shared with child tasks
+_upstream_calls: ContextVar[Optional[Dict[str, int]]] = ContextVar("upstream_calls", default=None)
+
+
+def json_loads(raw: Union[bytes, str]) -> Any:
+    """
+    Decode a JSON body with orjson when installed, the standard library otherwise.
+    """
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+class MetaGraphError(Exception):
+    """
+    Raised when the Graph API answers with a non-200 status.
+    """
+
+    def __init__(self, status_code: int, message: str, payload: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.payload = payload or {}
+
+
+def normalize_account_id(account_id: Any) -> str:
+    """
+    Strip the ``act_`` prefix so account IDs can be compared and re-prefixed safely.
+    """
+    account_id = str(account_id).strip()
+    return account_id[4:] if account_id.startswith("act_") else account_id
+
+
+def parse_account_id(account_id: Any) -> Optional[str]:
+    """
+    ``account_id`` without ``act_``, or None unless it is a numeric ad account ID.
+    """
+    if account_id is None:
+        return None
+    account_id = normalize_account_id(account_id)
+    return account_id if account_id.isascii() and account_id.isdigit() else None
+
+
+def token_fingerprint(access_token: str) -> str:
+    """
+    Short stable hash of an access token, safe to use in cache keys and logs.
+    """
+    return hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+
+def action_total(value: Any) -> float:
+    """
+    Sum an action-style metric, which Meta returns either as a numeric string or
+    as a list of ``{"action_type", "value"}`` entries.
+    """
+    if isinstance(value, list):
+        return sum(float(action.get('value', 0)) for action in value)
+    return float(value or 0)
+
+
+@contextmanager
+def track_upstream_calls() -> Iterator[Dict[str, int]]:
+    """
+    Count Graph calls made inside the block, including from tasks it spawns.
+
+    Usage::
+
+        with track_upstream_calls() as calls:
+            await do_work()
+        calls['count']
+    """
+    stats = {'count': 0}
+    token = _upstream_calls.set(stats)
+    try:
+        yield stats
+    finally:
+        _upstream_calls.reset(token)
+
+
+async def graph_get(
+    client: httpx.AsyncClient,
+    path: str,
+    params: Dict[str, Any],
+    access_token: str
+) -> Dict[str, Any]:
+    """
+    Perform a GET against the Graph API and return the decoded JSON body.
+
+    Args:
+        client: Shared async HTTP client.
+        path: Graph path relative to the versioned root, e.g. ``act_123/insights``.
+        params: Query parameters (without the access token).
+        access_token: Meta access token for the call.
+
+    Returns:
+        Decoded JSON response.
+
+    Raises:
+        MetaGraphError: If Meta answers with a non-200 status once retries are
+            exhausted, or with 503 while the Meta circuit is open.
+    """
+    _record_call(path)
+
+    try:
+        response = await resilient_get(
+            client,
+            'meta',
+            f"{GRAPH_API_URL}/{path.lstrip('/')}",
+            params={**params, "access_token": access_token}
+        )
+    except CircuitOpenError as e:
+        raise MetaGraphError(503, str(e), {'retry_after': e.retry_after})
+    graph_requests_total.inc(status=response.status_code)
+    rate_budget.observe(response.headers, path)
+
+    if response.status_code != 200:
+        raise _graph_error(response.status_code, response.text)
+
+    return json_loads(response.content)
+
+
+async def graph_post(
+    client: httpx.AsyncClient,
+    path: str,
+    data: Dict[str, Any],
+    access_token: str
+) -> Dict[str, Any]:
+    """
+    POST to the Graph API, e.g. to start an async insights report run. Not
+    retried: a repeated POST could create a second object.
+
+    Raises:
+        MetaGraphError: As for :func:`graph_get`.
+    """
+    _record_call(path)
+
+    try:
+        response = await resilient_request(
+            client,
+            'meta',
+            'POST',
+            f"{GRAPH_API_URL}/{path.lstrip('/')}",
+            idempotent=False,
+            data={**data, "access_token": access_token}
+        )
+    except CircuitOpenError as e:
+        raise MetaGraphError(503, str(e), {'retry_after': e.retry_after})
+    graph_requests_total.inc(status=response.status_code)
+    rate_budget.observe(response.headers, path)
+
+    if response.status_code != 200:
+        raise _graph_error(response.status_code, response.text)
+
+    return json_loads(response.content)
+
+
+async def graph_batch(
+    client: httpx.AsyncClient,
+    requests: Sequence[Dict[str, Any]],
+    access_token: str
+) -> List[Union[Dict[str, Any], MetaGraphError]]:
+    """
+    Send up to ``GRAPH_BATCH_LIMIT`` read requests as one Graph batch call.
+
+    Args:
+        client: Shared async HTTP client.
+        requests: Batch entries, e.g. ``{'method': 'GET', 'relative_url': 'act_1/campaigns?limit=0'}``.
+        access_token: Meta access token for every entry.
+
+    Returns:
+        One decoded body or ``MetaGraphError`` per request, in request order.
+
+    Raises:
+        MetaGraphError: If the batch call itself fails.
+    """
+    if len(requests) > GRAPH_BATCH_LIMIT:
+        raise ValueError(f"Graph batches take at most {GRAPH_BATCH_LIMIT} requests")
+
+    _count_call()
+    # Meta rate-limits each entry of a batch as its own call
+    for request in requests:
+        account = ACCOUNT_PATH.search(request.get('relative_url', ''))
+        if account:
+            rate_budget.record_call(account.group(1))
+
+    try:
+        response = await resilient_request(
+            client,
+            'meta',
+            'POST',
+            f"{GRAPH_API_URL}/",
+            idempotent=all(r.get('method', 'GET') == 'GET' for r in requests),
+            data={'batch': json.dumps(list(requests)), 'include_headers': 'false', 'access_token': access_token}
+        )
+    except CircuitOpenError as e:
+        raise MetaGraphError(503, str(e), {'retry_after': e.retry_after})
+    graph_requests_total.inc(status=response.status_code)
+    rate_budget.observe(response.headers)
+
+    if response.status_code != 200:
+        raise _graph_error(response.status_code, response.text)
+
+    results: List[Union[Dict[str, Any], MetaGraphError]] = []
+    for item in json_loads(response.content):
+        if item is None:
+            # Meta drops entries it could not finish within the batch timeout
+            results.append(MetaGraphError(504, "Batch entry timed out"))
+        elif item.get('code') != 200:
+            results.append(_graph_error(item.get('code', 500), item.get('body') or ''))
+        else:
+            results.append(json_loads(item.get('body') or '{}'))
+    return results
+
+
+def _count_call() -> None:
+    stats = _upstream_calls.get()
+    if stats is not None:
+        stats['count'] += 1
+
+
+def _record_call(path: str) -> None:
+    _count_call()
+    account = ACCOUNT_PATH.search(path)
+    if account:
+        rate_budget.record_call(account.group(1))
+
+
+def _graph_error(status_code: int, body: str) -> MetaGraphError:
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = {}
+    if not isinstance(payload, dict):
+        payload = {}
+    message = payload.get("error", {}).get("message") if isinstance(payload.get("error"), dict) else None
+    return MetaGraphError(status_code, message or body, payload)
+
+
+async def graph_get_all(
+    client: httpx.AsyncClient,
+    path: str,
+    params: Dict[str, Any],
+    access_token: str,
+    max_pages: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    Follow cursor pagination and return the concatenated ``data`` rows.
+    """
+    rows: List[Dict[str, Any]] = []
+    params = dict(params)
+    for _ in range(max_pages):
+        payload = await graph_get(client, path, params, access_token)
+        rows.extend(payload.get('data', []))
+        paging = payload.get('paging', {})
+        after = paging.get('cursors', {}).get('after')
+        if not paging.get('next') or not after:
+            break
+        params['after'] = after
+    return rows
+
+
+async def graph_stream(
+    client: httpx.AsyncClient,
+    path: str,
+    params: Dict[str, Any],
+    access_token: str,
+    max_pages: int = 20
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Like :func:`graph_get_all`, but yield each ``data`` row as soon as it is
+    decoded from the response stream instead of buffering whole pages.
+
+    Usage::
+
+        async for row in graph_stream(client, f"act_{account_id}/insights", params, token):
+            columns.append(row)
+
+    Raises:
+        MetaGraphError: If a page fails, or its body is cut off or malformed.
+            Rows from earlier pages (and earlier in the failing page) have
+            already been yielded.
+    """
+    params = dict(params)
+    for _ in range(max_pages):
+        _record_call(path)
+        try:
+            response = await resilient_request(
+                client,
+                'meta',
+                'GET',
+                f"{GRAPH_API_URL}/{path.lstrip('/')}",
+                stream=True,
+                params={**params, "access_token": access_token}
+            )
+        except CircuitOpenError as e:
+            raise MetaGraphError(503, str(e), {'retry_after': e.retry_after})
+
+        decoder = PageDecoder()
+        try:
+            graph_requests_total.inc(status=response.status_code)
+            rate_budget.observe(response.headers, path)
+            if response.status_code != 200:
+                raise _graph_error(response.status_code, response.text)
+
+            async for chunk in response.aiter_bytes():
+                for row in decoder.feed(chunk):
+                    yield row
+            for row in decoder.close():
+                yield row
+        except ValueError as e:
+            raise MetaGraphError(502, f"Malformed Graph response: {e}")
+        finally:
+            await response.aclose()
+
+        paging = decoder.envelope.get('paging', {})
+        after = paging.get('cursors', {}).get('after')
+        if not paging.get('next') or not after:
+            break
+        params['after'] = after
@@ -0,0 +1,225 @@
+"""
+Columnar parsing of Graph insights pages.
+
+Meta returns every metric as a string (``"impressions": "1000"``,
+``"spend": "25.50"``) and action metrics as lists of
+``{"action_type", "value"}`` entries. Converting that field by field into
+per-row dicts costs a dict, a handful of boxed numbers and a list of action
+dicts per row. :class:`InsightColumns` converts each row once, into typed
+``array`` columns:
+
+- count metrics become ``array('q')`` and money/ratio metrics ``array('d')``;
+- action lists are flattened into one ``array('d')`` per action type, named
+  ``<field>.<action_type>`` (``actions.purchase``, ``action_values.purchase``);
+- dimensions (ids, names, dates, currency) stay as lists of strings.
+
+Rows missing a metric read as zero, matching the ``insight.get(name, 0)``
+convention used elsewhere. Rows can be appended one at a time;
+:func:`stream_insights` feeds them in straight from the response stream.
+Sparkline loads fetch daily insights this way and copy the columns into
+their ring buffers without building per-row dicts.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import httpx
+
+from .graph_api import graph_stream, json_loads
+
+INT_METRICS = frozenset({
+    'impressions', 'clicks', 'reach', 'unique_clicks', 'inline_link_clicks',
+    'unique_inline_link_clicks', 'outbound_clicks_count', 'estimated_ad_recallers'
+})
+FLOAT_METRICS = frozenset({
+    'spend', 'cpc', 'cpm', 'cpp', 'ctr', 'frequency', 'unique_ctr',
+    'cost_per_unique_click', 'inline_link_click_ctr', 'social_spend'
+})
+
+Column = Union['array[int]', 'array[float]', List[Optional[str]]]
+
+
+def _number(value: Any, cast: type) -> Union[int, float]:
+    if value is None or value == '':
+        return 0
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        # Meta occasionally sends integral counts as "12.0"
+        return cast(float(value))
+
+
+class InsightColumns:
+    """
+    Insight rows stored column-wise.
+
+    Usage::
+
+        columns = parse_insights(response.content)
+        columns['spend']                  # array('d', [...])
+        columns['actions.purchase']       # array('d', [...])
+        columns.sum('impressions')
+    """
+
+    def __init__(self, int_metrics: Iterable[str] = INT_METRICS, float_metrics: Iterable[str] = FLOAT_METRICS):
+        self.int_metrics = frozenset(int_metrics)
+        self.float_metrics = frozenset(float_metrics)
+        self._kinds = {
+            **{name: (int, 'q') for name in self.int_metrics},
+            **{name: (float, 'd') for name in self.float_metrics}
+        }
+        self._numeric: Dict[str, array] = {}
+        self._labels: Dict[str, List[Optional[str]]] = {}
+        self._length = 0
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """
+        Convert one insight row and append it to every column.
+        """
+        n = self._length
+        numeric = self._numeric
+        for name, value in row.items():
+            kind = self._kinds.get(name)
+            if kind is not None:
+                cast, typecode = kind
+                column = numeric.get(name)
+                if column is None or len(column) != n:
+                    column = self._numeric_column(name, typecode, n)
+                try:
+                    column.append(cast(value))
+                except (TypeError, ValueError):
+                    column.append(_number(value, cast))
+            elif isinstance(value, list):
+                for action in value:
+                    column = self._numeric_column(f"{name}.{action.get('action_type')}", 'd', n)
+                    amount = _number(action.get('value'), float)
+                    if len(column) > n:
+                        # Same action type twice in a row (e.g. per attribution window)
+                        column[n] += amount
+                    else:
+                        column.append(amount)
+            elif isinstance(value, dict):
+                continue
+            else:
+                column = self._labels.get(name)
+                if column is None:
+                    column = self._labels[name] = []
+                if len(column) < n:
+                    column.extend([None] * (n - len(column)))
+                column.append(None if value is None else str(value))
+        self._length = n + 1
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> 'InsightColumns':
+        for row in rows:
+            self.append(row)
+        return self
+
+    def _numeric_column(self, name: str, typecode: str, length: int) -> array:
+        column = self._numeric.get(name)
+        if column is None:
+            column = self._numeric[name] = array(typecode)
+        if len(column) < length:
+            # Zero-fill rows that did not carry this metric
+            column.frombytes(bytes(column.itemsize * (length - len(column))))
+        return column
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._numeric or name in self._labels
+
+    def __getitem__(self, name: str) -> Column:
+        """
+        A full-length column; missing metrics read 0, missing dimensions None.
+
+        Raises:
+            KeyError: If no row carried ``name``.
+        """
+        if name in self._numeric:
+            return self._numeric_column(name, self._numeric[name].typecode, self._length)
+        column = self._labels[name]
+        if len(column) < self._length:
+            column.extend([None] * (self._length - len(column)))
+        return column
+
+    def names(self) -> List[str]:
+        return [*self._labels, *self._numeric]
+
+    def action_types(self, field: str = 'actions') -> List[str]:
+        """
+        Action types seen for an action-list field, e.g. ``['link_click', 'purchase']``.
+        """
+        prefix = f"{field}."
+        return sorted(name[len(prefix):] for name in self._numeric if name.startswith(prefix))
+
+    def sum(self, name: str) -> Union[int, float]:
+        """
+        Total of a numeric column, 0 if no row carried it.
+        """
+        column = self._numeric.get(name)
+        return sum(column) if column is not None else 0
+
+    def action_total(self, field: str) -> List[float]:
+        """
+        Per-row sum across every action type of ``field``.
+        """
+        totals = [0.0] * self._length
+        for action_type in self.action_types(field):
+            for i, value in enumerate(self[f"{field}.{action_type}"]):
+                totals[i] += value
+        return totals
+
+    def values(self, name: str) -> Sequence[Union[int, float]]:
+        """
+        Per-row values of a metric Meta sends either as a number or as an
+        action list (``conversions``), the way ``action_total`` reads a row;
+        zeros if no row carried it.
+        """
+        if name in self._numeric:
+            return self[name]
+        totals = self.action_total(name)
+        if name in self._labels:
+            # Rows that sent the metric as a plain string rather than an action list
+            for i, value in enumerate(self[name]):
+                totals[i] += _number(value, float)
+        return totals
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """
+        Rebuild typed per-row dicts, flattening action columns into their names.
+        """
+        columns = {name: self[name] for name in self.names()}
+        for i in range(self._length):
+            yield {name: column[i] for name, column in columns.items()}
+
+
+def parse_insights(
+    payload: Union[bytes, str, Dict[str, Any]],
+    columns: Optional[InsightColumns] = None
+) -> InsightColumns:
+    """
+    Parse an insights page (raw body or decoded dict) into columns, appending
+    to ``columns`` when given so several pages can share one set.
+    """
+    if isinstance(payload, (bytes, str)):
+        payload = json_loads(payload)
+    columns = columns if columns is not None else InsightColumns()
+    return columns.extend(payload.get('data', []))
+
+
+async def stream_insights(
+    client: httpx.AsyncClient,
+    path: str,
+    params: Dict[str, Any],
+    access_token: str,
+    columns: Optional[InsightColumns] = None
+) -> InsightColumns:
+    """
+    Fetch every page of an insights edge straight into columns, converting each
+    row as it is decoded from the response stream.
+    """
+    columns = columns if columns is not None else InsightColumns()
+    async for row in graph_stream(client, path, params, access_token):
+        columns.append(row)
+    return columns
@@ -0,0 +1,463 @@
+"""
+Durable job queue for sync and backfill work.
+
+Long-running work (syncing accounts from Meta, backfilling history) used to
+run inside the HTTP request that asked for it, holding a web worker and dying
+with the request. Jobs are rows in a ``jobs`` table instead:
+
+- :class:`JobQueue` enqueues, claims, heartbeats and finishes jobs. Claims
+  select with ``FOR UPDATE SKIP LOCKED`` on Postgres, so any number of
+  workers on any number of hosts take disjoint jobs without blocking each
+  other; the claim itself is a guarded ``UPDATE``, which keeps SQLite (used
+  in tests) correct too.
+- A claimed job carries a lease that its worker renews while it runs. A
+  worker that crashes stops renewing, and once the lease expires the job is
+  claimable again.
+- Failed jobs are retried with full-jitter exponential backoff until
+  ``max_attempts`` is used up.
+- :class:`JobWorker` runs registered handlers with a concurrency limit per
+  job type; :func:`run_worker_processes` starts one worker per core.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import (
+    JSON, Column, DateTime, Index, Integer, MetaData, String, Table, Text, and_, or_, select, update
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import Select
+
+from .metrics import registry
+from .resilience import RetryPolicy
+
+logger = logging.getLogger("meta-ads-railway.jobs")
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_POLICY = RetryPolicy(
+    base_delay=float(os.getenv("JOB_RETRY_BASE_SECONDS", "5")),
+    max_delay=float(os.getenv("JOB_RETRY_MAX_SECONDS", "600"))
+)
+
+jobs_claimed = registry.counter("jobs_claimed_total", "Jobs claimed by job type")
+jobs_finished = registry.counter("jobs_finished_total", "Job attempts finished by job type and outcome")
+
+job_metadata = MetaData()
+
+jobs_table = Table(
+    "jobs",
+    job_metadata,
+    Column("id", String(36), primary_key=True),
+    Column("job_type", String(50), nullable=False),
+    Column("owner", String(255)),
+    # Account the job acts on; only the worker leasing that account claims it
+    Column("shard", String(255)),
+    Column("payload", JSON, nullable=False),
+    Column("status", String(20), nullable=False, default=QUEUED),
+    Column("priority", Integer, nullable=False, default=0),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("max_attempts", Integer, nullable=False, default=JOB_MAX_ATTEMPTS),
+    Column("run_at", DateTime, nullable=False),
+    Column("lease_owner", String(255)),
+    Column("lease_expires_at", DateTime),
+    Column("last_error", Text),
+    Column("result", JSON),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("finished_at", DateTime),
+    Index("idx_jobs_claim", "job_type", "status", "run_at"),
+    Index("idx_jobs_owner", "owner"),
+)
+
+
+def utcnow() -> datetime:
+    """
+    Naive UTC now; job timestamps are stored without a zone on every backend.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@dataclass(slots=True)
+class Job:
+    id: str
+    job_type: str
+    owner: Optional[str]
+    shard: Optional[str]
+    payload: Dict[str, Any]
+    status: str
+    priority: int
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    lease_owner: Optional[str]
+    lease_expires_at: Optional[datetime]
+    last_error: Optional[str]
+    result: Any
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime]
+
+    @classmethod
+    def from_row(cls, row: Any) -> 'Job':
+        return cls(**row._mapping)
+
+    def status_payload(self) -> Dict[str, Any]:
+        """
+        What a client polling the job is shown.
+        """
+        return {
+            'id': self.id,
+            'type': self.job_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat(),
+            'last_error': self.last_error,
+            'result': self.result,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class JobQueue:
+    """
+    Jobs table operations. Every state change after a claim is guarded by the
+    claim's lease (worker and attempt), so a worker that lost its lease cannot
+    overwrite the outcome of the worker that took the job over.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        retry_policy: RetryPolicy = JOB_RETRY_POLICY
+    ):
+        self.engine = engine
+        self.lease = timedelta(seconds=lease_seconds)
+        self.retry_policy = retry_policy
+
+    def create_schema(self) -> None:
+        job_metadata.create_all(self.engine)
+
+    def enqueue(
+        self,
+        job_type: str,
+        payload: Dict[str, Any],
+        owner: Optional[str] = None,
+        priority: int = 0,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        run_at: Optional[datetime] = None,
+        connection: Optional[Connection] = None,
+        shard: Optional[str] = None
+    ) -> Job:
+        """
+        Add a job. With ``connection`` it is inserted in the caller's
+        transaction, so it only exists if the caller's other writes commit.
+        """
+        now = utcnow()
+        values = {
+            'id': str(uuid.uuid4()),
+            'job_type': job_type,
+            'owner': owner,
+            'shard': shard,
+            'payload': payload,
+            'status': QUEUED,
+            'priority': priority,
+            'attempts': 0,
+            'max_attempts': max_attempts,
+            'run_at': run_at or now,
+            'created_at': now,
+            'updated_at': now
+        }
+        if connection is not None:
+            connection.execute(jobs_table.insert().values(**values))
+        else:
+            with self.engine.begin() as conn:
+                conn.execute(jobs_table.insert().values(**values))
+        return Job(lease_owner=None, lease_expires_at=None, last_error=None, result=None, finished_at=None, **values)
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[Job]:
+        """
+        Job by id; with ``owner``, only if it belongs to that owner.
+        """
+        query = select(jobs_table).where(jobs_table.c.id == job_id)
+        if owner is not None:
+            query = query.where(jobs_table.c.owner == owner)
+        with self.engine.connect() as conn:
+            row = conn.execute(query).first()
+        return Job.from_row(row) if row else None
+
+    @staticmethod
+    def _claimable(now: datetime):
+        return or_(
+            and_(jobs_table.c.status == QUEUED, jobs_table.c.run_at <= now),
+            and_(jobs_table.c.status == RUNNING, jobs_table.c.lease_expires_at < now)
+        )
+
+    def claim(
+        self,
+        job_types: Sequence[str],
+        worker_id: str,
+        limit: int = 1,
+        shards: Optional[Select] = None
+    ) -> List[Job]:
+        """
+        Lease up to ``limit`` due jobs of ``job_types``, highest priority and
+        oldest first. Jobs whose lease expired are taken over; those that
+        already used up their attempts are failed instead.
+
+        ``shards`` selects the shard keys this worker owns; sharded jobs of
+        other shards are left to their owners.
+        """
+        now = utcnow()
+        claimable = self._claimable(now)
+        if shards is not None:
+            claimable = and_(claimable, or_(jobs_table.c.shard.is_(None), jobs_table.c.shard.in_(shards)))
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(jobs_table)
+                .where(
+                    jobs_table.c.job_type.in_(job_types),
+                    jobs_table.c.status == RUNNING,
+                    jobs_table.c.lease_expires_at < now,
+                    jobs_table.c.attempts >= jobs_table.c.max_attempts
+                )
+                .values(status=FAILED, last_error='Lease expired on the last attempt', lease_owner=None,
+                        lease_expires_at=None, finished_at=now, updated_at=now)
+            )
+            ids = conn.execute(
+                select(jobs_table.c.id)
+                .where(jobs_table.c.job_type.in_(job_types), claimable)
+                .order_by(jobs_table.c.priority.desc(), jobs_table.c.run_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not ids:
+                return []
+            # Re-checked in the UPDATE: backends without SKIP LOCKED may race here
+            rows = conn.execute(
+                update(jobs_table)
+                .where(jobs_table.c.id.in_(ids), claimable)
+                .values(status=RUNNING, lease_owner=worker_id, lease_expires_at=now + self.lease,
+                        attempts=jobs_table.c.attempts + 1, updated_at=now)
+                .returning(*jobs_table.c)
+            ).all()
+        # RETURNING rows come back in no particular order
+        jobs = sorted((Job.from_row(row) for row in rows), key=lambda job: (-job.priority, job.run_at))
+        for job in jobs:
+            jobs_claimed.inc(job_type=job.job_type)
+        return jobs
+
+    @staticmethod
+    def _leased(job: Job):
+        return and_(
+            jobs_table.c.id == job.id,
+            jobs_table.c.status == RUNNING,
+            jobs_table.c.lease_owner == job.lease_owner,
+            jobs_table.c.attempts == job.attempts
+        )
+
+    def _update_leased(self, job: Job, **values: Any) -> bool:
+        now = utcnow()
+        with self.engine.begin() as conn:
+            result = conn.execute(update(jobs_table).where(self._leased(job)).values(updated_at=now, **values))
+        return result.rowcount == 1
+
+    def heartbeat(self, job: Job) -> bool:
+        """
+        Extend the job's lease. False means the lease was lost and the job
+        may be running elsewhere.
+        """
+        return self._update_leased(job, lease_expires_at=utcnow() + self.lease)
+
+    def complete(self, job: Job, result: Any = None) -> bool:
+        done = self._update_leased(job, status=SUCCEEDED, result=result, lease_owner=None,
+                            lease_expires_at=None, finished_at=utcnow())
+        jobs_finished.inc(job_type=job.job_type, outcome=SUCCEEDED if done else 'lease_lost')
+        return done
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> bool:
+        """
+        Record a failed attempt; requeue with backoff while attempts remain.
+        """
+        if retry and job.attempts < job.max_attempts:
+            delay = self.retry_policy.backoff(job.attempts)
+            done = self._update_leased(job, status=QUEUED, last_error=error, lease_owner=None,
+                                lease_expires_at=None, run_at=utcnow() + timedelta(seconds=delay))
+            outcome = 'retried'
+        else:
+            done = self._update_leased(job, status=FAILED, last_error=error, lease_owner=None,
+                                lease_expires_at=None, finished_at=utcnow())
+            outcome = FAILED
+        jobs_finished.inc(job_type=job.job_type, outcome=outcome if done else 'lease_lost')
+        return done
+
+    def defer(self, job: Job, seconds: float, reason: Optional[str] = None) -> bool:
+        """
+        Requeue the job to run again in ``seconds`` without using up an
+        attempt, for work that paused rather than failed.
+        """
+        done = self._update_leased(job, status=QUEUED, attempts=job.attempts - 1, last_error=reason,
+                            lease_owner=None, lease_expires_at=None,
+                            run_at=utcnow() + timedelta(seconds=seconds))
+        jobs_finished.inc(job_type=job.job_type, outcome='deferred' if done else 'lease_lost')
+        return done
+
+
+class PermanentJobError(Exception):
+    """
+    Raised by a handler for failures retrying cannot fix (bad payload, revoked token).
+    """
+
+
+class DeferJob(Exception):
+    """
+    Raised by a handler to pause its job (e.g. while the account's rate budget
+    refills) and resume it in ``seconds`` without counting a failed attempt.
+    """
+
+    def __init__(self, seconds: float, reason: str = "Deferred"):
+        super().__init__(reason)
+        self.seconds = seconds
+        self.reason = reason
+
+
+JobHandler = Callable[[Job], Awaitable[Any]]
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobWorker:
+    """
+    Claims and runs jobs of the registered types in one process.
+
+    ``concurrency`` caps how many jobs of each type run at once, so a flood
+    of backfills cannot starve syncs. ``background`` coroutines (such as a
+    sync scheduler) run alongside. ``shards`` builds the query of shard keys
+    the worker owns (see :mod:`services.sharding`). Blocking queue calls run
+    in threads.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        concurrency: Optional[Dict[str, int]] = None,
+        poll_seconds: float = JOB_POLL_SECONDS,
+        worker_id: Optional[str] = None,
+        background: Sequence[Callable[[], Awaitable[None]]] = (),
+        shards: Optional[Callable[[], Select]] = None
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = {job_type: (concurrency or {}).get(job_type, 1) for job_type in handlers}
+        self.poll_seconds = poll_seconds
+        self.worker_id = worker_id or default_worker_id()
+        self.background = background
+        self.shards = shards
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self) -> None:
+        logger.info(f"👷 [JOBS] Worker {self.worker_id} running {self.concurrency}")
+        await asyncio.gather(
+            *(self._slot(job_type) for job_type, slots in self.concurrency.items() for _ in range(slots)),
+            *(task() for task in self.background)
+        )
+
+    async def run_until_idle(self) -> int:
+        """
+        Run jobs until none of the registered types is due; returns how many ran.
+        """
+        ran = 0
+        while True:
+            batch = await asyncio.gather(*(
+                self.run_one(job_type)
+                for job_type, slots in self.concurrency.items()
+                for _ in range(slots)
+            ))
+            if not any(batch):
+                return ran
+            ran += sum(batch)
+
+    async def _slot(self, job_type: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                if await self.run_one(job_type):
+                    continue
+            except Exception as e:
+                logger.error(f"❌ [JOBS] Worker {self.worker_id} failed to claim {job_type} jobs: {str(e)}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_one(self, job_type: str) -> bool:
+        """
+        Claim and run one job of ``job_type``. Returns whether one was due.
+        """
+        shards = self.shards() if self.shards else None
+        jobs = await asyncio.to_thread(self.queue.claim, [job_type], self.worker_id, 1, shards)
+        if not jobs:
+            return False
+        job = jobs[0]
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            result = await self.handlers[job_type](job)
+        except DeferJob as e:
+            logger.info(f"⏸️ [JOBS] {job.job_type} job {job.id} deferred {e.seconds:.0f}s: {e.reason}")
+            await asyncio.to_thread(self.queue.defer, job, e.seconds, e.reason)
+        except PermanentJobError as e:
+            logger.error(f"❌ [JOBS] {job.job_type} job {job.id} failed permanently: {str(e)}")
+            await asyncio.to_thread(self.queue.fail, job, str(e), False)
+        except Exception as e:
+            logger.warning(f"⚠️ [JOBS] {job.job_type} job {job.id} attempt {job.attempts} failed: {str(e)}")
+            await asyncio.to_thread(self.queue.fail, job, f"{type(e).__name__}: {e}")
+        else:
+            await asyncio.to_thread(self.queue.complete, job, result)
+        finally:
+            heartbeat.cancel()
+        return True
+
+    async def _heartbeat(self, job: Job) -> None:
+        interval = self.queue.lease.total_seconds() / 3
+        while True:
+            await asyncio.sleep(interval)
+            if not await asyncio.to_thread(self.queue.heartbeat, job):
+                logger.warning(f"⚠️ [JOBS] Lost lease on {job.job_type} job {job.id}")
+                return
+
+
+def _worker_process(factory: Callable[[], JobWorker]) -> None:
+    asyncio.run(factory().run())
+
+
+def run_worker_processes(factory: Callable[[], JobWorker], processes: int = os.cpu_count() or 1) -> None:
+    """
+    Run ``processes`` workers, each built by ``factory`` in its own process
+    (a picklable, module-level callable). Blocks until they all exit.
+    """
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_worker_process, args=(factory,), daemon=False) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
@@ -0,0 +1,149 @@
+"""
+Incremental decoding of Graph list responses.
+
+Graph list endpoints answer with ``{"data": [...], "paging": {...}}``. For
+large ad-level insight pages, buffering the body and calling ``json()`` holds
+both the raw bytes and every decoded row at once. :class:`PageDecoder` is fed
+the body chunk by chunk as it arrives and hands back each ``data`` element as
+soon as it is complete, so only the current row (plus one network chunk) is
+ever held. The other top-level members (``paging``, ``summary``) are collected
+into :attr:`PageDecoder.envelope`.
+
+Each element is decoded with the C scanner behind ``json.JSONDecoder.raw_decode``;
+an element cut off at a chunk boundary is simply retried once more bytes arrive.
+"""
+
+import codecs
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Largest single element we will buffer while waiting for the rest of it
+MAX_ELEMENT_CHARS = 8 * 1024 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class PageDecoder:
+    """
+    Push decoder for one ``{"data": [...], ...}`` document.
+
+    Usage::
+
+        decoder = PageDecoder()
+        async for chunk in response.aiter_bytes():
+            for row in decoder.feed(chunk):
+                consume(row)
+        for row in decoder.close():
+            consume(row)
+        decoder.envelope.get('paging')
+    """
+
+    def __init__(self, array_key: str = 'data', max_element_chars: int = MAX_ELEMENT_CHARS):
+        self.array_key = array_key
+        self.max_element_chars = max_element_chars
+        self.envelope: Dict[str, Any] = {}
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._state = 'start'
+        self._key: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        Add body bytes and return the ``data`` elements they completed.
+
+        Raises:
+            ValueError: If the body is not a JSON object or an element outgrows
+                ``max_element_chars``.
+        """
+        self._buffer += self._text.decode(chunk)
+        rows = self._drain(final=False)
+        if len(self._buffer) > self.max_element_chars:
+            raise ValueError(f"JSON element larger than {self.max_element_chars} characters")
+        return rows
+
+    def close(self) -> List[Any]:
+        """
+        Flush the decoder at end of body.
+
+        Raises:
+            ValueError: If the body was truncated or malformed.
+        """
+        self._buffer += self._text.decode(b'', final=True)
+        rows = self._drain(final=True)
+        if self._state != 'done' or self._buffer.strip():
+            raise ValueError("Truncated JSON document")
+        return rows
+
+    def _value(self, buffer: str, pos: int, final: bool) -> Tuple[Any, Optional[int]]:
+        try:
+            value, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None, None
+        if not final and end == len(buffer) and isinstance(value, (int, float)):
+            # A number at the end of the buffer may continue in the next chunk
+            return None, None
+        return value, end
+
+    def _drain(self, final: bool) -> List[Any]:
+        rows: List[Any] = []
+        buffer, pos, state = self._buffer, 0, self._state
+
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+
+            if state == 'start':
+                if char != '{':
+                    raise ValueError("Expected a JSON object")
+                pos, state = pos + 1, 'first_key'
+            elif state in ('first_key', 'key'):
+                if char == '}' and state == 'first_key':
+                    pos, state = pos + 1, 'done'
+                    continue
+                if char != '"':
+                    raise ValueError(f"Expected an object key at {char!r}")
+                key, end = self._value(buffer, pos, final)
+                if end is None:
+                    break
+                self._key, pos, state = key, end, 'colon'
+            elif state == 'colon':
+                if char != ':':
+                    raise ValueError(f"Expected ':' at {char!r}")
+                pos, state = pos + 1, 'value'
+            elif state == 'value':
+                if self._key == self.array_key and char == '[':
+                    pos, state = pos + 1, 'first_element'
+                    continue
+                value, end = self._value(buffer, pos, final)
+                if end is None:
+                    break
+                self.envelope[self._key] = value
+                pos, state = end, 'member_end'
+            elif state == 'member_end':
+                if char not in ',}':
+                    raise ValueError(f"Expected ',' or '}}' at {char!r}")
+                pos, state = pos + 1, 'key' if char == ',' else 'done'
+            elif state in ('first_element', 'element'):
+                if char == ']' and state == 'first_element':
+                    pos, state = pos + 1, 'member_end'
+                    continue
+                value, end = self._value(buffer, pos, final)
+                if end is None:
+                    break
+                rows.append(value)
+                pos, state = end, 'element_end'
+            elif state == 'element_end':
+                if char not in ',]':
+                    raise ValueError(f"Expected ',' or ']' at {char!r}")
+                pos, state = pos + 1, 'element' if char == ',' else 'member_end'
+            else:
+                raise ValueError("Unexpected data after JSON document")
+
+        self._buffer, self._state = buffer[pos:], state
+        return rows
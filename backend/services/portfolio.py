@@ -0,0 +1,305 @@
+"""
+Agency portfolio aggregation.
+
+Resolves every client account an employee can see through the agency schema
+(``employees`` -> ``client_accounts`` / ``employee_client_access``) and fans out
+to Meta concurrently, merging per-account insights into a single overview.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+
+from .graph_api import graph_get, normalize_account_id
+from .records import MetricsRow
+from .resilience import resilient_get
+
+logger = logging.getLogger("meta-ads-railway.portfolio")
+
+PORTFOLIO_FIELDS = ['spend', 'impressions', 'clicks', 'conversions', 'account_currency']
+
+DEFAULT_PER_ACCOUNT_TIMEOUT = float(os.getenv("PORTFOLIO_ACCOUNT_TIMEOUT", "1.5"))
+DEFAULT_DEADLINE = float(os.getenv("PORTFOLIO_DEADLINE", "2.5"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("PORTFOLIO_MAX_CONCURRENCY", "50"))
+
+
+@dataclass
+class PortfolioAccount:
+    """
+    A Meta ad account reachable through an agency client record.
+    """
+    account_id: str
+    client_name: str
+    client_account_id: Optional[str] = None
+    agency_id: Optional[str] = None
+
+
+def load_fx_rates() -> Dict[str, float]:
+    """
+    Load currency rates expressed as USD per one unit of each currency.
+
+    Rates come from the ``PORTFOLIO_FX_RATES`` environment variable, a JSON object
+    such as ``{"EUR": 1.08, "MXN": 0.058}``. USD is always present.
+    """
+    rates = {"USD": 1.0}
+    raw = os.getenv("PORTFOLIO_FX_RATES")
+    if raw:
+        try:
+            rates.update({code.upper(): float(rate) for code, rate in json.loads(raw).items()})
+        except (ValueError, AttributeError, TypeError):
+            logger.error("❌ [PORTFOLIO] PORTFOLIO_FX_RATES is not a valid JSON object of rates")
+    return rates
+
+
+def convert_amount(amount: float, currency: str, target_currency: str, fx_rates: Dict[str, float]) -> Optional[float]:
+    """
+    Convert an amount between currencies, returning None when a rate is missing.
+    """
+    currency = (currency or target_currency).upper()
+    target_currency = target_currency.upper()
+    if currency == target_currency:
+        return amount
+    if currency not in fx_rates or target_currency not in fx_rates:
+        return None
+    return amount * fx_rates[currency] / fx_rates[target_currency]
+
+
+async def resolve_employee_accounts(
+    client: httpx.AsyncClient,
+    supabase_url: str,
+    service_role_key: str,
+    user_id: str
+) -> List[PortfolioAccount]:
+    """
+    Resolve all client accounts an employee can view.
+
+    Mirrors the ``client_accounts`` RLS policy: owners see every active client in
+    their agency, other roles only those granted with ``permissions.view``.
+    """
+    headers = {
+        "Authorization": f"Bearer {service_role_key}",
+        "apikey": service_role_key
+    }
+
+    employees_response = await resilient_get(
+        client,
+        'supabase',
+        f"{supabase_url}/rest/v1/employees",
+        headers=headers,
+        params={
+            "user_id": f"eq.{user_id}",
+            "status": "eq.active",
+            "select": "id,agency_id,role"
+        }
+    )
+    employees_response.raise_for_status()
+    employees = employees_response.json()
+
+    owner_agencies = [e['agency_id'] for e in employees if e.get('role') == 'owner']
+    granted_employees = [e['id'] for e in employees if e.get('role') != 'owner']
+
+    accounts: Dict[str, PortfolioAccount] = {}
+
+    if owner_agencies:
+        clients_response = await resilient_get(
+            client,
+            'supabase',
+            f"{supabase_url}/rest/v1/client_accounts",
+            headers=headers,
+            params={
+                "agency_id": f"in.({','.join(owner_agencies)})",
+                "status": "eq.active",
+                "select": "id,agency_id,meta_account_id,client_name"
+            }
+        )
+        clients_response.raise_for_status()
+        for row in clients_response.json():
+            account_id = normalize_account_id(row['meta_account_id'])
+            accounts.setdefault(account_id, PortfolioAccount(
+                account_id=account_id,
+                client_name=row.get('client_name') or account_id,
+                client_account_id=row.get('id'),
+                agency_id=row.get('agency_id')
+            ))
+
+    if granted_employees:
+        access_response = await resilient_get(
+            client,
+            'supabase',
+            f"{supabase_url}/rest/v1/employee_client_access",
+            headers=headers,
+            params={
+                "employee_id": f"in.({','.join(granted_employees)})",
+                "select": "permissions,client_accounts(id,agency_id,meta_account_id,client_name,status)"
+            }
+        )
+        access_response.raise_for_status()
+        for row in access_response.json():
+            client_account = row.get('client_accounts') or {}
+            if not (row.get('permissions') or {}).get('view'):
+                continue
+            if client_account.get('status', 'active') != 'active' or not client_account.get('meta_account_id'):
+                continue
+            account_id = normalize_account_id(client_account['meta_account_id'])
+            accounts.setdefault(account_id, PortfolioAccount(
+                account_id=account_id,
+                client_name=client_account.get('client_name') or account_id,
+                client_account_id=client_account.get('id'),
+                agency_id=client_account.get('agency_id')
+            ))
+
+    return list(accounts.values())
+
+
+def make_insights_fetcher(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    date_preset: str
+) -> Callable[[str], Awaitable[Dict[str, Any]]]:
+    """
+    Build the per-account fetch coroutine used by :func:`aggregate_portfolio`.
+    """
+    async def fetch(account_id: str) -> Dict[str, Any]:
+        payload = await graph_get(
+            client,
+            f"act_{account_id}/insights",
+            {
+                'fields': ','.join(PORTFOLIO_FIELDS),
+                'date_preset': date_preset,
+                'level': 'account'
+            },
+            meta_token
+        )
+        data = payload.get('data', [])
+        return data[0] if data else {}
+
+    return fetch
+
+
+async def aggregate_portfolio(
+    accounts: List[PortfolioAccount],
+    fetch_insights: Callable[[str], Awaitable[Dict[str, Any]]],
+    target_currency: str = "USD",
+    fx_rates: Optional[Dict[str, float]] = None,
+    per_account_timeout: float = DEFAULT_PER_ACCOUNT_TIMEOUT,
+    deadline: float = DEFAULT_DEADLINE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+) -> Dict[str, Any]:
+    """
+    Fan out to every account concurrently and merge the results.
+
+    Each account gets its own timeout; once the global deadline passes any
+    outstanding fetches are cancelled and reported with status ``timeout`` so the
+    caller still receives partial totals.
+
+    Args:
+        accounts: Accounts to aggregate.
+        fetch_insights: Coroutine returning the account-level insight row.
+        target_currency: Currency for merged monetary totals.
+        fx_rates: USD-per-unit rates, see :func:`load_fx_rates`.
+        per_account_timeout: Seconds allowed for a single account.
+        deadline: Seconds allowed for the whole fan-out.
+        max_concurrency: Maximum in-flight Meta requests.
+
+    Returns:
+        Portfolio payload with ``totals``, per-account ``accounts`` and ``summary``.
+    """
+    fx_rates = fx_rates or load_fx_rates()
+    target_currency = target_currency.upper()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    started = time.monotonic()
+
+    async def run(account: PortfolioAccount) -> Dict[str, Any]:
+        async with semaphore:
+            account_started = time.monotonic()
+            try:
+                insight = await asyncio.wait_for(fetch_insights(account.account_id), per_account_timeout)
+            except asyncio.TimeoutError:
+                return {'status': 'timeout', 'reason': 'account_timeout'}
+            except Exception as e:
+                return {'status': 'error', 'error': str(e)}
+            return {
+                'status': 'ok' if insight else 'empty',
+                'insight': insight,
+                'latencyMs': round((time.monotonic() - account_started) * 1000, 1)
+            }
+
+    tasks = {asyncio.create_task(run(account)): account for account in accounts}
+    done: Set['asyncio.Task[Dict[str, Any]]'] = set()
+    try:
+        if tasks:
+            done, _ = await asyncio.wait(tasks.keys(), timeout=deadline)
+    finally:
+        # Also reached when the caller is cancelled (request deadline, client disconnect)
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    totals = {'spend': 0.0, 'impressions': 0, 'clicks': 0, 'conversions': 0}
+    counts = {'ok': 0, 'empty': 0, 'timeout': 0, 'error': 0}
+    results = []
+
+    for task, account in tasks.items():
+        outcome = task.result() if task in done else {'status': 'timeout', 'reason': 'deadline'}
+        entry = {
+            'accountId': account.account_id,
+            'clientName': account.client_name,
+            'clientAccountId': account.client_account_id,
+            'agencyId': account.agency_id,
+            'status': outcome['status']
+        }
+        for key in ('reason', 'error', 'latencyMs'):
+            if key in outcome:
+                entry[key] = outcome[key]
+
+        insight = outcome.get('insight')
+        if insight:
+            currency = (insight.get('account_currency') or target_currency).upper()
+            record = MetricsRow.from_insight(insight, 'account')
+            converted_spend = convert_amount(record.spend, currency, target_currency, fx_rates)
+            entry.update({
+                'currency': currency,
+                'spend': record.spend,
+                'convertedSpend': converted_spend,
+                'impressions': record.impressions,
+                'clicks': record.clicks,
+                'conversions': record.conversions
+            })
+            if converted_spend is None:
+                # Without a rate the account cannot be merged without skewing CPC/CPM
+                entry['converted'] = False
+            else:
+                entry['converted'] = True
+                totals['spend'] += converted_spend
+                totals['impressions'] += entry['impressions']
+                totals['clicks'] += entry['clicks']
+                totals['conversions'] += entry['conversions']
+
+        counts[entry['status']] += 1
+        results.append(entry)
+
+    totals['spend'] = round(totals['spend'], 2)
+    totals['ctr'] = (totals['clicks'] / totals['impressions'] * 100) if totals['impressions'] else 0.0
+    totals['cpc'] = (totals['spend'] / totals['clicks']) if totals['clicks'] else 0.0
+    totals['cpm'] = (totals['spend'] / totals['impressions'] * 1000) if totals['impressions'] else 0.0
+
+    return {
+        'currency': target_currency,
+        'totals': totals,
+        'accounts': results,
+        'summary': {
+            'requested': len(accounts),
+            **counts,
+            'unconverted': [r['accountId'] for r in results if r.get('converted') is False],
+            'elapsedMs': round((time.monotonic() - started) * 1000, 1)
+        },
+        'partial': counts['timeout'] + counts['error'] > 0
+    }
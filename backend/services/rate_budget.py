@@ -0,0 +1,206 @@
+"""
+Per-account Meta rate budget.
+
+Meta throttles each ad account separately and reports current utilisation in the
+``X-Business-Use-Case-Usage`` and ``X-Ad-Account-Usage`` response headers. Every
+account gets a budget combining the last reported usage with a local call-rate
+bucket. Callers ask with a priority: background work (refreshes, warm-ups,
+backfills) backs off well before interactive traffic would be affected.
+
+Every Graph call is charged once: calls made inside :func:`prepaid` were
+already reserved with :meth:`RateBudget.try_acquire`, and all others are
+charged as they are made with :meth:`RateBudget.record_call`.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+from .metrics import registry
+
+logger = logging.getLogger("meta-ads-railway.rate-budget")
+
+DEFAULT_CALLS_PER_MINUTE = float(os.getenv("META_ACCOUNT_CALLS_PER_MINUTE", "120"))
+
+# Highest reported usage percentage at which each priority may still call Meta
+PRIORITY_CEILINGS = {
+    'interactive': 95.0,
+    'background': 60.0,
+    'backfill': float(os.getenv("BACKFILL_USAGE_CEILING", "50"))
+}
+# Share of the local bucket background work must leave untouched for interactive calls
+BACKGROUND_RESERVE = 0.5
+# Most of an account's call rate a priority may use; priorities not listed are only bounded by the bucket
+PRIORITY_SHARES = {
+    'backfill': float(os.getenv("BACKFILL_BUDGET_SHARE", "0.25"))
+}
+
+ACCOUNT_PATH = re.compile(r"(?:^|/)act_(\d+)")
+
+budget_denials = registry.counter("meta_rate_budget_denials_total", "Calls deferred by the per-account rate budget")
+
+# Set while the caller's Graph calls were already reserved with try_acquire
+_prepaid: ContextVar[bool] = ContextVar("rate_budget_prepaid", default=False)
+
+
+@contextmanager
+def prepaid() -> Iterator[None]:
+    """
+    Make the Graph calls in the block without charging them again; the caller
+    reserved them with :meth:`RateBudget.try_acquire`.
+    """
+    token = _prepaid.set(True)
+    try:
+        yield
+    finally:
+        _prepaid.reset(token)
+
+
+class AccountBudget:
+    """
+    Token bucket plus last reported Meta usage for one ad account, with a
+    smaller bucket per rate-capped priority.
+    """
+
+    __slots__ = ('capacity', 'tokens', 'refilled_at', 'usage_pct', 'blocked_until', 'shares', 'share_tokens')
+
+    def __init__(self, capacity: float, shares: Optional[Dict[str, float]] = None):
+        self.capacity = capacity
+        self.tokens = capacity
+        self.refilled_at = time.monotonic()
+        self.usage_pct = 0.0
+        self.blocked_until = 0.0
+        self.shares = shares or {}
+        self.share_tokens = {priority: capacity * share for priority, share in self.shares.items()}
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.refilled_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / 60.0)
+        for priority, share in self.shares.items():
+            limit = self.capacity * share
+            self.share_tokens[priority] = min(limit, self.share_tokens[priority] + elapsed * limit / 60.0)
+        self.refilled_at = now
+
+
+class RateBudget:
+    """
+    Registry of per-account budgets.
+    """
+
+    def __init__(
+        self,
+        calls_per_minute: float = DEFAULT_CALLS_PER_MINUTE,
+        ceilings: Optional[Dict[str, float]] = None,
+        shares: Optional[Dict[str, float]] = None
+    ):
+        self.calls_per_minute = calls_per_minute
+        self.ceilings = {**PRIORITY_CEILINGS, **(ceilings or {})}
+        self.shares = {**PRIORITY_SHARES, **(shares or {})}
+        self._accounts: Dict[str, AccountBudget] = {}
+
+    def _account(self, account_id: str) -> AccountBudget:
+        budget = self._accounts.get(account_id)
+        if budget is None:
+            budget = self._accounts[account_id] = AccountBudget(self.calls_per_minute, self.shares)
+        return budget
+
+    def allows(self, account_id: str, priority: str = 'interactive', cost: float = 1.0) -> bool:
+        """
+        Whether the account's budget would grant ``cost`` calls to the priority,
+        without reserving them. Callers that do not know their cost up front
+        check this and let their calls be charged as they are made.
+        """
+        budget = self._account(account_id)
+        now = time.monotonic()
+        budget.refill(now)
+
+        reserve = budget.capacity * BACKGROUND_RESERVE if priority != 'interactive' else 0.0
+        allowed = (
+            now >= budget.blocked_until
+            and budget.usage_pct <= self.ceilings.get(priority, self.ceilings['background'])
+            and budget.tokens - cost >= reserve
+            and budget.share_tokens.get(priority, cost) >= cost
+        )
+        if not allowed:
+            budget_denials.inc(priority=priority)
+        return allowed
+
+    def try_acquire(self, account_id: str, priority: str = 'interactive', cost: float = 1.0) -> bool:
+        """
+        Reserve ``cost`` calls for an account if its budget allows the priority.
+        A priority with a share (backfills) must also fit in its own bucket,
+        which refills at that share of the account's call rate. Make the
+        reserved calls inside :func:`prepaid` so they are not charged twice.
+        """
+        if not self.allows(account_id, priority, cost):
+            return False
+        budget = self._accounts[account_id]
+        budget.tokens -= cost
+        if priority in budget.share_tokens:
+            budget.share_tokens[priority] -= cost
+        return True
+
+    def record_call(self, account_id: str, cost: float = 1.0) -> None:
+        """
+        Charge a call that was made regardless of budget (interactive traffic),
+        unless it was reserved up front (see :func:`prepaid`).
+        """
+        if _prepaid.get():
+            return
+        budget = self._account(account_id)
+        budget.refill(time.monotonic())
+        budget.tokens = max(-budget.capacity, budget.tokens - cost)
+
+    def observe(self, headers: Mapping[str, str], path: str = "") -> None:
+        """
+        Update budgets from Meta usage headers on a Graph response.
+        """
+        match = ACCOUNT_PATH.search(path)
+        path_account = match.group(1) if match else None
+
+        business_usage = _parse_header(headers.get('x-business-use-case-usage'))
+        for account_id, entries in (business_usage or {}).items():
+            for entry in entries if isinstance(entries, list) else [entries]:
+                self._update(
+                    str(account_id),
+                    max(float(entry.get(k, 0) or 0) for k in ('call_count', 'total_cputime', 'total_time')),
+                    float(entry.get('estimated_time_to_regain_access', 0) or 0) * 60
+                )
+
+        account_usage = _parse_header(headers.get('x-ad-account-usage'))
+        if account_usage and path_account:
+            self._update(path_account, float(account_usage.get('acc_id_util_pct', 0) or 0), 0.0)
+
+    def _update(self, account_id: str, usage_pct: float, blocked_for: float) -> None:
+        budget = self._account(account_id)
+        budget.usage_pct = usage_pct
+        if blocked_for > 0:
+            budget.blocked_until = time.monotonic() + blocked_for
+            logger.warning(f"⚠️ [RATE BUDGET] Account {account_id} throttled for {blocked_for:.0f}s")
+
+    def snapshot(self, account_id: str) -> Dict[str, Any]:
+        budget = self._account(account_id)
+        budget.refill(time.monotonic())
+        return {
+            'usagePct': budget.usage_pct,
+            'tokens': round(budget.tokens, 2),
+            'blockedFor': max(0.0, round(budget.blocked_until - time.monotonic(), 1))
+        }
+
+
+def _parse_header(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not value:
+        return None
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+rate_budget = RateBudget()
@@ -0,0 +1,127 @@
+"""
+Compact records for campaign, ad set and ad metric rows.
+
+Metric rows used to travel as Graph's string-valued dicts, get converted
+field by field into fresh dicts, and then into one Pydantic model per row.
+:class:`MetricsRow` is a slotted dataclass holding the converted values once
+(no per-instance ``__dict__``). It is built from a Graph insight row or an
+ORM metrics row and shaped into a response payload with a single dict
+construction.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from .graph_api import action_total
+
+# Meta reports the same purchase under several action types; take the first present
+PURCHASE_ACTION_TYPES = ('omni_purchase', 'purchase', 'offsite_conversion.fb_pixel_purchase')
+
+
+def _purchase_value(action_values: Any) -> float:
+    if not isinstance(action_values, list):
+        return 0.0
+    by_type = {a.get('action_type'): a.get('value') for a in action_values}
+    for action_type in PURCHASE_ACTION_TYPES:
+        if action_type in by_type:
+            return float(by_type[action_type] or 0)
+    return 0.0
+
+
+@dataclass(slots=True)
+class MetricsRow:
+    level: str
+    object_id: Optional[str] = None
+    name: Optional[str] = None
+    date_start: Optional[str] = None
+    date_stop: Optional[str] = None
+    impressions: int = 0
+    clicks: int = 0
+    reach: int = 0
+    conversions: int = 0
+    spend: float = 0.0
+    ctr: float = 0.0
+    cpc: float = 0.0
+    cpm: float = 0.0
+    purchase_value: float = 0.0
+    roas: float = 0.0
+
+    @classmethod
+    def from_insight(cls, row: Dict[str, Any], level: str = 'campaign') -> 'MetricsRow':
+        """
+        Convert a Graph insight row, whose metrics are strings, for ``level``
+        (``account``, ``campaign``, ``adset`` or ``ad``).
+        """
+        spend = float(row.get('spend') or 0)
+        purchase_value = _purchase_value(row.get('action_values'))
+        return cls(
+            level,
+            row.get(f'{level}_id'),
+            row.get(f'{level}_name'),
+            row.get('date_start'),
+            row.get('date_stop'),
+            int(row.get('impressions') or 0),
+            int(row.get('clicks') or 0),
+            int(row.get('reach') or 0),
+            int(action_total(row.get('conversions'))),
+            spend,
+            float(row.get('ctr') or 0),
+            float(row.get('cpc') or 0),
+            float(row.get('cpm') or 0),
+            purchase_value,
+            purchase_value / spend if spend else 0.0
+        )
+
+    @classmethod
+    def from_model(cls, metric: Any, level: str = 'campaign') -> 'MetricsRow':
+        """
+        Copy a ``CampaignMetrics`` / ``AdSetMetrics`` row, keeping its stored ratios.
+        """
+        return cls(
+            level,
+            None,
+            None,
+            metric.date_start.isoformat() if metric.date_start else None,
+            metric.date_stop.isoformat() if metric.date_stop else None,
+            metric.impressions or 0,
+            metric.clicks or 0,
+            metric.reach or 0,
+            metric.conversions or 0,
+            metric.spend or 0.0,
+            metric.ctr or 0.0,
+            metric.cpc or 0.0,
+            metric.cpm or 0.0,
+            metric.purchase_value or 0.0,
+            metric.roas or 0.0
+        )
+
+    def metrics_payload(self) -> Dict[str, Any]:
+        """
+        Daily series point in the ``MetricsResponse`` shape.
+        """
+        return {
+            'date': self.date_start,
+            'impressions': self.impressions,
+            'clicks': self.clicks,
+            'ctr': self.ctr,
+            'cpc': self.cpc,
+            'cpm': self.cpm,
+            'spend': self.spend,
+            'conversions': self.conversions,
+            'roas': self.roas
+        }
+
+    def top_campaign_payload(self) -> Dict[str, Any]:
+        return {
+            'id': self.object_id,
+            'name': self.name,
+            'spend': self.spend,
+            'impressions': self.impressions,
+            'clicks': self.clicks,
+            'ctr': self.ctr,
+            'conversions': self.conversions
+        }
+
+
+def rows_from_insights(rows: Iterable[Dict[str, Any]], level: str = 'campaign') -> List[MetricsRow]:
+    return [MetricsRow.from_insight(row, level) for row in rows]
@@ -0,0 +1,355 @@
+"""
+Retries, circuit breakers and hedged requests for upstream HTTP calls.
+
+Every Meta Graph and Supabase request goes through :func:`resilient_request`:
+
+- transient failures (5xx, timeouts, connection errors, Meta throttling and
+  ``is_transient`` errors) are retried with full-jitter exponential backoff,
+  honouring ``Retry-After`` when the upstream sends one;
+- each upstream has a circuit breaker that fails fast while the upstream is
+  down instead of letting every request sit out the client timeout;
+- idempotent reads can be hedged: if the first attempt has not answered after
+  ``hedge_after`` seconds a second one is raced against it.
+
+Defaults come from the environment per upstream; routes can tighten or loosen
+them for everything they call with :func:`upstream_policy`.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterator, Optional
+
+import httpx
+
+from .deadline import call_timeout, remaining
+from .metrics import registry
+
+logger = logging.getLogger("meta-ads-railway.resilience")
+
+RETRYABLE_STATUSES = frozenset({500, 502, 503, 504})
+# Graph error codes for throttling (4, 17, 32, 613, 80000-80014) and temporary failures (1, 2)
+META_TRANSIENT_CODES = frozenset({1, 2, 4, 17, 32, 341, 613, *range(80000, 80015)})
+
+upstream_attempts = registry.counter("upstream_attempts_total", "Upstream HTTP attempts by upstream and outcome")
+upstream_retries = registry.counter("upstream_retries_total", "Upstream retries by upstream and reason")
+upstream_hedges = registry.counter("upstream_hedges_total", "Hedged upstream requests by upstream and winner")
+upstream_circuit_state = registry.gauge("upstream_circuit_state", "Circuit state per upstream (0 closed, 1 half-open, 2 open)")
+upstream_circuit_rejections = registry.counter("upstream_circuit_rejections_total", "Calls refused by an open circuit")
+
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return float(value)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = 3
+    base_delay: float = 0.2
+    max_delay: float = 2.0
+    timeout: float = 10.0
+    hedge_after: Optional[float] = None
+    retry_statuses: FrozenSet[int] = RETRYABLE_STATUSES
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Full-jitter delay before retry number ``attempt`` (1-based).
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+DEFAULT_POLICIES: Dict[str, RetryPolicy] = {
+    'meta': RetryPolicy(
+        attempts=int(os.getenv("META_RETRY_ATTEMPTS", "3")),
+        timeout=float(os.getenv("META_REQUEST_TIMEOUT_SECONDS", "10")),
+        hedge_after=_env_float("META_HEDGE_AFTER_SECONDS", None)
+    ),
+    'supabase': RetryPolicy(
+        attempts=int(os.getenv("SUPABASE_RETRY_ATTEMPTS", "2")),
+        timeout=float(os.getenv("SUPABASE_REQUEST_TIMEOUT_SECONDS", "5")),
+        hedge_after=_env_float("SUPABASE_HEDGE_AFTER_SECONDS", None)
+    )
+}
+
+_policy_overrides: ContextVar[Dict[str, RetryPolicy]] = ContextVar("upstream_policy_overrides", default={})
+
+
+@contextmanager
+def upstream_policy(upstream: str, **overrides: Any) -> Iterator[RetryPolicy]:
+    """
+    Override the retry policy for ``upstream`` for calls made inside the block,
+    including from tasks it spawns.
+
+    Usage::
+
+        with upstream_policy('meta', hedge_after=0.8, attempts=2):
+            await fetch_dashboard()
+    """
+    policy = replace(current_policy(upstream), **overrides)
+    token = _policy_overrides.set({**_policy_overrides.get(), upstream: policy})
+    try:
+        yield policy
+    finally:
+        _policy_overrides.reset(token)
+
+
+def current_policy(upstream: str) -> RetryPolicy:
+    return _policy_overrides.get().get(upstream) or DEFAULT_POLICIES.get(upstream) or RetryPolicy()
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream whose circuit is open.
+    """
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable (circuit open)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker. After ``failure_threshold`` failures the
+    circuit opens for ``reset_after`` seconds, then lets a single probe through;
+    the probe's outcome closes or re-opens it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_after: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def abandon(self) -> None:
+        """
+        Forget an in-flight attempt that ended without an outcome (cancelled).
+        """
+        self._probing = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_after - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            logger.info(f"✅ [CIRCUIT] {self.name} recovered")
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"⚠️ [CIRCUIT] {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def _set_state(self, state: int) -> None:
+        self.state = state
+        upstream_circuit_state.set(state, upstream=self.name)
+
+
+breakers: Dict[str, CircuitBreaker] = {
+    'meta': CircuitBreaker(
+        'meta',
+        failure_threshold=int(os.getenv("META_CIRCUIT_FAILURES", "5")),
+        reset_after=float(os.getenv("META_CIRCUIT_RESET_SECONDS", "30"))
+    ),
+    'supabase': CircuitBreaker(
+        'supabase',
+        failure_threshold=int(os.getenv("SUPABASE_CIRCUIT_FAILURES", "5")),
+        reset_after=float(os.getenv("SUPABASE_CIRCUIT_RESET_SECONDS", "15"))
+    )
+}
+
+
+def breaker_for(upstream: str) -> CircuitBreaker:
+    breaker = breakers.get(upstream)
+    if breaker is None:
+        breaker = breakers[upstream] = CircuitBreaker(upstream)
+    return breaker
+
+
+def retry_reason(response: httpx.Response, policy: RetryPolicy) -> Optional[str]:
+    """
+    Why a response is worth retrying, or None if it is final.
+    """
+    if response.status_code in policy.retry_statuses:
+        return f"status_{response.status_code}"
+    if response.status_code == 429:
+        return 'throttled'
+    if response.status_code in (400, 403):
+        try:
+            payload = response.json()
+        except ValueError:
+            return None
+        error = payload.get('error') if isinstance(payload, dict) else None
+        if isinstance(error, dict):
+            if error.get('code') in META_TRANSIENT_CODES:
+                return 'throttled'
+            if error.get('is_transient'):
+                return 'transient'
+    return None
+
+
+def _retry_after_header(response: httpx.Response) -> float:
+    try:
+        return float(response.headers.get('retry-after', 0))
+    except ValueError:
+        return 0.0
+
+
+def _fits_deadline(delay: float) -> bool:
+    left = remaining()
+    return left is None or left > delay
+
+
+async def _hedged(send: Callable[[], Awaitable[httpx.Response]], hedge_after: float, upstream: str) -> httpx.Response:
+    """
+    Race a second attempt against the first if it has not answered in ``hedge_after``.
+    """
+    first = asyncio.create_task(send())
+    pending = {first}
+    error: Optional[BaseException] = None
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return first.result()
+
+        pending.add(asyncio.create_task(send()))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    upstream_hedges.inc(upstream=upstream, winner='primary' if task is first else 'hedge')
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def resilient_get(
+    client: httpx.AsyncClient,
+    upstream: str,
+    url: str,
+    **kwargs: Any
+) -> httpx.Response:
+    """
+    GET ``url`` under the upstream's retry policy and circuit breaker.
+    See :func:`resilient_request`.
+    """
+    return await resilient_request(client, upstream, 'GET', url, **kwargs)
+
+
+async def resilient_request(
+    client: httpx.AsyncClient,
+    upstream: str,
+    method: str,
+    url: str,
+    idempotent: Optional[bool] = None,
+    stream: bool = False,
+    **kwargs: Any
+) -> httpx.Response:
+    """
+    Send a request under the upstream's retry policy and circuit breaker.
+
+    Only idempotent requests (GETs by default) are retried or hedged; pass
+    ``idempotent=True`` for POSTs that only read, such as Graph batches of GETs.
+
+    With ``stream=True`` the response is returned as soon as its headers arrive
+    and the caller must close it. Only error bodies are read here, so retries
+    still see them; streamed requests are never hedged.
+
+    Returns the final response (which may still be an error status once retries
+    are exhausted); transport errors from the last attempt are re-raised. Attempt
+    timeouts shrink to the request deadline, and no retry is started that the
+    deadline cannot accommodate.
+
+    Raises:
+        CircuitOpenError: If the upstream's circuit is open.
+        DeadlineExceeded: If the request deadline has already passed.
+    """
+    policy = current_policy(upstream)
+    if not (method == 'GET' if idempotent is None else idempotent):
+        policy = replace(policy, attempts=1, hedge_after=None)
+    if stream:
+        policy = replace(policy, hedge_after=None)
+    breaker = breaker_for(upstream)
+    timeout = kwargs.pop('timeout', policy.timeout)
+
+    async def send() -> httpx.Response:
+        # Each attempt only gets what is left of the request's deadline
+        if stream:
+            request = client.build_request(method, url, timeout=call_timeout(timeout), **kwargs)
+            return await client.send(request, stream=True)
+        return await client.request(method, url, timeout=call_timeout(timeout), **kwargs)
+
+    for attempt in range(1, policy.attempts + 1):
+        if not breaker.allow():
+            upstream_circuit_rejections.inc(upstream=upstream)
+            raise CircuitOpenError(upstream, breaker.retry_after())
+
+        try:
+            if policy.hedge_after is not None:
+                response = await _hedged(send, policy.hedge_after, upstream)
+            else:
+                response = await send()
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            upstream_attempts.inc(upstream=upstream, outcome='transport_error')
+            reason, delay = type(e).__name__, policy.backoff(attempt)
+            if attempt == policy.attempts or not _fits_deadline(delay):
+                raise
+        else:
+            if stream and response.status_code != 200:
+                # Reading the (small) error body also releases the connection
+                await response.aread()
+            reason = retry_reason(response, policy)
+            # Throttling and client errors mean the upstream is up; only server errors count against it
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            upstream_attempts.inc(upstream=upstream, outcome='retryable' if reason else 'ok')
+            if reason is None or attempt == policy.attempts:
+                return response
+            delay = max(policy.backoff(attempt), _retry_after_header(response))
+            if delay > policy.max_delay or not _fits_deadline(delay):
+                # Upstream asked for a longer pause than this request can afford
+                return response
+
+        upstream_retries.inc(upstream=upstream, reason=reason)
+        logger.info(f"🔁 [RETRY] {upstream} attempt {attempt} failed ({reason}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    raise RuntimeError("unreachable")
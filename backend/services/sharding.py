@@ -0,0 +1,263 @@
+"""
+Consistent-hash sharding of account syncs across worker nodes.
+
+With several backend nodes every scheduler would otherwise sync every account,
+and each node's in-process rate budget would only see part of an account's
+Meta traffic. Accounts are partitioned instead:
+
+- Live nodes register in ``worker_nodes`` and keep renewing a membership
+  lease; a node that stops heartbeating drops out once its lease expires.
+- Each node places every live node on a :class:`HashRing` (with virtual nodes
+  for an even spread) and works out which accounts should be its own. Only
+  about ``1/n`` of the accounts move when a node joins or leaves.
+- Ownership itself is a lease row in ``account_leases``. A node takes an
+  account only once nobody else holds a live lease on it, and releases the
+  accounts the ring moved away, so during rebalancing an account briefly has
+  no owner rather than two.
+- As a last line of defence a sync holds a Postgres advisory lock on its
+  account (:func:`advisory_lock`), so even a node acting on a stale view of
+  the ring cannot sync an account twice at once.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Column, DateTime, String, Table, delete, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import Select
+
+from .jobs import job_metadata, utcnow
+from .metrics import registry
+
+logger = logging.getLogger("meta-ads-railway.sharding")
+
+NODE_LEASE_SECONDS = float(os.getenv("NODE_LEASE_SECONDS", "30"))
+RING_VIRTUAL_NODES = int(os.getenv("RING_VIRTUAL_NODES", "64"))
+
+shard_accounts_owned = registry.gauge("shard_accounts_owned", "Accounts this node holds sync leases on")
+shard_rebalances = registry.counter("shard_rebalances_total", "Account leases moved by rebalancing, by direction")
+
+worker_nodes_table = Table(
+    "worker_nodes",
+    job_metadata,
+    Column("node_id", String(255), primary_key=True),
+    Column("started_at", DateTime, nullable=False),
+    Column("heartbeat_at", DateTime, nullable=False),
+    Column("lease_expires_at", DateTime, nullable=False, index=True),
+)
+
+account_leases_table = Table(
+    "account_leases",
+    job_metadata,
+    Column("account_id", String(255), primary_key=True),
+    Column("node_id", String(255), nullable=False, index=True),
+    Column("lease_expires_at", DateTime, nullable=False),
+)
+
+
+def hash64(key: str) -> int:
+    """
+    Stable unsigned 64-bit hash, the same in every process and on every host.
+    """
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent-hash ring of node ids.
+    """
+
+    def __init__(self, nodes: Iterable[str], virtual_nodes: int = RING_VIRTUAL_NODES):
+        self.nodes = tuple(sorted(set(nodes)))
+        points = sorted((hash64(f"{node}#{i}"), node) for node in self.nodes for i in range(virtual_nodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """
+        Node owning ``key``: the first point clockwise from the key's hash.
+        """
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, hash64(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ShardCoordinator:
+    """
+    Membership and account leases for one node.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        node_id: str,
+        lease_seconds: float = NODE_LEASE_SECONDS,
+        virtual_nodes: int = RING_VIRTUAL_NODES
+    ):
+        self.engine = engine
+        self.node_id = node_id
+        self.lease = timedelta(seconds=lease_seconds)
+        self.virtual_nodes = virtual_nodes
+        self.ring = HashRing((), virtual_nodes)
+
+    def heartbeat(self) -> List[str]:
+        """
+        Renew this node's membership, forget expired nodes and return the live ones.
+        """
+        now = utcnow()
+        expires = now + self.lease
+        with self.engine.begin() as conn:
+            renewed = conn.execute(
+                update(worker_nodes_table)
+                .where(worker_nodes_table.c.node_id == self.node_id)
+                .values(heartbeat_at=now, lease_expires_at=expires)
+            ).rowcount
+            if not renewed:
+                conn.execute(worker_nodes_table.insert().values(
+                    node_id=self.node_id, started_at=now, heartbeat_at=now, lease_expires_at=expires
+                ))
+                logger.info(f"🧩 [SHARDS] Node {self.node_id} joined")
+            conn.execute(delete(worker_nodes_table).where(worker_nodes_table.c.lease_expires_at < now))
+            nodes = conn.execute(select(worker_nodes_table.c.node_id)).scalars().all()
+        if set(nodes) != set(self.ring.nodes):
+            self.ring = HashRing(nodes, self.virtual_nodes)
+        return list(nodes)
+
+    def rebalance(self, accounts: Sequence[str]) -> Set[str]:
+        """
+        Move this node's account leases to match the ring: renew the accounts
+        it should keep, release the ones it should not, and take the ones that
+        are now its own and free. Returns the accounts it holds afterwards.
+        """
+        now = utcnow()
+        expires = now + self.lease
+        wanted = {account for account in accounts if self.ring.owner(account) == self.node_id}
+        with self.engine.begin() as conn:
+            leases: Dict[str, Tuple[str, datetime]] = {
+                row.account_id: (row.node_id, row.lease_expires_at)
+                for row in conn.execute(select(account_leases_table))
+            }
+            held = {account for account, (node, _) in leases.items() if node == self.node_id}
+
+            released = held - wanted
+            if released:
+                conn.execute(delete(account_leases_table).where(
+                    account_leases_table.c.node_id == self.node_id,
+                    account_leases_table.c.account_id.in_(released)
+                ))
+            kept = held & wanted
+            if kept:
+                conn.execute(
+                    update(account_leases_table)
+                    .where(account_leases_table.c.node_id == self.node_id, account_leases_table.c.account_id.in_(kept))
+                    .values(lease_expires_at=expires)
+                )
+
+            expired = [a for a in wanted - held if a in leases and leases[a][1] < now]
+            if expired:
+                # Guarded: the previous owner may have renewed in the meantime
+                conn.execute(
+                    update(account_leases_table)
+                    .where(account_leases_table.c.account_id.in_(expired), account_leases_table.c.lease_expires_at < now)
+                    .values(node_id=self.node_id, lease_expires_at=expires)
+                )
+        for account in wanted - set(leases):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(account_leases_table.insert().values(
+                        account_id=account, node_id=self.node_id, lease_expires_at=expires
+                    ))
+            except IntegrityError:
+                # Another node got there first; the ring will settle on the next round
+                continue
+
+        owned = self.owned()
+        taken, lost = len(owned - held), len(released)
+        if taken or lost:
+            shard_rebalances.inc(taken, direction='taken')
+            shard_rebalances.inc(lost, direction='released')
+            logger.info(f"🧩 [SHARDS] Node {self.node_id} took {taken} and released {lost} accounts")
+        shard_accounts_owned.set(len(owned))
+        return owned
+
+    def owned_query(self) -> Select:
+        """
+        Accounts this node holds a live lease on, as a subquery for claims.
+        """
+        return select(account_leases_table.c.account_id).where(
+            account_leases_table.c.node_id == self.node_id,
+            account_leases_table.c.lease_expires_at >= utcnow()
+        )
+
+    def owned(self) -> Set[str]:
+        with self.engine.connect() as conn:
+            return set(conn.execute(self.owned_query()).scalars())
+
+    def leave(self) -> None:
+        """
+        Drop membership and leases so other nodes take over without waiting for expiry.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(delete(account_leases_table).where(account_leases_table.c.node_id == self.node_id))
+            conn.execute(delete(worker_nodes_table).where(worker_nodes_table.c.node_id == self.node_id))
+        logger.info(f"🧩 [SHARDS] Node {self.node_id} left")
+
+    def step(self, accounts: Sequence[str]) -> Set[str]:
+        self.heartbeat()
+        return self.rebalance(accounts)
+
+    async def run(self, accounts: Callable[[], Sequence[str]]) -> None:
+        """
+        Heartbeat and rebalance every third of a lease until cancelled, then leave.
+        """
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(lambda: self.step(accounts()))
+                except Exception as e:
+                    logger.error(f"❌ [SHARDS] Rebalance failed on {self.node_id}: {str(e)}")
+                await asyncio.sleep(self.lease.total_seconds() / 3)
+        finally:
+            await asyncio.to_thread(self.leave)
+
+
+@contextmanager
+def advisory_lock(engine: Engine, key: str) -> Iterator[bool]:
+    """
+    Hold a Postgres session advisory lock on ``key`` for the block; yields
+    whether it was acquired. Other databases have no advisory locks and
+    always yield True.
+    """
+    if engine.dialect.name != 'postgresql':
+        yield True
+        return
+    lock_id = hash64(key) - 2 ** 63
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {'id': lock_id}).scalar()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': lock_id})
+
+
+@asynccontextmanager
+async def async_advisory_lock(engine: Engine, key: str) -> AsyncIterator[bool]:
+    """
+    :func:`advisory_lock` for async code: the lock's connection is opened,
+    locked and released in a thread, so the event loop never waits on the database.
+    """
+    lock = advisory_lock(engine, key)
+    acquired = await asyncio.to_thread(lock.__enter__)
+    try:
+        yield acquired
+    finally:
+        await asyncio.to_thread(lock.__exit__, None, None, None)
@@ -0,0 +1,363 @@
+"""
+In-memory per-account sparkline ring buffers.
+
+Each account keeps a fixed number of daily slots for a handful of metrics in a
+single flat ``array('d')``; a parallel ``array('l')`` records which day ordinal
+each slot currently holds so stale slots read as missing rather than as old data.
+Buffers are filled from Meta the first time an account is requested (or warmed
+up) and only their last few days are re-fetched afterwards; sparkline requests
+are served from memory.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from array import array
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import httpx
+
+from .column_store import SETTLED_AFTER_DAYS, column_store, settled_rows
+from .deadline import DeadlineExceeded, create_detached_task, remaining
+from .graph_api import action_total, token_fingerprint
+from .insights_columns import InsightColumns, stream_insights
+from .rate_budget import rate_budget
+from .swr_cache import freshness
+
+logger = logging.getLogger("meta-ads-railway.sparklines")
+
+SPARKLINE_METRICS = ('spend', 'impressions', 'clicks', 'conversions')
+COUNT_METRICS = {'impressions', 'clicks', 'conversions'}
+DEFAULT_CAPACITY_DAYS = int(os.getenv("SPARKLINE_BUFFER_DAYS", "90"))
+REFRESH_AFTER_SECONDS = float(os.getenv("SPARKLINE_REFRESH_SECONDS", "900"))
+# Days re-fetched on a warm refresh; older days are settled and kept from the buffer
+REFRESH_TAIL_DAYS = 3
+EMPTY_SLOT = -1
+
+
+class SparklineBuffer:
+    """
+    Fixed-size ring buffer of daily values for one account.
+    """
+
+    __slots__ = ('capacity', 'metrics', 'values', 'days', 'latest_day', 'updated_at')
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY_DAYS, metrics: Sequence[str] = SPARKLINE_METRICS):
+        self.capacity = capacity
+        self.metrics = tuple(metrics)
+        self.values = array('d', bytes(8 * capacity * len(self.metrics)))
+        self.days = array('l', [EMPTY_SLOT]) * capacity
+        self.latest_day: Optional[int] = None
+        self.updated_at: Optional[float] = None
+
+    def put(self, day: date, row: Dict[str, Any]) -> bool:
+        """
+        Write one day of metrics. Days older than the buffer window are ignored.
+        """
+        return self.put_values(day, [action_total(row.get(metric)) for metric in self.metrics])
+
+    def put_values(self, day: date, values: Sequence[float]) -> bool:
+        """
+        Write one day of values, in ``metrics`` order.
+        """
+        ordinal = day.toordinal()
+        if self.latest_day is not None and ordinal <= self.latest_day - self.capacity:
+            return False
+
+        slot = ordinal % self.capacity
+        offset = slot * len(self.metrics)
+        self.values[offset:offset + len(self.metrics)] = array('d', values)
+        self.days[slot] = ordinal
+
+        if self.latest_day is None or ordinal > self.latest_day:
+            self.latest_day = ordinal
+        return True
+
+    def series(
+        self,
+        window: int,
+        metrics: Optional[Sequence[str]] = None,
+        end_day: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the last ``window`` days ending at ``end_day`` (default: latest day held).
+        Days without data are returned as zeros so every sparkline has a fixed length.
+        """
+        if self.latest_day is None:
+            return []
+
+        metrics = [m for m in (metrics or self.metrics) if m in self.metrics]
+        indexes = [self.metrics.index(m) for m in metrics]
+        end = end_day.toordinal() if end_day else self.latest_day
+        window = max(1, min(window, self.capacity))
+
+        points = []
+        for ordinal in range(end - window + 1, end + 1):
+            slot = ordinal % self.capacity
+            point: Dict[str, Any] = {'date': date.fromordinal(ordinal).isoformat()}
+            if self.days[slot] == ordinal:
+                offset = slot * len(self.metrics)
+                for metric, index in zip(metrics, indexes):
+                    point[metric] = self.values[offset + index]
+            else:
+                for metric in metrics:
+                    point[metric] = 0.0
+            points.append(point)
+        return points
+
+
+class SparklineStore:
+    """
+    Registry of sparkline buffers keyed by account ID.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY_DAYS, metrics: Sequence[str] = SPARKLINE_METRICS):
+        self.capacity = capacity
+        self.metrics = tuple(metrics)
+        self._buffers: Dict[str, SparklineBuffer] = {}
+        # Token fingerprints that Meta has accepted for each account's data
+        self._access: Dict[str, Set[str]] = {}
+
+    def grant(self, account_id: str, token_key: str) -> None:
+        self._access.setdefault(account_id, set()).add(token_key)
+
+    def is_authorized(self, account_id: str, token_key: str) -> bool:
+        return token_key in self._access.get(account_id, ())
+
+    def ingest(self, account_id: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Write daily insight rows (``date_start`` plus metric fields) for an account.
+
+        Returns:
+            Number of days written.
+        """
+        buffer = self._buffers.get(account_id)
+        if buffer is None:
+            buffer = self._buffers[account_id] = SparklineBuffer(self.capacity, self.metrics)
+
+        written = 0
+        for row in rows:
+            day = row.get('date_start') or row.get('date')
+            if not day:
+                continue
+            if isinstance(day, str):
+                day = date.fromisoformat(day[:10])
+            written += buffer.put(day, row)
+        buffer.updated_at = time.time()
+        return written
+
+    def ingest_columns(self, account_id: str, columns: InsightColumns) -> int:
+        """
+        Write daily insights already parsed into columns, see :func:`fetch_daily_insights`.
+
+        Returns:
+            Number of days written.
+        """
+        buffer = self._buffers.get(account_id)
+        if buffer is None:
+            buffer = self._buffers[account_id] = SparklineBuffer(self.capacity, self.metrics)
+
+        written = 0
+        if 'date_start' in columns:
+            values = [columns.values(metric) for metric in self.metrics]
+            for i, day in enumerate(columns['date_start']):
+                if day:
+                    written += buffer.put_values(date.fromisoformat(day[:10]), [column[i] for column in values])
+        buffer.updated_at = time.time()
+        return written
+
+    def get(self, account_id: str) -> Optional[SparklineBuffer]:
+        return self._buffers.get(account_id)
+
+    def is_fresh(self, account_id: str, max_age: float) -> bool:
+        buffer = self._buffers.get(account_id)
+        return bool(buffer and buffer.updated_at and time.time() - buffer.updated_at <= max_age)
+
+    def series(
+        self,
+        account_id: str,
+        window: int = 7,
+        metrics: Optional[Sequence[str]] = None,
+        end_day: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        buffer = self._buffers.get(account_id)
+        return buffer.series(window, metrics, end_day) if buffer else []
+
+    def age(self, account_id: str) -> Optional[float]:
+        buffer = self._buffers.get(account_id)
+        return time.time() - buffer.updated_at if buffer and buffer.updated_at else None
+
+    def invalidate(self, account_id: str) -> None:
+        self._buffers.pop(account_id, None)
+        self._access.pop(account_id, None)
+
+    def __contains__(self, account_id: str) -> bool:
+        return account_id in self._buffers
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+
+def to_sparkline_points(
+    series: List[Dict[str, Any]],
+    value_metric: str = 'spend'
+) -> List[Dict[str, Any]]:
+    """
+    Shape buffer rows for the frontend: ``value`` carries the primary metric and
+    count metrics are returned as integers.
+    """
+    points = []
+    for row in series:
+        point = {
+            key: int(value) if key in COUNT_METRICS else value
+            for key, value in row.items()
+        }
+        point['value'] = row.get(value_metric, 0.0)
+        points.append(point)
+    return points
+
+
+def backfill_range(days: int, today: Optional[date] = None) -> Dict[str, str]:
+    """
+    Graph ``time_range`` covering the last ``days`` days including today.
+    """
+    today = today or date.today()
+    return {
+        'since': (today - timedelta(days=days - 1)).isoformat(),
+        'until': today.isoformat()
+    }
+
+
+sparkline_store = SparklineStore()
+_inflight: Dict[Tuple[str, str], "asyncio.Task[int]"] = {}
+_background: Set["asyncio.Task[Any]"] = set()
+
+
+async def fetch_daily_insights(
+    client: httpx.AsyncClient,
+    meta_token: str,
+    account_id: str,
+    days: int
+) -> InsightColumns:
+    """
+    Fetch account-level daily insights for the last ``days`` days in one call,
+    parsed into typed columns as the response streams in.
+    """
+    return await stream_insights(
+        client,
+        f"act_{account_id}/insights",
+        {
+            'fields': ','.join(SPARKLINE_METRICS),
+            'time_range': json.dumps(backfill_range(days)),
+            'time_increment': 1,
+            'level': 'account',
+            'limit': days
+        },
+        meta_token
+    )
+
+
+def _daily_rows(columns: InsightColumns, metrics: Sequence[str]) -> List[Dict[str, Any]]:
+    if 'date_start' not in columns:
+        return []
+    values = [columns.values(metric) for metric in metrics]
+    return [
+        {'date_start': day, **{metric: column[i] for metric, column in zip(metrics, values)}}
+        for i, day in enumerate(columns['date_start'])
+    ]
+
+
+def _start_load(meta_token: str, account_id: str, store: SparklineStore) -> "asyncio.Task[int]":
+    key = (account_id, token_fingerprint(meta_token))
+    task = _inflight.get(key)
+    if task is None:
+        days = REFRESH_TAIL_DAYS if account_id in store else store.capacity
+
+        async def load() -> int:
+            try:
+                # Not a caller's client: the first caller may return before the load finishes
+                async with httpx.AsyncClient(timeout=30.0) as client:
+                    columns = await fetch_daily_insights(client, meta_token, account_id, days)
+                written = store.ingest_columns(account_id, columns)
+                store.grant(account_id, key[1])
+                if column_store is not None:
+                    rows = settled_rows(_daily_rows(columns, column_store.metrics), SETTLED_AFTER_DAYS)
+                    await asyncio.to_thread(column_store.append, account_id, rows)
+                return written
+            finally:
+                _inflight.pop(key, None)
+
+        # Loads are shared between callers, so they run under no single caller's deadline
+        task = _inflight[key] = create_detached_task(load())
+    return task
+
+
+async def _load(meta_token: str, account_id: str, store: SparklineStore) -> int:
+    task = _start_load(meta_token, account_id, store)
+    # Shield so one caller going away does not cancel a load others are waiting on
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Request deadline exceeded waiting for sparkline load")
+
+
+def refresh_in_background(meta_token: str, account_id: str, store: SparklineStore = sparkline_store) -> bool:
+    """
+    Re-fetch the buffer tail without blocking the caller, within the account's
+    background rate budget. Returns whether a refresh is running.
+    """
+    if (account_id, token_fingerprint(meta_token)) in _inflight:
+        return True
+    # Only a check: the load's Graph call charges the budget when it is made
+    if not rate_budget.allows(account_id, 'background'):
+        return False
+
+    task = _start_load(meta_token, account_id, store)
+    _background.add(task)
+
+    def done(t: "asyncio.Task[Any]") -> None:
+        _background.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.error(f"❌ [SPARKLINES] Background refresh failed for {account_id}: {t.exception()}")
+
+    task.add_done_callback(done)
+    return True
+
+
+async def ensure_loaded(
+    meta_token: str,
+    account_id: str,
+    store: SparklineStore = sparkline_store,
+    max_age: float = REFRESH_AFTER_SECONDS,
+    max_staleness: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Make sure an account's buffer exists and is recent enough to serve.
+
+    Cold accounts are filled with the full buffer window; stale ones only re-fetch
+    the last few days. Buffers within ``max_staleness`` are served as-is while the
+    tail refreshes in the background. A token that has not yet loaded the account
+    itself always goes to Meta once, so cached data is never served to a user Meta
+    would refuse. Concurrent callers for the same account and token share one fetch,
+    which keeps running if any of them is cancelled.
+
+    Returns:
+        Freshness metadata for the buffer being served.
+    """
+    authorized = store.is_authorized(account_id, token_fingerprint(meta_token))
+
+    if authorized and store.is_fresh(account_id, max_age):
+        return _buffer_freshness(store, account_id, 'cache', False)
+    if authorized and max_staleness and store.is_fresh(account_id, max_staleness):
+        revalidating = refresh_in_background(meta_token, account_id, store)
+        return _buffer_freshness(store, account_id, 'cache', revalidating)
+
+    await _load(meta_token, account_id, store)
+    return _buffer_freshness(store, account_id, 'upstream', False)
+
+
+def _buffer_freshness(store: SparklineStore, account_id: str, source: str, revalidating: bool) -> Dict[str, Any]:
+    return freshness(time.time() - (store.age(account_id) or 0.0), source, revalidating, REFRESH_AFTER_SECONDS)
@@ -0,0 +1,150 @@
+"""
+Stale-while-revalidate response cache.
+
+Callers pass the staleness they are willing to accept. A cached value within
+that bound is returned immediately; if it is older than ``refresh_after`` a
+single background refresh is started, provided the account's Meta rate budget
+allows background work. Concurrent misses and refreshes for the same key share
+one upstream load.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from .deadline import DeadlineExceeded, create_detached_task, remaining
+from .metrics import registry
+from .rate_budget import RateBudget, rate_budget
+
+logger = logging.getLogger("meta-ads-railway.swr")
+
+DEFAULT_REFRESH_AFTER = float(os.getenv("SWR_REFRESH_AFTER_SECONDS", "60"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SWR_MAX_ENTRIES", "5000"))
+
+swr_lookups = registry.counter("swr_cache_lookups_total", "Stale-while-revalidate lookups by outcome")
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fetched_at: float
+
+
+def freshness(fetched_at: float, source: str, revalidating: bool = False, refresh_after: float = DEFAULT_REFRESH_AFTER) -> Dict[str, Any]:
+    """
+    Freshness metadata returned alongside cached payloads.
+    """
+    age = max(0.0, time.time() - fetched_at)
+    return {
+        'lastUpdated': datetime.fromtimestamp(fetched_at).isoformat(),
+        'ageSeconds': round(age, 1),
+        'source': source,
+        'stale': age > refresh_after,
+        'revalidating': revalidating
+    }
+
+
+class SWRCache:
+    """
+    Bounded LRU of loaded values with single-flight loading.
+    """
+
+    def __init__(
+        self,
+        refresh_after: float = DEFAULT_REFRESH_AFTER,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        budget: RateBudget = rate_budget
+    ):
+        self.refresh_after = refresh_after
+        self.max_entries = max_entries
+        self.budget = budget
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Hashable, "asyncio.Task[CacheEntry]"] = {}
+        self._background: Set["asyncio.Task[Any]"] = set()
+
+    async def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        max_staleness: float = 0.0,
+        account_id: Optional[str] = None
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Return ``(value, freshness)`` for ``key``.
+
+        Args:
+            key: Cache key; must include everything that scopes the data (user, account, params).
+            loader: Coroutine factory that fetches a fresh value.
+            max_staleness: Seconds of staleness the caller accepts; 0 always loads.
+            account_id: Account whose rate budget background refreshes are charged to.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry.fetched_at <= max_staleness:
+            self._entries.move_to_end(key)
+            revalidating = False
+            if time.time() - entry.fetched_at > self.refresh_after:
+                revalidating = self._schedule_refresh(key, loader, account_id)
+            swr_lookups.inc(outcome='stale' if revalidating else 'hit')
+            return entry.value, freshness(entry.fetched_at, 'cache', revalidating, self.refresh_after)
+
+        swr_lookups.inc(outcome='miss')
+        entry = await self._load(key, loader)
+        return entry.value, freshness(entry.fetched_at, 'upstream', False, self.refresh_after)
+
+    def _start(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> "asyncio.Task[CacheEntry]":
+        async def load() -> CacheEntry:
+            try:
+                value = await loader()
+                entry = CacheEntry(value=value, fetched_at=time.time())
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                return entry
+            finally:
+                self._inflight.pop(key, None)
+
+        # Loads are shared between callers, so they run under no single caller's deadline
+        task = self._inflight[key] = create_detached_task(load())
+        return task
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> CacheEntry:
+        task = self._inflight.get(key) or self._start(key, loader)
+        # Shield so one caller going away does not cancel a load others are waiting on
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request deadline exceeded waiting for upstream load")
+
+    def _schedule_refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]], account_id: Optional[str]) -> bool:
+        if key in self._inflight:
+            return True
+        # Only a check: the loader's Graph calls charge the budget as they are made
+        if account_id is not None and not self.budget.allows(account_id, 'background'):
+            logger.info(f"⏸️ [SWR] Background refresh deferred for account {account_id}: rate budget")
+            return False
+
+        task = self._start(key, loader)
+        self._background.add(task)
+
+        def done(t: "asyncio.Task[Any]") -> None:
+            self._background.discard(t)
+            if not t.cancelled() and t.exception() is not None:
+                logger.error(f"❌ [SWR] Background refresh failed: {t.exception()}")
+
+        task.add_done_callback(done)
+        return True
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+response_cache = SWRCache()
@@ -0,0 +1,283 @@
+"""
+Activity-weighted periodic sync scheduling.
+
+Stored account data has to be refreshed from Meta, but syncing every account
+on the same cadence either leaves busy accounts stale or spends Meta calls on
+dormant ones. Each account gets a row in ``account_sync_schedule`` with its
+own interval, derived from an activity score:
+
+    score = spend_7d / SYNC_SPEND_UNIT + active_campaigns / SYNC_CAMPAIGN_UNIT + views_7d / SYNC_VIEW_UNIT
+    interval = SYNC_MAX_INTERVAL / (1 + score) ** 2, clamped to [SYNC_MIN_INTERVAL, SYNC_MAX_INTERVAL]
+
+so an account spending and being watched every day is synced every few
+minutes, and one with no spend, no active campaigns and no dashboard views
+once a day. Dashboard views are counted with a one-week exponential decay.
+
+:meth:`SyncScheduler.tick` enqueues a ``sync`` job for every due account
+(claiming due rows with ``FOR UPDATE SKIP LOCKED``, so several schedulers can
+run side by side). Accounts enter the schedule at a point spread over their
+first interval by a hash of the account id, and every next run is jittered,
+so syncs do not bunch up at the top of the hour. An account whose background
+Meta rate budget is spent is pushed back instead of queued, and so is one
+whose previous sync is still queued or running.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from sqlalchemy import Column, DateTime, Float, Integer, String, Table, select, update
+from sqlalchemy.engine import Connection
+
+from .jobs import QUEUED, RUNNING, Job, JobQueue, job_metadata, jobs_table, utcnow
+from .metrics import registry
+from .rate_budget import RateBudget, rate_budget
+from .sharding import ShardCoordinator
+
+logger = logging.getLogger("meta-ads-railway.sync-scheduler")
+
+SYNC_MIN_INTERVAL = float(os.getenv("SYNC_MIN_INTERVAL_SECONDS", "300"))
+SYNC_MAX_INTERVAL = float(os.getenv("SYNC_MAX_INTERVAL_SECONDS", "86400"))
+SYNC_SPEND_UNIT = float(os.getenv("SYNC_SPEND_UNIT", "50"))
+SYNC_CAMPAIGN_UNIT = 1.0
+SYNC_VIEW_UNIT = 2.0
+# Next runs land within +/- this share of the interval
+SYNC_JITTER = 0.1
+# Meta calls an account's background budget must have room for before a sync
+# is queued; the sync's calls are charged as they are made
+SYNC_CALL_COST = float(os.getenv("SYNC_CALL_COST", "5"))
+# How long an account whose rate budget is spent, or whose last sync has not
+# finished, waits before it is tried again
+SYNC_BUDGET_RETRY_SECONDS = 120.0
+SYNC_TICK_SECONDS = float(os.getenv("SYNC_TICK_SECONDS", "30"))
+VIEW_DECAY_SECONDS = 7 * 24 * 3600.0
+
+syncs_scheduled = registry.counter("sync_jobs_scheduled_total", "Periodic account syncs by outcome")
+
+sync_schedule_table = Table(
+    "account_sync_schedule",
+    job_metadata,
+    Column("account_id", String(255), primary_key=True),
+    Column("owner", String(255)),
+    Column("interval_seconds", Float, nullable=False),
+    Column("next_sync_at", DateTime, nullable=False, index=True),
+    Column("last_enqueued_at", DateTime),
+    Column("spend_7d", Float, nullable=False, default=0.0),
+    Column("active_campaigns", Integer, nullable=False, default=0),
+    Column("views_7d", Float, nullable=False, default=0.0),
+    Column("views_updated_at", DateTime),
+)
+
+
+@dataclass(slots=True)
+class AccountActivity:
+    spend_7d: float = 0.0
+    active_campaigns: int = 0
+    views_7d: float = 0.0
+
+    @property
+    def score(self) -> float:
+        return (
+            max(0.0, self.spend_7d) / SYNC_SPEND_UNIT
+            + max(0, self.active_campaigns) / SYNC_CAMPAIGN_UNIT
+            + max(0.0, self.views_7d) / SYNC_VIEW_UNIT
+        )
+
+
+def sync_interval(activity: AccountActivity) -> float:
+    """
+    Seconds between syncs of an account with ``activity``.
+    """
+    return min(SYNC_MAX_INTERVAL, max(SYNC_MIN_INTERVAL, SYNC_MAX_INTERVAL / (1.0 + activity.score) ** 2))
+
+
+def phase(account_id: str) -> float:
+    """
+    Stable position in [0, 1) of an account within its interval.
+    """
+    digest = hashlib.sha1(account_id.encode()).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+def decayed_views(views: float, updated_at: Optional[datetime], now: datetime) -> float:
+    if updated_at is None:
+        return views
+    return views * math.exp(-max(0.0, (now - updated_at).total_seconds()) / VIEW_DECAY_SECONDS)
+
+
+class SyncScheduler:
+    """
+    Keeps per-account sync intervals and turns due accounts into sync jobs.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        budget: RateBudget = rate_budget,
+        call_cost: float = SYNC_CALL_COST,
+        shards: Optional[ShardCoordinator] = None
+    ):
+        self.queue = queue
+        self.budget = budget
+        self.call_cost = call_cost
+        self.shards = shards
+
+    def accounts(self) -> List[str]:
+        """
+        Every scheduled account, for partitioning across nodes.
+        """
+        with self.queue.engine.connect() as conn:
+            return list(conn.execute(select(sync_schedule_table.c.account_id)).scalars())
+
+    def update_activity(
+        self,
+        account_id: str,
+        owner: Optional[str],
+        spend_7d: float,
+        active_campaigns: int
+    ) -> float:
+        """
+        Record an account's spend and active campaigns (after a sync, or when
+        the account is first connected) and reschedule it. An account that
+        became busier is pulled forward; returns the new interval.
+        """
+        now = utcnow()
+        with self.queue.engine.begin() as conn:
+            row = conn.execute(
+                select(sync_schedule_table).where(sync_schedule_table.c.account_id == account_id).with_for_update()
+            ).first()
+            views = decayed_views(row.views_7d, row.views_updated_at, now) if row else 0.0
+            interval = sync_interval(AccountActivity(spend_7d, active_campaigns, views))
+            values = {
+                'owner': owner,
+                'interval_seconds': interval,
+                'spend_7d': spend_7d,
+                'active_campaigns': active_campaigns,
+                'views_7d': views,
+                'views_updated_at': now
+            }
+            if row is None:
+                conn.execute(sync_schedule_table.insert().values(
+                    account_id=account_id,
+                    next_sync_at=now + timedelta(seconds=interval * phase(account_id)),
+                    **values
+                ))
+            else:
+                last = row.last_enqueued_at or now
+                next_sync_at = min(row.next_sync_at, last + timedelta(seconds=interval))
+                conn.execute(
+                    update(sync_schedule_table)
+                    .where(sync_schedule_table.c.account_id == account_id)
+                    .values(next_sync_at=next_sync_at, **values)
+                )
+        return interval
+
+    def record_view(self, account_id: str) -> None:
+        """
+        Count a dashboard view of an account; frequently viewed accounts sync sooner.
+        """
+        now = utcnow()
+        with self.queue.engine.begin() as conn:
+            row = conn.execute(
+                select(sync_schedule_table).where(sync_schedule_table.c.account_id == account_id).with_for_update()
+            ).first()
+            if row is None:
+                return
+            views = decayed_views(row.views_7d, row.views_updated_at, now) + 1.0
+            interval = sync_interval(AccountActivity(row.spend_7d, row.active_campaigns, views))
+            last = row.last_enqueued_at or now
+            conn.execute(
+                update(sync_schedule_table)
+                .where(sync_schedule_table.c.account_id == account_id)
+                .values(
+                    views_7d=views,
+                    views_updated_at=now,
+                    interval_seconds=interval,
+                    next_sync_at=min(row.next_sync_at, last + timedelta(seconds=interval))
+                )
+            )
+
+    def tick(self, limit: int = 100) -> List[Job]:
+        """
+        Enqueue sync jobs for up to ``limit`` due accounts, most overdue first.
+        With ``shards``, only accounts this node leases are considered, and
+        their jobs are claimable by this node only.
+        """
+        now = utcnow()
+        jobs = []
+        due = select(sync_schedule_table).where(sync_schedule_table.c.next_sync_at <= now)
+        if self.shards is not None:
+            due = due.where(sync_schedule_table.c.account_id.in_(self.shards.owned_query()))
+        with self.queue.engine.begin() as conn:
+            rows = conn.execute(
+                due.order_by(sync_schedule_table.c.next_sync_at).limit(limit).with_for_update(skip_locked=True)
+            ).all()
+            pending = self._pending_syncs(conn, [row.account_id for row in rows])
+            for row in rows:
+                if row.account_id in pending:
+                    outcome = 'pending'
+                elif self.budget.allows(row.account_id, 'background', self.call_cost):
+                    outcome = 'queued'
+                else:
+                    outcome = 'deferred'
+                queued = outcome == 'queued'
+                if queued:
+                    jitter = 1.0 + random.uniform(-SYNC_JITTER, SYNC_JITTER)
+                    values = {
+                        'next_sync_at': now + timedelta(seconds=row.interval_seconds * jitter),
+                        'last_enqueued_at': now
+                    }
+                else:
+                    values = {'next_sync_at': now + timedelta(seconds=min(row.interval_seconds, SYNC_BUDGET_RETRY_SECONDS))}
+                # Guarded: without SKIP LOCKED another scheduler may have taken the row
+                moved = conn.execute(
+                    update(sync_schedule_table)
+                    .where(
+                        sync_schedule_table.c.account_id == row.account_id,
+                        sync_schedule_table.c.next_sync_at == row.next_sync_at
+                    )
+                    .values(**values)
+                ).rowcount
+                if not moved:
+                    continue
+                syncs_scheduled.inc(outcome=outcome)
+                if queued:
+                    jobs.append(self.queue.enqueue(
+                        'sync', {'account_id': row.account_id}, owner=row.owner, connection=conn,
+                        shard=row.account_id if self.shards is not None else None
+                    ))
+        if jobs:
+            logger.info(f"🗓️ [SCHEDULER] Queued {len(jobs)} account syncs")
+        return jobs
+
+    def _pending_syncs(self, conn: Connection, account_ids: List[str]) -> Set[str]:
+        """
+        Those of ``account_ids`` with a sync job still queued or running.
+        """
+        if not account_ids:
+            return set()
+        account = jobs_table.c.payload['account_id'].as_string()
+        return set(conn.execute(
+            select(account).where(
+                jobs_table.c.job_type == 'sync',
+                jobs_table.c.status.in_([QUEUED, RUNNING]),
+                account.in_(account_ids)
+            )
+        ).scalars())
+
+    async def run(self, tick_seconds: float = SYNC_TICK_SECONDS) -> None:
+        """
+        Tick forever; meant to run next to a job worker's slots.
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.tick)
+            except Exception as e:
+                logger.error(f"❌ [SCHEDULER] Tick failed: {str(e)}")
+            await asyncio.sleep(tick_seconds)
@@ -0,0 +1,248 @@
+"""
+Background cache warming for newly authenticated sessions.
+
+The first authenticated request of a session (or the first one after the user's
+Meta token changes, i.e. an OAuth token sync) schedules a low-priority warm-up:
+the ad account list, then campaign lists, last-30-day dashboard metrics and the
+daily insight buffers behind sparklines for the user's most-used accounts. The
+warm-up fills the same caches the endpoints read, so the first dashboard paint
+is a cache hit.
+
+Warm-ups are bounded per user (accounts and upstream calls), only spend each
+account's background rate budget, and stop once the user has been idle for a
+while.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+from .dashboard import (
+    ad_accounts_cache_key,
+    campaigns_cache_key,
+    dashboard_cache_key,
+    load_ad_accounts,
+    load_campaign_list,
+    load_dashboard_metrics,
+)
+from .deadline import create_detached_task
+from .graph_api import normalize_account_id, token_fingerprint, track_upstream_calls
+from .metrics import registry
+from .rate_budget import RateBudget, rate_budget
+from .sparkline_store import SparklineStore, ensure_loaded, sparkline_store
+from .swr_cache import SWRCache, response_cache
+
+logger = logging.getLogger("meta-ads-railway.warmup")
+
+WARMUP_MAX_ACCOUNTS = int(os.getenv("WARMUP_MAX_ACCOUNTS", "5"))
+WARMUP_MAX_CALLS = int(os.getenv("WARMUP_MAX_CALLS", "40"))
+WARMUP_IDLE_SECONDS = float(os.getenv("WARMUP_IDLE_SECONDS", "300"))
+# A session is not warmed again until this long after its last warm-up started
+WARMUP_INTERVAL_SECONDS = float(os.getenv("WARMUP_INTERVAL_SECONDS", "1800"))
+WARMUP_DATE_PRESET = 'last_30d'
+ACTIVE_ACCOUNT_STATUS = 1
+
+warmups_total = registry.counter("cache_warmups_total", "Session cache warm-ups by outcome")
+warmup_steps = registry.counter("cache_warmup_steps_total", "Cache warm-up steps by kind and outcome")
+
+
+class AccountUsage:
+    """
+    Per-user request counts by account, used to pick which accounts to warm.
+    Bounded to the most recently active users.
+    """
+
+    def __init__(self, max_users: int = 10000):
+        self.max_users = max_users
+        self._users: "OrderedDict[str, Counter]" = OrderedDict()
+
+    def record(self, user_id: str, account_id: str) -> None:
+        counts = self._users.get(user_id)
+        if counts is None:
+            counts = self._users[user_id] = Counter()
+        counts[account_id] += 1
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def top(self, user_id: str, limit: int) -> List[str]:
+        counts = self._users.get(user_id)
+        return [account_id for account_id, _ in counts.most_common(limit)] if counts else []
+
+
+@dataclass
+class WarmupSession:
+    token_key: str
+    started_at: float
+    last_seen: float
+    task: Optional["asyncio.Task[str]"] = None
+    accounts: List[str] = field(default_factory=list)
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+
+class CacheWarmer:
+    """
+    Schedules and supervises one warm-up task per user. Sessions and token
+    owners are kept for the most recently active ``max_users`` users.
+    """
+
+    def __init__(
+        self,
+        cache: SWRCache = response_cache,
+        store: SparklineStore = sparkline_store,
+        budget: RateBudget = rate_budget,
+        max_accounts: int = WARMUP_MAX_ACCOUNTS,
+        max_calls: int = WARMUP_MAX_CALLS,
+        idle_after: float = WARMUP_IDLE_SECONDS,
+        interval: float = WARMUP_INTERVAL_SECONDS,
+        max_users: int = 10000
+    ):
+        self.cache = cache
+        self.store = store
+        self.budget = budget
+        self.max_accounts = max_accounts
+        self.max_calls = max_calls
+        self.idle_after = idle_after
+        self.interval = interval
+        self.max_users = max_users
+        self.usage = AccountUsage(max_users)
+        self._sessions: "OrderedDict[str, WarmupSession]" = OrderedDict()
+        self._users_by_token: "OrderedDict[str, str]" = OrderedDict()
+
+    def touch(self, user_id: str, meta_token: str) -> bool:
+        """
+        Note an authenticated request and start a warm-up if this session needs one.
+        Returns whether a warm-up was scheduled.
+        """
+        now = time.monotonic()
+        token_key = token_fingerprint(meta_token)
+        self._users_by_token[token_key] = user_id
+        self._users_by_token.move_to_end(token_key)
+        while len(self._users_by_token) > self.max_users:
+            self._users_by_token.popitem(last=False)
+        session = self._sessions.get(user_id)
+        if session is not None:
+            self._sessions.move_to_end(user_id)
+
+        if session is not None and session.token_key == token_key:
+            session.last_seen = now
+            if session.running or now - session.started_at < self.interval:
+                return False
+        elif session is not None and session.running:
+            # Token changed (re-connected Meta account): the old warm-up is for stale credentials
+            session.task.cancel()
+
+        session = self._sessions[user_id] = WarmupSession(token_key=token_key, started_at=now, last_seen=now)
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > self.max_users:
+            _, evicted = self._sessions.popitem(last=False)
+            if evicted.running:
+                evicted.task.cancel()
+        session.task = create_detached_task(self._run(user_id, meta_token, session))
+        session.task.add_done_callback(self._finished)
+        logger.info(f"🔥 [WARMUP] Scheduled cache warm-up for user {user_id}")
+        return True
+
+    def record_account(self, meta_token: str, account_id: str) -> None:
+        """
+        Count a request against an account for the user owning ``meta_token``.
+        """
+        user_id = self._users_by_token.get(token_fingerprint(meta_token))
+        if user_id is not None and account_id:
+            self.usage.record(user_id, account_id)
+
+    def cancel(self, user_id: str) -> None:
+        session = self._sessions.pop(user_id, None)
+        if session is not None and session.running:
+            session.task.cancel()
+
+    def pick_accounts(self, user_id: str, ad_accounts: List[Dict[str, Any]]) -> List[str]:
+        """
+        Most-used accounts first, topped up with active accounts from the account list.
+        """
+        picked = self.usage.top(user_id, self.max_accounts)
+        for account in ad_accounts:
+            if len(picked) >= self.max_accounts:
+                break
+            account_id = normalize_account_id(account.get('id'))
+            if account.get('account_status') == ACTIVE_ACCOUNT_STATUS and account_id not in picked:
+                picked.append(account_id)
+        return picked
+
+    def _stop_reason(self, session: WarmupSession, calls: Dict[str, int]) -> Optional[str]:
+        if time.monotonic() - session.last_seen > self.idle_after:
+            return 'idle'
+        if calls['count'] >= self.max_calls:
+            return 'budget'
+        return None
+
+    async def _run(self, user_id: str, meta_token: str, session: WarmupSession) -> str:
+        with track_upstream_calls() as calls:
+            try:
+                ad_accounts, _ = await self.cache.get(
+                    ad_accounts_cache_key(meta_token),
+                    lambda: load_ad_accounts(meta_token),
+                    max_staleness=self.interval
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ [WARMUP] Account list failed for user {user_id}: {str(e)}")
+                return 'error'
+
+            session.accounts = self.pick_accounts(user_id, ad_accounts)
+            for account_id in session.accounts:
+                for kind, step in self._steps(meta_token, account_id):
+                    reason = self._stop_reason(session, calls)
+                    if reason is not None:
+                        logger.info(f"⏹️ [WARMUP] Stopped for user {user_id}: {reason} ({calls['count']} calls)")
+                        return reason
+                    # Only a check: the step's Graph calls charge the budget as they are made
+                    if not self.budget.allows(account_id, 'background'):
+                        warmup_steps.inc(kind=kind, outcome='deferred')
+                        break
+                    try:
+                        await step()
+                        warmup_steps.inc(kind=kind, outcome='ok')
+                    except Exception as e:
+                        warmup_steps.inc(kind=kind, outcome='error')
+                        logger.warning(f"⚠️ [WARMUP] {kind} failed for account {account_id}: {str(e)}")
+
+            logger.info(
+                f"✅ [WARMUP] Warmed {len(session.accounts)} accounts for user {user_id} ({calls['count']} calls)"
+            )
+            return 'complete'
+
+    def _steps(self, meta_token: str, account_id: str) -> List[Tuple[str, Callable[[], Awaitable[Any]]]]:
+        return [
+            ('dashboard', lambda: self.cache.get(
+                dashboard_cache_key(meta_token, account_id, WARMUP_DATE_PRESET),
+                lambda: load_dashboard_metrics(meta_token, account_id, WARMUP_DATE_PRESET),
+                max_staleness=self.interval
+            )),
+            ('campaigns', lambda: self.cache.get(
+                campaigns_cache_key(meta_token, account_id),
+                lambda: load_campaign_list(meta_token, account_id),
+                max_staleness=self.interval
+            )),
+            ('sparklines', lambda: ensure_loaded(meta_token, account_id, store=self.store))
+        ]
+
+    @staticmethod
+    def _finished(task: "asyncio.Task[str]") -> None:
+        if task.cancelled():
+            warmups_total.inc(outcome='cancelled')
+        elif task.exception() is not None:
+            warmups_total.inc(outcome='error')
+            logger.error(f"❌ [WARMUP] Warm-up crashed: {task.exception()}")
+        else:
+            warmups_total.inc(outcome=task.result())
+
+
+cache_warmer = CacheWarmer()
@@ -0,0 +1,3 @@
+"""
+Offline test tooling: synthetic Meta ad data and a fake Graph API server.
+"""
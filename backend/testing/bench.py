@@ -0,0 +1,369 @@
+"""
+Load generation and result files for end-to-end API benchmarks.
+
+:func:`run_load` drives an ASGI app in-process with a fixed number of
+concurrent clients (a closed loop: each client sends its next request as soon
+as the previous one finishes) and returns a :class:`ScenarioResult` with
+throughput, latency percentiles, upstream calls per request and peak RSS.
+:func:`route_upstreams` points the ``httpx.AsyncClient`` instances the app
+builds for itself at in-process fakes, so requests never leave the process.
+
+Results are written as JSON by :func:`write_results`; compare two runs with::
+
+    python -m testing.bench old.json new.json --threshold 0.1
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
+
+import httpx
+
+RESULTS_VERSION = 1
+RSS_SAMPLE_SECONDS = 0.005
+# Lower is better for every compared metric except throughput
+HIGHER_IS_BETTER = ('throughput_rps',)
+COMPARED_METRICS = (
+    'throughput_rps', 'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms',
+    'upstream_calls_per_request', 'peak_rss_mb'
+)
+
+
+@dataclass(frozen=True)
+class BenchRequest:
+    method: str
+    url: str
+    json: Optional[Any] = None
+    params: Optional[Dict[str, Any]] = None
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    A named request mix: ``request(i, worker)`` builds the i-th request, sent
+    by simulated client ``worker``. Scenarios cycle through accounts or date
+    ranges by ``i`` to control cache hits.
+    """
+    name: str
+    app: str
+    request: Callable[[int, int], BenchRequest]
+    expect_status: int = 200
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    app: str
+    concurrency: int
+    requests: int
+    errors: int
+    statuses: Dict[str, int]
+    duration_s: float
+    throughput_rps: float
+    latency_p50_ms: float
+    latency_p95_ms: float
+    latency_p99_ms: float
+    latency_max_ms: float
+    upstream_calls_per_request: float
+    upstream: Dict[str, float]
+    peak_rss_mb: float
+    rss_growth_mb: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.app}:{self.scenario}@{self.concurrency}"
+
+    def summary(self) -> str:
+        return (
+            f"{self.key}: {self.throughput_rps:.0f} req/s, "
+            f"p50 {self.latency_p50_ms:.1f} ms, p95 {self.latency_p95_ms:.1f} ms, p99 {self.latency_p99_ms:.1f} ms, "
+            f"{self.upstream_calls_per_request:.2f} upstream/req, peak RSS {self.peak_rss_mb:.0f} MiB, "
+            f"{self.errors} errors"
+        )
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile (``q`` in 0-100) of ``samples``.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[min(len(ordered), int(rank)) - 1]
+
+
+def current_rss() -> int:
+    """
+    Resident set size of this process in bytes; the lifetime peak where the
+    current value cannot be read (outside Linux).
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    """
+    Peak RSS while the block runs, sampled from a background thread.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self) -> "RssSampler":
+        self.start = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+@contextmanager
+def route_upstreams(transports: Mapping[str, httpx.AsyncBaseTransport]) -> Iterator[None]:
+    """
+    Send requests to each host in ``transports`` through its transport, for
+    every ``httpx.AsyncClient`` created in the block without a transport of its own.
+    """
+    original = httpx.AsyncClient
+    mounts = {f"all://{host}": transport for host, transport in transports.items()}
+
+    class RoutedAsyncClient(original):
+        def __init__(self, *args: Any, **kwargs: Any):
+            if 'transport' not in kwargs:
+                kwargs['mounts'] = {**mounts, **(kwargs.get('mounts') or {})}
+            super().__init__(*args, **kwargs)
+
+    httpx.AsyncClient = RoutedAsyncClient
+    try:
+        yield
+    finally:
+        httpx.AsyncClient = original
+
+
+def unsigned_jwt(claims: Dict[str, Any]) -> str:
+    """
+    A JWT-shaped token carrying ``claims``, as :class:`FakeSupabase` reads
+    it; the signature is not valid.
+    """
+    def part(value: Dict[str, Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+    return f"{part({'alg': 'HS256', 'typ': 'JWT'})}.{part(claims)}.bench"
+
+
+class FakeSupabase:
+    """
+    Supabase auth and profiles for ``get_authenticated_user``: any token is a
+    user (its ``sub`` claim, or the token itself) with ``meta_token`` connected.
+    """
+
+    def __init__(self, meta_token: str = "bench-meta-token"):
+        self.meta_token = meta_token
+        self.calls = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if request.url.path == '/auth/v1/user':
+            token = request.headers.get('authorization', '')[len('Bearer '):]
+            parts = token.split('.')
+            try:
+                claims = json.loads(base64.urlsafe_b64decode(parts[1] + '=' * (-len(parts[1]) % 4)))
+                user_id = claims['sub']
+            except (IndexError, ValueError, KeyError):
+                user_id = token
+            return httpx.Response(200, json={'id': user_id})
+        if request.url.path == '/rest/v1/profiles':
+            return httpx.Response(200, json=[{'meta_access_token': self.meta_token}])
+        return httpx.Response(404, json={'message': f"No route for {request.url.path}"})
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    concurrency: int,
+    requests: int,
+    warmup: int = 0,
+    headers: Callable[[int], Dict[str, str]] = lambda worker: {},
+    upstream: Callable[[], Mapping[str, int]] = dict
+) -> ScenarioResult:
+    """
+    Send ``requests`` requests from ``concurrency`` concurrent clients after
+    ``warmup`` unmeasured ones.
+
+    Args:
+        client: Client for the app under test.
+        headers: Headers for each simulated client, e.g. its credentials.
+        upstream: Cumulative upstream call counters by name; the result
+            reports their growth per measured request.
+    """
+    async def send(index: int, worker: int) -> int:
+        spec = scenario.request(index, worker)
+        response = await client.request(spec.method, spec.url, json=spec.json, params=spec.params, headers=headers(worker))
+        return response.status_code
+
+    for index in range(warmup):
+        await send(index, index % concurrency)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_index = iter(range(warmup, warmup + requests))
+
+    async def worker(worker_id: int) -> None:
+        for index in next_index:
+            started = time.perf_counter()
+            status = await send(index, worker_id)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    before = dict(upstream())
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        duration = time.perf_counter() - started
+    after = upstream()
+
+    calls = {name: (after.get(name, 0) - before.get(name, 0)) / requests for name in after}
+    latency_ms = [seconds * 1000 for seconds in latencies]
+    return ScenarioResult(
+        scenario=scenario.name,
+        app=scenario.app,
+        concurrency=concurrency,
+        requests=requests,
+        errors=requests - statuses[scenario.expect_status],
+        statuses={str(status): count for status, count in sorted(statuses.items())},
+        duration_s=round(duration, 4),
+        throughput_rps=round(requests / duration, 2),
+        latency_p50_ms=round(percentile(latency_ms, 50), 3),
+        latency_p95_ms=round(percentile(latency_ms, 95), 3),
+        latency_p99_ms=round(percentile(latency_ms, 99), 3),
+        latency_max_ms=round(max(latency_ms), 3),
+        upstream_calls_per_request=round(sum(calls.values()), 3),
+        upstream={name: round(value, 3) for name, value in calls.items()},
+        peak_rss_mb=round(rss.peak / 2**20, 1),
+        rss_growth_mb=round((rss.peak - rss.start) / 2**20, 1)
+    )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path: str, results: List[ScenarioResult], settings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Write ``results`` and the run's environment to ``path`` as JSON.
+    """
+    document = {
+        'version': RESULTS_VERSION,
+        'run': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'settings': settings or {}
+        },
+        'scenarios': [asdict(result) for result in results]
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as out:
+        json.dump(document, out, indent=2)
+    return document
+
+
+def _by_key(document: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    return {f"{s['app']}:{s['scenario']}@{s['concurrency']}": s for s in document['scenarios']}
+
+
+@dataclass
+class Change:
+    key: str
+    metric: str
+    baseline: float
+    current: float
+    regression: bool = False
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline - 1 if self.baseline else 0.0
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.1) -> List[Change]:
+    """
+    Per-metric changes for scenarios present in both runs; a change is a
+    regression when it is worse by more than ``threshold`` (a fraction).
+    """
+    changes = []
+    old = _by_key(baseline)
+    for key, scenario in _by_key(current).items():
+        if key not in old:
+            continue
+        for metric in COMPARED_METRICS:
+            change = Change(key, metric, old[key][metric], scenario[metric])
+            worse = -change.ratio if metric in HIGHER_IS_BETTER else change.ratio
+            change.regression = worse > threshold
+            changes.append(change)
+    return changes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="fractional change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    changes = compare_results(baseline, current, args.threshold)
+    for change in changes:
+        flag = "  REGRESSION" if change.regression else ""
+        print(f"{change.key:<48} {change.metric:<28} {change.baseline:>12.2f} -> {change.current:>12.2f} ({change.ratio:+.1%}){flag}")
+    regressions = [c for c in changes if c.regression]
+    print(f"{len(regressions)} regressions in {len(changes)} compared metrics")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Bulk loading of synthetic data for scale tests.
+
+:func:`load_models` writes a :class:`~testing.synthetic.SyntheticGraphData`
+dataset into the app's tables (users, ad accounts, campaigns, ad sets, ads,
+creatives, and daily campaign and ad set metrics) as a full sync would have
+stored it: objects go through the hierarchy sync's normalisation, metric rows
+carry the same ratios the insights sync stores. :func:`write_graph_json`
+writes the same data as Graph-shaped NDJSON files instead.
+
+Both stream account by account, so memory stays flat however many rows are
+written. Rows are inserted with batched Core ``executemany`` and, on
+PostgreSQL with psycopg2, with ``COPY``. Every row gets a deterministic UUID,
+so tests can address loaded rows without querying for them::
+
+    python -m testing.bulk --accounts 50 --campaigns 200 --days 1095 --database-url postgresql://...
+    python -m testing.bulk --accounts 5 --graph-json /tmp/graph
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from services.hierarchy_sync import HIERARCHY_LEVELS, REMOVED_STATUSES, normalize_object
+
+from .synthetic import DailyMetrics, SyntheticGraphData, SyntheticObject
+
+BATCH_ROWS = 5000
+METRIC_LEVELS = ('campaign', 'adset')
+GRAPH_LEVELS = ('campaign', 'adset', 'ad')
+INSIGHT_FIELDS = (
+    'account_id', 'campaign_id', 'campaign_name', 'adset_id', 'adset_name', 'ad_id', 'ad_name',
+    'account_currency', 'spend', 'impressions', 'clicks', 'reach', 'frequency', 'ctr', 'cpc', 'cpm',
+    'conversions', 'actions', 'action_values', 'purchase_roas'
+)
+# Generated UUIDs are prefix, kind, Meta id and, for metric rows, the day. The prefix
+# keeps a letter in the hex form, which SQLite would otherwise store as a number
+_ID_PREFIX = 0xda7a
+_ID_KINDS = {
+    'user': 1, 'account': 2, 'campaign': 3, 'adset': 4, 'ad': 5, 'creative': 6,
+    'campaign_metrics': 7, 'adset_metrics': 8,
+}
+_LEVEL_CONFIG = {level.name: level for level in HIERARCHY_LEVELS}
+
+
+def model_id(kind: str, meta_id: str, day: Optional[date] = None) -> uuid.UUID:
+    """
+    Deterministic primary key of a loaded row: ``kind`` is a level, ``user``,
+    ``creative`` or ``<level>_metrics`` (with the row's ``day``).
+    """
+    return uuid.UUID(int=(_ID_PREFIX << 112) | (_ID_KINDS[kind] << 96) | (int(meta_id) << 32) | (day.toordinal() if day else 0))
+
+
+def user_email(account_index: int) -> str:
+    """
+    Email of the user owning the ``account_index``-th account (from 0).
+    """
+    return f"synthetic-{account_index}@example.com"
+
+
+@dataclass
+class LoadSummary:
+    rows: Dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def total_rows(self) -> int:
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total_rows / self.seconds if self.seconds else 0.0
+
+
+def _object_row(obj: SyntheticObject, parent_key: Tuple[str, uuid.UUID]) -> Dict[str, Any]:
+    level = _LEVEL_CONFIG[obj.level]
+    values = normalize_object(level, obj.graph_fields())
+    values['is_active'] = values.pop('effective_status', None) not in REMOVED_STATUSES
+    external = {'campaign': 'campaign_id', 'adset': 'ad_set_id', 'ad': 'ad_id'}[obj.level]
+    values.pop(level.parent, None)
+    values[external] = values.pop('id')
+    values['id'] = model_id(obj.level, obj.id)
+    values[parent_key[0]] = parent_key[1]
+    return values
+
+
+def metric_row(obj: SyntheticObject, day: date, m: DailyMetrics) -> Dict[str, Any]:
+    """
+    A ``campaign_metrics`` / ``adset_metrics`` row for one object and day.
+    """
+    return {
+        'id': model_id(f"{obj.level}_metrics", obj.id, day),
+        'campaign_id' if obj.level == 'campaign' else 'ad_set_id': model_id(obj.level, obj.id),
+        'date_start': day,
+        'date_stop': day,
+        'impressions': m.impressions,
+        'clicks': m.clicks,
+        'reach': m.reach,
+        'conversions': m.conversions,
+        'spend': m.spend,
+        'ctr': m.clicks / m.impressions * 100 if m.impressions else 0.0,
+        'cpc': m.spend / m.clicks if m.clicks else 0.0,
+        'cpm': m.spend / m.impressions * 1000 if m.impressions else 0.0,
+        'purchase_value': m.purchase_value,
+        'roas': m.purchase_value / m.spend if m.spend else 0.0
+    }
+
+
+def _copy_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _Writer:
+    """
+    Buffers rows per table and writes them in batches on one connection.
+    """
+
+    def __init__(self, connection: Any, batch_rows: int):
+        self.connection = connection
+        self.batch_rows = batch_rows
+        self.copy = connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+        self.pending: Dict[Any, List[Dict[str, Any]]] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, table: Any, row: Dict[str, Any]) -> None:
+        rows = self.pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        # Tables were first used parents first, so foreign keys always find their rows
+        for target, rows in self.pending.items():
+            if not rows:
+                continue
+            if self.copy:
+                self._copy(target, rows)
+            else:
+                self.connection.execute(insert(target), rows)
+            self.counts[target.name] = self.counts.get(target.name, 0) + len(rows)
+            self.pending[target] = []
+
+    def _copy(self, table: Any, rows: List[Dict[str, Any]]) -> None:
+        # COPY skips Python-side column defaults that Core inserts would apply
+        defaults = {
+            column.name: column.default.arg for column in table.columns
+            if column.default is not None and column.default.is_scalar
+        }
+        columns = list({**defaults, **rows[0]})
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([_copy_value(row[name] if name in row else defaults[name]) for name in columns])
+        buffer.seek(0)
+        cursor = self.connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+
+def load_models(
+    engine: Any,
+    data: SyntheticGraphData,
+    metric_levels: Iterable[str] = METRIC_LEVELS,
+    batch_rows: int = BATCH_ROWS,
+    progress: Optional[Callable[[str, LoadSummary], None]] = None
+) -> LoadSummary:
+    """
+    Insert ``data`` into the app's tables, one transaction per account. The
+    tables must exist and not hold these ids yet. Each account gets its own
+    user, :func:`user_email` of the account's index.
+
+    Args:
+        metric_levels: Which of ``campaign`` and ``adset`` get daily metric rows.
+        progress: Called with each account id and the running totals once it is committed.
+    """
+    from models import AdSet, Ad, Campaign, CampaignMetrics, AdSetMetrics, Creative, MetaAdAccount, User
+
+    metric_tables = {'campaign': CampaignMetrics.__table__, 'adset': AdSetMetrics.__table__}
+    levels = tuple(metric_levels)
+    summary = LoadSummary()
+    started = time.perf_counter()
+
+    for index, account_id in enumerate(data.account_ids()):
+        account = data.account(account_id)
+        with engine.begin() as connection:
+            writer = _Writer(connection, batch_rows)
+            writer.add(User.__table__, {
+                'id': model_id('user', account_id), 'email': user_email(index), 'hashed_password': '!',
+                'full_name': f"Synthetic User {index + 1}", 'is_active': True, 'is_superuser': False,
+                'meta_user_id': f"synthetic-{account_id}", 'meta_access_token': 'synthetic-meta-token'
+            })
+            writer.add(MetaAdAccount.__table__, {
+                'id': model_id('account', account_id), 'user_id': model_id('user', account_id),
+                'account_id': account_id, 'account_name': account.name, 'currency': data.currency,
+                'timezone_name': 'UTC', 'status': 'ACTIVE', 'is_active': True
+            })
+            for campaign in data.objects(account_id, 'campaign'):
+                writer.add(Campaign.__table__, _object_row(campaign, ('ad_account_id', model_id('account', account_id))))
+            for adset in data.objects(account_id, 'adset'):
+                writer.add(AdSet.__table__, _object_row(adset, ('campaign_id', model_id('campaign', adset.parent_id))))
+            for ad in data.objects(account_id, 'ad'):
+                row = _object_row(ad, ('ad_set_id', model_id('adset', ad.parent_id)))
+                writer.add(Ad.__table__, row)
+                writer.add(Creative.__table__, {
+                    'id': model_id('creative', row['creative_id']), 'ad_id': row['id'],
+                    'creative_id': row['creative_id'], 'name': f"{ad.name} creative", 'created_time': ad.created_time
+                })
+            writer.flush()
+
+            for obj, day, m in data.iter_daily(account_id, levels):
+                writer.add(metric_tables[obj.level], metric_row(obj, day, m))
+            writer.flush()
+
+        for name, count in writer.counts.items():
+            summary.rows[name] = summary.rows.get(name, 0) + count
+        data.release(account_id)
+        summary.seconds = time.perf_counter() - started
+        if progress:
+            progress(account_id, summary)
+    return summary
+
+
+def write_graph_json(
+    data: SyntheticGraphData,
+    out_dir: str,
+    levels: Iterable[str] = GRAPH_LEVELS,
+    fields: Tuple[str, ...] = INSIGHT_FIELDS
+) -> Dict[str, int]:
+    """
+    Write each account as Graph would return it, under ``out_dir/act_<id>/``:
+    ``account.json``, ``<level>s.ndjson`` with every object of a level, and
+    ``insights_<level>.ndjson`` with daily insight rows (``time_increment=1``).
+    Returns rows written per file name.
+    """
+    levels = tuple(levels)
+    counts: Dict[str, int] = {}
+
+    for account_id in data.account_ids():
+        directory = os.path.join(out_dir, f"act_{account_id}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'account.json'), 'w') as out:
+            json.dump(data.account(account_id).graph_fields(), out)
+
+        for level in levels:
+            name = f"{level}s.ndjson"
+            with open(os.path.join(directory, name), 'w') as out:
+                for obj in data.objects(account_id, level):
+                    out.write(json.dumps(obj.graph_fields()))
+                    out.write('\n')
+                    counts[name] = counts.get(name, 0) + 1
+
+        outputs = {level: open(os.path.join(directory, f"insights_{level}.ndjson"), 'w') for level in levels}
+        try:
+            for obj, day, m in data.iter_daily(account_id, levels):
+                outputs[obj.level].write(json.dumps(data.insight_row(obj, day, day, fields, m)))
+                outputs[obj.level].write('\n')
+                name = f"insights_{obj.level}.ndjson"
+                counts[name] = counts.get(name, 0) + 1
+        finally:
+            for out in outputs.values():
+                out.close()
+        data.release(account_id)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic Meta ads dataset for scale tests")
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--campaigns", type=int, default=100, help="mean campaigns per account")
+    parser.add_argument("--adsets", type=int, default=3, help="mean ad sets per campaign")
+    parser.add_argument("--ads", type=int, default=2, help="mean ads per ad set")
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--until", type=date.fromisoformat, default=None, help="last day of history (default today)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size-spread", type=float, default=1.0, help="lognormal sigma of per-account and per-campaign sizes")
+    parser.add_argument("--levels", help=(
+        f"levels that get daily metric rows (default {','.join(METRIC_LEVELS)}; "
+        f"{','.join(GRAPH_LEVELS)} for --graph-json)"
+    ))
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--database-url", help="load into this database, creating the tables if needed")
+    target.add_argument("--graph-json", metavar="DIR", help="write Graph-shaped NDJSON files here")
+    args = parser.parse_args()
+
+    data = SyntheticGraphData(
+        accounts=args.accounts, campaigns=args.campaigns, adsets_per_campaign=args.adsets,
+        ads_per_adset=args.ads, days=args.days, until=args.until or datetime.now(timezone.utc).date(),
+        seed=args.seed, size_spread=args.size_spread
+    )
+    levels = [level for level in (args.levels or '').split(',') if level]
+
+    if args.graph_json:
+        levels = levels or list(GRAPH_LEVELS)
+        started = time.perf_counter()
+        counts = write_graph_json(data, args.graph_json, levels)
+        print(f"Wrote {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s: {counts}")
+        return
+
+    # models reads DATABASE_URL when imported
+    os.environ["DATABASE_URL"] = args.database_url
+    from models import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+
+    def report(account_id: str, summary: LoadSummary) -> None:
+        print(f"act_{account_id}: {summary.total_rows} rows, {summary.rows_per_second:.0f} rows/s")
+
+    summary = load_models(engine, data, levels or METRIC_LEVELS, progress=report)
+    print(f"Loaded {summary.total_rows} rows in {summary.seconds:.1f}s: {summary.rows}")
+
+
+if __name__ == "__main__":
+    main()
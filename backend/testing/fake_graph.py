@@ -0,0 +1,626 @@
+"""
+Fake Meta Graph API for offline tests and benchmarks.
+
+:class:`FakeGraph` answers Graph requests from a
+:class:`~testing.synthetic.SyntheticGraphData`, and :func:`create_app` wraps
+it in an ASGI app. Code taking an ``httpx.AsyncClient`` can be pointed at it
+in-process with :meth:`FakeGraph.client`; code building its own clients can
+reach it over a socket with :func:`serve_in_thread` and ``META_GRAPH_API_URL``.
+
+Supported requests:
+
+- nodes: ``act_<id>``, campaigns, ad sets and ads by id; ``me/adaccounts``;
+- the ``campaigns`` / ``adsets`` / ``ads`` edges, with ``fields``, cursor
+  pagination (``limit`` / ``after``), ``summary=total_count``,
+  ``effective_status`` and ``filtering``. As on Graph, archived and deleted
+  objects are left out unless asked for by status;
+- ``insights`` on any node, with ``level``, ``fields``, ``date_preset`` or
+  ``time_range``, ``time_increment`` and ``sort``;
+- async report runs: POST ``<node>/insights``, then GET ``<run id>`` and
+  ``<run id>/insights``;
+- batches: POST to the root with ``batch``.
+
+Behaviour is set by :class:`FakeGraphConfig`: a :class:`LatencyModel` per
+HTTP request, random errors at ``error_rate`` plus scripted ones from
+:meth:`FakeGraph.inject_error`, and per-account rate limiting. Each call on
+an account counts against ``calls_per_window``. Usage is reported in the
+``X-Business-Use-Case-Usage`` and ``X-Ad-Account-Usage`` headers, and past
+100% calls fail with Meta's throttling error (code 80004) until the window
+slides on.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+from fastapi import FastAPI, Request, Response
+
+from .synthetic import LEVELS, DailyMetrics, SyntheticGraphData, SyntheticObject, date_range
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 5000
+BATCH_LIMIT = 50
+EDGE_LEVELS = {'campaigns': 'campaign', 'adsets': 'adset', 'ads': 'ad'}
+REMOVED_STATUSES = ('ARCHIVED', 'DELETED')
+DEFAULT_INSIGHT_FIELDS = ('spend', 'impressions', 'clicks')
+SORTABLE_FIELDS = tuple(DailyMetrics.__dataclass_fields__)
+# Insights computed for recent queries, so paging through one does not recompute it
+INSIGHTS_CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    """
+    Seconds each HTTP request is held before it is answered.
+    """
+
+    kind: str = 'constant'
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def constant(cls, seconds: float) -> 'LatencyModel':
+        return cls('constant', seconds)
+
+    @classmethod
+    def uniform(cls, low: float, high: float) -> 'LatencyModel':
+        return cls('uniform', low, high)
+
+    @classmethod
+    def lognormal(cls, median: float, sigma: float) -> 'LatencyModel':
+        """
+        Long-tailed latency: half the requests take under ``median``, and
+        ``sigma`` sets how far the slow tail reaches.
+        """
+        return cls('lognormal', median, sigma)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'uniform':
+            return rng.uniform(self.a, self.b)
+        if self.kind == 'lognormal':
+            return rng.lognormvariate(math.log(self.a), self.b) if self.a > 0 else 0.0
+        return self.a
+
+
+@dataclass
+class FakeGraphConfig:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    # Share of calls failing with one of ``error_statuses``
+    error_rate: float = 0.0
+    error_statuses: Tuple[int, ...] = (500, 503)
+    # Calls per account in ``usage_window_seconds`` that make 100% usage; None for no limit
+    calls_per_window: Optional[int] = None
+    usage_window_seconds: float = 60.0
+    # Status polls before an async report run completes
+    report_polls: int = 2
+    seed: int = 0
+
+
+@dataclass
+class GraphResponse:
+    status: int
+    body: Any
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class InjectedError:
+    status: int
+    code: int
+    remaining: int
+    path: Optional[str]
+    transient: bool
+
+
+@dataclass
+class ReportRun:
+    id: str
+    node: SyntheticObject
+    params: Dict[str, str]
+    polls: int = 0
+
+
+def graph_error(status: int, code: int, message: str, subcode: Optional[int] = None, transient: bool = False) -> GraphResponse:
+    error: Dict[str, Any] = {'message': message, 'type': 'OAuthException', 'code': code, 'fbtrace_id': 'FakeGraphTrace'}
+    if subcode is not None:
+        error['error_subcode'] = subcode
+    if transient:
+        error['is_transient'] = True
+    return GraphResponse(status, {'error': error})
+
+
+class GraphRequestError(Exception):
+    def __init__(self, response: GraphResponse):
+        super().__init__(response.body['error']['message'])
+        self.response = response
+
+
+def _unsupported(path: str) -> GraphRequestError:
+    return GraphRequestError(graph_error(
+        400, 100, f"Unsupported request - method type: get, object '{path}' does not exist or cannot be loaded"
+    ))
+
+
+def _invalid(message: str) -> GraphRequestError:
+    return GraphRequestError(graph_error(400, 100, f"(#100) {message}"))
+
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode().split(':', 1)[1])
+    except (ValueError, IndexError):
+        raise _invalid("Invalid cursor")
+
+
+def _json_param(params: Dict[str, str], name: str) -> Any:
+    try:
+        return json.loads(params[name])
+    except ValueError:
+        raise _invalid(f"Param {name} must be JSON")
+
+
+class FakeGraph:
+    """
+    Graph API behaviour over synthetic data, plus call counters for assertions.
+    """
+
+    def __init__(
+        self,
+        data: Optional[SyntheticGraphData] = None,
+        config: Optional[FakeGraphConfig] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.data = data or SyntheticGraphData()
+        self.config = config or FakeGraphConfig()
+        self.clock = clock
+        self.rng = random.Random(self.config.seed)
+        # Graph calls by kind; batch entries count individually
+        self.calls: Counter = Counter()
+        self.http_requests = 0
+        self._usage: Dict[str, Deque[float]] = {}
+        self._injected: List[InjectedError] = []
+        self._reports: Dict[str, ReportRun] = {}
+        self._insights: 'OrderedDict[Tuple, List[Dict[str, Any]]]' = OrderedDict()
+        self.app = create_app(self)
+
+    @property
+    def today(self) -> date:
+        # Date presets are relative to the last day of data, as if it were today
+        return self.data.until
+
+    def client(self, **kwargs: Any) -> httpx.AsyncClient:
+        """
+        Client whose requests (to any host) are answered by this fake in-process.
+        """
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), **{'timeout': 30.0, **kwargs})
+
+    def inject_error(
+        self,
+        status: int = 500,
+        count: int = 1,
+        path: Optional[str] = None,
+        code: int = 2,
+        transient: bool = True
+    ) -> None:
+        """
+        Fail the next ``count`` calls (whose path contains ``path``, if given).
+        """
+        self._injected.append(InjectedError(status, code, count, path, transient))
+
+    def reset_stats(self) -> None:
+        self.calls.clear()
+        self.http_requests = 0
+
+    def usage_pct(self, account_id: str) -> float:
+        if not self.config.calls_per_window:
+            return 0.0
+        window = self._window(account_id)
+        return len(window) / self.config.calls_per_window * 100
+
+    def handle(self, method: str, path: str, params: Dict[str, str]) -> GraphResponse:
+        """
+        Answer one HTTP request (a batch counts as one).
+        """
+        self.http_requests += 1
+        path = path.strip('/')
+        if method == 'POST' and not path and 'batch' in params:
+            return self._batch(params)
+        return self.call(method, path, params)
+
+    def call(self, method: str, path: str, params: Dict[str, str]) -> GraphResponse:
+        """
+        Answer one Graph call, with errors and rate limiting applied.
+        """
+        if not params.get('access_token'):
+            return graph_error(400, 190, "An active access token must be used to query information about the current user.")
+
+        injected = next((e for e in self._injected if e.path is None or e.path in path), None)
+        if injected is not None:
+            injected.remaining -= 1
+            if injected.remaining <= 0:
+                self._injected.remove(injected)
+            self.calls['error'] += 1
+            return graph_error(injected.status, injected.code, "An unexpected error has occurred. Please retry your request later.",
+                               transient=injected.transient)
+        if self.config.error_rate and self.rng.random() < self.config.error_rate:
+            self.calls['error'] += 1
+            return graph_error(self.rng.choice(self.config.error_statuses), 2,
+                               "An unexpected error has occurred. Please retry your request later.", transient=True)
+
+        headers: Dict[str, str] = {}
+        account_id = self._account_of(path)
+        if account_id is not None and self.config.calls_per_window:
+            throttled = self._count_usage(account_id)
+            headers = self._usage_headers(account_id)
+            if throttled:
+                self.calls['throttled'] += 1
+                response = graph_error(400, 80004, "There have been too many calls to this ad-account. Wait a bit and try again.",
+                                       subcode=2446079, transient=True)
+                response.headers = headers
+                return response
+
+        try:
+            response = self._route(method, path, params)
+        except GraphRequestError as e:
+            response = e.response
+        response.headers.update(headers)
+        return response
+
+    # Rate limiting
+
+    def _window(self, account_id: str) -> Deque[float]:
+        window = self._usage.setdefault(account_id, deque())
+        horizon = self.clock() - self.config.usage_window_seconds
+        while window and window[0] <= horizon:
+            window.popleft()
+        return window
+
+    def _count_usage(self, account_id: str) -> bool:
+        """
+        Count a call; True if the account is over its limit (the call is refused and not counted).
+        """
+        window = self._window(account_id)
+        if len(window) >= self.config.calls_per_window:
+            return True
+        window.append(self.clock())
+        return False
+
+    def _usage_headers(self, account_id: str) -> Dict[str, str]:
+        window = self._window(account_id)
+        pct = min(100, round(self.usage_pct(account_id)))
+        regain = 0
+        if pct >= 100 and window:
+            regain = math.ceil((window[0] + self.config.usage_window_seconds - self.clock()) / 60)
+        usage = {'type': 'ads_management', 'call_count': pct, 'total_cputime': pct // 2, 'total_time': pct // 2,
+                 'estimated_time_to_regain_access': regain}
+        return {
+            'x-business-use-case-usage': json.dumps({account_id: [usage]}),
+            'x-ad-account-usage': json.dumps({'acc_id_util_pct': pct, 'reset_time_duration': int(self.config.usage_window_seconds)})
+        }
+
+    def _account_of(self, path: str) -> Optional[str]:
+        node = path.split('/', 1)[0]
+        if node in self._reports:
+            return self._reports[node].node.account_id
+        obj = self.data.get(node) if node and node != 'me' else None
+        return obj.account_id if obj else None
+
+    # Routing
+
+    def _route(self, method: str, path: str, params: Dict[str, str]) -> GraphResponse:
+        parts = path.split('/') if path else []
+        if parts == ['me', 'adaccounts'] and method == 'GET':
+            self.calls['accounts'] += 1
+            accounts = [self.data.account(account_id) for account_id in self.data.account_ids()]
+            return GraphResponse(200, self._page(path, [self._fields(a, params) for a in accounts], params))
+        if not parts or len(parts) > 2:
+            raise _unsupported(path)
+
+        node_id = parts[0]
+        report = self._reports.get(node_id)
+        if report is not None and method == 'GET':
+            self.calls['report'] += 1
+            if len(parts) == 1:
+                return GraphResponse(200, self._report_status(report))
+            if parts[1] == 'insights':
+                if report.polls < self.config.report_polls:
+                    raise _invalid("Report is not ready yet")
+                return GraphResponse(200, self._page(path, self._insight_rows(report.node, report.params), params))
+            raise _unsupported(path)
+
+        node = self.data.get(node_id)
+        if node is None:
+            raise _unsupported(path)
+        if len(parts) == 1 and method == 'GET':
+            self.calls['node'] += 1
+            return GraphResponse(200, self._fields(node, params))
+        edge = parts[1]
+        if edge == 'insights':
+            if method == 'POST':
+                self.calls['report'] += 1
+                return GraphResponse(200, {'report_run_id': self._start_report(node, params)})
+            self.calls['insights'] += 1
+            return GraphResponse(200, self._page(path, self._insight_rows(node, params), params))
+        if edge in EDGE_LEVELS and method == 'GET':
+            self.calls['edge'] += 1
+            objects = self._filter(self._descendants(node, EDGE_LEVELS[edge]), params)
+            return GraphResponse(200, self._page(path, [self._fields(obj, params) for obj in objects], params))
+        raise _unsupported(path)
+
+    def _batch(self, params: Dict[str, str]) -> GraphResponse:
+        entries = _json_param(params, 'batch') if 'batch' in params else []
+        if not isinstance(entries, list) or len(entries) > BATCH_LIMIT:
+            return graph_error(400, 100, f"(#100) Too many requests in batch message. Maximum batch size is {BATCH_LIMIT}")
+        self.calls['batch'] += 1
+        results = []
+        usage: Dict[str, Any] = {}
+        for entry in entries:
+            path, _, query = entry.get('relative_url', '').partition('?')
+            entry_params = {'access_token': params.get('access_token', ''), **dict(parse_qsl(query))}
+            entry_params.update(parse_qsl(entry.get('body', '')))
+            response = self.call(entry.get('method', 'GET').upper(), path.strip('/'), entry_params)
+            usage.update(json.loads(response.headers.get('x-business-use-case-usage', '{}')))
+            results.append({
+                'code': response.status,
+                'headers': [{'name': name, 'value': value} for name, value in response.headers.items()],
+                'body': json.dumps(response.body)
+            })
+        return GraphResponse(200, results, {'x-business-use-case-usage': json.dumps(usage)} if usage else {})
+
+    # Objects and edges
+
+    @staticmethod
+    def _fields(obj: SyntheticObject, params: Dict[str, str]) -> Dict[str, Any]:
+        values = obj.graph_fields()
+        wanted = [name for name in params.get('fields', '').split(',') if name]
+        if not wanted:
+            return {'id': values['id'], 'name': values['name']}
+        return {'id': values['id'], **{name: values[name] for name in wanted if name in values}}
+
+    def _descendants(self, node: SyntheticObject, level: str) -> List[SyntheticObject]:
+        if LEVELS.index(level) < LEVELS.index(node.level):
+            raise _invalid(f"Cannot request {level} objects under a {node.level}")
+        objects = [node]
+        while objects and objects[0].level != level:
+            if objects[0].level == 'account':
+                objects = list(self.data.objects(node.account_id, 'campaign'))
+            else:
+                objects = [child for obj in objects for child in self.data.children(obj.id)]
+        return objects
+
+    def _filter(self, objects: List[SyntheticObject], params: Dict[str, str]) -> List[SyntheticObject]:
+        rules = list(_json_param(params, 'filtering')) if 'filtering' in params else []
+        if 'effective_status' in params:
+            rules.append({'field': 'effective_status', 'operator': 'IN', 'value': _json_param(params, 'effective_status')})
+        if not any(rule.get('field') == 'effective_status' for rule in rules):
+            rules.append({'field': 'effective_status', 'operator': 'NOT_IN', 'value': list(REMOVED_STATUSES)})
+        return [obj for obj in objects if all(self._matches(obj, rule) for rule in rules)]
+
+    @staticmethod
+    def _matches(obj: SyntheticObject, rule: Dict[str, Any]) -> bool:
+        name, operator, expected = rule.get('field'), rule.get('operator'), rule.get('value')
+        if name in ('updated_time', 'created_time'):
+            value: Any = getattr(obj, name).timestamp()
+            expected = float(expected)
+        else:
+            value = obj.graph_fields().get(name)
+        if operator == 'IN':
+            return value in expected
+        if operator == 'NOT_IN':
+            return value not in expected
+        if operator == 'EQUAL':
+            return value == expected
+        if operator == 'NOT_EQUAL':
+            return value != expected
+        if operator == 'GREATER_THAN':
+            return value is not None and value > expected
+        if operator == 'LESS_THAN':
+            return value is not None and value < expected
+        if operator == 'CONTAIN':
+            return str(expected).lower() in str(value or '').lower()
+        raise _invalid(f"Unsupported filtering operator {operator}")
+
+    def _page(self, path: str, rows: List[Dict[str, Any]], params: Dict[str, str]) -> Dict[str, Any]:
+        limit = min(int(params.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        offset = _decode_cursor(params['after']) if params.get('after') else 0
+        page = rows[offset:offset + limit]
+        body: Dict[str, Any] = {'data': page}
+        if page:
+            paging: Dict[str, Any] = {'cursors': {'before': _encode_cursor(offset), 'after': _encode_cursor(offset + len(page))}}
+            if offset + len(page) < len(rows):
+                query = {k: v for k, v in params.items() if k != 'access_token'}
+                query['after'] = _encode_cursor(offset + len(page))
+                paging['next'] = f"https://graph.facebook.com/v19.0/{path}?{urlencode(query)}"
+            body['paging'] = paging
+        if 'total_count' in params.get('summary', ''):
+            body['summary'] = {'total_count': len(rows)}
+        return body
+
+    # Insights
+
+    def _time_range(self, params: Dict[str, str]) -> Tuple[date, date]:
+        if 'time_range' in params:
+            window = _json_param(params, 'time_range')
+            try:
+                return date.fromisoformat(window['since']), date.fromisoformat(window['until'])
+            except (KeyError, TypeError, ValueError):
+                raise _invalid("time_range needs since and until dates")
+        preset = params.get('date_preset', 'last_30d')
+        today = self.today
+        yesterday = today - timedelta(days=1)
+        if preset == 'today':
+            return today, today
+        if preset == 'yesterday':
+            return yesterday, yesterday
+        if preset.startswith('last_') and preset.endswith('d') and preset[5:-1].isdigit():
+            return today - timedelta(days=int(preset[5:-1])), yesterday
+        if preset == 'this_month':
+            return today.replace(day=1), today
+        if preset == 'last_month':
+            end = today.replace(day=1) - timedelta(days=1)
+            return end.replace(day=1), end
+        if preset == 'this_year':
+            return today.replace(month=1, day=1), today
+        if preset in ('maximum', 'lifetime'):
+            return self.data.since, yesterday
+        raise _invalid(f"date_preset must be one of the supported presets, not {preset}")
+
+    @staticmethod
+    def _buckets(since: date, until: date, increment: str) -> List[Tuple[date, date]]:
+        if increment in ('', 'all_days'):
+            return [(since, until)]
+        if increment == 'monthly':
+            buckets = []
+            start = since
+            while start <= until:
+                next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+                buckets.append((start, min(until, next_month - timedelta(days=1))))
+                start = next_month
+            return buckets
+        if not increment.isdigit() or not 1 <= int(increment) <= 90:
+            raise _invalid("time_increment must be all_days, monthly or a number of days from 1 to 90")
+        step = int(increment)
+        return [(day, min(until, day + timedelta(days=step - 1))) for day in list(date_range(since, until))[::step]]
+
+    def _insight_rows(self, node: SyntheticObject, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        key = (node.id, *sorted((k, v) for k, v in params.items() if k not in ('access_token', 'after', 'limit')))
+        rows = self._insights.get(key)
+        if rows is not None:
+            self._insights.move_to_end(key)
+            return rows
+
+        level = params.get('level') or node.level
+        if level not in LEVELS:
+            raise _invalid(f"level must be one of {', '.join(LEVELS)}")
+        since, until = self._time_range(params)
+        fields = tuple(name for name in params.get('fields', '').split(',') if name) or DEFAULT_INSIGHT_FIELDS
+        buckets = self._buckets(since, until, str(params.get('time_increment', 'all_days')))
+
+        keyed = []
+        for obj in self._descendants(node, level):
+            for start, end in buckets:
+                metrics = self.data.metrics(obj, start, end)
+                # Graph leaves out rows without delivery
+                if metrics.impressions or metrics.spend:
+                    keyed.append((metrics, self.data.insight_row(obj, start, end, fields, metrics)))
+        sort = params.get('sort', '')
+        if sort:
+            name, _, direction = sort.rpartition('_')
+            if name not in SORTABLE_FIELDS or direction not in ('ascending', 'descending'):
+                raise _invalid(f"Cannot sort by {sort}")
+            keyed.sort(key=lambda item: getattr(item[0], name), reverse=direction == 'descending')
+        rows = [row for _, row in keyed]
+
+        self._insights[key] = rows
+        if len(self._insights) > INSIGHTS_CACHE_SIZE:
+            self._insights.popitem(last=False)
+        return rows
+
+    def _start_report(self, node: SyntheticObject, params: Dict[str, str]) -> str:
+        self._time_range(params)
+        run_id = f"6{len(self._reports) + 1:014d}"
+        self._reports[run_id] = ReportRun(run_id, node, {k: v for k, v in params.items() if k != 'access_token'})
+        return run_id
+
+    def _report_status(self, report: ReportRun) -> Dict[str, Any]:
+        report.polls += 1
+        needed = max(1, self.config.report_polls)
+        done = report.polls >= needed
+        return {
+            'id': report.id,
+            'account_id': report.node.account_id,
+            'async_status': 'Job Completed' if done else ('Job Running' if report.polls > 1 else 'Job Not Started'),
+            'async_percent_completion': 100 if done else int(report.polls / needed * 100),
+            'time_ref': int(datetime.now(timezone.utc).timestamp())
+        }
+
+
+def create_app(graph: FakeGraph) -> FastAPI:
+    """
+    ASGI app serving ``graph`` under any version prefix, e.g. ``/v19.0/act_1/insights``.
+    """
+    app = FastAPI(title="Fake Meta Graph API", docs_url=None, redoc_url=None, openapi_url=None)
+    app.state.graph = graph
+
+    @app.api_route("/{version}/{path:path}", methods=["GET", "POST"])
+    async def graph_request(version: str, path: str, request: Request) -> Response:
+        params = dict(request.query_params)
+        if request.method == "POST":
+            params.update(parse_qsl((await request.body()).decode()))
+        delay = graph.config.latency.sample(graph.rng)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = graph.handle(request.method, path, params)
+        return Response(json.dumps(response.body), status_code=response.status,
+                        headers=response.headers, media_type="application/json")
+
+    return app
+
+
+@contextmanager
+def serve_in_thread(graph: FakeGraph, host: str = "127.0.0.1", port: int = 0) -> Iterator[str]:
+    """
+    Serve ``graph`` over HTTP from a background thread; yields the versioned
+    base URL to use as ``META_GRAPH_API_URL``.
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(graph.app, host=host, port=port, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, name="fake-graph", daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("Fake Graph server failed to start")
+            time.sleep(0.01)
+        bound = server.servers[0].sockets[0].getsockname()[1]
+        yield f"http://{host}:{bound}/v19.0"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve a fake Meta Graph API over synthetic data")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--campaigns", type=int, default=50)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="median latency of a lognormal distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--calls-per-minute", type=int, default=None)
+    args = parser.parse_args()
+
+    graph = FakeGraph(
+        SyntheticGraphData(accounts=args.accounts, campaigns=args.campaigns, days=args.days, seed=args.seed),
+        FakeGraphConfig(
+            latency=LatencyModel.lognormal(args.latency_ms / 1000, 0.5) if args.latency_ms else LatencyModel(),
+            error_rate=args.error_rate,
+            calls_per_window=args.calls_per_minute,
+            seed=args.seed
+        )
+    )
+    uvicorn.run(graph.app, host="127.0.0.1", port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
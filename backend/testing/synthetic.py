@@ -0,0 +1,517 @@
+"""
+Deterministic synthetic Meta ad data.
+
+Every object and every daily metric is derived from the seed and the
+object's id, so two runs (or two processes) with the same parameters see the
+same accounts. Nothing is stored up front: an account's hierarchy is built
+the first time it is asked for, and daily metrics are computed per request,
+so a dataset of thousands of campaigns over years of history costs no memory
+until it is read.
+
+Metrics are generated per campaign and day and split down the hierarchy by
+fixed per-object weights, so ad set and ad rows add up (up to rounding) to
+their campaign, and campaigns to their account. A campaign's day follows its
+objective's funnel (CPM, CTR, conversion rate, order value), month and
+weekday seasonality with a Black Friday to Cyber Monday peak, yearly CPM
+inflation, a learning-phase ramp after launch and budget changes every few
+weeks. ``size_spread`` makes account and campaign sizes heavy-tailed, as in
+real agencies where a few accounts hold most of the campaigns.
+
+For scale tests, :meth:`SyntheticGraphData.iter_daily` streams an account's
+daily rows without going through the caches, and :meth:`release` drops an
+account's hierarchy once it has been written out, so generating tens of
+millions of rows runs in the memory of one account.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+LEVELS = ('account', 'campaign', 'adset', 'ad')
+OBJECTIVES = ('OUTCOME_SALES', 'OUTCOME_TRAFFIC', 'OUTCOME_LEADS', 'OUTCOME_AWARENESS', 'OUTCOME_ENGAGEMENT')
+OBJECTIVE_WEIGHTS = (0.45, 0.2, 0.15, 0.1, 0.1)
+# Rough share of campaigns in each effective status
+STATUS_WEIGHTS = (('ACTIVE', 0.55), ('PAUSED', 0.3), ('ARCHIVED', 0.1), ('DELETED', 0.05))
+# Spend by weekday, Monday first
+WEEKDAY_FACTORS = (1.0, 1.02, 1.03, 1.0, 0.97, 0.9, 0.88)
+# Spend by month, January first; CPMs rise with Q4 demand
+MONTH_FACTORS = (0.85, 0.85, 0.95, 0.95, 1.0, 0.95, 0.9, 0.95, 1.0, 1.05, 1.3, 1.25)
+Q4_CPM_FACTOR = 1.25
+# Black Friday to Cyber Monday
+PEAK_SPEND_FACTOR = 1.6
+PEAK_CPM_FACTOR = 1.4
+# CPMs grow year over year, measured from a fixed date so history is stable
+CPM_GROWTH_PER_YEAR = 0.08
+CPM_REFERENCE_DATE = date(2024, 1, 1)
+# New campaigns ramp up spend and convert worse until delivery has learned
+LEARNING_DAYS = 7
+LEARNING_CVR_FACTOR = 0.6
+# Budgets are revised this often; Meta may overspend a daily budget by up to 25%
+BUDGET_PERIOD_DAYS = 28
+MAX_PACING = 1.25
+# Object ids are "23" + 4-digit account index + 6-digit campaign + 3-digit ad set + 3-digit ad
+MAX_ACCOUNTS = 10000
+MAX_CAMPAIGNS = 999999
+MAX_CHILDREN = 999
+
+
+@dataclass(frozen=True, slots=True)
+class Funnel:
+    # Median CPM in account currency
+    cpm: float
+    # Clicks per impression
+    ctr: Tuple[float, float]
+    # Conversions per click
+    cvr: Tuple[float, float]
+    # Median value of a conversion; 0 for conversions without purchase value
+    order_value: float
+    # Thruplays per impression
+    thruplay_rate: float
+
+
+FUNNELS: Dict[str, Funnel] = {
+    'OUTCOME_SALES': Funnel(11.0, (0.008, 0.02), (0.015, 0.05), 65.0, 0.01),
+    'OUTCOME_TRAFFIC': Funnel(6.5, (0.012, 0.035), (0.003, 0.012), 40.0, 0.01),
+    'OUTCOME_LEADS': Funnel(9.0, (0.007, 0.018), (0.05, 0.15), 0.0, 0.01),
+    'OUTCOME_AWARENESS': Funnel(3.5, (0.002, 0.008), (0.0, 0.003), 0.0, 0.04),
+    'OUTCOME_ENGAGEMENT': Funnel(5.0, (0.005, 0.015), (0.0, 0.005), 0.0, 0.06),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class SyntheticObject:
+    id: str
+    level: str
+    name: str
+    account_id: str
+    parent_id: Optional[str]
+    status: str
+    effective_status: str
+    created_time: datetime
+    updated_time: datetime
+    objective: Optional[str] = None
+    # Minor currency units, as Meta reports budgets
+    daily_budget: Optional[int] = None
+    # Share of the parent's daily metrics
+    weight: float = 1.0
+
+    def graph_fields(self) -> Dict[str, object]:
+        """
+        Every field Graph could return for the object, as Graph formats it.
+        """
+        values: Dict[str, object] = {
+            'id': f"act_{self.id}" if self.level == 'account' else self.id,
+            'name': self.name,
+            'created_time': graph_time(self.created_time),
+            'updated_time': graph_time(self.updated_time),
+        }
+        if self.level == 'account':
+            values.update({'account_id': self.id, 'account_status': 1})
+            return values
+        values.update({'status': self.status, 'effective_status': self.effective_status, 'account_id': self.account_id})
+        if self.level == 'campaign':
+            values.update({'objective': self.objective, 'buying_type': 'AUCTION', 'bid_strategy': 'LOWEST_COST_WITHOUT_CAP'})
+        elif self.level == 'adset':
+            values.update({'campaign_id': self.parent_id, 'billing_event': 'IMPRESSIONS', 'optimization_goal': 'OFFSITE_CONVERSIONS'})
+        else:
+            values.update({'adset_id': self.parent_id, 'creative': {'id': f"9{self.id}"}})
+        if self.daily_budget is not None:
+            values['daily_budget'] = str(self.daily_budget)
+            values['budget_remaining'] = str(self.daily_budget // 2)
+        return values
+
+
+@dataclass(slots=True)
+class DailyMetrics:
+    spend: float = 0.0
+    impressions: int = 0
+    clicks: int = 0
+    reach: int = 0
+    conversions: int = 0
+    purchase_value: float = 0.0
+    thruplays: int = 0
+
+    def __add__(self, other: 'DailyMetrics') -> 'DailyMetrics':
+        return DailyMetrics(
+            self.spend + other.spend,
+            self.impressions + other.impressions,
+            self.clicks + other.clicks,
+            self.reach + other.reach,
+            self.conversions + other.conversions,
+            self.purchase_value + other.purchase_value,
+            self.thruplays + other.thruplays
+        )
+
+    def scaled(self, weight: float) -> 'DailyMetrics':
+        return DailyMetrics(
+            round(self.spend * weight, 2),
+            round(self.impressions * weight),
+            round(self.clicks * weight),
+            round(self.reach * weight),
+            round(self.conversions * weight),
+            round(self.purchase_value * weight, 2),
+            round(self.thruplays * weight)
+        )
+
+
+def graph_time(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%S+0000')
+
+
+def _rng(*parts: object) -> random.Random:
+    return random.Random(':'.join(str(part) for part in parts))
+
+
+def _weights(rng: random.Random, count: int) -> List[float]:
+    raw = [rng.lognormvariate(0.0, 0.6) for _ in range(count)]
+    total = sum(raw)
+    return [value / total for value in raw]
+
+
+def _spread(rng: random.Random, mean: int, sigma: float, cap: int) -> int:
+    """
+    A count drawn from a lognormal with mean ``mean``, at most ``cap``;
+    ``mean`` itself when ``sigma`` is 0.
+    """
+    if not sigma:
+        return mean
+    return max(1, min(cap, round(mean * rng.lognormvariate(-sigma * sigma / 2, sigma))))
+
+
+@lru_cache(maxsize=16)
+def _peak_days(year: int) -> Tuple[date, date]:
+    # Black Friday follows the fourth Thursday of November
+    first = date(year, 11, 1)
+    thanksgiving = first + timedelta(days=(3 - first.weekday()) % 7 + 21)
+    return thanksgiving + timedelta(days=1), thanksgiving + timedelta(days=4)
+
+
+def _is_peak(day: date) -> bool:
+    start, end = _peak_days(day.year)
+    return start <= day <= end
+
+
+@lru_cache(maxsize=4096)
+def _budget_factor(seed: int, campaign_id: str, period: int) -> float:
+    return _rng(seed, campaign_id, 'budget', period).lognormvariate(0.0, 0.25) if period else 1.0
+
+
+def campaign_metrics(seed: int, campaign: 'SyntheticObject', day: date) -> Optional['DailyMetrics']:
+    """
+    What ``campaign`` delivered on ``day``, or None on days it did not run
+    (before launch, or after it was stopped).
+    """
+    created = campaign.created_time.date()
+    if day < created:
+        return None
+    # Stopped campaigns stop spending at their last update
+    if campaign.effective_status != 'ACTIVE' and day > campaign.updated_time.date():
+        return None
+
+    age = (day - created).days
+    funnel = FUNNELS.get(campaign.objective, FUNNELS['OUTCOME_SALES'])
+    rng = _rng(seed, campaign.id, day.isoformat())
+    learning = age < LEARNING_DAYS
+    peak = _is_peak(day)
+
+    budget = campaign.daily_budget / 100 * _budget_factor(seed, campaign.id, age // BUDGET_PERIOD_DAYS)
+    pacing = min(MAX_PACING, rng.lognormvariate(-0.2, 0.2))
+    if learning:
+        pacing *= (age + 1) / LEARNING_DAYS
+    spend = budget * pacing * WEEKDAY_FACTORS[day.weekday()] * MONTH_FACTORS[day.month - 1] * (PEAK_SPEND_FACTOR if peak else 1.0)
+
+    cpm = funnel.cpm * rng.lognormvariate(0.0, 0.25) * (1 + CPM_GROWTH_PER_YEAR) ** ((day - CPM_REFERENCE_DATE).days / 365.25)
+    if day.month >= 10:
+        cpm *= Q4_CPM_FACTOR
+    if peak:
+        cpm *= PEAK_CPM_FACTOR
+    impressions = int(spend / cpm * 1000)
+    clicks = int(impressions * rng.uniform(*funnel.ctr))
+    conversions = int(clicks * rng.uniform(*funnel.cvr) * (LEARNING_CVR_FACTOR if learning else 1.0))
+    purchase_value = conversions * funnel.order_value * rng.lognormvariate(0.0, 0.4) if funnel.order_value else 0.0
+    return DailyMetrics(
+        round(spend, 2),
+        impressions,
+        clicks,
+        # Daily frequency of 1.1 to ~3
+        int(impressions / (1 + rng.lognormvariate(-0.8, 0.5))),
+        conversions,
+        round(purchase_value, 2),
+        int(impressions * funnel.thruplay_rate * rng.uniform(0.5, 1.5))
+    )
+
+
+@dataclass
+class SyntheticGraphData:
+    """
+    ``accounts`` ad accounts, each with ``campaigns`` campaigns of
+    ``adsets_per_campaign`` ad sets of ``ads_per_adset`` ads, and daily
+    metrics for the ``days`` days up to ``until``.
+
+    With ``size_spread`` above 0 those counts are means: each account's
+    campaign count and each campaign's ad set and ad counts are drawn from a
+    lognormal with that sigma (around 1 gives agency-like skew).
+    """
+
+    accounts: int = 1
+    campaigns: int = 20
+    adsets_per_campaign: int = 3
+    ads_per_adset: int = 2
+    days: int = 365
+    until: date = field(default_factory=date.today)
+    seed: int = 0
+    currency: str = 'USD'
+    size_spread: float = 0.0
+
+    def __post_init__(self):
+        if not 0 < self.accounts <= MAX_ACCOUNTS:
+            raise ValueError(f"accounts must be between 1 and {MAX_ACCOUNTS}")
+        self._hierarchies: Dict[str, Dict[str, List[SyntheticObject]]] = {}
+        self._objects: Dict[str, SyntheticObject] = {}
+        self._children: Dict[str, List[SyntheticObject]] = {}
+        self.campaign_day = lru_cache(maxsize=65536)(self._campaign_day)
+        self.account_day = lru_cache(maxsize=16384)(self._account_day)
+
+    @property
+    def since(self) -> date:
+        return self.until - timedelta(days=self.days - 1)
+
+    @property
+    def _first_account(self) -> int:
+        return 100000000 + self.seed * 10000
+
+    def account_ids(self) -> List[str]:
+        return [str(self._first_account + index) for index in range(self.accounts)]
+
+    def has_account(self, account_id: str) -> bool:
+        return account_id.isdigit() and 0 <= int(account_id) - self._first_account < self.accounts
+
+    def account(self, account_id: str) -> Optional[SyntheticObject]:
+        if not self.has_account(account_id):
+            return None
+        return self._hierarchy(account_id)['account'][0]
+
+    def objects(self, account_id: str, level: str) -> List[SyntheticObject]:
+        """
+        Every object of ``level`` in an account, parents' order first.
+        """
+        if not self.has_account(account_id):
+            return []
+        return self._hierarchy(account_id)[level]
+
+    def get(self, object_id: str) -> Optional[SyntheticObject]:
+        """
+        Object by Meta id (accounts with or without ``act_``).
+        """
+        if object_id.startswith('act_'):
+            return self.account(object_id[4:])
+        if object_id in self._objects:
+            return self._objects[object_id]
+        account_id = self._account_of(object_id)
+        if account_id is None:
+            return None
+        self._hierarchy(account_id)
+        return self._objects.get(object_id)
+
+    def children(self, object_id: str) -> List[SyntheticObject]:
+        obj = self.get(object_id)
+        return self._children.get(obj.id, []) if obj else []
+
+    def campaign_count(self, account_id: str) -> int:
+        """
+        How many campaigns an account has, without building its hierarchy.
+        """
+        index = int(account_id) - self._first_account
+        return _spread(_rng(self.seed, 'size', index), self.campaigns, self.size_spread, MAX_CAMPAIGNS)
+
+    def release(self, account_id: str) -> None:
+        """
+        Forget an account's hierarchy; it is rebuilt, identically, when next asked for.
+        """
+        hierarchy = self._hierarchies.pop(account_id, None)
+        if hierarchy is None:
+            return
+        for objects in hierarchy.values():
+            for obj in objects:
+                self._objects.pop(obj.id, None)
+                self._children.pop(obj.id, None)
+
+    def _account_of(self, object_id: str) -> Optional[str]:
+        # Object ids embed their account's index after the "23" prefix
+        if not object_id.startswith('23') or len(object_id) < 12 or not object_id.isdigit():
+            return None
+        account_id = str(self._first_account + int(object_id[2:6]))
+        return account_id if self.has_account(account_id) else None
+
+    def _hierarchy(self, account_id: str) -> Dict[str, List[SyntheticObject]]:
+        hierarchy = self._hierarchies.get(account_id)
+        if hierarchy is not None:
+            return hierarchy
+
+        index = int(account_id) - self._first_account
+        opened = datetime.combine(self.since, time(9), tzinfo=timezone.utc) - timedelta(days=30)
+        account = SyntheticObject(
+            account_id, 'account', f"Synthetic Account {index + 1}", account_id, None,
+            'ACTIVE', 'ACTIVE', opened, opened
+        )
+        hierarchy = {'account': [account], 'campaign': [], 'adset': [], 'ad': []}
+        self._children[account_id] = hierarchy['campaign']
+        window = max(1, (self.until - self.since).days)
+
+        for c in range(self.campaign_count(account_id)):
+            campaign_id = f"23{index:04d}{c:06d}"
+            rng = _rng(self.seed, campaign_id)
+            created = opened + timedelta(days=rng.randrange(window), minutes=rng.randrange(1440))
+            updated = created + timedelta(days=rng.randrange(max(1, (self.until - created.date()).days + 1)))
+            status = rng.choices([s for s, _ in STATUS_WEIGHTS], [w for _, w in STATUS_WEIGHTS])[0]
+            campaign = SyntheticObject(
+                campaign_id, 'campaign', f"Campaign {c + 1}", account_id, account_id,
+                status, status, created, updated,
+                objective=rng.choices(OBJECTIVES, OBJECTIVE_WEIGHTS)[0],
+                daily_budget=int(rng.lognormvariate(8.5, 0.8)) // 100 * 100 or 1000
+            )
+            hierarchy['campaign'].append(campaign)
+            adsets = self._children[campaign_id] = []
+            adset_count = _spread(rng, self.adsets_per_campaign, self.size_spread, MAX_CHILDREN)
+            for s, adset_weight in enumerate(_weights(rng, adset_count)):
+                adset_id = f"{campaign_id}{s:03d}"
+                adset = SyntheticObject(
+                    adset_id, 'adset', f"Campaign {c + 1} / Ad Set {s + 1}", account_id, campaign_id,
+                    campaign.status, campaign.effective_status, created, updated, weight=adset_weight
+                )
+                adsets.append(adset)
+                ads = self._children[adset_id] = []
+                ad_count = _spread(rng, self.ads_per_adset, self.size_spread, MAX_CHILDREN)
+                for a, ad_weight in enumerate(_weights(rng, ad_count)):
+                    ads.append(SyntheticObject(
+                        f"{adset_id}{a:03d}", 'ad', f"Campaign {c + 1} / Ad {s + 1}.{a + 1}", account_id, adset_id,
+                        campaign.status, campaign.effective_status, created, updated, weight=ad_weight
+                    ))
+                hierarchy['ad'].extend(ads)
+            hierarchy['adset'].extend(adsets)
+
+        for objects in hierarchy.values():
+            for obj in objects:
+                self._objects[obj.id] = obj
+        self._hierarchies[account_id] = hierarchy
+        return hierarchy
+
+    def _campaign_day(self, campaign_id: str, day: date) -> DailyMetrics:
+        campaign = self.get(campaign_id)
+        if campaign is None or not self.since <= day <= self.until:
+            return DailyMetrics()
+        return campaign_metrics(self.seed, campaign, day) or DailyMetrics()
+
+    def _account_day(self, account_id: str, day: date) -> DailyMetrics:
+        total = DailyMetrics()
+        for campaign in self.objects(account_id, 'campaign'):
+            total = total + self.campaign_day(campaign.id, day)
+        return total
+
+    def daily(self, obj: SyntheticObject, day: date) -> DailyMetrics:
+        """
+        An object's metrics for one day.
+        """
+        if obj.level == 'account':
+            return self.account_day(obj.id, day)
+        if obj.level == 'campaign':
+            return self.campaign_day(obj.id, day)
+        if obj.level == 'adset':
+            return self.campaign_day(obj.parent_id, day).scaled(obj.weight)
+        adset = self.get(obj.parent_id)
+        return self.campaign_day(adset.parent_id, day).scaled(adset.weight * obj.weight)
+
+    def iter_daily(
+        self,
+        account_id: str,
+        levels: Iterable[str] = ('campaign',),
+        since: Optional[date] = None,
+        until: Optional[date] = None
+    ) -> Iterator[Tuple[SyntheticObject, date, DailyMetrics]]:
+        """
+        ``(object, day, metrics)`` for every day an account's objects at
+        ``levels`` (``campaign``, ``adset``, ``ad``) delivered, campaign by
+        campaign. Days without delivery are left out, as Graph leaves them
+        out of insights. Values equal :meth:`daily`'s, but nothing is cached.
+        """
+        levels = frozenset(levels)
+        unknown = levels - {'campaign', 'adset', 'ad'}
+        if unknown:
+            raise ValueError(f"Unsupported levels: {sorted(unknown)}")
+        since = max(since or self.since, self.since)
+        until = min(until or self.until, self.until)
+
+        for campaign in self.objects(account_id, 'campaign'):
+            adsets = self._children[campaign.id]
+            ads = [(adset, self._children[adset.id]) for adset in adsets]
+            last = until if campaign.effective_status == 'ACTIVE' else min(until, campaign.updated_time.date())
+            for day in date_range(max(since, campaign.created_time.date()), last):
+                m = campaign_metrics(self.seed, campaign, day)
+                if m is None:
+                    continue
+                if 'campaign' in levels:
+                    yield campaign, day, m
+                for adset, children in ads:
+                    if 'adset' in levels:
+                        yield adset, day, m.scaled(adset.weight)
+                    if 'ad' in levels:
+                        for ad in children:
+                            yield ad, day, m.scaled(adset.weight * ad.weight)
+
+    def metrics(self, obj: SyntheticObject, since: date, until: date) -> DailyMetrics:
+        total = DailyMetrics()
+        for day in date_range(since, until):
+            total = total + self.daily(obj, day)
+        return total
+
+    def insight_row(
+        self,
+        obj: SyntheticObject,
+        since: date,
+        until: date,
+        fields: Tuple[str, ...],
+        metrics: Optional[DailyMetrics] = None
+    ) -> Dict[str, object]:
+        """
+        A Graph insights row for ``obj`` over ``since..until``, limited to
+        ``fields``: numbers as strings, actions as action lists, ids and
+        names of the object and its parents.
+        """
+        m = metrics if metrics is not None else self.metrics(obj, since, until)
+        values: Dict[str, object] = {}
+        node: Optional[SyntheticObject] = obj
+        while node is not None:
+            values[f"{node.level}_id"] = node.id
+            values[f"{node.level}_name"] = node.name
+            node = self.get(node.parent_id) if node.level != 'account' else None
+        purchases = [{'action_type': 'offsite_conversion.fb_pixel_purchase', 'value': str(m.conversions)}]
+        values.update({
+            'account_currency': self.currency,
+            'spend': f"{m.spend:.2f}",
+            'impressions': str(m.impressions),
+            'clicks': str(m.clicks),
+            'reach': str(m.reach),
+            'frequency': f"{m.impressions / m.reach:.6f}" if m.reach else "0",
+            'ctr': f"{m.clicks / m.impressions * 100:.6f}" if m.impressions else "0",
+            'cpc': f"{m.spend / m.clicks:.6f}" if m.clicks else "0",
+            'cpm': f"{m.spend / m.impressions * 1000:.6f}" if m.impressions else "0",
+            'cpp': f"{m.spend / m.reach * 1000:.6f}" if m.reach else "0",
+            'conversions': purchases,
+            'actions': [{'action_type': 'link_click', 'value': str(m.clicks)}, *purchases],
+            'action_values': [{'action_type': 'omni_purchase', 'value': f"{m.purchase_value:.2f}"}],
+            'purchase_roas': [{'action_type': 'omni_purchase', 'value': f"{m.purchase_value / m.spend:.6f}"}] if m.spend else [],
+            'video_thruplay_watched_actions': [{'action_type': 'video_view', 'value': str(m.thruplays)}],
+        })
+        row = {name: values[name] for name in fields if name in values}
+        row['date_start'] = since.isoformat()
+        row['date_stop'] = until.isoformat()
+        return row
+
+
+def date_range(since: date, until: date) -> Iterator[date]:
+    day = since
+    while day <= until:
+        yield day
+        day += timedelta(days=1)
@@ -37,6 +37,28 @@ def pytest_addoption(parser):
         default=False,
         help="run benchmark tests"
     )
+    parser.addoption(
+        "--bench-concurrency",
+        default="1,8",
+        help="comma-separated client concurrency levels for API load benchmarks"
+    )
+    parser.addoption(
+        "--bench-requests",
+        type=int,
+        default=200,
+        help="measured requests per API load benchmark scenario"
+    )
+    parser.addoption(
+        "--bench-upstream-ms",
+        type=float,
+        default=25.0,
+        help="median latency of the fake Graph API in API load benchmarks"
+    )
+    parser.addoption(
+        "--bench-results",
+        default="benchmark-results.json",
+        help="where API load benchmarks write their JSON results"
+    )
 
 def pytest_collection_modifyitems(config, items):
     """Modify test collection based on command line options"""
@@ -64,4 +86,11 @@ def test_environment():
     yield
     # Cleanup
     for key in ["TESTING", "META_APP_ID", "META_APP_SECRET", "DATABASE_URL"]:
-        os.environ.pop(key, None)
\ No newline at end of file
+        os.environ.pop(key, None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_circuit_breakers(monkeypatch):
+    """Give every test closed upstream circuits"""
+    from services import resilience
+    monkeypatch.setattr(resilience, "breakers", {})
@@ -0,0 +1,174 @@
+"""
+Test suite for admission control
+"""
+
+import asyncio
+import base64
+import json
+
+import httpx
+from fastapi import FastAPI
+
+from services.admission import AdmissionController, AdmissionMiddleware, SlotLimiter, token_key_from_scope
+
+
+def bearer(sub, **claims):
+    payload = base64.urlsafe_b64encode(json.dumps({"sub": sub, **claims}).encode()).rstrip(b"=").decode()
+    return f"Bearer header.{payload}.signature"
+
+
+def make_app(controller, release):
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    @app.get("/slow")
+    async def slow():
+        await release.wait()
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    return app
+
+
+class TestSlotLimiter:
+    """Test slot hand-off and bounded waiting"""
+
+    def test_freed_slot_goes_to_first_waiter(self):
+        limiter = SlotLimiter(1)
+
+        async def run():
+            assert limiter.try_acquire()
+            first = asyncio.create_task(limiter.acquire(1.0))
+            await asyncio.sleep(0)
+            limiter.release()
+            # A newcomer cannot jump the queue while the hand-off is pending
+            newcomer = limiter.try_acquire()
+            return await first, newcomer
+
+        assert asyncio.run(run()) == (True, False)
+        assert limiter.active == 1
+        assert not limiter.waiters
+
+    def test_wait_times_out(self):
+        limiter = SlotLimiter(1)
+
+        async def run():
+            limiter.try_acquire()
+            return await limiter.acquire(0.01)
+
+        assert asyncio.run(run()) is False
+        assert not limiter.waiters
+
+
+class TestAdmissionController:
+    """Test per-user and per-agency limits"""
+
+    def test_user_queue_full_rejects_immediately(self):
+        controller = AdmissionController(per_user=1, max_queue=0, max_wait=5.0)
+
+        async def run():
+            first = await controller.admit(controller.tenant_keys("u1"))
+            second = await controller.admit(controller.tenant_keys("u1"))
+            other = await controller.admit(controller.tenant_keys("u2"))
+            return first, second, other
+
+        first, second, other = asyncio.run(run())
+
+        assert first.granted and other.granted
+        assert second.rejected_by == "user"
+        assert second.retry_after >= 1
+
+    def test_agency_limit_shared_across_users(self):
+        controller = AdmissionController(per_user=5, per_agency=2, max_queue=0)
+        for user in ("u1", "u2", "u3"):
+            controller.assign_agency(user, "agency-1")
+
+        async def run():
+            return [await controller.admit(controller.tenant_keys(u)) for u in ("u1", "u2", "u3")]
+
+        results = asyncio.run(run())
+
+        assert [r.granted for r in results] == [True, True, False]
+        assert results[2].rejected_by == "agency"
+        # The rejected request gave its user slot back
+        assert controller.snapshot().get("user:u3") is None
+
+    def test_release_frees_limiters(self):
+        controller = AdmissionController(per_user=1)
+
+        async def run():
+            admission = await controller.admit(controller.tenant_keys("u1", "a1"))
+            admission.release()
+
+        asyncio.run(run())
+
+        assert controller.snapshot() == {}
+
+
+class TestAdmissionMiddleware:
+    """Test middleware behaviour over HTTP"""
+
+    def test_noisy_user_gets_429_while_others_pass(self):
+        controller = AdmissionController(per_user=1, max_queue=0)
+
+        async def run():
+            release = asyncio.Event()
+            app = make_app(controller, release)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                hog = asyncio.create_task(client.get("/slow", headers={"Authorization": bearer("noisy")}))
+                await asyncio.sleep(0.05)
+                rejected = await client.get("/slow", headers={"Authorization": bearer("noisy")})
+                health = await client.get("/health", headers={"Authorization": bearer("noisy")})
+                other = asyncio.create_task(client.get("/slow", headers={"Authorization": bearer("quiet")}))
+                await asyncio.sleep(0.05)
+                release.set()
+                return rejected, health, await hog, await other
+
+        rejected, health, hog, other = asyncio.run(run())
+
+        assert rejected.status_code == 429
+        assert int(rejected.headers["Retry-After"]) >= 1
+        assert health.status_code == 200
+        assert hog.status_code == 200
+        assert other.status_code == 200
+        assert controller.snapshot() == {}
+
+    def test_forged_subject_does_not_take_another_users_slots(self):
+        controller = AdmissionController(per_user=1, max_queue=0)
+        victim = bearer("victim")
+        controller.verify(victim.split(" ", 1)[1], "victim")
+
+        async def run():
+            release = asyncio.Event()
+            app = make_app(controller, release)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                forged_token = bearer("victim", app_metadata={"agency_id": "a1"})
+                forged = asyncio.create_task(client.get("/slow", headers={"Authorization": forged_token}))
+                await asyncio.sleep(0.05)
+                keys = controller.snapshot()
+                own = asyncio.create_task(client.get("/slow", headers={"Authorization": victim}))
+                await asyncio.sleep(0.05)
+                release.set()
+                return keys, await forged, await own
+
+        keys, forged, own = asyncio.run(run())
+
+        assert forged.status_code == own.status_code == 200
+        assert "user:victim" not in keys and not any(key.startswith("agency:") for key in keys)
+
+    def test_verified_token_counts_against_its_user_and_agency(self):
+        controller = AdmissionController()
+        controller.verify("token-1", "u1")
+        controller.assign_agency("u1", "a1")
+        scope = {"headers": [(b"authorization", b"Bearer token-1")]}
+
+        user_key = controller.user_key(token_key_from_scope(scope))
+
+        assert controller.tenant_keys(user_key) == [("user", "u1"), ("agency", "a1")]
+        assert controller.user_key(token_key_from_scope({"headers": [(b"authorization", b"Bearer token-2")]})) != "u1"
+        assert token_key_from_scope({"client": ("10.0.0.1", 1234)}) == "ip:10.0.0.1"
@@ -0,0 +1,294 @@
+"""
+End-to-end load benchmarks for the API apps
+
+Drives ``railway_main.app`` (against the fake Graph API and a fake Supabase)
+and ``main.app`` (against a seeded SQLite database) in-process. Run with::
+
+    pytest tests/test_api_benchmarks.py --benchmark -s \
+        --bench-concurrency 1,4,8 --bench-requests 200 --bench-results out.json
+
+and compare two result files with ``python -m testing.bench old.json new.json``.
+"""
+
+import asyncio
+import importlib
+import os
+from datetime import datetime, time, timedelta, timezone
+
+import httpx
+import pytest
+
+from services.graph_api import GRAPH_API_URL
+from fastapi import FastAPI
+
+from testing.bench import (
+    BenchRequest, FakeSupabase, Scenario, compare_results, percentile, route_upstreams, run_load, unsigned_jwt, write_results
+)
+from testing.bulk import load_models, model_id, user_email
+from testing.fake_graph import FakeGraph, FakeGraphConfig, LatencyModel
+from testing.synthetic import SyntheticGraphData
+
+ACCOUNTS = 4
+CAMPAIGNS = 40
+DAYS = 400
+SUPABASE_HOST = "supabase.bench"
+DATE_PRESETS = ('last_7d', 'last_14d', 'last_30d', 'last_90d')
+# Lazy: objects and metrics are only generated as requests read them
+DATA = SyntheticGraphData(accounts=ACCOUNTS, campaigns=CAMPAIGNS, days=DAYS)
+
+
+def pytest_generate_tests(metafunc):
+    if "concurrency" in metafunc.fixturenames:
+        levels = [int(c) for c in metafunc.config.getoption("--bench-concurrency").split(",")]
+        metafunc.parametrize("concurrency", levels)
+
+
+@pytest.fixture(scope="module")
+def results(request):
+    collected = []
+    yield collected
+    if collected:
+        config = request.config
+        write_results(config.getoption("--bench-results"), collected, {
+            'requests': config.getoption("--bench-requests"),
+            'upstream_ms': config.getoption("--bench-upstream-ms"),
+            'accounts': ACCOUNTS,
+            'campaigns': CAMPAIGNS,
+            'days': DAYS
+        })
+
+
+def bench(app, scenario, concurrency, config, results, headers, upstream=dict, warmup=0):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60.0) as client:
+            return await run_load(
+                client, scenario, concurrency, config.getoption("--bench-requests"),
+                warmup=warmup, headers=headers, upstream=upstream
+            )
+
+    result = asyncio.run(main())
+    results.append(result)
+    print(f"\n{result.summary()}")
+    assert result.errors == 0, result.statuses
+    return result
+
+
+class TestHarness:
+    """Test the load generator and result files"""
+
+    def test_percentiles(self):
+        samples = list(range(1, 101))
+
+        assert [percentile(samples, q) for q in (50, 95, 99, 100)] == [50, 95, 99, 100]
+        assert percentile([7.0], 99) == 7.0
+
+    def test_load_counts_requests_and_upstream_calls(self):
+        app = FastAPI()
+        seen = []
+
+        @app.get("/items/{item}")
+        async def item(item: int):
+            async with httpx.AsyncClient() as client:
+                await client.get(f"https://upstream.test/{item}")
+            return {"item": item}
+
+        upstream = httpx.MockTransport(lambda request: seen.append(request.url.path) or httpx.Response(200))
+        scenario = Scenario("items", "test", lambda i, worker: BenchRequest("GET", f"/items/{i}"))
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await run_load(client, scenario, concurrency=4, requests=20, warmup=2, upstream=lambda: {'upstream': len(seen)})
+
+        with route_upstreams({"upstream.test": upstream}):
+            result = asyncio.run(run())
+
+        assert result.errors == 0 and result.statuses == {"200": 20}
+        assert result.upstream_calls_per_request == 1.0
+        assert sorted(int(path[1:]) for path in seen) == list(range(22))
+        assert result.latency_p50_ms <= result.latency_p99_ms <= result.latency_max_ms
+        assert result.peak_rss_mb > 0
+
+    def test_compare_flags_regressions(self, tmp_path):
+        async def measure(app_delay):
+            app = FastAPI()
+
+            @app.get("/")
+            async def root():
+                await asyncio.sleep(app_delay)
+                return {}
+
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await run_load(client, Scenario("root", "test", lambda i, w: BenchRequest("GET", "/")), 2, 10)
+
+        baseline = write_results(str(tmp_path / "old.json"), [asyncio.run(measure(0.0))])
+        current = write_results(str(tmp_path / "new.json"), [asyncio.run(measure(0.02))])
+
+        regressions = {c.metric for c in compare_results(baseline, current) if c.regression}
+        assert {'throughput_rps', 'latency_p50_ms'} <= regressions
+        assert 'upstream_calls_per_request' not in regressions
+
+
+# railway_main.app
+
+@pytest.fixture(scope="module")
+def graph(pytestconfig):
+    median = pytestconfig.getoption("--bench-upstream-ms") / 1000
+    return FakeGraph(DATA, FakeGraphConfig(latency=LatencyModel.lognormal(median, 0.5) if median else LatencyModel()))
+
+
+@pytest.fixture(scope="module")
+def railway(graph):
+    railway_main = importlib.import_module("railway_main")
+    supabase = FakeSupabase()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(railway_main, "SUPABASE_URL", f"https://{SUPABASE_HOST}")
+        mp.setattr(railway_main, "SUPABASE_SERVICE_ROLE_KEY", "bench-service-key")
+        # Background warm-ups would add Graph calls that no measured request made
+        mp.setattr(railway_main.cache_warmer, "touch", lambda user_id, meta_token: False)
+        with route_upstreams({
+            httpx.URL(GRAPH_API_URL).host: httpx.ASGITransport(app=graph.app),
+            SUPABASE_HOST: supabase.transport()
+        }):
+            yield railway_main.app, supabase
+
+
+def railway_user(worker):
+    return {"Authorization": f"Bearer {unsigned_jwt({'sub': f'bench-user-{worker}'})}"}
+
+
+def railway_scenarios(data):
+    accounts = data.account_ids()
+
+    def account(i):
+        return accounts[i % len(accounts)]
+
+    def post(path, body):
+        return lambda i, worker: BenchRequest("POST", path, json=body(i))
+
+    export_since = (data.until - timedelta(days=29)).isoformat()
+    return [
+        Scenario("health", "railway", lambda i, worker: BenchRequest("GET", "/health")),
+        Scenario("ad_accounts_cached", "railway", post("/api/ad-accounts", lambda i: {"max_staleness": 3600})),
+        Scenario("dashboard_metrics", "railway", post("/api/dashboard-metrics", lambda i: {
+            "account_id": account(i), "date_preset": DATE_PRESETS[i // len(accounts) % len(DATE_PRESETS)], "max_staleness": 0
+        })),
+        Scenario("dashboard_stream", "railway", post("/api/dashboard-stream", lambda i: {
+            "account_id": account(i), "format": "ndjson"
+        })),
+        Scenario("campaigns", "railway", post("/api/campaigns", lambda i: {"account_id": account(i), "max_staleness": 0})),
+        Scenario("sparkline_batch", "railway", post("/api/sparkline-data/batch", lambda i: {
+            "account_ids": accounts, "window": 30
+        })),
+        Scenario("composite", "railway", post("/api/dashboard/composite", lambda i: {"widgets": [
+            {"id": "kpis", "type": "kpis", "account_id": account(i)},
+            {"id": "top", "type": "topCampaigns", "account_id": account(i)},
+            {"id": "trend", "type": "sparkline", "account_id": account(i), "window": 14}
+        ]})),
+        Scenario("export_csv_30d", "railway", post("/api/export/insights", lambda i: {
+            "account_id": account(i), "level": "campaign", "since": export_since, "until": data.until.isoformat()
+        }))
+    ]
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("scenario", railway_scenarios(DATA), ids=lambda s: s.name)
+def test_railway_app(scenario, concurrency, railway, graph, pytestconfig, results):
+    app, supabase = railway
+
+    def upstream():
+        return {'graph': graph.http_requests, 'supabase': supabase.calls}
+
+    bench(app, scenario, concurrency, pytestconfig, results, railway_user, upstream, warmup=concurrency)
+
+
+# main.app
+
+def seed_main_database(engine, data):
+    """
+    One user per synthetic account, owning its campaigns and their daily metrics.
+    Returns ``[(email, account uuid, [campaign uuid, ...]), ...]``.
+    """
+    load_models(engine, data, metric_levels=('campaign',))
+    return [
+        (user_email(n), model_id('account', account_id), [model_id('campaign', c.id) for c in data.objects(account_id, 'campaign')])
+        for n, account_id in enumerate(data.account_ids())
+    ]
+
+
+@pytest.fixture(scope="module")
+def main_app(tmp_path_factory):
+    previous = os.environ.get("DATABASE_URL")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_path_factory.mktemp('bench') / 'main.db'}"
+    try:
+        main = importlib.import_module("main")
+    finally:
+        if previous is None:
+            os.environ.pop("DATABASE_URL")
+        else:
+            os.environ["DATABASE_URL"] = previous
+
+    # The app's lifespan is not run over ASGITransport
+    main.Base.metadata.create_all(bind=main.engine)
+    main.jobs.job_queue.create_schema()
+    tenants = seed_main_database(main.engine, DATA)
+    tokens = [main.auth.create_access_token({"sub": email}, timedelta(hours=1)) for email, _, _ in tenants]
+    return main.app, tenants, tokens
+
+
+def main_scenarios(data):
+    """
+    ``{name: build(tenant, i)}``; simulated client ``worker`` acts as tenant ``worker % len(tenants)``.
+    """
+    until = datetime.combine(data.until, time(), timezone.utc)
+    metrics_range = {"start_date": (until - timedelta(days=89)).isoformat(), "end_date": until.isoformat()}
+
+    def campaign(tenant, i):
+        _, _, campaigns = tenant
+        return campaigns[i % len(campaigns)]
+
+    return {
+        "health": lambda tenant, i: BenchRequest("GET", "/health"),
+        "accounts": lambda tenant, i: BenchRequest("GET", "/api/meta/accounts"),
+        "campaigns": lambda tenant, i: BenchRequest("GET", f"/api/meta/accounts/{tenant[1]}/campaigns"),
+        "campaign_metrics_90d": lambda tenant, i: BenchRequest(
+            "GET", f"/api/meta/campaigns/{campaign(tenant, i)}/metrics", params=metrics_range
+        ),
+        "campaign_metrics_90d_columns": lambda tenant, i: BenchRequest(
+            "GET", f"/api/meta/campaigns/{campaign(tenant, i)}/metrics", params={**metrics_range, "layout": "columns"}
+        ),
+        "export_csv_1y": lambda tenant, i: BenchRequest("GET", "/api/meta/export/metrics", params={
+            "account_id": str(tenant[1]), "start_date": (until - timedelta(days=364)).isoformat(), "end_date": until.isoformat()
+        })
+    }
+
+
+MAIN_SCENARIOS = main_scenarios(DATA)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("name", MAIN_SCENARIOS)
+def test_main_app(name, concurrency, main_app, pytestconfig, results):
+    app, tenants, tokens = main_app
+    build = MAIN_SCENARIOS[name]
+    scenario = Scenario(name, "main", lambda i, worker: build(tenants[worker % len(tenants)], i))
+
+    bench(app, scenario, concurrency, pytestconfig, results, lambda worker: {"Authorization": f"Bearer {tokens[worker % len(tokens)]}"})
+
+
+def test_main_app_unknown_ids_are_not_found(main_app):
+    app, tenants, tokens = main_app
+    (_, account, campaigns), other = tenants[0], tenants[1]
+
+    async def get(path):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path, headers={"Authorization": f"Bearer {tokens[0]}"})
+
+    assert asyncio.run(get(f"/api/meta/accounts/{account}/campaigns")).json()
+    assert asyncio.run(get(f"/api/meta/campaigns/{campaigns[0]}/metrics")).status_code == 200
+    for path in (
+        "/api/meta/accounts/not-a-uuid/campaigns",
+        f"/api/meta/accounts/{other[1]}/campaigns",
+        "/api/meta/campaigns/not-a-uuid/metrics",
+        "/api/meta/export/metrics?account_id=not-a-uuid",
+    ):
+        assert asyncio.run(get(path)).status_code == 404, path
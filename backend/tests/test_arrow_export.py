@@ -0,0 +1,166 @@
+"""
+Test suite for Arrow and Parquet exports
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import FileResponse
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from services.arrow_export import (  # noqa: E402
+    filter_expression,
+    ipc_stream_chunks,
+    metrics_schema,
+    query_batches,
+    partition_path,
+    record_batches,
+    select_schema,
+    write_parquet_partitions,
+)
+
+
+def metric_rows(count, months=("2024-01", "2024-02")):
+    return [
+        {
+            "level": "ad", "object_id": str(i), "name": f"Ad {i}",
+            "date_start": f"{months[i % len(months)]}-{1 + i % 28:02d}", "date_stop": None,
+            "impressions": 1000 + i, "clicks": i % 40, "reach": 0, "conversions": i % 3,
+            "spend": float(i % 100), "ctr": 1.0, "cpc": 0.5, "cpm": 10.0, "purchase_value": 0.0, "roas": 0.0,
+        }
+        for i in range(count)
+    ]
+
+
+async def agen(rows):
+    for row in rows:
+        yield row
+
+
+def ipc_table(rows, filters=None, columns=None, batch_rows=10):
+    schema = metrics_schema()
+
+    async def go():
+        batches = query_batches(record_batches(agen(rows), schema, batch_rows), filter_expression(filters, schema), columns)
+        return b"".join([chunk async for chunk in ipc_stream_chunks(batches, select_schema(schema, columns))])
+
+    return pa.ipc.open_stream(asyncio.run(go())).read_all()
+
+
+class TestArrowStream:
+    """Test record batches, filtering and IPC encoding"""
+
+    def test_round_trip_with_typed_columns(self):
+        table = ipc_table(metric_rows(25))
+
+        assert table.num_rows == 25
+        assert table.schema.field("impressions").type == pa.int64()
+        assert table.schema.field("date_start").type == pa.date32()
+        assert table.column("object_id").to_pylist()[:2] == ["0", "1"]
+
+    def test_filter_and_projection_per_batch(self):
+        table = ipc_table(metric_rows(50), filters={"spend": {"gte": 40}, "date_start": {"lt": "2024-02-01"}},
+                          columns=["object_id", "spend"])
+
+        assert table.column_names == ["object_id", "spend"]
+        assert table.column("object_id").to_pylist() == ["40", "42", "44", "46", "48"]
+
+    def test_filters_that_match_nothing_yield_empty_stream(self):
+        assert ipc_table(metric_rows(5), filters={"level": "campaign"}).num_rows == 0
+
+    def test_unknown_filter_rejected(self):
+        with pytest.raises(ValueError):
+            filter_expression({"spend": {"about": 1}}, metrics_schema())
+        with pytest.raises(ValueError):
+            select_schema(metrics_schema(), ["nope"])
+
+
+class TestParquetPartitions:
+    """Test month partitions on disk and range serving"""
+
+    def test_partitions_by_month_readable_as_dataset(self, tmp_path):
+        paths = asyncio.run(write_parquet_partitions(agen(metric_rows(30)), "owner", "1", "ad", root=tmp_path, batch_rows=4))
+
+        assert sorted(paths) == ["2024-01", "2024-02"]
+        assert paths["2024-01"] == tmp_path / "owner" / "account_id=1" / "month=2024-01" / "ad.parquet"
+        dataset = pq.ParquetDataset(str(tmp_path / "owner")).read()
+        assert dataset.num_rows == 30
+        assert set(dataset.column("month").to_pylist()) == {"2024-01", "2024-02"}
+
+    def test_failed_export_keeps_previous_files(self, tmp_path):
+        paths = asyncio.run(write_parquet_partitions(agen(metric_rows(4)), "owner", "1", "ad", root=tmp_path))
+
+        async def failing():
+            yield metric_rows(1)[0]
+            raise RuntimeError("Meta went away")
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(write_parquet_partitions(failing(), "owner", "1", "ad", root=tmp_path))
+
+        assert pq.read_table(paths["2024-01"]).num_rows == 2
+        assert not list(tmp_path.rglob("*.tmp"))
+
+    def test_partition_paths_stay_under_root(self, tmp_path):
+        with pytest.raises(ValueError):
+            partition_path(tmp_path, "owner", "1/../../../../../v19.0/act_123", "2024-01", "ad")
+        with pytest.raises(ValueError):
+            asyncio.run(write_parquet_partitions(agen(metric_rows(2)), "owner", "1/../../../..", "ad", root=tmp_path))
+
+        assert not (tmp_path / "owner" / "account_id=1/../../../..").resolve().joinpath("month=2024-01").exists()
+
+    def test_export_rejects_non_numeric_account_ids(self, monkeypatch, tmp_path):
+        railway_main = pytest.importorskip("railway_main")
+        monkeypatch.setattr(railway_main, "PARQUET_EXPORT_DIR", tmp_path)
+        railway_main.app.dependency_overrides[railway_main.get_user_meta_token] = lambda: "token"
+
+        async def post():
+            transport = httpx.ASGITransport(app=railway_main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post("/api/export/parquet", json={"account_id": "1/../../../../../v19.0/act_123"})
+
+        try:
+            response = asyncio.run(post())
+        finally:
+            railway_main.app.dependency_overrides.clear()
+
+        assert response.status_code == 400
+        assert not list(tmp_path.rglob("*"))
+
+    def test_partition_served_with_ranges(self, tmp_path):
+        paths = asyncio.run(write_parquet_partitions(agen(metric_rows(10)), "owner", "1", "ad", root=tmp_path))
+        app = FastAPI()
+
+        @app.get("/file")
+        async def file():
+            return FileResponse(paths["2024-01"])
+
+        async def fetch():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await client.get("/file", headers={"Range": "bytes=0-3"})
+
+        response = asyncio.run(fetch())
+
+        assert response.status_code == 206
+        assert response.content == b"PAR1"
+
+
+@pytest.mark.benchmark
+class TestArrowTransferSize:
+    """Bytes on the wire for 100k ad-level rows: JSON versus Arrow IPC versus Parquet"""
+
+    ROWS = 100_000
+
+    def test_columnar_formats_are_smaller(self, tmp_path):
+        rows = metric_rows(self.ROWS)
+        json_size = len(json.dumps(rows).encode())
+        arrow_size = ipc_table(rows, batch_rows=10_000).nbytes
+        paths = asyncio.run(write_parquet_partitions(agen(rows), "owner", "1", "ad", root=tmp_path))
+        parquet_size = sum(p.stat().st_size for p in paths.values())
+
+        print(f"\nJSON {json_size / 2**20:.1f} MiB, Arrow {arrow_size / 2**20:.1f} MiB, Parquet {parquet_size / 2**20:.2f} MiB")
+        assert parquet_size * 10 < json_size
@@ -0,0 +1,199 @@
+"""
+Test suite for rate-budgeted historical backfills
+"""
+
+import asyncio
+import json
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, update
+
+from services.backfill import (
+    DONE, BackfillPlanner, BackfillRunner, backfill_chunks_table, months_before, plan_chunks
+)
+from services import graph_api, rate_budget as rate_budget_module
+from services.jobs import DeferJob, JobQueue, utcnow
+from services.rate_budget import RateBudget
+
+UNTIL = date(2024, 3, 31)
+
+
+@pytest.fixture
+def planner(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    JobQueue(engine).create_schema()
+    return BackfillPlanner(engine)
+
+
+class FakeReports:
+    """Graph async report runs: each completes after ``polls`` status checks."""
+
+    def __init__(self, polls=1, fail_longer_than=None, page_size=2):
+        self.polls = polls
+        self.fail_longer_than = fail_longer_than
+        self.page_size = page_size
+        self.runs = {}
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        path = request.url.path.split("/", 2)[-1]
+        if request.method == "POST":
+            form = dict(httpx.QueryParams(request.content.decode()))
+            window = json.loads(form["time_range"])
+            run_id = str(len(self.runs) + 1)
+            self.runs[run_id] = {"window": window, "polls": 0}
+            return httpx.Response(200, json={"report_run_id": run_id})
+        run_id, _, edge = path.partition("/")
+        run = self.runs[run_id]
+        since, until = (date.fromisoformat(run["window"][k]) for k in ("since", "until"))
+        if not edge:
+            run["polls"] += 1
+            if self.fail_longer_than and (until - since).days + 1 > self.fail_longer_than:
+                return httpx.Response(200, json={"async_status": "Job Failed"})
+            done = run["polls"] >= self.polls
+            return httpx.Response(200, json={"async_status": "Job Completed" if done else "Job Running"})
+        days = [since + timedelta(days=i) for i in range((until - since).days + 1)]
+        offset = int(request.url.params.get("after", 0))
+        page = days[offset:offset + self.page_size]
+        body = {"data": [
+            {"campaign_id": "c1", "date_start": day.isoformat(), "date_stop": day.isoformat(), "spend": "1.5"}
+            for day in page
+        ]}
+        if offset + self.page_size < len(days):
+            body["paging"] = {"next": "more", "cursors": {"after": str(offset + self.page_size)}}
+        return httpx.Response(200, json=body)
+
+
+def run_backfill(planner, reports, budget=None):
+    stored = []
+
+    async def store(chunk, rows):
+        stored.append((chunk.since, chunk.until, rows))
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(reports)) as client:
+            runner = BackfillRunner(planner, client, "token", budget=budget or RateBudget(calls_per_minute=10000), poll_seconds=0)
+            return await runner.run("1", store)
+
+    return asyncio.run(run()), stored
+
+
+class TestPlanning:
+    """Test how history is split into chunks"""
+
+    def test_months_before_clamps_to_month_end(self):
+        assert months_before(date(2024, 3, 31), 1) == date(2024, 2, 29)
+        assert months_before(date(2024, 3, 15), 37) == date(2021, 2, 15)
+
+    def test_chunks_cover_history_most_recent_first(self):
+        chunks = plan_chunks(UNTIL, months=37, chunk_days=30)
+
+        assert chunks[0] == (UNTIL - timedelta(days=29), UNTIL)
+        assert chunks[-1][0] == date(2021, 3, 1)
+        assert all(newer[0] == older[1] + timedelta(days=1) for newer, older in zip(chunks, chunks[1:]))
+        assert sum((until - since).days + 1 for since, until in chunks) == (UNTIL - date(2021, 3, 1)).days + 1
+
+    def test_replanning_keeps_progress_and_adds_new_days(self, planner):
+        assert planner.plan("1", UNTIL, months=3) == 4
+        planner.finish(planner.next_chunk("1"), 10)
+
+        assert planner.plan("1", UNTIL) == 0
+        assert planner.plan("1", UNTIL + timedelta(days=5)) == 1
+
+        chunks = planner.chunks("1")
+        assert (chunks[0].since, chunks[0].until) == (UNTIL + timedelta(days=1), UNTIL + timedelta(days=5))
+        assert chunks[1].status == DONE
+
+
+class TestRunner:
+    """Test report runs, checkpoints and the rate budget"""
+
+    def test_runs_every_chunk_newest_first(self, planner):
+        planner.plan("1", UNTIL, months=2, chunk_days=30)
+        reports = FakeReports(polls=3)
+
+        progress, stored = run_backfill(planner, reports)
+
+        assert [since for since, _, _ in stored] == sorted((since for since, _, _ in stored), reverse=True)
+        assert sum(len(rows) for _, _, rows in stored) == progress.days_total == progress.rows
+        assert stored[0][2][0].spend == 1.5
+        assert progress.complete and progress.eta_seconds == 0
+        assert progress.done_since == date(2024, 2, 1)
+
+    def test_resumes_the_checkpointed_report_run(self, planner):
+        planner.plan("1", UNTIL, months=1, chunk_days=31)
+        reports = FakeReports()
+        reports.runs["7"] = {"window": {"since": "2024-03-01", "until": "2024-03-31"}, "polls": 0}
+        planner.start(planner.next_chunk("1"), "7")
+
+        progress, _ = run_backfill(planner, reports)
+
+        assert progress.complete
+        assert list(reports.runs) == ["7"]
+
+    def test_failed_reports_are_split(self, planner):
+        planner.plan("1", UNTIL, months=1, chunk_days=31)
+
+        progress, stored = run_backfill(planner, FakeReports(fail_longer_than=8))
+
+        assert progress.complete
+        assert progress.days_done == 31
+        assert all((until - since).days + 1 <= 8 for since, until, _ in stored)
+
+    def test_spent_budget_defers_and_keeps_progress(self, planner):
+        planner.plan("1", UNTIL, months=3, chunk_days=30)
+        # 20 backfill calls: the first chunk (1 submit, 1 poll, 15 pages) fits, the second does not
+        budget = RateBudget(calls_per_minute=80, shares={'backfill': 0.25})
+        reports = FakeReports()
+
+        with pytest.raises(DeferJob):
+            run_backfill(planner, reports, budget)
+
+        progress = planner.progress("1")
+        assert progress.chunks_done == 1
+        assert 0 < progress.eta_seconds
+        assert planner.next_chunk("1").report_run_id == "2"
+
+        final, _ = run_backfill(planner, reports)
+        assert final.complete
+        assert len(reports.runs) == 4
+
+    def test_graph_calls_are_charged_once(self, planner, monkeypatch):
+        monkeypatch.setattr(rate_budget_module, "time", SimpleNamespace(monotonic=lambda: 1000.0))
+        budget = RateBudget(calls_per_minute=1000, shares={'backfill': 1.0})
+        # The runner's budget is the one Graph calls are charged to, as in production
+        monkeypatch.setattr(graph_api, "rate_budget", budget)
+        planner.plan("1", UNTIL, months=2, chunk_days=30)
+        reports = FakeReports(polls=2)
+
+        run_backfill(planner, reports, budget)
+
+        assert budget.snapshot("1")["tokens"] == 1000 - reports.calls
+
+    def test_eta_follows_throughput(self, planner):
+        planner.plan("1", UNTIL, months=2, chunk_days=30)
+        planner.finish(planner.next_chunk("1"), 30)
+        with planner.engine.begin() as conn:
+            conn.execute(update(backfill_chunks_table).values(started_at=utcnow() - timedelta(seconds=60)))
+
+        progress = planner.progress("1")
+
+        remaining = progress.days_total - progress.days_done
+        assert progress.eta_seconds == pytest.approx(60 / 30 * remaining, rel=0.05)
+
+
+class TestBackfillBudget:
+    """Test the backfill share of an account's rate budget"""
+
+    def test_backfill_uses_only_its_share(self):
+        budget = RateBudget(calls_per_minute=100, shares={'backfill': 0.2})
+
+        granted = sum(budget.try_acquire("1", 'backfill') for _ in range(100))
+
+        assert granted == 20
+        assert budget.try_acquire("1", 'background')
+        assert budget.try_acquire("1", 'interactive')
@@ -0,0 +1,90 @@
+"""
+Test suite for Graph summary campaign counts
+"""
+
+import asyncio
+import json
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from services.campaign_counts import CampaignCountCache, fetch_campaign_counts, fetch_campaign_counts_many
+from services.graph_api import MetaGraphError
+
+TOTALS = {None: 1834, "ACTIVE": 1200, "PAUSED": 600}
+
+
+def batch_handler(batches, fail_account=None):
+    def handler(request):
+        form = parse_qs(request.content.decode())
+        entries = json.loads(form["batch"][0])
+        batches.append(entries)
+        results = []
+        for entry in entries:
+            url = urlparse(entry["relative_url"])
+            params = parse_qs(url.query)
+            if fail_account and url.path.startswith(f"act_{fail_account}/"):
+                results.append({"code": 400, "body": json.dumps({"error": {"message": "no access"}})})
+                continue
+            status = json.loads(params["effective_status"][0])[0] if "effective_status" in params else None
+            results.append({"code": 200, "body": json.dumps({"data": [], "summary": {"total_count": TOTALS[status]}})})
+        return httpx.Response(200, json=results)
+
+    return handler
+
+
+def run(handler, coro_factory):
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await coro_factory(client)
+
+    return asyncio.run(go())
+
+
+class TestCampaignCounts:
+    """Test batched summary counts and caching"""
+
+    def test_counts_come_from_one_batch_of_summaries(self):
+        batches = []
+        cache = CampaignCountCache()
+
+        counts = run(batch_handler(batches), lambda c: fetch_campaign_counts(c, "token", "1", cache))
+
+        assert counts == {"totalCampaigns": 1834, "activeCampaigns": 1200, "pausedCampaigns": 600}
+        assert len(batches) == 1
+        assert all("summary=total_count" in e["relative_url"] and "limit=0" in e["relative_url"] for e in batches[0])
+
+    def test_many_accounts_split_into_batches(self):
+        batches = []
+
+        results = run(batch_handler(batches), lambda c: fetch_campaign_counts_many(
+            c, "token", [str(i) for i in range(20)], CampaignCountCache()
+        ))
+
+        assert len(results) == 20
+        assert [len(b) for b in batches] == [48, 12]
+
+    def test_failed_account_does_not_fail_others(self):
+        results = run(batch_handler([], fail_account="2"), lambda c: fetch_campaign_counts_many(
+            c, "token", ["1", "2"], CampaignCountCache()
+        ))
+
+        assert results["1"]["totalCampaigns"] == 1834
+        assert isinstance(results["2"], MetaGraphError)
+        assert results["2"].message == "no access"
+
+    def test_cached_per_token_and_invalidated_on_sync(self):
+        batches = []
+        cache = CampaignCountCache()
+        handler = batch_handler(batches)
+
+        run(handler, lambda c: fetch_campaign_counts(c, "token", "1", cache))
+        run(handler, lambda c: fetch_campaign_counts(c, "token", "1", cache))
+        assert len(batches) == 1
+
+        run(handler, lambda c: fetch_campaign_counts(c, "other-token", "1", cache))
+        assert len(batches) == 2
+
+        cache.invalidate("1")
+        run(handler, lambda c: fetch_campaign_counts(c, "token", "1", cache))
+        assert len(batches) == 3
@@ -0,0 +1,269 @@
+"""
+Test suite for the memory-mapped column store
+"""
+
+import asyncio
+import json
+import time
+from datetime import date, timedelta
+
+import httpx
+import pytest
+
+from services import sparkline_store as sparkline_module
+from services.column_store import ColumnStore, archive_settled_days, range_totals, settled_rows
+from services.sparkline_store import SparklineStore, ensure_loaded
+from testing.bench import route_upstreams
+
+
+def daily_rows(start, days, spend=1.0):
+    return [
+        {"date_start": (start + timedelta(days=i)).isoformat(), "spend": str(spend * (i + 1)),
+         "impressions": "100", "clicks": "5"}
+        for i in range(days)
+    ]
+
+
+class TestColumnStore:
+    """Test appends, gaps and zero-copy range reads"""
+
+    def test_append_and_read_range(self, tmp_path):
+        store = ColumnStore(tmp_path)
+
+        assert store.append("1", daily_rows(date(2024, 1, 1), 10)) == 10
+
+        spend = store.column("1", "spend", date(2024, 1, 3), date(2024, 1, 5))
+        assert list(spend) == [3.0, 4.0, 5.0]
+        assert store.date_range("1") == (date(2024, 1, 1), date(2024, 1, 10))
+        assert store.totals("1", ["spend", "clicks"]) == {"spend": 55.0, "clicks": 50.0}
+
+    def test_totals_without_numpy(self, tmp_path, monkeypatch):
+        store = ColumnStore(tmp_path)
+        store.append("1", daily_rows(date(2024, 1, 1), 10))
+        expected = store.totals("1", ["spend"], date(2024, 1, 2), date(2024, 1, 4))
+        monkeypatch.setattr("services.column_store.numpy", None)
+
+        assert store.totals("1", ["spend"], date(2024, 1, 2), date(2024, 1, 4)) == expected == {"spend": 9.0}
+
+    def test_only_days_after_the_end_are_appended(self, tmp_path):
+        store = ColumnStore(tmp_path)
+        store.append("1", daily_rows(date(2024, 1, 1), 5))
+
+        rows = daily_rows(date(2024, 1, 4), 4, spend=10.0)
+        assert store.append("1", rows) == 2
+
+        assert list(store.column("1", "spend")) == [1.0, 2.0, 3.0, 4.0, 5.0, 30.0, 40.0]
+
+    def test_gaps_are_zero_and_marked_absent(self, tmp_path):
+        store = ColumnStore(tmp_path)
+        store.append("1", [{"date_start": "2024-01-01", "spend": "2"}, {"date_start": "2024-01-04", "spend": "3"}])
+
+        assert list(store.column("1", "spend")) == [2.0, 0.0, 0.0, 3.0]
+        assert list(store.present("1")) == [1, 0, 0, 1]
+
+    def test_views_survive_later_appends(self, tmp_path):
+        store = ColumnStore(tmp_path)
+        store.append("1", daily_rows(date(2024, 1, 1), 3))
+        view = store.column("1", "spend")
+
+        store.append("1", daily_rows(date(2024, 1, 4), 2))
+
+        assert list(view) == [1.0, 2.0, 3.0]
+        assert len(store.column("1", "spend")) == 5
+
+    def test_torn_append_is_invisible_and_overwritten(self, tmp_path):
+        store = ColumnStore(tmp_path)
+        store.append("1", daily_rows(date(2024, 1, 1), 3))
+        # Simulate a crash after writing values but before the manifest
+        with open(tmp_path / "1" / "spend.f64", "ab") as f:
+            f.write(b"\xff" * 40)
+
+        reopened = ColumnStore(tmp_path)
+        assert list(reopened.column("1", "spend")) == [1.0, 2.0, 3.0]
+
+        reopened.append("1", daily_rows(date(2024, 1, 4), 1, spend=7.0))
+        assert list(ColumnStore(tmp_path).column("1", "spend")) == [1.0, 2.0, 3.0, 7.0]
+
+    def test_manifest_records_schema_and_range(self, tmp_path):
+        ColumnStore(tmp_path).append("1", daily_rows(date(2024, 1, 1), 2))
+
+        manifest = json.loads((tmp_path / "1" / "manifest.json").read_text())
+
+        assert manifest["epoch"] == "2024-01-01"
+        assert manifest["days"] == 2
+        assert manifest["metrics"] == ["spend", "impressions", "clicks", "conversions"]
+
+    def test_unknown_account_and_metric(self, tmp_path):
+        store = ColumnStore(tmp_path)
+
+        assert len(store.column("1", "spend")) == 0
+        assert store.date_range("1") is None
+        with pytest.raises(KeyError):
+            store.column("1", "roas")
+        with pytest.raises(ValueError):
+            store.append("../1", daily_rows(date(2024, 1, 1), 1))
+
+    def test_append_through_stores_missing_days_as_absent(self, tmp_path):
+        store = ColumnStore(tmp_path)
+        store.append("1", daily_rows(date(2024, 1, 1), 2))
+
+        assert store.append("1", [], through=date(2024, 1, 4)) == 2
+
+        assert store.date_range("1") == (date(2024, 1, 1), date(2024, 1, 4))
+        assert list(store.present("1")) == [1, 1, 0, 0]
+        assert store.append("1", [], through=date(2024, 1, 3)) == 0
+
+    def test_reads_see_appends_by_another_process(self, tmp_path):
+        reader = ColumnStore(tmp_path)
+        ColumnStore(tmp_path).append("1", daily_rows(date(2024, 1, 1), 2))
+        assert len(reader.column("1", "spend")) == 2
+
+        ColumnStore(tmp_path).append("1", daily_rows(date(2024, 1, 3), 3))
+
+        assert list(reader.column("1", "spend")) == [1.0, 2.0, 1.0, 2.0, 3.0]
+
+    def test_settled_rows_drop_recent_days(self):
+        today = date(2024, 1, 10)
+        rows = daily_rows(date(2024, 1, 1), 10)
+
+        settled = settled_rows(rows, 3, today=today)
+
+        assert settled[-1]["date_start"] == "2024-01-06"
+
+
+class TestSparklineArchive:
+    """Test that sparkline loads append settled days to the column store"""
+
+    def test_load_appends_settled_days(self, tmp_path, monkeypatch):
+        archive = ColumnStore(tmp_path)
+        start = date.today() - timedelta(days=9)
+
+        def handler(request):
+            return httpx.Response(200, json={"data": daily_rows(start, 10)})
+
+        async def run():
+            with route_upstreams({"graph.facebook.com": httpx.MockTransport(handler)}):
+                await ensure_loaded("token", "1", store=SparklineStore(capacity=30))
+
+        monkeypatch.setattr(sparkline_module, "_inflight", {})
+        monkeypatch.setattr(sparkline_module, "column_store", archive)
+        asyncio.run(run())
+
+        assert archive.date_range("1") == (start, date.today() - timedelta(days=4))
+
+
+
+def insights_handler(calls, rows_for):
+    def handler(request):
+        calls.append(request)
+        if request.url.path.endswith("/insights"):
+            window = json.loads(request.url.params["time_range"])
+            since, until = date.fromisoformat(window["since"]), date.fromisoformat(window["until"])
+            return httpx.Response(200, json={"data": rows_for(since, until, request)})
+        return httpx.Response(200, json={"id": "act_1"})
+    return handler
+
+
+class TestArchive:
+    """Test the sync path that appends settled days and the range totals read path"""
+
+    def test_archive_appends_only_new_settled_days(self, tmp_path):
+        store = ColumnStore(tmp_path)
+        today = date(2024, 3, 1)
+        calls = []
+        handler = insights_handler(calls, lambda since, until, _: daily_rows(since, (until - since).days + 1))
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                first = await archive_settled_days(client, "token", "1", store, today=today)
+                again = await archive_settled_days(client, "token", "1", store, today=today)
+                later = await archive_settled_days(client, "token", "1", store, today=today + timedelta(days=2))
+                return first, again, later
+
+        first, again, later = asyncio.run(run())
+
+        assert (first, again, later) == (362, 0, 2)
+        assert len(calls) == 2
+        assert json.loads(calls[1].url.params["time_range"]) == {"since": "2024-02-27", "until": "2024-02-28"}
+        assert store.date_range("1")[1] == today + timedelta(days=2) - timedelta(days=4)
+
+    def test_archive_follows_short_pages_before_marking_days_absent(self, tmp_path, monkeypatch):
+        store = ColumnStore(tmp_path)
+        today = date(2024, 3, 1)
+        monkeypatch.setattr("services.column_store.ARCHIVE_INITIAL_DAYS", 10)
+        monkeypatch.setattr("services.column_store.ARCHIVE_MAX_PAGES", 3)
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            window = json.loads(request.url.params["time_range"])
+            since, until = date.fromisoformat(window["since"]), date.fromisoformat(window["until"])
+            rows = daily_rows(since, (until - since).days + 1)
+            # Meta answers with two days per page whatever the limit
+            offset = int(request.url.params.get("after", "0"))
+            payload = {"data": rows[offset:offset + 2]}
+            if offset + 2 < len(rows):
+                payload["paging"] = {"cursors": {"after": str(offset + 2)}, "next": "https://graph.test/next"}
+            return httpx.Response(200, json=payload)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                cut_short = await archive_settled_days(client, "token", "1", store, today=today)
+                monkeypatch.setattr("services.column_store.ARCHIVE_MAX_PAGES", 20)
+                rest = await archive_settled_days(client, "token", "1", store, today=today)
+                return cut_short, rest
+
+        cut_short, rest = asyncio.run(run())
+
+        # Three pages reached the sixth day; the seventh was not marked absent
+        assert (cut_short, rest) == (6, 1)
+        assert store.date_range("1") == (date(2024, 2, 20), date(2024, 2, 26))
+        assert list(store.present("1")) == [1] * 7
+        assert len(calls) == 4
+
+    def test_range_totals_read_stored_days_and_fetch_the_rest(self, tmp_path):
+        store = ColumnStore(tmp_path)
+        store.append("1", daily_rows(date(2024, 1, 1), 10))
+        calls = []
+        handler = insights_handler(calls, lambda since, until, _: [
+            {"spend": str((until - since).days + 1), "clicks": "0"}
+        ])
+
+        async def run(since, until):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await range_totals(client, "token", "1", ["spend", "clicks"], since, until, store)
+
+        totals, archived = asyncio.run(run(date(2023, 12, 30), date(2024, 1, 13)))
+
+        assert archived == 10
+        assert totals == {"spend": 55.0 + 2 + 3, "clicks": 50.0}
+        assert [json.loads(c.url.params["time_range"]) for c in calls] == [
+            {"since": "2023-12-30", "until": "2023-12-31"}, {"since": "2024-01-11", "until": "2024-01-13"}
+        ]
+
+        calls.clear()
+        totals, archived = asyncio.run(run(date(2024, 1, 2), date(2024, 1, 3)))
+
+        assert (totals["spend"], archived) == (5.0, 2)
+        # Stored days are still only served to a token Meta lets read the account
+        assert [c.url.path.rsplit("/", 1)[-1] for c in calls] == ["act_1"]
+
+
+@pytest.mark.benchmark
+class TestColumnStoreBenchmark:
+    """Multi-year aggregation over mapped columns"""
+
+    ACCOUNTS = 20
+    DAYS = 5 * 365
+
+    def test_multi_year_totals(self, tmp_path):
+        store = ColumnStore(tmp_path)
+        for account in range(self.ACCOUNTS):
+            store.append(str(account + 1), daily_rows(date(2020, 1, 1), self.DAYS))
+
+        started = time.perf_counter()
+        totals = [store.totals(str(account + 1), ["spend", "clicks"]) for account in range(self.ACCOUNTS)]
+        elapsed = time.perf_counter() - started
+
+        print(f"\n{self.ACCOUNTS} accounts x {self.DAYS} days: {elapsed * 1000:.1f} ms")
+        assert totals[0]["clicks"] == 5.0 * self.DAYS
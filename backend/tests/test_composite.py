@@ -0,0 +1,153 @@
+"""
+Test suite for composite dashboard query planning
+"""
+
+import asyncio
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import pytest
+
+from services import sparkline_store as sparkline_module
+from services.composite import WidgetSpec, execute_plan, plan_widgets, rollup_rows
+from services.graph_api import track_upstream_calls
+
+
+def widgets(*raw):
+    return [WidgetSpec.from_dict(w, i) for i, w in enumerate(raw)]
+
+
+CAMPAIGN_ROWS = [
+    {"campaign_id": "c1", "campaign_name": "One", "spend": "30", "impressions": "1000", "clicks": "10",
+     "conversions": [{"action_type": "purchase", "value": "2"}], "date_start": "2024-01-01", "date_stop": "2024-01-30"},
+    {"campaign_id": "c2", "campaign_name": "Two", "spend": "70", "impressions": "3000", "clicks": "50",
+     "conversions": [{"action_type": "purchase", "value": "3"}], "date_start": "2024-01-01", "date_stop": "2024-01-30"},
+]
+
+
+class TestPlanWidgets:
+    """Test merging of widget requirements"""
+
+    def test_same_scope_fields_are_merged(self):
+        plan = plan_widgets(widgets(
+            {"type": "insights", "account_id": "1", "fields": ["spend"], "level": "adset"},
+            {"type": "insights", "account_id": "act_1", "fields": ["reach"], "level": "adset"},
+        ))
+
+        assert len(plan.queries) == 1
+        assert plan.queries[0].fields == {"spend", "reach"}
+
+    def test_different_ranges_are_not_merged(self):
+        plan = plan_widgets(widgets(
+            {"type": "insights", "account_id": "1", "fields": ["spend"], "date_preset": "last_7d"},
+            {"type": "insights", "account_id": "1", "fields": ["spend"], "date_preset": "last_30d"},
+        ))
+
+        assert len(plan.queries) == 2
+
+    def test_kpis_roll_up_from_campaign_query(self):
+        plan = plan_widgets(widgets(
+            {"id": "kpis", "type": "kpis", "account_id": "1"},
+            {"id": "top", "type": "topCampaigns", "account_id": "1"},
+            {"id": "table", "type": "insights", "account_id": "1", "level": "campaign", "fields": ["spend", "clicks"]},
+        ))
+
+        assert len(plan.queries) == 1
+        assert plan.queries[0].level == "campaign"
+        assert plan.queries[0].paginate
+        assert plan.sources["kpis"] == (0, True)
+
+    def test_non_additive_fields_get_their_own_query(self):
+        plan = plan_widgets(widgets(
+            {"id": "reach", "type": "insights", "account_id": "1", "fields": ["reach", "frequency"]},
+            {"id": "top", "type": "topCampaigns", "account_id": "1", "limit": 3},
+        ))
+
+        assert len(plan.queries) == 2
+        top_query = plan.queries[plan.sources["top"][0]]
+        assert top_query.params()["sort"] == "spend_descending"
+        assert top_query.params()["limit"] == 3
+
+    def test_sparklines_and_counts_deduplicated_per_account(self):
+        plan = plan_widgets(widgets(
+            *({"type": "sparkline", "account_id": "1"} for _ in range(5)),
+            {"type": "campaignCounts", "account_id": "1"},
+            {"type": "campaignCounts", "account_id": "1"},
+        ))
+
+        assert plan.naive_calls == 7
+        assert plan.planned_calls == 2
+
+    def test_invalid_widget_rejected(self):
+        with pytest.raises(ValueError):
+            WidgetSpec.from_dict({"type": "pie", "account_id": "1"})
+        with pytest.raises(ValueError):
+            WidgetSpec.from_dict({"type": "insights", "account_id": "1"})
+
+
+class TestRollup:
+    """Test rebuilding account rows from campaign rows"""
+
+    def test_sums_and_recomputes_ratios(self):
+        row = rollup_rows(CAMPAIGN_ROWS, ["spend", "clicks", "impressions", "ctr", "cpc", "conversions"])[0]
+
+        assert row["spend"] == 100.0
+        assert row["clicks"] == 60.0
+        assert row["ctr"] == pytest.approx(1.5)
+        assert row["cpc"] == pytest.approx(100 / 60)
+        assert row["conversions"] == [{"action_type": "purchase", "value": 5.0}]
+
+
+class TestExecutePlan:
+    """Test one-shot execution and fan-out to widgets"""
+
+    def test_widgets_served_from_shared_query(self, monkeypatch):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            params = parse_qs(urlparse(str(request.url)).query)
+            assert params["level"] == ["campaign"]
+            return httpx.Response(200, json={"data": CAMPAIGN_ROWS})
+
+        plan = plan_widgets(widgets(
+            {"id": "kpis", "type": "kpis", "account_id": "1"},
+            {"id": "top", "type": "topCampaigns", "account_id": "1", "limit": 1},
+            {"id": "table", "type": "insights", "account_id": "1", "level": "campaign", "fields": ["spend"]},
+        ))
+
+        async def run():
+            with track_upstream_calls() as calls:
+                async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                    results = await execute_plan(plan, client, "token")
+            return results, calls["count"]
+
+        monkeypatch.setattr(sparkline_module, "_inflight", {})
+        results, calls = asyncio.run(run())
+
+        assert calls == 1
+        assert results["kpis"]["data"]["totalSpend"] == 100.0
+        assert results["kpis"]["data"]["totalConversions"] == 5
+        assert [c["id"] for c in results["top"]["data"]] == ["c2"]
+        assert results["table"]["data"][0] == {"campaign_id": "c1", "campaign_name": "One", "spend": "30",
+                                                "date_start": "2024-01-01", "date_stop": "2024-01-30"}
+
+    def test_failed_query_only_fails_its_widgets(self):
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(500, json={"error": {"message": "boom"}})
+            return httpx.Response(200, json={"data": [{"spend": "5"}]})
+
+        plan = plan_widgets(widgets(
+            {"id": "kpis", "type": "kpis", "account_id": "1"},
+            {"id": "counts", "type": "campaignCounts", "account_id": "1"},
+        ))
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await execute_plan(plan, client, "token")
+
+        results = asyncio.run(run())
+
+        assert results["kpis"]["success"] is True
+        assert results["counts"] == {"type": "campaignCounts", "success": False, "error": "boom"}
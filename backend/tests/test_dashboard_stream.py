@@ -0,0 +1,98 @@
+"""
+Test suite for streaming dashboard blocks
+"""
+
+import asyncio
+import json
+
+from services.dashboard import format_ndjson, format_sse, kpis_from_insight, stream_blocks
+
+
+def delayed(value, delay):
+    async def factory():
+        await asyncio.sleep(delay)
+        return value
+    return factory
+
+
+async def collect(blocks, is_disconnected=None):
+    return [event async for event in stream_blocks(blocks, is_disconnected, poll_interval=0.01)]
+
+
+class TestStreamBlocks:
+    """Test that blocks are emitted as they complete"""
+
+    def test_blocks_emitted_in_completion_order(self):
+        blocks = {
+            'kpis': delayed({'totalSpend': 1.0}, 0.1),
+            'sparkline': delayed([], 0.0),
+            'campaigns': delayed({'totalCampaigns': 3}, 0.05),
+        }
+
+        events = asyncio.run(collect(blocks))
+
+        assert [name for name, _ in events] == ['sparkline', 'campaigns', 'kpis', 'done']
+        assert events[2][1] == {'block': 'kpis', 'data': {'totalSpend': 1.0}}
+
+    def test_failed_block_reported_without_stopping_stream(self):
+        async def failing():
+            raise RuntimeError("Meta API error")
+
+        events = asyncio.run(collect({'kpis': failing, 'sparkline': delayed([], 0.01)}))
+
+        assert ('error', {'block': 'kpis', 'error': 'Meta API error'}) in events
+        assert events[-1][0] == 'done'
+
+    def test_disconnect_cancels_outstanding_blocks(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def disconnected():
+            return True
+
+        events = asyncio.run(collect({'fast': delayed(1, 0.0), 'slow': slow}, disconnected))
+
+        assert [name for name, _ in events] == ['fast']
+        assert cancelled == [True]
+
+    def test_consumer_closing_stream_cancels_blocks(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run():
+            stream = stream_blocks({'fast': delayed(1, 0.0), 'slow': slow}, poll_interval=0.01)
+            await stream.__anext__()
+            await stream.aclose()
+
+        asyncio.run(run())
+
+        assert cancelled == [True]
+
+
+class TestFormatting:
+    """Test wire formats"""
+
+    def test_sse_format(self):
+        assert format_sse('kpis', {'block': 'kpis'}) == 'event: kpis\ndata: {"block": "kpis"}\n\n'
+
+    def test_ndjson_format(self):
+        line = format_ndjson('kpis', {'block': 'kpis', 'data': 1})
+        assert line.endswith("\n")
+        assert json.loads(line) == {'event': 'kpis', 'block': 'kpis', 'data': 1}
+
+    def test_kpis_from_empty_insight(self):
+        kpis = kpis_from_insight({})
+        assert kpis['totalSpend'] == 0.0
+        assert kpis['totalConversions'] == 0
@@ -0,0 +1,199 @@
+"""
+Test suite for the fake Graph API server and its synthetic data
+"""
+
+import asyncio
+import json
+import random
+import statistics
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+
+from services.backfill import BackfillPlanner, BackfillRunner
+from services.campaign_counts import CampaignCountCache, fetch_campaign_counts_many
+from services.graph_api import MetaGraphError, graph_get, graph_get_all
+from services.hierarchy_sync import fetch_hierarchy_delta
+from services.jobs import JobQueue
+from services.rate_budget import RateBudget
+from services.sparkline_store import fetch_daily_insights
+from testing.fake_graph import FakeGraph, FakeGraphConfig, LatencyModel
+from testing.synthetic import SyntheticGraphData
+
+UNTIL = date(2024, 3, 31)
+
+
+def make_graph(**config):
+    data = SyntheticGraphData(accounts=2, campaigns=12, days=120, seed=7)
+    return FakeGraph(data, FakeGraphConfig(**config))
+
+
+def run(graph, call):
+    async def main():
+        async with graph.client() as client:
+            return await call(client)
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def graph():
+    return make_graph()
+
+
+@pytest.fixture
+def account(graph):
+    return graph.data.account_ids()[0]
+
+
+class TestSyntheticData:
+    """Test that generated data is stable and consistent"""
+
+    def test_same_seed_same_data(self):
+        a = SyntheticGraphData(campaigns=5, until=UNTIL, seed=3)
+        b = SyntheticGraphData(campaigns=5, until=UNTIL, seed=3)
+        account = a.account_ids()[0]
+
+        assert [c.graph_fields() for c in a.objects(account, 'campaign')] == [c.graph_fields() for c in b.objects(account, 'campaign')]
+        campaign = a.objects(account, 'campaign')[0]
+        assert a.metrics(campaign, UNTIL - timedelta(days=30), UNTIL) == b.metrics(b.get(campaign.id), UNTIL - timedelta(days=30), UNTIL)
+
+    def test_levels_add_up(self, graph, account):
+        data = graph.data
+        since = data.until - timedelta(days=13)
+        campaigns = sum(data.metrics(c, since, data.until).spend for c in data.objects(account, 'campaign'))
+        ads = sum(data.metrics(ad, since, data.until).spend for ad in data.objects(account, 'ad'))
+
+        assert data.metrics(data.account(account), since, data.until).spend == pytest.approx(campaigns)
+        assert ads == pytest.approx(campaigns, rel=0.01)
+
+
+class TestGraphEndpoints:
+    """Test the fake against the services that call Graph"""
+
+    def test_first_hierarchy_sync_then_delta(self, graph, account):
+        deltas = run(graph, lambda client: fetch_hierarchy_delta(client, "token", account, {}))
+
+        live = [c for c in graph.data.objects(account, 'campaign') if c.effective_status not in ('ARCHIVED', 'DELETED')]
+        assert {c['id'] for c in deltas['campaign'].changed} == {c.id for c in live}
+        assert all(a['creative_id'] for a in deltas['ad'].changed)
+
+        watermark = datetime.combine(graph.data.until - timedelta(days=45), datetime.min.time(), timezone.utc)
+        deltas = run(graph, lambda client: fetch_hierarchy_delta(client, "token", account, {'campaign': watermark}))
+        changed = {c['id'] for c in deltas['campaign'].changed}
+        assert changed == {c.id for c in live if c.updated_time.timestamp() > watermark.timestamp() - 300}
+        assert {c['id'] for c in deltas['campaign'].removed} <= {c.id for c in graph.data.objects(account, 'campaign')}
+
+    def test_batched_campaign_counts(self, graph):
+        accounts = graph.data.account_ids()
+
+        counts = run(graph, lambda client: fetch_campaign_counts_many(client, "token", accounts, CampaignCountCache()))
+
+        for account in accounts:
+            statuses = [c.effective_status for c in graph.data.objects(account, 'campaign')]
+            assert counts[account]['activeCampaigns'] == statuses.count('ACTIVE')
+            assert counts[account]['pausedCampaigns'] == statuses.count('PAUSED')
+        assert graph.calls['batch'] == 1 and graph.http_requests == 1
+
+    def test_daily_insights_and_sorting(self, graph, account):
+        columns = run(graph, lambda client: fetch_daily_insights(client, "token", account, 30))
+
+        assert len(columns) == 30
+        assert columns['date_start'][-1] == graph.today.isoformat()
+
+        top = run(graph, lambda client: graph_get(client, f"act_{account}/insights", {
+            'level': 'campaign', 'fields': 'campaign_id,spend', 'date_preset': 'last_30d', 'sort': 'spend_descending'
+        }, "token"))['data']
+        spends = [float(row['spend']) for row in top]
+        assert spends == sorted(spends, reverse=True)
+
+    def test_cursor_pagination(self, graph, account):
+        rows = run(graph, lambda client: graph_get_all(client, f"act_{account}/ads", {'fields': 'id,name', 'limit': 7}, "token"))
+
+        live = [a for a in graph.data.objects(account, 'ad') if a.effective_status not in ('ARCHIVED', 'DELETED')]
+        assert [row['id'] for row in rows] == [a.id for a in live]
+        assert graph.calls['edge'] == -(-len(live) // 7)
+
+    def test_async_report_backfill(self, graph, account, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+        JobQueue(engine).create_schema()
+        planner = BackfillPlanner(engine)
+        planner.plan(account, graph.data.until, months=2)
+        stored = []
+
+        async def store(chunk, rows):
+            stored.extend(rows)
+
+        async def backfill(client):
+            runner = BackfillRunner(planner, client, "token", budget=RateBudget(calls_per_minute=10000), poll_seconds=0)
+            return await runner.run(account, store)
+
+        progress = run(graph, backfill)
+
+        assert progress.complete
+        campaigns = graph.data.objects(account, 'campaign')
+        since = min(chunk.since for chunk in planner.chunks(account))
+        assert sum(row.spend for row in stored) == pytest.approx(
+            sum(graph.data.metrics(c, since, graph.data.until).spend for c in campaigns)
+        )
+
+
+class TestFaults:
+    """Test injected errors, rate limiting and latency"""
+
+    def test_injected_errors_are_retried(self, graph, account):
+        graph.inject_error(status=503, count=1)
+
+        payload = run(graph, lambda client: graph_get(client, f"act_{account}", {'fields': 'name'}, "token"))
+
+        assert payload['name'] == "Synthetic Account 1"
+        assert graph.calls['error'] == 1
+
+    def test_permanent_errors_surface(self, graph, account):
+        graph.inject_error(status=400, code=100, transient=False, path="campaigns")
+
+        with pytest.raises(MetaGraphError) as error:
+            run(graph, lambda client: graph_get(client, f"act_{account}/campaigns", {}, "token"))
+        assert error.value.status_code == 400
+
+    def test_usage_headers_and_throttling(self):
+        now = [0.0]
+        graph = FakeGraph(
+            SyntheticGraphData(campaigns=3, days=30, until=UNTIL),
+            FakeGraphConfig(calls_per_window=4, usage_window_seconds=60),
+            clock=lambda: now[0]
+        )
+        account = graph.data.account_ids()[0]
+        budget = RateBudget()
+
+        async def calls(client):
+            return [await client.get(f"https://graph.facebook.com/v19.0/act_{account}", params={'access_token': 't'}) for _ in range(5)]
+
+        responses = run(graph, calls)
+
+        assert [r.status_code for r in responses] == [200, 200, 200, 200, 400]
+        assert json.loads(responses[1].headers['x-ad-account-usage'])['acc_id_util_pct'] == 50
+        assert responses[-1].json()['error']['code'] == 80004
+        budget.observe(responses[-1].headers, f"act_{account}")
+        assert not budget.try_acquire(account, 'background')
+
+        now[0] = 61.0
+        assert run(graph, lambda client: client.get(
+            f"https://graph.facebook.com/v19.0/act_{account}", params={'access_token': 't'}
+        )).status_code == 200
+
+    def test_latency_models(self):
+        rng = random.Random(1)
+        samples = [LatencyModel.lognormal(0.05, 0.5).sample(rng) for _ in range(2000)]
+
+        assert statistics.median(samples) == pytest.approx(0.05, rel=0.1)
+        assert max(samples) > 0.15
+        assert LatencyModel.constant(0.2).sample(rng) == 0.2
+        assert 0.1 <= LatencyModel.uniform(0.1, 0.3).sample(rng) <= 0.3
+
+    def test_missing_token_is_rejected(self, graph, account):
+        response = run(graph, lambda client: client.get(f"https://graph.facebook.com/v19.0/act_{account}"))
+
+        assert response.status_code == 400
+        assert response.json()['error']['code'] == 190
@@ -0,0 +1,111 @@
+"""
+Test suite for delta hierarchy sync
+"""
+
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import httpx
+
+from services.hierarchy_sync import (
+    HIERARCHY_LEVELS, WATERMARK_OVERLAP_SECONDS, fetch_hierarchy_delta, normalize_object, plan_upserts
+)
+
+CAMPAIGN, ADSET, AD = HIERARCHY_LEVELS
+WATERMARK = datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def fetch(handler, watermarks):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_hierarchy_delta(client, "token", "1", watermarks)
+
+    return asyncio.run(run())
+
+
+class TestFetchDelta:
+    """Test which Graph queries a sync sends"""
+
+    def test_first_sync_fetches_everything(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={"data": [{"id": "1", "updated_time": "2024-03-01T10:00:00+0000"}]})
+
+        deltas = fetch(handler, {})
+
+        assert [r.url.path.rsplit("/", 1)[-1] for r in requests] == ["campaigns", "adsets", "ads"]
+        assert all("filtering" not in r.url.params for r in requests)
+        assert all(delta.full and len(delta.changed) == 1 for delta in deltas.values())
+
+    def test_watermarked_levels_request_changes_and_removals(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            filtering = json.loads(request.url.params["filtering"])
+            if any(f["field"] == "effective_status" for f in filtering):
+                return httpx.Response(200, json={"data": [
+                    {"id": "9", "effective_status": "ARCHIVED", "updated_time": "2024-03-02T00:00:00+0000"}
+                ]})
+            return httpx.Response(200, json={"data": [{"id": "5", "name": "renamed"}]})
+
+        deltas = fetch(handler, {"campaign": WATERMARK, "adset": WATERMARK, "ad": WATERMARK})
+
+        assert len(requests) == 6
+        changed_filter = json.loads(requests[0].url.params["filtering"])
+        assert changed_filter == [{
+            "field": "updated_time", "operator": "GREATER_THAN",
+            "value": int(WATERMARK.timestamp()) - WATERMARK_OVERLAP_SECONDS
+        }]
+        assert requests[1].url.params["fields"] == "id,effective_status,updated_time"
+        assert deltas["campaign"].changed == [{"id": "5", "name": "renamed"}]
+        assert deltas["ad"].removed[0]["effective_status"] == "ARCHIVED"
+        assert not deltas["adset"].full
+
+    def test_naive_watermarks_are_utc(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request.url.params.get("filtering"))
+            return httpx.Response(200, json={"data": []})
+
+        fetch(handler, {"campaign": WATERMARK.replace(tzinfo=None)})
+
+        assert json.loads(seen[0])[0]["value"] == int(WATERMARK.timestamp()) - WATERMARK_OVERLAP_SECONDS
+
+
+class TestNormalizeAndPlan:
+    """Test conversion of Graph objects and minimal upserts"""
+
+    def test_normalize_object(self):
+        values = normalize_object(AD, {
+            "id": "7", "adset_id": "3", "creative": {"id": "c1"},
+            "updated_time": "2024-03-01T10:00:00+0000", "unrequested": "x"
+        })
+
+        assert values == {
+            "id": "7", "adset_id": "3", "creative_id": "c1",
+            "updated_time": datetime(2024, 3, 1, 10, tzinfo=timezone.utc)
+        }
+        assert normalize_object(ADSET, {"id": "3", "daily_budget": "2500", "bid_amount": "150"}) == {
+            "id": "3", "daily_budget": 2500.0, "bid_amount": 150
+        }
+
+    def test_plan_upserts_writes_only_differences(self):
+        stored = {
+            "1": {"name": "same", "status": "ACTIVE", "updated_time": datetime(2024, 3, 1, 10)},
+            "2": {"name": "old", "status": "ACTIVE", "updated_time": datetime(2024, 3, 1, 10)},
+        }
+        changed = [
+            {"id": "1", "name": "same", "status": "ACTIVE", "updated_time": datetime(2024, 3, 1, 10, tzinfo=timezone.utc)},
+            {"id": "2", "name": "new", "status": "ACTIVE"},
+            {"id": "3", "name": "fresh"},
+        ]
+
+        inserts, updates = plan_upserts(stored, changed)
+
+        assert inserts == [{"id": "3", "name": "fresh"}]
+        assert updates == {"2": {"name": "new"}}
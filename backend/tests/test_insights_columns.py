@@ -0,0 +1,147 @@
+"""
+Test suite for the columnar insights parser
+"""
+
+import json
+import time
+import tracemalloc
+
+import pytest
+
+from services.graph_api import action_total
+from services.insights_columns import InsightColumns, parse_insights
+
+
+def ad_rows(count):
+    return [
+        {
+            "ad_id": str(1000 + i),
+            "date_start": "2024-01-01",
+            "impressions": str(1000 + i),
+            "clicks": str(i % 50),
+            "spend": f"{i % 97}.{i % 100:02d}",
+            "ctr": "1.234",
+            "actions": [
+                {"action_type": "link_click", "value": str(i % 50)},
+                {"action_type": "purchase", "value": str(i % 3)},
+            ],
+            "action_values": [{"action_type": "purchase", "value": "19.99"}],
+        }
+        for i in range(count)
+    ]
+
+
+def per_dict_convert(payload):
+    """The field-by-field conversion the endpoints do today"""
+    return [
+        {
+            "id": row.get("ad_id"),
+            "impressions": int(row.get("impressions", 0)),
+            "clicks": int(row.get("clicks", 0)),
+            "spend": float(row.get("spend", 0)),
+            "ctr": float(row.get("ctr", 0)),
+            "actions": {a["action_type"]: float(a["value"]) for a in row.get("actions", [])},
+            "purchase_value": action_total(row.get("action_values")),
+        }
+        for row in json.loads(payload)["data"]
+    ]
+
+
+class TestInsightColumns:
+    """Test typed columns built from string metrics"""
+
+    def test_metrics_are_typed(self):
+        columns = parse_insights(json.dumps({"data": ad_rows(3)}).encode())
+
+        assert len(columns) == 3
+        assert columns["impressions"].typecode == "q"
+        assert list(columns["impressions"]) == [1000, 1001, 1002]
+        assert columns["spend"].typecode == "d"
+        assert columns["spend"][2] == pytest.approx(2.02)
+        assert columns["ad_id"] == ["1000", "1001", "1002"]
+
+    def test_actions_flattened_per_type(self):
+        columns = parse_insights({"data": ad_rows(3)})
+
+        assert columns.action_types("actions") == ["link_click", "purchase"]
+        assert list(columns["actions.purchase"]) == [0.0, 1.0, 2.0]
+        assert columns.sum("action_values.purchase") == pytest.approx(59.97)
+        assert columns.action_total("actions") == [0.0, 2.0, 4.0]
+
+    def test_missing_values_read_as_zero(self):
+        columns = InsightColumns().extend([
+            {"spend": "1.5"},
+            {"clicks": "3", "actions": [{"action_type": "purchase", "value": "2"}]},
+            {"spend": "", "clicks": "4.0", "campaign_name": "Late"},
+        ])
+
+        assert list(columns["spend"]) == [1.5, 0.0, 0.0]
+        assert list(columns["clicks"]) == [0, 3, 4]
+        assert list(columns["actions.purchase"]) == [0.0, 2.0, 0.0]
+        assert columns["campaign_name"] == [None, None, "Late"]
+        assert "reach" not in columns
+
+    def test_pages_append_to_one_set(self):
+        columns = parse_insights({"data": ad_rows(2)})
+        parse_insights({"data": ad_rows(3)}, columns)
+
+        assert len(columns) == 5
+        assert len(columns["actions.link_click"]) == 5
+
+    def test_duplicate_action_types_are_summed(self):
+        columns = InsightColumns().extend([{
+            "actions": [{"action_type": "purchase", "value": "1"}, {"action_type": "purchase", "value": "2"}]
+        }])
+
+        assert list(columns["actions.purchase"]) == [3.0]
+
+    def test_values_read_numbers_action_lists_and_strings(self):
+        rows = [
+            {"spend": "1.5", "conversions": [{"action_type": "a", "value": "1"}, {"action_type": "b", "value": "2"}]},
+            {"spend": "2", "conversions": "4", "clicks": "3"},
+        ]
+        columns = InsightColumns().extend(rows)
+
+        for name in ("spend", "conversions", "clicks", "reach"):
+            assert list(columns.values(name)) == [action_total(row.get(name)) for row in rows]
+
+    def test_rows_round_trip(self):
+        rows = list(parse_insights({"data": ad_rows(1)}).rows())
+
+        assert rows[0]["impressions"] == 1000
+        assert rows[0]["actions.link_click"] == 0.0
+
+
+@pytest.mark.benchmark
+class TestInsightColumnsBenchmark:
+    """Throughput and peak memory against per-dict conversion on 100k ad rows"""
+
+    ROWS = 100_000
+
+    def measure(self, parse, payload):
+        started = time.perf_counter()
+        result = parse(payload)
+        elapsed = time.perf_counter() - started
+        del result
+
+        # Timed separately: tracemalloc slows allocation-heavy code several times over
+        tracemalloc.start()
+        result = parse(payload)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, elapsed, peak, retained
+
+    def test_columnar_vs_per_dict(self):
+        payload = json.dumps({"data": ad_rows(self.ROWS)}).encode()
+
+        _, dict_time, dict_peak, dict_retained = self.measure(per_dict_convert, payload)
+        columns, column_time, column_peak, column_retained = self.measure(parse_insights, payload)
+
+        for label, elapsed, peak, retained in (
+            ("per-dict", dict_time, dict_peak, dict_retained),
+            ("columnar", column_time, column_peak, column_retained),
+        ):
+            print(f"\n{label}: {self.ROWS / elapsed:,.0f} rows/s, peak {peak / 2**20:.1f} MiB, retained {retained / 2**20:.1f} MiB")
+        assert len(columns) == self.ROWS
+        assert column_peak < dict_peak
+        assert column_retained * 4 < dict_retained
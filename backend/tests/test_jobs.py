@@ -0,0 +1,208 @@
+"""
+Test suite for the durable job queue
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, update
+
+from services.jobs import (
+    FAILED, QUEUED, RUNNING, SUCCEEDED, DeferJob, JobQueue, JobWorker, PermanentJobError, jobs_table, utcnow
+)
+from services.resilience import RetryPolicy
+
+
+@pytest.fixture
+def queue(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    queue = JobQueue(engine, lease_seconds=30, retry_policy=RetryPolicy(base_delay=10, max_delay=10))
+    queue.create_schema()
+    return queue
+
+
+def expire_lease(queue, job):
+    with queue.engine.begin() as conn:
+        conn.execute(
+            update(jobs_table).where(jobs_table.c.id == job.id).values(lease_expires_at=utcnow() - timedelta(seconds=1))
+        )
+
+
+class TestJobQueue:
+    """Test claiming, leases, retries and ownership"""
+
+    def test_enqueue_claim_complete(self, queue):
+        job = queue.enqueue('sync', {'account_id': '1'}, owner='user-1')
+        assert job.status == QUEUED
+
+        claimed = queue.claim(['sync'], 'worker-a')
+        assert [j.id for j in claimed] == [job.id]
+        assert claimed[0].status == RUNNING and claimed[0].attempts == 1
+        assert queue.claim(['sync'], 'worker-b') == []
+
+        assert queue.complete(claimed[0], {'accounts_synced': 3})
+        done = queue.get(job.id)
+        assert done.status == SUCCEEDED
+        assert done.result == {'accounts_synced': 3}
+        assert done.finished_at is not None
+
+    def test_claim_order_and_types(self, queue):
+        low = queue.enqueue('sync', {})
+        high = queue.enqueue('sync', {}, priority=5)
+        queue.enqueue('backfill', {})
+
+        claimed = queue.claim(['sync'], 'worker-a', limit=5)
+
+        assert [j.id for j in claimed] == [high.id, low.id]
+
+    def test_future_jobs_wait(self, queue):
+        queue.enqueue('sync', {}, run_at=utcnow() + timedelta(minutes=5))
+
+        assert queue.claim(['sync'], 'worker-a') == []
+
+    def test_failure_retries_with_backoff_then_fails(self, queue):
+        job = queue.enqueue('sync', {}, max_attempts=2)
+
+        first = queue.claim(['sync'], 'worker-a')[0]
+        assert queue.fail(first, 'boom')
+        retried = queue.get(job.id)
+        assert retried.status == QUEUED
+        assert retried.last_error == 'boom'
+        assert retried.run_at > utcnow()
+
+        with queue.engine.begin() as conn:
+            conn.execute(update(jobs_table).values(run_at=utcnow()))
+        second = queue.claim(['sync'], 'worker-a')[0]
+        assert second.attempts == 2
+        queue.fail(second, 'boom again')
+        assert queue.get(job.id).status == FAILED
+
+    def test_expired_lease_is_taken_over(self, queue):
+        job = queue.enqueue('sync', {})
+        crashed = queue.claim(['sync'], 'worker-a')[0]
+        expire_lease(queue, crashed)
+
+        taken = queue.claim(['sync'], 'worker-b')[0]
+
+        assert taken.id == job.id and taken.attempts == 2
+        # The old worker can no longer touch the job
+        assert not queue.heartbeat(crashed)
+        assert not queue.complete(crashed)
+        assert queue.heartbeat(taken)
+        assert queue.complete(taken)
+
+    def test_expired_lease_on_last_attempt_fails(self, queue):
+        job = queue.enqueue('sync', {}, max_attempts=1)
+        expire_lease(queue, queue.claim(['sync'], 'worker-a')[0])
+
+        assert queue.claim(['sync'], 'worker-b') == []
+        assert queue.get(job.id).status == FAILED
+
+    def test_get_scoped_to_owner(self, queue):
+        job = queue.enqueue('sync', {}, owner='user-1')
+
+        assert queue.get(job.id, owner='user-1') is not None
+        assert queue.get(job.id, owner='user-2') is None
+
+    def test_concurrent_claims_are_disjoint(self, queue):
+        for _ in range(40):
+            queue.enqueue('sync', {})
+        claims = []
+
+        def claim_all(worker_id):
+            while True:
+                jobs = queue.claim(['sync'], worker_id, limit=3)
+                if not jobs:
+                    return
+                claims.extend(j.id for j in jobs)
+
+        threads = [threading.Thread(target=claim_all, args=(f"worker-{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(claims) == 40
+        assert len(set(claims)) == 40
+
+
+class TestJobWorker:
+    """Test handler outcomes and per-type concurrency"""
+
+    def test_handler_outcomes(self, queue):
+        ok = queue.enqueue('sync', {'n': 1})
+        flaky = queue.enqueue('sync', {'raise': 'transient'})
+        broken = queue.enqueue('sync', {'raise': 'permanent'})
+
+        async def handler(job):
+            if job.payload.get('raise') == 'transient':
+                raise RuntimeError("Meta timed out")
+            if job.payload.get('raise') == 'permanent':
+                raise PermanentJobError("token revoked")
+            return {'n': job.payload['n']}
+
+        ran = asyncio.run(JobWorker(queue, {'sync': handler}, worker_id='w').run_until_idle())
+
+        assert ran == 3
+        assert queue.get(ok.id).result == {'n': 1}
+        assert queue.get(flaky.id).status == QUEUED
+        assert queue.get(flaky.id).last_error == "RuntimeError: Meta timed out"
+        assert queue.get(broken.id).status == FAILED
+
+    def test_deferred_job_keeps_its_attempts(self, queue):
+        job = queue.enqueue('backfill', {}, max_attempts=1)
+
+        async def handler(job):
+            raise DeferJob(60, "budget spent")
+
+        asyncio.run(JobWorker(queue, {'backfill': handler}, worker_id='w').run_until_idle())
+
+        deferred = queue.get(job.id)
+        assert deferred.status == QUEUED
+        assert deferred.attempts == 0
+        assert deferred.last_error == "budget spent"
+        assert deferred.run_at > utcnow() + timedelta(seconds=50)
+
+    def test_concurrency_per_job_type(self, queue):
+        for _ in range(6):
+            queue.enqueue('sync', {})
+            queue.enqueue('backfill', {})
+        running = {'sync': 0, 'backfill': 0}
+        peak = {'sync': 0, 'backfill': 0}
+
+        def handler(job_type):
+            async def run(job):
+                running[job_type] += 1
+                peak[job_type] = max(peak[job_type], running[job_type])
+                await asyncio.sleep(0.01)
+                running[job_type] -= 1
+            return run
+
+        worker = JobWorker(
+            queue,
+            {'sync': handler('sync'), 'backfill': handler('backfill')},
+            concurrency={'sync': 3, 'backfill': 1}
+        )
+        assert asyncio.run(worker.run_until_idle()) == 12
+
+        assert peak['sync'] <= 3
+        assert peak['backfill'] == 1
+
+
+def test_worker_entrypoint_imports(tmp_path):
+    """The Procfile's ``python worker.py`` runs from backend/ with it as the import root"""
+    backend = Path(__file__).parent.parent
+    env = {**os.environ, 'DATABASE_URL': f"sqlite:///{tmp_path / 'worker.db'}"}
+    result = subprocess.run(
+        [sys.executable, '-c', "import worker\nfrom api.jobs import build_worker\nprint(callable(build_worker))"],
+        cwd=backend, env=env, capture_output=True, text=True, timeout=60
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith('True')
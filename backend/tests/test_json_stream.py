@@ -0,0 +1,207 @@
+"""
+Test suite for streaming decode of Graph list responses
+"""
+
+import asyncio
+import json
+import tracemalloc
+
+import httpx
+import pytest
+
+from services.graph_api import MetaGraphError, graph_get_all, graph_stream
+from services.insights_columns import stream_insights
+from services.json_stream import PageDecoder
+
+
+def ad_row(i):
+    return {
+        "ad_id": str(i),
+        "impressions": str(1000 + i),
+        "spend": "1.25",
+        "actions": [{"action_type": "purchase", "value": "1"}],
+    }
+
+
+class ChunkedStream(httpx.AsyncByteStream):
+    """Serve a page body in small chunks, generating rows lazily"""
+
+    def __init__(self, rows, paging=None, chunk_size=512, truncate=False):
+        self.rows = rows
+        self.paging = paging
+        self.chunk_size = chunk_size
+        self.truncate = truncate
+
+    def parts(self):
+        yield b'{"data":['
+        for i, row in enumerate(self.rows):
+            yield (b"," if i else b"") + json.dumps(row).encode()
+        if self.truncate:
+            return
+        yield b"]"
+        if self.paging:
+            yield b',"paging":' + json.dumps(self.paging).encode()
+        yield b"}"
+
+    async def __aiter__(self):
+        pending = b""
+        for part in self.parts():
+            pending += part
+            while len(pending) >= self.chunk_size:
+                yield pending[:self.chunk_size]
+                pending = pending[self.chunk_size:]
+        if pending:
+            yield pending
+
+
+def paged_handler(pages, requests=None, **stream_options):
+    def handler(request):
+        if requests is not None:
+            requests.append(request)
+        page = int(request.url.params.get("after", "0"))
+        start, end = pages[page]
+        paging = {"cursors": {"after": str(page + 1)}, "next": "https://next"} if page + 1 < len(pages) else None
+        rows = (ad_row(i) for i in range(start, end))
+        return httpx.Response(200, stream=ChunkedStream(rows, paging, **stream_options))
+
+    return handler
+
+
+def run(handler, coro_factory):
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await coro_factory(client)
+
+    return asyncio.run(go())
+
+
+async def collect(client, **kwargs):
+    return [row async for row in graph_stream(client, "act_1/insights", {"level": "ad"}, "token", **kwargs)]
+
+
+class TestPageDecoder:
+    """Test incremental decoding across arbitrary chunk boundaries"""
+
+    def test_any_chunk_size_yields_same_rows(self):
+        doc = {"data": [{"id": i, "name": "café \"q\"", "v": [1, 2.5]} for i in range(20)] + [7, 12345],
+               "paging": {"cursors": {"after": "x"}}, "summary": {"total_count": 22}}
+        raw = json.dumps(doc, ensure_ascii=False).encode()
+
+        for size in (1, 2, 5, 64, len(raw)):
+            decoder = PageDecoder()
+            rows = []
+            for i in range(0, len(raw), size):
+                rows.extend(decoder.feed(raw[i:i + size]))
+            rows.extend(decoder.close())
+
+            assert rows == doc["data"]
+            assert decoder.envelope == {"paging": doc["paging"], "summary": doc["summary"]}
+
+    def test_rows_released_as_they_complete(self):
+        decoder = PageDecoder()
+
+        assert decoder.feed(b'{"data":[{"a":1},{"a"') == [{"a": 1}]
+        assert decoder.feed(b':2}]}') == [{"a": 2}]
+        assert decoder.close() == []
+
+    def test_truncated_and_malformed_bodies_fail(self):
+        truncated = PageDecoder()
+        truncated.feed(b'{"data":[{"a":1}')
+        with pytest.raises(ValueError):
+            truncated.close()
+
+        with pytest.raises(ValueError):
+            PageDecoder().feed(b'[1, 2]')
+
+        with pytest.raises(ValueError):
+            PageDecoder(max_element_chars=16).feed(b'{"data":[{"name":"' + b"x" * 32)
+
+
+class TestGraphStream:
+    """Test streamed pagination against the Graph client"""
+
+    def test_rows_streamed_across_pages(self):
+        requests = []
+
+        rows = run(paged_handler([(0, 30), (30, 45)], requests), collect)
+
+        assert [row["ad_id"] for row in rows] == [str(i) for i in range(45)]
+        assert len(requests) == 2
+        assert requests[1].url.params["after"] == "1"
+
+    def test_error_status_raises(self):
+        handler = lambda request: httpx.Response(400, json={"error": {"message": "bad field", "code": 100}})
+
+        with pytest.raises(MetaGraphError) as error:
+            run(handler, collect)
+
+        assert error.value.status_code == 400
+        assert error.value.message == "bad field"
+
+    def test_server_error_retried_before_streaming(self):
+        calls = []
+        ok = paged_handler([(0, 3)])
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(503, json={"error": {"message": "unavailable"}})
+            return ok(request)
+
+        rows = run(handler, collect)
+
+        assert len(rows) == 3
+        assert len(calls) == 2
+
+    def test_truncated_body_raises(self):
+        with pytest.raises(MetaGraphError) as error:
+            run(paged_handler([(0, 5)], truncate=True), collect)
+
+        assert error.value.status_code == 502
+
+    def test_stream_into_columns(self):
+        columns = run(paged_handler([(0, 10), (10, 25)]), lambda client: stream_insights(
+            client, "act_1/insights", {"level": "ad"}, "token"
+        ))
+
+        assert len(columns) == 25
+        assert columns.sum("impressions") == sum(1000 + i for i in range(25))
+        assert columns.sum("actions.purchase") == 25.0
+
+
+@pytest.mark.benchmark
+class TestGraphStreamMemory:
+    """Peak memory of streamed versus buffered pages"""
+
+    ROWS = 50_000
+
+    def peak(self, coro_factory):
+        handler = paged_handler([(0, self.ROWS)], chunk_size=64 * 1024)
+
+        async def go():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                tracemalloc.start()
+                total = await coro_factory(client)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                return total, peak
+
+        return asyncio.run(go())
+
+    def test_streaming_keeps_memory_per_row(self):
+        async def buffered(client):
+            rows = await graph_get_all(client, "act_1/insights", {}, "token")
+            return sum(int(row["impressions"]) for row in rows)
+
+        async def streamed(client):
+            total = 0
+            async for row in graph_stream(client, "act_1/insights", {}, "token"):
+                total += int(row["impressions"])
+            return total
+
+        buffered_total, buffered_peak = self.peak(buffered)
+        streamed_total, streamed_peak = self.peak(streamed)
+
+        print(f"\nbuffered peak {buffered_peak / 2**20:.1f} MiB, streamed peak {streamed_peak / 2**20:.1f} MiB")
+        assert streamed_total == buffered_total
+        assert streamed_peak * 10 < buffered_peak
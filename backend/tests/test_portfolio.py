@@ -0,0 +1,173 @@
+"""
+Test suite for agency portfolio aggregation
+"""
+
+import asyncio
+import httpx
+import pytest
+
+from services.portfolio import (
+    PortfolioAccount,
+    aggregate_portfolio,
+    convert_amount,
+    resolve_employee_accounts,
+)
+
+FX_RATES = {"USD": 1.0, "EUR": 1.1}
+
+
+def make_accounts(n):
+    return [PortfolioAccount(account_id=str(i), client_name=f"Client {i}") for i in range(n)]
+
+
+class TestCurrencyConversion:
+    """Test currency normalization"""
+
+    def test_same_currency(self):
+        assert convert_amount(10.0, "usd", "USD", FX_RATES) == 10.0
+
+    def test_convert_to_target(self):
+        assert convert_amount(10.0, "EUR", "USD", FX_RATES) == pytest.approx(11.0)
+        assert convert_amount(11.0, "USD", "EUR", FX_RATES) == pytest.approx(10.0)
+
+    def test_missing_rate(self):
+        assert convert_amount(10.0, "JPY", "USD", FX_RATES) is None
+
+
+class TestAggregatePortfolio:
+    """Test concurrent fan-out and merging"""
+
+    def test_merges_totals_across_currencies(self):
+        async def fetch(account_id):
+            currency = "EUR" if account_id == "1" else "USD"
+            return {"spend": "10", "impressions": "1000", "clicks": "10",
+                    "conversions": [{"action_type": "purchase", "value": "2"}],
+                    "account_currency": currency}
+
+        result = asyncio.run(aggregate_portfolio(make_accounts(2), fetch, fx_rates=FX_RATES))
+
+        assert result["partial"] is False
+        assert result["summary"]["ok"] == 2
+        assert result["totals"]["spend"] == pytest.approx(21.0)
+        assert result["totals"]["impressions"] == 2000
+        assert result["totals"]["conversions"] == 4
+        assert result["totals"]["ctr"] == pytest.approx(1.0)
+
+    def test_unconvertible_accounts_excluded_from_totals(self):
+        async def fetch(account_id):
+            return {"spend": "10", "impressions": "100", "clicks": "1",
+                    "account_currency": "JPY" if account_id == "0" else "USD"}
+
+        result = asyncio.run(aggregate_portfolio(make_accounts(2), fetch, fx_rates=FX_RATES))
+
+        assert result["totals"]["spend"] == 10.0
+        assert result["summary"]["unconverted"] == ["0"]
+
+    def test_slow_and_failing_accounts_return_partial_results(self):
+        async def fetch(account_id):
+            if account_id == "1":
+                await asyncio.sleep(5)
+            if account_id == "2":
+                raise RuntimeError("permission denied")
+            return {"spend": "5", "impressions": "10", "clicks": "1"}
+
+        result = asyncio.run(aggregate_portfolio(
+            make_accounts(3), fetch, fx_rates=FX_RATES, per_account_timeout=0.05, deadline=1.0
+        ))
+
+        statuses = {a["accountId"]: a["status"] for a in result["accounts"]}
+        assert statuses == {"0": "ok", "1": "timeout", "2": "error"}
+        assert result["partial"] is True
+        assert result["totals"]["spend"] == 5.0
+
+    def test_global_deadline_cancels_outstanding_fetches(self):
+        cancelled = []
+
+        async def fetch(account_id):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(account_id)
+                raise
+            return {}
+
+        result = asyncio.run(aggregate_portfolio(
+            make_accounts(4), fetch, fx_rates=FX_RATES, per_account_timeout=10, deadline=0.05
+        ))
+
+        assert result["summary"]["timeout"] == 4
+        assert all(a["reason"] == "deadline" for a in result["accounts"])
+        assert len(cancelled) == 4
+
+    def test_cancelling_the_caller_cancels_fetches(self):
+        started, cancelled = [], []
+
+        async def fetch(account_id):
+            started.append(account_id)
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(account_id)
+                raise
+            return {}
+
+        async def main():
+            caller = asyncio.create_task(aggregate_portfolio(
+                make_accounts(5), fetch, fx_rates=FX_RATES, per_account_timeout=10, deadline=10
+            ))
+            while len(started) < 5:
+                await asyncio.sleep(0)
+            caller.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await caller
+            return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+        assert asyncio.run(main()) == []
+        assert sorted(cancelled) == sorted(started)
+
+    def test_fan_out_runs_concurrently(self):
+        async def fetch(account_id):
+            await asyncio.sleep(0.05)
+            return {"spend": "1", "impressions": "1", "clicks": "0"}
+
+        result = asyncio.run(aggregate_portfolio(
+            make_accounts(200), fetch, fx_rates=FX_RATES, max_concurrency=200
+        ))
+
+        assert result["summary"]["ok"] == 200
+        assert result["summary"]["elapsedMs"] < 1000
+
+
+class TestResolveEmployeeAccounts:
+    """Test account resolution through the agency schema"""
+
+    def test_owner_and_granted_accounts(self):
+        def handler(request):
+            path = request.url.path
+            if path.endswith("/employees"):
+                return httpx.Response(200, json=[
+                    {"id": "emp-1", "agency_id": "agency-1", "role": "owner"},
+                    {"id": "emp-2", "agency_id": "agency-2", "role": "viewer"},
+                ])
+            if path.endswith("/client_accounts"):
+                return httpx.Response(200, json=[
+                    {"id": "ca-1", "agency_id": "agency-1", "meta_account_id": "act_111", "client_name": "A"},
+                ])
+            if path.endswith("/employee_client_access"):
+                return httpx.Response(200, json=[
+                    {"permissions": {"view": True}, "client_accounts": {
+                        "id": "ca-2", "agency_id": "agency-2", "meta_account_id": "222",
+                        "client_name": "B", "status": "active"}},
+                    {"permissions": {"view": False}, "client_accounts": {
+                        "id": "ca-3", "agency_id": "agency-2", "meta_account_id": "333",
+                        "client_name": "C", "status": "active"}},
+                ])
+            return httpx.Response(404)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await resolve_employee_accounts(client, "https://supabase.test", "key", "user-1")
+
+        accounts = asyncio.run(run())
+
+        assert sorted(a.account_id for a in accounts) == ["111", "222"]
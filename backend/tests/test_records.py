@@ -0,0 +1,133 @@
+"""
+Test suite for slotted metric records
+"""
+
+import tracemalloc
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from services.dashboard import top_campaigns_from_rows
+from services.records import MetricsRow, rows_from_insights
+
+
+def insight(i, **extra):
+    return {
+        "campaign_id": str(i),
+        "campaign_name": f"Campaign {i}",
+        "date_start": "2024-01-01",
+        "impressions": str(1000 + i),
+        "clicks": "25",
+        "spend": f"{10 + i}.50",
+        "ctr": "2.5",
+        "cpc": "0.42",
+        "cpm": "10.5",
+        "conversions": [{"action_type": "purchase", "value": "3"}],
+        **extra,
+    }
+
+
+class MetricsResponse(BaseModel):
+    """Mirror of the per-row response model in api/meta.py"""
+    date: str
+    impressions: int
+    clicks: int
+    ctr: float
+    cpc: float
+    cpm: float
+    spend: float
+    conversions: int
+    roas: float
+
+
+class TestMetricsRow:
+    """Test conversion into and out of the compact record"""
+
+    def test_from_insight_converts_strings(self):
+        row = MetricsRow.from_insight(insight(1, action_values=[
+            {"action_type": "purchase", "value": "40"},
+            {"action_type": "omni_purchase", "value": "44"},
+        ]))
+
+        assert (row.object_id, row.name) == ("1", "Campaign 1")
+        assert row.impressions == 1001 and row.spend == 11.5
+        assert row.conversions == 3
+        # omni_purchase already includes the pixel purchase; it must not be added twice
+        assert row.purchase_value == 44.0
+        assert row.roas == pytest.approx(44.0 / 11.5)
+
+    def test_record_has_no_instance_dict(self):
+        row = MetricsRow("ad")
+
+        assert not hasattr(row, "__dict__")
+        with pytest.raises(AttributeError):
+            row.unknown = 1
+
+    def test_from_model_keeps_stored_ratios(self):
+        metric = SimpleNamespace(
+            date_start=date(2024, 1, 2), date_stop=date(2024, 1, 2), impressions=100, clicks=None,
+            reach=50, conversions=2, spend=5.0, ctr=1.5, cpc=0.0, cpm=50.0, purchase_value=20.0, roas=4.0
+        )
+
+        payload = MetricsRow.from_model(metric).metrics_payload()
+
+        assert payload == {
+            "date": "2024-01-02", "impressions": 100, "clicks": 0, "ctr": 1.5, "cpc": 0.0,
+            "cpm": 50.0, "spend": 5.0, "conversions": 2, "roas": 4.0,
+        }
+        MetricsResponse(**payload)
+
+    def test_levels_pick_their_id_fields(self):
+        rows = rows_from_insights([{"ad_id": "9", "ad_name": "Ad", "spend": None}], level="ad")
+
+        assert (rows[0].object_id, rows[0].name, rows[0].spend) == ("9", "Ad", 0.0)
+
+    def test_top_campaigns_sorted_by_spend(self):
+        top = top_campaigns_from_rows([insight(1), insight(3), insight(2)], limit=2)
+
+        assert [c["id"] for c in top] == ["3", "2"]
+        assert top[0] == {"id": "3", "name": "Campaign 3", "spend": 13.5, "impressions": 1003,
+                          "clicks": 25, "ctr": 2.5, "conversions": 3}
+
+
+@pytest.mark.benchmark
+class TestMetricsRowAllocations:
+    """Allocated bytes per 10k rows: dict plus Pydantic model versus slotted record"""
+
+    ROWS = 10_000
+
+    def allocated(self, convert, rows):
+        tracemalloc.start()
+        result = convert(rows)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(result) == self.ROWS
+        return current
+
+    def test_slotted_records_allocate_less(self):
+        rows = [insight(i) for i in range(self.ROWS)]
+
+        def per_dict(rows):
+            converted = [
+                {
+                    "date": row.get("date_start"),
+                    "impressions": int(row.get("impressions", 0)),
+                    "clicks": int(row.get("clicks", 0)),
+                    "ctr": float(row.get("ctr", 0)),
+                    "cpc": float(row.get("cpc", 0)),
+                    "cpm": float(row.get("cpm", 0)),
+                    "spend": float(row.get("spend", 0)),
+                    "conversions": 3,
+                    "roas": 0.0,
+                }
+                for row in rows
+            ]
+            return [MetricsResponse(**row) for row in converted]
+
+        before = self.allocated(per_dict, rows)
+        after = self.allocated(rows_from_insights, rows)
+
+        print(f"\ndict + model: {before / self.ROWS:.0f} B/row, slotted record: {after / self.ROWS:.0f} B/row")
+        assert after * 2 < before
@@ -0,0 +1,109 @@
+"""
+Test suite for request validation shared by the Railway routes
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from services.graph_api import parse_account_id
+
+railway_main = pytest.importorskip("railway_main")
+
+
+@pytest.fixture
+def app():
+    railway_main.app.dependency_overrides[railway_main.get_user_meta_token] = lambda: "token"
+    yield railway_main.app
+    railway_main.app.dependency_overrides.clear()
+
+
+def post(app, path, body):
+    def refuse(request):
+        raise AssertionError(f"Unexpected upstream call to {request.url}")
+
+    original = httpx.AsyncClient
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with original(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=body)
+
+    # Any client the route builds for itself must not be used
+    httpx.AsyncClient = lambda *args, **kwargs: original(transport=httpx.MockTransport(refuse))
+    try:
+        return asyncio.run(main())
+    finally:
+        httpx.AsyncClient = original
+
+
+class TestAccountIds:
+    """Test that account IDs are validated before any upstream call"""
+
+    def test_parse_account_id(self):
+        assert parse_account_id("act_123") == "123"
+        assert parse_account_id(" 123 ") == "123"
+        assert parse_account_id(123) == "123"
+        for value in (None, "", "act_", "None", "12a", "1/../2", "١٢٣"):
+            assert parse_account_id(value) is None
+
+    @pytest.mark.parametrize("path", [
+        "/api/dashboard-metrics", "/api/dashboard-stream", "/api/sparkline-data",
+        "/api/campaigns", "/api/export/insights", "/api/export/hierarchy", "/api/range-totals",
+    ])
+    @pytest.mark.parametrize("body", [{}, {"account_id": None}, {"account_id": "act_None"}])
+    def test_missing_or_malformed_id_is_rejected(self, app, path, body):
+        response = post(app, path, body)
+
+        assert response.status_code == 400
+        assert "account_id" in response.json()["detail"]
+
+    def test_batch_rejects_malformed_ids(self, app):
+        response = post(app, "/api/sparkline-data/batch", {"account_ids": ["1", "act_x"]})
+
+        assert response.status_code == 400
+
+
+class TestNumericFields:
+    """Test that numeric request fields are validated and clamped"""
+
+    @pytest.mark.parametrize("path", [
+        "/api/dashboard-metrics", "/api/sparkline-data", "/api/sparkline-data/batch", "/api/ad-accounts",
+        "/api/campaigns",
+    ])
+    @pytest.mark.parametrize("value", ["abc", "nan", [1], True])
+    def test_malformed_max_staleness_is_rejected(self, app, path, value):
+        response = post(app, path, {"account_id": "1", "account_ids": ["1"], "max_staleness": value})
+
+        assert response.status_code == 400
+        assert "max_staleness" in response.json()["detail"]
+
+    @pytest.mark.parametrize("path", ["/api/sparkline-data", "/api/sparkline-data/batch"])
+    @pytest.mark.parametrize("value", ["abc", None, "1e9", [7]])
+    def test_malformed_window_is_rejected(self, app, path, value):
+        response = post(app, path, {"account_id": "1", "account_ids": ["1"], "window": value})
+
+        assert response.status_code == 400
+        assert "window" in response.json()["detail"]
+
+    @pytest.mark.parametrize("body", [
+        {"per_account_timeout": "abc"}, {"deadline": None}, {"max_concurrency": "many"},
+        {"fx_rates": {"EUR": "x"}}, {"fx_rates": {"EUR": 0}}, {"fx_rates": ["EUR"]},
+    ])
+    def test_malformed_portfolio_fields_are_rejected(self, app, body):
+        app.dependency_overrides[railway_main.get_authenticated_user] = lambda: {"user_id": "u1", "meta_token": "token"}
+
+        response = post(app, "/api/agency/portfolio", body)
+
+        assert response.status_code == 400
+
+    def test_portfolio_fields_are_clamped(self):
+        assert railway_main._request_number(0, "max_concurrency", 1, 100, cast=int) == 1
+        assert railway_main._request_number(-3.0, "deadline", 0.1, 10.0) == 0.1
+        assert railway_main._request_number("500", "max_concurrency", 1, 100, cast=int) == 100
+
+    def test_max_staleness_is_clamped_at_zero(self):
+        assert railway_main._max_staleness({"max_staleness": -5}) == 0.0
+        assert railway_main._max_staleness({"max_staleness": None}) == 0.0
+        assert railway_main._max_staleness({"max_staleness": "30"}) == 30.0
@@ -0,0 +1,149 @@
+"""
+Test suite for upstream retries, circuit breakers and hedging
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from services import resilience
+from services.graph_api import MetaGraphError, graph_get
+from services.resilience import CircuitBreaker, CircuitOpenError, resilient_get, retry_reason, upstream_policy
+
+
+def run(handler, upstream="meta", **policy):
+    async def go():
+        with upstream_policy(upstream, base_delay=0.0, **policy):
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await resilient_get(client, upstream, "https://graph.test/me")
+
+    return asyncio.run(go())
+
+
+def sequence(*responses):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        response = responses[min(len(calls), len(responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    return handler, calls
+
+
+class TestRetries:
+    """Test which failures are retried"""
+
+    def test_server_error_retried(self):
+        handler, calls = sequence(httpx.Response(500), httpx.Response(200, json={"data": []}))
+
+        response = run(handler)
+
+        assert response.status_code == 200
+        assert len(calls) == 2
+
+    def test_meta_throttling_retried(self):
+        throttled = httpx.Response(400, json={"error": {"message": "User request limit reached", "code": 17}})
+        handler, calls = sequence(throttled, httpx.Response(200, json={}))
+
+        assert run(handler).status_code == 200
+        assert len(calls) == 2
+
+    def test_permanent_errors_not_retried(self):
+        handler, calls = sequence(httpx.Response(400, json={"error": {"message": "Invalid parameter", "code": 100}}))
+
+        assert run(handler).status_code == 400
+        assert len(calls) == 1
+
+    def test_gives_up_after_attempts(self):
+        handler, calls = sequence(httpx.Response(503))
+
+        assert run(handler, attempts=3).status_code == 503
+        assert len(calls) == 3
+
+    def test_transport_errors_reraised_after_attempts(self):
+        handler, calls = sequence(httpx.ConnectError("refused"))
+
+        with pytest.raises(httpx.ConnectError):
+            run(handler, attempts=2)
+        assert len(calls) == 2
+
+    def test_long_retry_after_returns_immediately(self):
+        handler, calls = sequence(httpx.Response(429, headers={"Retry-After": "60"}))
+
+        assert run(handler, max_delay=2.0).status_code == 429
+        assert len(calls) == 1
+
+    def test_retry_reason_handles_non_dict_bodies(self):
+        assert retry_reason(httpx.Response(400, json=["nope"]), resilience.RetryPolicy()) is None
+
+
+class TestCircuitBreaker:
+    """Test fail-fast and recovery"""
+
+    def test_opens_and_fails_fast(self):
+        handler, calls = sequence(httpx.Response(500))
+        resilience.breakers["meta"] = CircuitBreaker("meta", failure_threshold=2, reset_after=60)
+
+        run(handler, attempts=2)
+        with pytest.raises(CircuitOpenError):
+            run(handler)
+        assert len(calls) == 2
+
+    def test_half_open_probe_closes_circuit(self):
+        breaker = CircuitBreaker("meta", failure_threshold=1, reset_after=0)
+        breaker.record_failure()
+
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_throttling_does_not_trip_breaker(self):
+        handler, _ = sequence(httpx.Response(429))
+        resilience.breakers["meta"] = CircuitBreaker("meta", failure_threshold=1)
+
+        run(handler, attempts=2)
+
+        assert resilience.breakers["meta"].state == CircuitBreaker.CLOSED
+
+    def test_graph_get_reports_open_circuit_as_503(self):
+        breaker = resilience.breakers["meta"] = CircuitBreaker("meta", failure_threshold=1, reset_after=60)
+        breaker.record_failure()
+
+        async def go():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(200))) as client:
+                await graph_get(client, "act_1/insights", {}, "token")
+
+        with pytest.raises(MetaGraphError) as error:
+            asyncio.run(go())
+        assert error.value.status_code == 503
+
+
+class TestHedging:
+    """Test hedged reads"""
+
+    def test_slow_primary_is_hedged(self):
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                await asyncio.sleep(5)
+                return httpx.Response(200, json={"from": "primary"})
+            return httpx.Response(200, json={"from": "hedge"})
+
+        response = run(handler, hedge_after=0.01)
+
+        assert response.json() == {"from": "hedge"}
+        assert len(calls) == 2
+
+    def test_fast_primary_is_not_hedged(self):
+        handler, calls = sequence(httpx.Response(200, json={}))
+
+        run(handler, hedge_after=1.0)
+
+        assert len(calls) == 1
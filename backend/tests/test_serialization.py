@@ -0,0 +1,152 @@
+"""
+Test suite for bulk JSON responses
+"""
+
+import asyncio
+import gzip
+import json
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from services.records import MetricsRow
+from services.serialization import Layout, bulk_response, dumps, negotiate_encoding, to_columns
+
+
+class MetricsResponse(BaseModel):
+    """Mirror of the per-row response model in api/meta.py"""
+    date: str
+    impressions: int
+    clicks: int
+    ctr: float
+    cpc: float
+    cpm: float
+    spend: float
+    conversions: int
+    roas: float
+
+
+def metric_models(days):
+    start = date(2022, 1, 1)
+    return [
+        SimpleNamespace(
+            date_start=start + timedelta(days=i), date_stop=start + timedelta(days=i), impressions=1000 + i,
+            clicks=20, reach=500, conversions=2, spend=12.5, ctr=2.0, cpc=0.625, cpm=12.5,
+            purchase_value=40.0, roas=3.2
+        )
+        for i in range(days)
+    ]
+
+
+def make_app(models):
+    app = FastAPI()
+
+    @app.get("/metrics", response_model=List[MetricsResponse])
+    async def metrics(request: Request, layout: Layout = "rows"):
+        return bulk_response(request, [MetricsRow.from_model(m).metrics_payload() for m in models], layout)
+
+    return app
+
+
+def get(app, path, headers=None):
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(go())
+
+
+class TestSerialization:
+    """Test layouts, encoding negotiation and the response helper"""
+
+    def test_to_columns(self):
+        rows = [{"date": "2024-01-01", "spend": 1.0}, {"date": "2024-01-02", "spend": 2.0}]
+
+        assert to_columns(rows) == {"date": ["2024-01-01", "2024-01-02"], "spend": [1.0, 2.0]}
+        assert to_columns(rows, ["spend"]) == {"spend": [1.0, 2.0]}
+        assert to_columns([]) == {}
+
+    def test_dumps_handles_dates(self):
+        assert json.loads(dumps({"at": datetime(2024, 1, 2, 3, 4, 5), "day": date(2024, 1, 2)})) == {
+            "at": "2024-01-02T03:04:05", "day": "2024-01-02"
+        }
+
+    def test_negotiate_encoding(self):
+        assert negotiate_encoding("gzip, deflate") == "gzip"
+        assert negotiate_encoding("gzip;q=0, deflate") is None
+        assert negotiate_encoding("identity") is None
+        assert negotiate_encoding("*") in ("br", "gzip")
+
+    def test_rows_response_matches_model_shape(self):
+        response = get(make_app(metric_models(3)), "/metrics", {"Accept-Encoding": "identity"})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert TypeAdapter(List[MetricsResponse]).validate_python(body)
+        assert body[0]["date"] == "2022-01-01"
+
+    def test_columns_layout_compressed(self):
+        response = get(make_app(metric_models(400)), "/metrics?layout=columns", {"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert int(response.headers["content-length"]) < len(response.content) / 4
+        body = response.json()
+        assert len(body["date"]) == 400
+        assert body["impressions"][:2] == [1000, 1001]
+
+    def test_small_bodies_not_compressed(self):
+        response = get(make_app(metric_models(1)), "/metrics", {"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+
+    def test_unknown_layout_rejected(self):
+        assert get(make_app([]), "/metrics?layout=sideways").status_code == 422
+
+
+@pytest.mark.benchmark
+class TestBulkResponseCPU:
+    """CPU per 1000-row series: per-row models plus response_model versus bulk_response"""
+
+    ROWS = 1000
+    ROUNDS = 20
+
+    def cpu(self, render):
+        started = time.process_time()
+        for _ in range(self.ROUNDS):
+            body = render()
+        return (time.process_time() - started) / self.ROUNDS, body
+
+    def test_bulk_response_at_least_5x_cheaper(self):
+        models = metric_models(self.ROWS)
+        request = Request({"type": "http", "headers": []})
+        field = TypeAdapter(List[MetricsResponse])
+
+        def pydantic_path():
+            rows = [
+                MetricsResponse(
+                    date=m.date_start.isoformat(), impressions=m.impressions, clicks=m.clicks, ctr=m.ctr,
+                    cpc=m.cpc, cpm=m.cpm, spend=m.spend, conversions=m.conversions, roas=m.roas
+                )
+                for m in models
+            ]
+            # What FastAPI does with a returned list: validate against response_model, encode, dump
+            validated = field.validate_python([r.model_dump() for r in rows])
+            return JSONResponse(jsonable_encoder(validated)).body
+
+        def bulk_path():
+            return bulk_response(request, [MetricsRow.from_model(m).metrics_payload() for m in models]).body
+
+        before, expected = self.cpu(pydantic_path)
+        after, body = self.cpu(bulk_path)
+
+        print(f"\nper-row models: {before * 1000:.2f} ms, bulk: {after * 1000:.2f} ms ({before / after:.1f}x)")
+        assert json.loads(body) == json.loads(expected)
+        assert before / after >= 5
@@ -0,0 +1,143 @@
+"""
+Test suite for consistent-hash sharding of account syncs
+"""
+
+import asyncio
+from collections import Counter
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine, update
+
+from services.jobs import JobQueue, utcnow
+from services.rate_budget import RateBudget
+from services.sharding import (
+    HashRing, ShardCoordinator, account_leases_table, advisory_lock, async_advisory_lock, worker_nodes_table
+)
+from services.sync_scheduler import SyncScheduler, sync_schedule_table
+
+ACCOUNTS = [str(1000 + i) for i in range(300)]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    JobQueue(engine).create_schema()
+    return engine
+
+
+def settle(*nodes):
+    # Two rounds: releases from the first let the new owners take over in the second
+    for _ in range(2):
+        for node in nodes:
+            node.heartbeat()
+        for node in nodes:
+            node.rebalance(ACCOUNTS)
+    return [node.owned() for node in nodes]
+
+
+def expire(engine, node_id):
+    past = utcnow() - timedelta(seconds=1)
+    with engine.begin() as conn:
+        conn.execute(update(worker_nodes_table).where(worker_nodes_table.c.node_id == node_id).values(lease_expires_at=past))
+        conn.execute(update(account_leases_table).where(account_leases_table.c.node_id == node_id).values(lease_expires_at=past))
+
+
+class TestHashRing:
+    """Test key placement and movement"""
+
+    def test_keys_spread_evenly(self):
+        ring = HashRing(["a", "b", "c", "d"])
+
+        counts = Counter(ring.owner(str(key)) for key in range(20000))
+
+        assert set(counts) == {"a", "b", "c", "d"}
+        assert all(3000 < count < 7000 for count in counts.values())
+
+    def test_joining_node_only_takes_keys(self):
+        before = HashRing(["a", "b", "c", "d"])
+        after = HashRing(["a", "b", "c", "d", "e"])
+        keys = [str(key) for key in range(20000)]
+
+        moved = [key for key in keys if before.owner(key) != after.owner(key)]
+
+        assert all(after.owner(key) == "e" for key in moved)
+        assert 0.1 < len(moved) / len(keys) < 0.3
+
+    def test_empty_ring(self):
+        assert HashRing([]).owner("1") is None
+
+
+class TestShardCoordinator:
+    """Test leases across joins, leaves and crashes"""
+
+    def test_nodes_partition_accounts(self, engine):
+        owned_a, owned_b = settle(ShardCoordinator(engine, "a"), ShardCoordinator(engine, "b"))
+
+        assert owned_a and owned_b
+        assert not owned_a & owned_b
+        assert owned_a | owned_b == set(ACCOUNTS)
+
+    def test_join_rebalances_without_double_ownership(self, engine):
+        a, b = ShardCoordinator(engine, "a"), ShardCoordinator(engine, "b")
+        settle(a, b)
+        c = ShardCoordinator(engine, "c")
+
+        # The newcomer cannot take accounts still leased by their old owner
+        c.heartbeat()
+        assert c.rebalance(ACCOUNTS) == set()
+
+        owned = settle(a, b, c)
+        assert all(owned)
+        assert sum(len(o) for o in owned) == len(ACCOUNTS)
+        assert set().union(*owned) == set(ACCOUNTS)
+
+    def test_leave_hands_accounts_over(self, engine):
+        a, b = ShardCoordinator(engine, "a"), ShardCoordinator(engine, "b")
+        settle(a, b)
+
+        b.leave()
+
+        assert settle(a) == [set(ACCOUNTS)]
+
+    def test_crashed_node_is_replaced_after_lease_expiry(self, engine):
+        a, b = ShardCoordinator(engine, "a"), ShardCoordinator(engine, "b")
+        settle(a, b)
+        a.heartbeat()
+        # b's accounts stay put while its leases are live
+        assert a.rebalance(ACCOUNTS) != set(ACCOUNTS)
+
+        expire(engine, "b")
+
+        assert settle(a) == [set(ACCOUNTS)]
+
+    def test_advisory_lock_is_a_no_op_off_postgres(self, engine):
+        with advisory_lock(engine, "sync:1") as acquired:
+            assert acquired
+
+    def test_async_advisory_lock_is_a_no_op_off_postgres(self, engine):
+        async def run():
+            async with async_advisory_lock(engine, "sync:1") as acquired:
+                return acquired
+
+        assert asyncio.run(run())
+
+
+class TestShardedWork:
+    """Test that schedulers and workers stay on their own accounts"""
+
+    def test_scheduler_and_claims_follow_leases(self, engine):
+        queue = JobQueue(engine)
+        a, b = ShardCoordinator(engine, "a"), ShardCoordinator(engine, "b")
+        SyncScheduler(queue).update_activity(ACCOUNTS[0], "user-1", 100.0, 1)
+        for account in ACCOUNTS[1:]:
+            SyncScheduler(queue).update_activity(account, "user-1", 0.0, 0)
+        with engine.begin() as conn:
+            conn.execute(update(sync_schedule_table).values(next_sync_at=utcnow() - timedelta(seconds=1)))
+        owned_a, owned_b = settle(a, b)
+
+        jobs = SyncScheduler(queue, budget=RateBudget(), shards=a).tick(limit=1000)
+
+        assert {job.shard for job in jobs} == owned_a
+        assert queue.claim(['sync'], "b", limit=1000, shards=b.owned_query()) == []
+        assert len(queue.claim(['sync'], "a", limit=1000, shards=a.owned_query())) == len(owned_a)
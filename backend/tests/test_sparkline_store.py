@@ -0,0 +1,156 @@
+"""
+Test suite for the sparkline ring buffers
+"""
+
+import asyncio
+from datetime import date, timedelta
+
+import httpx
+
+from services import sparkline_store as sparkline_module
+from services.insights_columns import InsightColumns
+from services.sparkline_store import SparklineStore, ensure_loaded, to_sparkline_points
+from testing.bench import route_upstreams
+
+
+def daily_rows(start, days, spend=1.0):
+    return [
+        {"date_start": (start + timedelta(days=i)).isoformat(), "spend": str(spend * (i + 1)),
+         "impressions": "100", "clicks": "5"}
+        for i in range(days)
+    ]
+
+
+class TestSparklineBuffer:
+    """Test ring buffer storage and windowing"""
+
+    def test_ingest_and_window(self):
+        store = SparklineStore(capacity=10)
+        store.ingest("1", daily_rows(date(2024, 1, 1), 5))
+
+        series = store.series("1", window=3, metrics=["spend"])
+
+        assert [p["date"] for p in series] == ["2024-01-03", "2024-01-04", "2024-01-05"]
+        assert [p["spend"] for p in series] == [3.0, 4.0, 5.0]
+        assert "clicks" not in series[0]
+
+    def test_ring_wraps_and_drops_old_days(self):
+        store = SparklineStore(capacity=5)
+        store.ingest("1", daily_rows(date(2024, 1, 1), 12))
+
+        series = store.series("1", window=30)
+
+        assert len(series) == 5
+        assert series[0]["date"] == "2024-01-08"
+        assert series[-1]["spend"] == 12.0
+
+    def test_days_older_than_window_are_ignored(self):
+        store = SparklineStore(capacity=5)
+        store.ingest("1", daily_rows(date(2024, 1, 10), 1))
+
+        written = store.ingest("1", daily_rows(date(2024, 1, 1), 1))
+
+        assert written == 0
+        assert store.series("1", window=5)[-1]["date"] == "2024-01-10"
+
+    def test_gaps_read_as_zero(self):
+        store = SparklineStore(capacity=10)
+        store.ingest("1", [{"date_start": "2024-01-01", "spend": "4"},
+                           {"date_start": "2024-01-03", "spend": "6"}])
+
+        series = store.series("1", window=3, metrics=["spend"])
+
+        assert [p["spend"] for p in series] == [4.0, 0.0, 6.0]
+
+    def test_action_lists_are_summed(self):
+        store = SparklineStore(capacity=10)
+        store.ingest("1", [{"date_start": "2024-01-01",
+                            "conversions": [{"action_type": "purchase", "value": "2"},
+                                            {"action_type": "lead", "value": "3"}]}])
+
+        assert store.series("1", window=1)[0]["conversions"] == 5.0
+
+    def test_ingest_columns_matches_rows(self):
+        rows = daily_rows(date(2024, 1, 1), 4)
+        rows[1]["conversions"] = [{"action_type": "purchase", "value": "2"}, {"action_type": "lead", "value": "1"}]
+        by_rows, by_columns = SparklineStore(capacity=10), SparklineStore(capacity=10)
+
+        by_rows.ingest("1", rows)
+        assert by_columns.ingest_columns("1", InsightColumns().extend(rows)) == 4
+
+        assert by_columns.series("1", window=4) == by_rows.series("1", window=4)
+        assert by_columns.series("1", window=3)[0]["conversions"] == 3.0
+
+    def test_frontend_points(self):
+        points = to_sparkline_points([{"date": "2024-01-01", "spend": 2.5, "clicks": 3.0}])
+
+        assert points == [{"date": "2024-01-01", "spend": 2.5, "clicks": 3, "value": 2.5}]
+
+
+class TestEnsureLoaded:
+    """Test cold loading and request coalescing"""
+
+    def test_concurrent_cold_loads_share_one_fetch(self, monkeypatch):
+        calls = []
+        store = SparklineStore(capacity=30)
+
+        def handler(request):
+            calls.append(request.url)
+            return httpx.Response(200, json={"data": daily_rows(date.today() - timedelta(days=2), 3)})
+
+        async def run():
+            with route_upstreams({"graph.facebook.com": httpx.MockTransport(handler)}):
+                await asyncio.gather(*(ensure_loaded("token", "1", store=store) for _ in range(10)))
+                await ensure_loaded("token", "1", store=store)
+
+        monkeypatch.setattr(sparkline_module, "_inflight", {})
+        asyncio.run(run())
+
+        assert len(calls) == 1
+        assert len(store.series("1", window=3)) == 3
+
+    def test_other_token_must_load_before_reading_cache(self, monkeypatch):
+        calls = []
+        store = SparklineStore(capacity=30)
+
+        def handler(request):
+            calls.append(request.url.params["access_token"])
+            if request.url.params["access_token"] == "intruder":
+                return httpx.Response(403, json={"error": {"message": "no access"}})
+            return httpx.Response(200, json={"data": daily_rows(date.today(), 1)})
+
+        async def run():
+            with route_upstreams({"graph.facebook.com": httpx.MockTransport(handler)}):
+                await ensure_loaded("owner", "1", store=store)
+                try:
+                    await ensure_loaded("intruder", "1", store=store)
+                except Exception as e:
+                    return e
+
+        monkeypatch.setattr(sparkline_module, "_inflight", {})
+        error = asyncio.run(run())
+
+        assert calls == ["owner", "intruder"]
+        assert error is not None
+        assert not store.is_authorized("1", sparkline_module.token_fingerprint("intruder"))
+
+    def test_cancelled_caller_does_not_cancel_shared_load(self, monkeypatch):
+        store = SparklineStore(capacity=30)
+
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"data": daily_rows(date.today(), 1)})
+
+        async def run():
+            with route_upstreams({"graph.facebook.com": httpx.MockTransport(handler)}):
+                first = asyncio.create_task(ensure_loaded("token", "1", store=store))
+                second = asyncio.create_task(ensure_loaded("token", "1", store=store))
+                await asyncio.sleep(0.01)
+                first.cancel()
+                return await second
+
+        monkeypatch.setattr(sparkline_module, "_inflight", {})
+        freshness = asyncio.run(run())
+
+        assert freshness["source"] == "upstream"
+        assert len(store.series("1", window=1)) == 1
@@ -0,0 +1,150 @@
+"""
+Test suite for stale-while-revalidate serving and the per-account rate budget
+"""
+
+import asyncio
+import json
+
+from services.rate_budget import RateBudget
+from services.swr_cache import SWRCache
+
+
+def counting_loader(values):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return values[min(len(calls), len(values)) - 1]
+
+    return loader, calls
+
+
+def age_entry(cache, key, seconds):
+    cache._entries[key].fetched_at -= seconds
+
+
+class TestSWRCache:
+    """Test cache hits, stale serving and background refresh"""
+
+    def test_zero_staleness_always_loads(self):
+        cache = SWRCache(refresh_after=60, budget=RateBudget())
+        loader, calls = counting_loader(["a", "b"])
+
+        async def run():
+            await cache.get("k", loader)
+            return await cache.get("k", loader)
+
+        value, meta = asyncio.run(run())
+
+        assert value == "b"
+        assert meta["source"] == "upstream"
+        assert len(calls) == 2
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = SWRCache(budget=RateBudget())
+        loader, calls = counting_loader(["a"])
+
+        async def run():
+            return await asyncio.gather(*(cache.get("k", loader) for _ in range(10)))
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert {value for value, _ in results} == {"a"}
+
+    def test_stale_entry_served_while_refreshing_once(self):
+        cache = SWRCache(refresh_after=60, budget=RateBudget())
+        loader, calls = counting_loader(["old", "new"])
+
+        async def run():
+            await cache.get("k", loader)
+            age_entry(cache, "k", 120)
+            served = await asyncio.gather(*(cache.get("k", loader, max_staleness=300, account_id="1") for _ in range(5)))
+            await asyncio.gather(*cache._background)
+            return served, await cache.get("k", loader, max_staleness=300)
+
+        served, (refreshed, meta) = asyncio.run(run())
+
+        assert [value for value, _ in served] == ["old"] * 5
+        assert all(m["stale"] and m["revalidating"] for _, m in served)
+        assert len(calls) == 2
+        assert refreshed == "new"
+        assert meta == {**meta, "source": "cache", "stale": False}
+
+    def test_refresh_deferred_when_budget_exhausted(self):
+        budget = RateBudget()
+        budget.observe({"x-business-use-case-usage": json.dumps({"1": [{"call_count": 80}]})})
+        cache = SWRCache(refresh_after=60, budget=budget)
+        loader, calls = counting_loader(["old", "new"])
+
+        async def run():
+            await cache.get("k", loader)
+            age_entry(cache, "k", 120)
+            return await cache.get("k", loader, max_staleness=300, account_id="1")
+
+        value, meta = asyncio.run(run())
+
+        assert value == "old"
+        assert meta["revalidating"] is False
+        assert len(calls) == 1
+
+    def test_entries_beyond_bound_are_reloaded(self):
+        cache = SWRCache(refresh_after=60, budget=RateBudget())
+        loader, calls = counting_loader(["old", "new"])
+
+        async def run():
+            await cache.get("k", loader)
+            age_entry(cache, "k", 600)
+            return await cache.get("k", loader, max_staleness=300)
+
+        value, meta = asyncio.run(run())
+
+        assert value == "new"
+        assert meta["source"] == "upstream"
+
+    def test_lru_bound(self):
+        cache = SWRCache(max_entries=2, budget=RateBudget())
+
+        async def run():
+            for key in ("a", "b", "c"):
+                await cache.get(key, counting_loader([key])[0])
+
+        asyncio.run(run())
+
+        assert len(cache) == 2
+        assert "a" not in cache._entries
+
+
+class TestRateBudget:
+    """Test priority ceilings and Meta usage header parsing"""
+
+    def test_background_backs_off_before_interactive(self):
+        budget = RateBudget()
+        budget.observe({"x-ad-account-usage": json.dumps({"acc_id_util_pct": 75})}, "act_42/insights")
+
+        assert budget.try_acquire("42", "background") is False
+        assert budget.try_acquire("42", "interactive") is True
+
+    def test_regain_access_blocks_everything(self):
+        budget = RateBudget()
+        budget.observe({"x-business-use-case-usage": json.dumps(
+            {"42": [{"type": "ads_insights", "call_count": 100, "estimated_time_to_regain_access": 5}]}
+        )})
+
+        assert budget.try_acquire("42", "interactive") is False
+        assert budget.snapshot("42")["blockedFor"] > 0
+
+    def test_background_keeps_reserve_for_interactive(self):
+        budget = RateBudget(calls_per_minute=10)
+
+        granted = sum(budget.try_acquire("1", "background") for _ in range(10))
+
+        assert granted == 5
+        assert budget.try_acquire("1", "interactive") is True
+
+    def test_malformed_headers_ignored(self):
+        budget = RateBudget()
+        budget.observe({"x-business-use-case-usage": "not json", "x-ad-account-usage": "[]"}, "act_1/campaigns")
+
+        assert budget.snapshot("1")["usagePct"] == 0.0
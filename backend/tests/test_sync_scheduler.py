@@ -0,0 +1,154 @@
+"""
+Test suite for the activity-weighted sync scheduler
+"""
+
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine, select, update
+
+from services.jobs import JobQueue, jobs_table, utcnow
+from services.rate_budget import RateBudget
+from services.sync_scheduler import (
+    SYNC_MAX_INTERVAL, SYNC_MIN_INTERVAL, AccountActivity, SyncScheduler, phase, sync_interval,
+    sync_schedule_table
+)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(create_engine(f"sqlite:///{tmp_path / 'jobs.db'}"))
+    queue.create_schema()
+    return queue
+
+
+def schedule_row(queue, account_id):
+    with queue.engine.connect() as conn:
+        return conn.execute(
+            select(sync_schedule_table).where(sync_schedule_table.c.account_id == account_id)
+        ).first()
+
+
+def make_due(queue, account_id=None):
+    query = update(sync_schedule_table).values(next_sync_at=utcnow() - timedelta(seconds=1))
+    if account_id:
+        query = query.where(sync_schedule_table.c.account_id == account_id)
+    with queue.engine.begin() as conn:
+        conn.execute(query)
+
+
+class TestSyncInterval:
+    """Test how activity maps to sync intervals"""
+
+    def test_dormant_accounts_sync_daily(self):
+        assert sync_interval(AccountActivity()) == SYNC_MAX_INTERVAL
+
+    def test_busy_accounts_sync_within_minutes(self):
+        busy = AccountActivity(spend_7d=5000, active_campaigns=12, views_7d=40)
+
+        assert sync_interval(busy) == SYNC_MIN_INTERVAL
+
+    def test_more_activity_never_syncs_less(self):
+        intervals = [sync_interval(AccountActivity(spend_7d=spend)) for spend in (0, 10, 50, 200, 1000)]
+
+        assert intervals == sorted(intervals, reverse=True)
+        assert intervals[0] > intervals[2] > intervals[-1]
+
+    def test_phase_is_stable_and_spread(self):
+        phases = [phase(str(account)) for account in range(1000)]
+
+        assert phase("123") == phase("123")
+        # Roughly uniform: every tenth of the interval gets some accounts
+        assert len({int(p * 10) for p in phases}) == 10
+
+
+class TestSyncScheduler:
+    """Test scheduling, view weighting and rate budgets"""
+
+    def test_new_accounts_are_spread_over_their_interval(self, queue):
+        scheduler = SyncScheduler(queue)
+        now = utcnow()
+        for account in range(50):
+            scheduler.update_activity(str(account), "user-1", 0.0, 0)
+
+        offsets = [(schedule_row(queue, str(a)).next_sync_at - now).total_seconds() for a in range(50)]
+
+        assert all(0 <= offset <= SYNC_MAX_INTERVAL + 1 for offset in offsets)
+        assert max(offsets) - min(offsets) > SYNC_MAX_INTERVAL / 2
+
+    def test_tick_enqueues_due_accounts_and_reschedules(self, queue):
+        scheduler = SyncScheduler(queue, budget=RateBudget())
+        scheduler.update_activity("1", "user-1", 1000.0, 5)
+        scheduler.update_activity("2", "user-2", 0.0, 0)
+        make_due(queue, "1")
+
+        jobs = scheduler.tick()
+
+        assert [(job.payload, job.owner) for job in jobs] == [({'account_id': '1'}, 'user-1')]
+        row = schedule_row(queue, "1")
+        assert row.last_enqueued_at is not None
+        assert row.next_sync_at > utcnow()
+        assert scheduler.tick() == []
+
+    def test_activity_pulls_a_dormant_account_forward(self, queue):
+        scheduler = SyncScheduler(queue, budget=RateBudget())
+        scheduler.update_activity("1", "user-1", 0.0, 0)
+        make_due(queue, "1")
+        scheduler.tick()
+        dormant_next = schedule_row(queue, "1").next_sync_at
+
+        scheduler.update_activity("1", "user-1", 2000.0, 10)
+
+        assert schedule_row(queue, "1").next_sync_at < dormant_next - timedelta(hours=20)
+
+    def test_views_shorten_the_interval(self, queue):
+        scheduler = SyncScheduler(queue)
+        scheduler.update_activity("1", "user-1", 0.0, 0)
+        before = schedule_row(queue, "1").interval_seconds
+
+        for _ in range(5):
+            scheduler.record_view("1")
+
+        row = schedule_row(queue, "1")
+        assert row.views_7d == pytest.approx(5.0, rel=1e-3)
+        assert row.interval_seconds < before
+
+    def test_spent_rate_budget_defers_instead_of_queueing(self, queue):
+        scheduler = SyncScheduler(queue, budget=RateBudget(calls_per_minute=4), call_cost=5)
+        scheduler.update_activity("1", "user-1", 1000.0, 5)
+        make_due(queue, "1")
+
+        assert scheduler.tick() == []
+
+        with queue.engine.connect() as conn:
+            assert conn.execute(select(jobs_table)).first() is None
+        assert schedule_row(queue, "1").next_sync_at > utcnow()
+
+    def test_tick_leaves_the_budget_to_the_sync_itself(self, queue):
+        budget = RateBudget(calls_per_minute=100)
+        scheduler = SyncScheduler(queue, budget=budget, call_cost=5)
+        scheduler.update_activity("1", "user-1", 1000.0, 5)
+        make_due(queue, "1")
+        before = budget._account("1").tokens
+
+        assert len(scheduler.tick()) == 1
+
+        # The sync's Graph calls are charged as they are made, not here as well
+        assert budget._account("1").tokens == pytest.approx(before, abs=1e-3)
+
+    def test_unfinished_sync_is_not_queued_again(self, queue):
+        scheduler = SyncScheduler(queue, budget=RateBudget())
+        scheduler.update_activity("1", "user-1", 1000.0, 5)
+        scheduler.update_activity("2", "user-2", 1000.0, 5)
+        make_due(queue)
+        first = scheduler.tick()
+        make_due(queue)
+
+        assert scheduler.tick() == []
+
+        with queue.engine.begin() as conn:
+            conn.execute(update(jobs_table).where(jobs_table.c.id == first[0].id).values(status='succeeded'))
+        make_due(queue)
+
+        assert [job.payload['account_id'] for job in scheduler.tick()] == [first[0].payload['account_id']]
+        assert schedule_row(queue, "2").next_sync_at > utcnow()
@@ -0,0 +1,199 @@
+"""
+Test suite for large synthetic datasets: generator distributions, streaming
+and bulk loading into the app's tables or Graph-shaped files
+"""
+
+import importlib
+import json
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from services.records import MetricsRow
+from testing.bench import RssSampler
+from testing.bulk import load_models, model_id, user_email, write_graph_json
+from testing.synthetic import FUNNELS, SyntheticGraphData, date_range
+
+UNTIL = date(2024, 12, 31)
+
+
+@pytest.fixture
+def models(monkeypatch):
+    # models builds its engine from DATABASE_URL at import; tests bring their own engine
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    try:
+        return importlib.import_module("models")
+    except ImportError as e:
+        pytest.skip(f"models cannot be imported here: {e}")
+
+
+@pytest.fixture
+def database(models, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'scale.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+class TestDistributions:
+    """Test that generated data looks like real accounts"""
+
+    def test_default_sizes_are_exact(self):
+        data = SyntheticGraphData(accounts=3, campaigns=7, adsets_per_campaign=2, ads_per_adset=3, until=UNTIL)
+
+        for account in data.account_ids():
+            assert data.campaign_count(account) == 7
+            assert len(data.objects(account, 'adset')) == 14
+            assert len(data.objects(account, 'ad')) == 42
+
+    def test_size_spread_is_skewed_around_the_mean(self):
+        data = SyntheticGraphData(accounts=200, campaigns=50, size_spread=1.0, until=UNTIL)
+        counts = sorted(data.campaign_count(account) for account in data.account_ids())
+
+        assert sum(counts) / len(counts) == pytest.approx(50, rel=0.2)
+        assert counts[len(counts) // 2] < 50
+        assert counts[-1] > 3 * 50
+
+    def test_seasonality_and_funnels(self):
+        data = SyntheticGraphData(accounts=2, campaigns=60, days=3 * 365, until=UNTIL)
+        spend_by_month = {}
+        cost = {}
+        for account in data.account_ids():
+            for campaign, day, m in data.iter_daily(account):
+                spend_by_month[day.month] = spend_by_month.get(day.month, 0.0) + m.spend
+                totals = cost.setdefault(campaign.objective, [0.0, 0])
+                totals[0] += m.spend
+                totals[1] += m.impressions
+        cpm = {objective: spend / impressions * 1000 for objective, (spend, impressions) in cost.items()}
+
+        assert spend_by_month[11] > 1.2 * spend_by_month[7]
+        assert cpm['OUTCOME_AWARENESS'] < cpm['OUTCOME_SALES']
+        assert FUNNELS['OUTCOME_AWARENESS'].cpm < FUNNELS['OUTCOME_SALES'].cpm
+
+    def test_learning_phase_ramps_spend(self):
+        data = SyntheticGraphData(campaigns=40, days=365, until=UNTIL)
+        first, settled = 0.0, 0.0
+        for campaign in data.objects(data.account_ids()[0], 'campaign'):
+            launched = campaign.created_time.date()
+            if launched + timedelta(days=20) > min(UNTIL, campaign.updated_time.date()):
+                continue
+            first += data.daily(campaign, launched).spend
+            settled += data.daily(campaign, launched + timedelta(days=14)).spend
+
+        assert 0 < first < settled / 3
+
+
+class TestStreaming:
+    """Test the uncached daily row stream"""
+
+    def test_matches_daily_and_skips_idle_days(self):
+        data = SyntheticGraphData(campaigns=6, days=90, until=UNTIL, seed=5)
+        account = data.account_ids()[0]
+        rows = list(data.iter_daily(account, ('campaign', 'adset', 'ad')))
+
+        for obj, day, m in rows:
+            assert data.daily(obj, day) == m
+        campaign_days = {(obj.id, day) for obj, day, _ in rows if obj.level == 'campaign'}
+        for campaign in data.objects(account, 'campaign'):
+            for day in date_range(data.since, data.until):
+                assert ((campaign.id, day) in campaign_days) == (data.daily(campaign, day).spend > 0)
+
+    def test_levels_and_window(self):
+        data = SyntheticGraphData(campaigns=4, days=60, until=UNTIL)
+        account = data.account_ids()[0]
+        since = UNTIL - timedelta(days=9)
+
+        rows = list(data.iter_daily(account, ('adset',), since=since))
+        assert rows and {obj.level for obj, _, _ in rows} == {'adset'}
+        assert min(day for _, day, _ in rows) >= since
+        with pytest.raises(ValueError):
+            list(data.iter_daily(account, ('account',)))
+
+    def test_release_rebuilds_the_same_hierarchy(self):
+        data = SyntheticGraphData(campaigns=5, until=UNTIL, size_spread=0.8)
+        account = data.account_ids()[0]
+        before = [obj.graph_fields() for obj in data.objects(account, 'ad')]
+
+        data.release(account)
+
+        assert data.get(before[0]['id']) is not None
+        assert [obj.graph_fields() for obj in data.objects(account, 'ad')] == before
+
+
+class TestBulkLoad:
+    """Test loading synthetic data into the app's tables"""
+
+    def test_load_matches_generator(self, models, database):
+        data = SyntheticGraphData(accounts=2, campaigns=8, days=120, until=UNTIL, seed=2)
+        expected = {level: 0 for level in ('campaign', 'adset')}
+        spend = 0.0
+        for account in data.account_ids():
+            for obj, _, m in data.iter_daily(account, ('campaign', 'adset')):
+                expected[obj.level] += 1
+                spend += m.spend if obj.level == 'campaign' else 0.0
+
+        summary = load_models(database, data, batch_rows=500)
+
+        assert summary.rows['campaign_metrics'] == expected['campaign']
+        assert summary.rows['adset_metrics'] == expected['adset']
+        assert summary.rows['ads'] == summary.rows['creatives'] == 2 * 8 * 3 * 2
+        with database.connect() as connection:
+            assert connection.scalar(select(func.count()).select_from(models.CampaignMetrics)) == expected['campaign']
+            assert connection.scalar(select(func.sum(models.CampaignMetrics.spend))) == pytest.approx(spend)
+
+    def test_rows_are_stored_as_a_sync_stores_them(self, models, database):
+        data = SyntheticGraphData(campaigns=3, days=30, until=UNTIL)
+        account = data.account_ids()[0]
+        campaign = data.objects(account, 'campaign')[0]
+        day, m = next((day, m) for obj, day, m in data.iter_daily(account) if obj.id == campaign.id)
+
+        load_models(database, data, metric_levels=('campaign',))
+
+        with database.connect() as connection:
+            stored = connection.execute(
+                select(models.Campaign).where(models.Campaign.id == model_id('campaign', campaign.id))
+            ).one()
+            owner = connection.execute(select(models.User).where(models.User.email == user_email(0))).one()
+            metric = connection.execute(
+                select(models.CampaignMetrics).where(models.CampaignMetrics.id == model_id('campaign_metrics', campaign.id, day))
+            ).one()
+        assert stored.campaign_id == campaign.id
+        assert stored.daily_budget == float(campaign.daily_budget)
+        assert stored.is_active == (campaign.effective_status in ('ACTIVE', 'PAUSED'))
+        assert owner.id == model_id('user', account)
+        synced = MetricsRow.from_insight(data.insight_row(campaign, day, day, ('spend', 'impressions', 'clicks', 'ctr', 'cpc', 'cpm')))
+        loaded = MetricsRow.from_model(metric)
+        assert (loaded.spend, loaded.impressions, loaded.clicks) == (m.spend, m.impressions, m.clicks)
+        assert loaded.ctr == pytest.approx(synced.ctr, abs=1e-6)
+        assert loaded.cpm == pytest.approx(synced.cpm, abs=1e-6)
+
+    def test_graph_json(self, tmp_path):
+        data = SyntheticGraphData(accounts=2, campaigns=3, days=20, until=UNTIL)
+
+        counts = write_graph_json(data, str(tmp_path))
+
+        account = data.account_ids()[1]
+        directory = tmp_path / f"act_{account}"
+        assert json.loads((directory / 'account.json').read_text())['id'] == f"act_{account}"
+        ads = [json.loads(line) for line in (directory / 'ads.ndjson').read_text().splitlines()]
+        assert [ad['id'] for ad in ads] == [ad.id for ad in data.objects(account, 'ad')]
+        rows = [json.loads(line) for line in (directory / 'insights_campaign.ndjson').read_text().splitlines()]
+        assert counts['insights_campaign.ndjson'] == sum(1 for a in data.account_ids() for _ in data.iter_daily(a))
+        first = MetricsRow.from_insight(rows[0])
+        assert first.spend == data.daily(data.get(first.object_id), date.fromisoformat(first.date_start)).spend
+
+
+@pytest.mark.benchmark
+def test_bulk_load_scale(models, database):
+    """Generate and load a couple of million rows in flat memory"""
+    data = SyntheticGraphData(accounts=8, campaigns=120, days=730, until=UNTIL, size_spread=1.0)
+    rates = []
+
+    with RssSampler() as rss:
+        summary = load_models(database, data, progress=lambda account, s: rates.append(s.rows_per_second))
+
+    print(f"\nLoaded {summary.total_rows} rows in {summary.seconds:.1f}s ({summary.rows_per_second:.0f} rows/s), "
+          f"RSS +{(rss.peak - rss.start) / 2**20:.0f} MiB")
+    assert summary.total_rows > 500000
+    assert (rss.peak - rss.start) / 2**20 < 200
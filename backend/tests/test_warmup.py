@@ -0,0 +1,152 @@
+"""
+Test suite for session cache warming
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services import rate_budget as rate_budget_module, warmup as warmup_module
+from services.dashboard import campaigns_cache_key, dashboard_cache_key
+from services.rate_budget import RateBudget
+from services.sparkline_store import SparklineStore
+from services.swr_cache import SWRCache
+from services.warmup import CacheWarmer
+
+AD_ACCOUNTS = [
+    {"id": "act_1", "account_status": 1},
+    {"id": "act_2", "account_status": 2},
+    {"id": "act_3", "account_status": 1},
+    {"id": "act_4", "account_status": 1},
+]
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    async def load_ad_accounts(meta_token):
+        calls.append(("accounts", None))
+        return AD_ACCOUNTS
+
+    async def load_dashboard_metrics(meta_token, account_id, date_preset):
+        calls.append(("dashboard", account_id))
+        return {"totalSpend": 1.0}
+
+    async def load_campaign_list(meta_token, account_id):
+        calls.append(("campaigns", account_id))
+        return []
+
+    async def ensure_loaded(meta_token, account_id, store):
+        calls.append(("sparklines", account_id))
+
+    monkeypatch.setattr(warmup_module, "load_ad_accounts", load_ad_accounts)
+    monkeypatch.setattr(warmup_module, "load_dashboard_metrics", load_dashboard_metrics)
+    monkeypatch.setattr(warmup_module, "load_campaign_list", load_campaign_list)
+    monkeypatch.setattr(warmup_module, "ensure_loaded", ensure_loaded)
+    return calls
+
+
+def make_warmer(budget=None, **kwargs):
+    budget = budget or RateBudget()
+    return CacheWarmer(
+        cache=SWRCache(budget=budget), store=SparklineStore(capacity=30), budget=budget, **kwargs
+    )
+
+
+def run_warmup(warmer, *touches):
+    async def run():
+        tasks = []
+        for user_id, token in touches:
+            warmer.touch(user_id, token)
+            tasks.append(warmer._sessions[user_id].task)
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    return asyncio.run(run())
+
+
+class TestCacheWarmer:
+    """Test warm-up scheduling, account selection and limits"""
+
+    def test_warms_most_used_then_active_accounts(self, loads):
+        warmer = make_warmer(max_accounts=3)
+        warmer._users_by_token[warmup_module.token_fingerprint("token")] = "u1"
+        for _ in range(3):
+            warmer.record_account("token", "4")
+
+        outcome, = run_warmup(warmer, ("u1", "token"))
+
+        assert outcome == "complete"
+        assert [a for kind, a in loads if kind == "sparklines"] == ["4", "1", "3"]
+        assert dashboard_cache_key("token", "4", "last_30d") in warmer.cache._entries
+        assert campaigns_cache_key("token", "3") in warmer.cache._entries
+
+    def test_session_warmed_once(self, loads):
+        warmer = make_warmer()
+
+        async def run():
+            first = warmer.touch("u1", "token")
+            await warmer._sessions["u1"].task
+            return first, warmer.touch("u1", "token")
+
+        assert asyncio.run(run()) == (True, False)
+        assert sum(1 for kind, _ in loads if kind == "accounts") == 1
+
+    def test_sessions_and_tokens_are_bounded(self, loads):
+        warmer = make_warmer(max_users=2)
+
+        run_warmup(warmer, ("u1", "token-1"), ("u2", "token-2"), ("u3", "token-3"))
+        # u3 pushed out u1; u2's new token pushes out its old one
+        run_warmup(warmer, ("u2", "token-2b"))
+
+        assert list(warmer._sessions) == ["u3", "u2"]
+        assert list(warmer._users_by_token.values()) == ["u3", "u2"]
+
+    def test_token_change_rewarms(self, loads):
+        warmer = make_warmer()
+
+        async def run():
+            warmer.touch("u1", "old-token")
+            old_task = warmer._sessions["u1"].task
+            scheduled = warmer.touch("u1", "new-token")
+            await asyncio.gather(old_task, warmer._sessions["u1"].task, return_exceptions=True)
+            return scheduled, old_task.cancelled()
+
+        assert asyncio.run(run()) == (True, True)
+
+    def test_idle_user_stops_warmup(self, loads):
+        warmer = make_warmer(idle_after=-1)
+
+        outcome, = run_warmup(warmer, ("u1", "token"))
+
+        assert outcome == "idle"
+        assert [kind for kind, _ in loads] == ["accounts"]
+
+    def test_call_budget_stops_warmup(self, loads):
+        warmer = make_warmer(max_calls=0)
+
+        outcome, = run_warmup(warmer, ("u1", "token"))
+
+        assert outcome == "budget"
+
+    def test_throttled_accounts_are_skipped(self, loads):
+        budget = RateBudget()
+        budget.observe({"x-business-use-case-usage": json.dumps({"1": [{"call_count": 90}]})})
+        warmer = make_warmer(budget=budget, max_accounts=2)
+
+        run_warmup(warmer, ("u1", "token"))
+
+        assert [a for kind, a in loads if kind != "accounts"] == ["3", "3", "3"]
+
+    def test_budget_check_does_not_charge_the_steps(self, loads, monkeypatch):
+        monkeypatch.setattr(rate_budget_module, "time", SimpleNamespace(monotonic=lambda: 1000.0))
+        budget = RateBudget(calls_per_minute=100)
+        warmer = make_warmer(budget=budget, max_accounts=1)
+
+        run_warmup(warmer, ("u1", "token"))
+
+        # The stubbed steps make no Graph calls, so nothing is charged
+        assert [a for kind, a in loads if kind == "sparklines"] == ["1"]
+        assert budget.snapshot("1")["tokens"] == 100
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+import sys
+
+from services.jobs import run_worker_processes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run sync and backfill job workers")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("JOB_WORKER_PROCESSES", os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    print(f"👷 Starting {args.processes} job worker processes")
+
+    from api.jobs import build_worker
+
+    run_worker_processes(build_worker, args.processes)
@@ -0,0 +1,15 @@
+-- Per-account periodic sync schedule (see backend/services/sync_scheduler.py)
+CREATE TABLE IF NOT EXISTS public.account_sync_schedule (
+    account_id varchar(255) PRIMARY KEY,
+    owner varchar(255),
+    interval_seconds double precision NOT NULL,
+    next_sync_at timestamp without time zone NOT NULL,
+    last_enqueued_at timestamp without time zone,
+    spend_7d double precision NOT NULL DEFAULT 0,
+    active_campaigns integer NOT NULL DEFAULT 0,
+    views_7d double precision NOT NULL DEFAULT 0,
+    views_updated_at timestamp without time zone
+);
+
+-- Schedulers claim due accounts with FOR UPDATE SKIP LOCKED
+CREATE INDEX IF NOT EXISTS ix_account_sync_schedule_next_sync_at ON public.account_sync_schedule(next_sync_at);
@@ -0,0 +1,12 @@
+-- Checkpointed chunks of historical metric backfills (see backend/services/backfill.py)
+CREATE TABLE IF NOT EXISTS public.backfill_chunks (
+    account_id varchar(255) NOT NULL,
+    since date NOT NULL,
+    until date NOT NULL,
+    status varchar(20) NOT NULL DEFAULT 'pending',
+    report_run_id varchar(64),
+    rows integer NOT NULL DEFAULT 0,
+    started_at timestamp without time zone,
+    finished_at timestamp without time zone,
+    PRIMARY KEY (account_id, since)
+);
@@ -0,0 +1,23 @@
+-- Durable job queue for sync and backfill work (see backend/services/jobs.py)
+CREATE TABLE IF NOT EXISTS public.jobs (
+    id varchar(36) PRIMARY KEY,
+    job_type varchar(50) NOT NULL,
+    owner varchar(255),
+    payload json NOT NULL,
+    status varchar(20) NOT NULL DEFAULT 'queued',
+    priority integer NOT NULL DEFAULT 0,
+    attempts integer NOT NULL DEFAULT 0,
+    max_attempts integer NOT NULL DEFAULT 5,
+    run_at timestamp without time zone NOT NULL,
+    lease_owner varchar(255),
+    lease_expires_at timestamp without time zone,
+    last_error text,
+    result json,
+    created_at timestamp without time zone NOT NULL,
+    updated_at timestamp without time zone NOT NULL,
+    finished_at timestamp without time zone
+);
+
+-- Workers claim due jobs of a type with FOR UPDATE SKIP LOCKED
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON public.jobs(job_type, status, run_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_owner ON public.jobs(owner);
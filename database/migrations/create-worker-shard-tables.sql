@@ -0,0 +1,20 @@
+-- Consistent-hash sharding of account syncs across worker nodes (see backend/services/sharding.py)
+CREATE TABLE IF NOT EXISTS public.worker_nodes (
+    node_id varchar(255) PRIMARY KEY,
+    started_at timestamp without time zone NOT NULL,
+    heartbeat_at timestamp without time zone NOT NULL,
+    lease_expires_at timestamp without time zone NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_worker_nodes_lease_expires_at ON public.worker_nodes(lease_expires_at);
+
+CREATE TABLE IF NOT EXISTS public.account_leases (
+    account_id varchar(255) PRIMARY KEY,
+    node_id varchar(255) NOT NULL,
+    lease_expires_at timestamp without time zone NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_account_leases_node_id ON public.account_leases(node_id);
+
+-- Sharded jobs are only claimed by the node leasing their account
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS shard varchar(255);